@@ -0,0 +1,100 @@
+"""
+MoinMoin - delta_store_bench
+
+Compare the stores backend to the delta backend (text revisions stored as deltas
+against their parent revisions) for an often edited text page: size of the data
+on disk, time to store the revisions, retrieval latency and the time to compute
+the line diffs of adjacent revisions (SequenceMatcher vs. the stored deltas).
+
+Usage: python scripts/delta_store_bench.py [REVISIONS [KILOBYTES]]
+
+@copyright: 2026 MoinMoin project
+@license: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+"""
+
+import difflib
+import os
+import random
+import sys
+import tempfile
+import time
+
+from io import BytesIO
+
+from moin.constants.keys import CONTENTTYPE, DATAID, NAME, PARENTID
+from moin.storage.backends import delta, stores
+from moin.storage.stores.fs import BytesStore, FileStore
+
+REVISIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+KILOBYTES = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+
+def revisions():
+    """
+    Generate the texts of the revisions: every revision changes, adds or removes a few lines.
+    """
+    rnd = random.Random(42)
+    lines = [f"line {i}: {'some wiki text ' * 4}\n" for i in range(KILOBYTES * 1024 // 80)]
+    for number in range(REVISIONS):
+        for _ in range(rnd.randint(1, 3)):
+            pos = rnd.randrange(len(lines))
+            action = rnd.choice("cad")
+            if action == "c":
+                lines[pos] = f"line changed in revision {number}\n"
+            elif action == "a":
+                lines.insert(pos, f"line added in revision {number}\n")
+            elif len(lines) > 1:
+                del lines[pos]
+        yield "".join(lines).encode()
+
+
+def disk_usage(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, dirs, names in os.walk(path) for name in names)
+
+
+def bench(label, backend, path):
+    backend.create()
+    backend.open()
+    revids = []
+    timing = time.time()
+    for text in revisions():
+        meta = {NAME: ["page"], CONTENTTYPE: "text/x.moin.wiki;charset=utf-8"}
+        if revids:
+            meta[PARENTID] = revids[-1]
+        revids.append(backend.store(meta, BytesIO(text)))
+    store_time = time.time() - timing
+    latencies = []
+    texts = []
+    for revid in revids:
+        timing = time.time()
+        meta, data = backend.retrieve(revid)
+        texts.append((meta[DATAID], data.read()))
+        data.close()
+        latencies.append(time.time() - timing)
+    timing = time.time()
+    for (old_dataid, old), (new_dataid, new) in zip(texts, texts[1:]):
+        opcodes = backend.delta_opcodes(old_dataid, new_dataid) if isinstance(backend, delta.Backend) else None
+        if opcodes is None:
+            difflib.SequenceMatcher(None, old.splitlines(), new.splitlines()).get_opcodes()
+    diff_time = time.time() - timing
+    latencies.sort()
+    print(
+        f"{label:7s} {disk_usage(path) / 1e6:9.1f} MB {store_time:8.2f}s store "
+        f"{sum(latencies) / len(latencies) * 1000:7.2f}ms avg {latencies[len(latencies) * 99 // 100] * 1000:7.2f}ms p99 "
+        f"retrieve {diff_time / max(len(texts) - 1, 1) * 1000:7.2f}ms diff"
+    )
+    backend.close()
+
+
+def main():
+    print(f"{REVISIONS} revisions of a {KILOBYTES} KB page")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stores")
+        bench("stores", stores.Backend(BytesStore(f"{path}/meta"), FileStore(f"{path}/data")), path)
+        path = os.path.join(tmp, "delta")
+        backend = delta.Backend(BytesStore(f"{path}/meta"), FileStore(f"{path}/data"), BytesStore(f"{path}/deltas"))
+        bench("delta", backend, path)
+
+
+if __name__ == "__main__":
+    main()
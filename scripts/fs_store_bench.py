@@ -0,0 +1,63 @@
+"""
+MoinMoin - fs_store_bench
+
+Compare the fs store with all files in one directory to the fan-out layouts:
+time to iterate over all keys (as an index rebuild does), latency of opening
+single keys and time to migrate the store to the layout.
+
+Usage: python scripts/fs_store_bench.py [KEYS]
+
+@copyright: 2026 MoinMoin project
+@license: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+"""
+
+import random
+import sys
+import tempfile
+import time
+
+from moin.storage.stores.fs import BytesStore
+from moin.utils.crypto import make_uuid
+
+KEYS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+LOOKUPS = 10000
+
+
+def bench(path, levels, keys):
+    store = BytesStore(path, levels)
+    timing = time.time()
+    store.migrate(levels)
+    migrate_time = time.time() - timing
+    store.open()
+    timing = time.time()
+    count = sum(1 for key in store)
+    iterate_time = time.time() - timing
+    assert count == len(keys)
+    latencies = []
+    for key in random.sample(keys, min(LOOKUPS, len(keys))):
+        timing = time.time()
+        store[key]
+        latencies.append(time.time() - timing)
+    latencies.sort()
+    print(
+        f"{levels} levels: {migrate_time:7.2f}s migrate {iterate_time:7.2f}s iterate "
+        f"{sum(latencies) / len(latencies) * 1e6:7.1f}us avg {latencies[len(latencies) * 99 // 100] * 1e6:7.1f}us p99 open"
+    )
+    store.close()
+
+
+def main():
+    print(f"{KEYS} keys")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BytesStore(tmp)
+        store.open()
+        keys = [make_uuid() for i in range(KEYS)]
+        for key in keys:
+            store[key] = b"x" * 100
+        store.close()
+        for levels in (0, 1, 2):
+            bench(tmp, levels, keys)
+
+
+if __name__ == "__main__":
+    main()
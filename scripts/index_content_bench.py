@@ -0,0 +1,106 @@
+"""
+MoinMoin - index_content_bench
+
+Compare the ALL_REVS index with the extracted content stored in every document
+(index schema version 2) to storing it once per distinct content in the indexed
+content store (version 3): index size and history search latency, including
+the loading of the content needed for highlighting the hits.
+
+Usage: python scripts/index_content_bench.py [ITEMS [REVISIONS]]
+
+@copyright: 2026 MoinMoin project
+@license: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from whoosh.fields import TEXT
+from whoosh.filedb.filestore import FileStorage
+from whoosh.qparser import QueryParser
+
+from moin.constants.keys import ALL_REVS, CONTENT, CONTENT_HASH, ITEMID, MTIME, NAME, NAMESPACE, REVID, REV_NUMBER
+from moin.storage.middleware.indexing import IndexedContentStore, IndexingMiddleware, backend_to_index
+from moin.utils.crypto import make_uuid
+
+ITEMS = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+REVISIONS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+RUNS = 20
+WORDS = [f"word{i}" for i in range(5000)]
+
+
+def revisions():
+    rnd = random.Random(42)
+    for i in range(ITEMS):
+        itemid = make_uuid()
+        text = [rnd.choice(WORDS) for _ in range(500)]
+        for rev_number in range(1, REVISIONS + 1):
+            # every edit changes a few words only, every other revision is a metadata-only change
+            if rev_number % 2:
+                for _ in range(3):
+                    text[rnd.randrange(len(text))] = rnd.choice(WORDS)
+            meta = {
+                NAMESPACE: "",
+                NAME: [f"Item{i}"],
+                ITEMID: itemid,
+                REVID: make_uuid(),
+                REV_NUMBER: rev_number,
+                MTIME: 1000000000 + rev_number * 60,
+            }
+            yield meta, " ".join(text)
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, fn)) for root, dirs, files in os.walk(path) for fn in files)
+
+
+def build(index_dir, schema, content_store):
+    ix = FileStorage(index_dir).create_index(schema)
+    with ix.writer(limitmb=256) as writer:
+        for meta, content in revisions():
+            writer.add_document(**backend_to_index(meta, content, schema, "default"))
+            if content_store is not None:
+                content_store.put(content)
+    return ix
+
+
+def bench(label, ix, schema, indexer):
+    query = QueryParser(CONTENT, schema=schema).parse("word1 OR word2 OR word3")
+    timing = time.time()
+    for run in range(RUNS):
+        with ix.searcher() as searcher:
+            results = searcher.search(query, limit=100, terms=True)
+            for hit in results:
+                hit.highlights(CONTENT, text=indexer.indexed_content(hit))
+    timing = (time.time() - timing) / RUNS
+    print(f"{label:<35} {timing * 1000:10.1f} ms")
+
+
+indexer = IndexingMiddleware(("FileStorage", ("unused",), {}), backend=None)
+new_schema = indexer.schemas[ALL_REVS]
+old_schema = new_schema.copy()
+old_schema.remove(CONTENT_HASH)
+old_schema.remove(CONTENT)
+old_schema.add(CONTENT, TEXT(stored=True, spelling=True))
+
+print(f"Indexing {ITEMS} items with {REVISIONS} revisions each ...")
+with tempfile.TemporaryDirectory() as old_dir, tempfile.TemporaryDirectory() as new_dir:
+    old_ix = build(old_dir, old_schema, None)
+    indexer.content_store = IndexedContentStore(os.path.join(new_dir, "content"))
+    new_ix = build(new_dir, new_schema, indexer.content_store)
+    old_ix.optimize()
+    new_ix.optimize()
+    content_size = dir_size(indexer.content_store.path)
+    print(f"content stored in ALL_REVS:        {dir_size(old_dir) / 1e6:10.1f} MB")
+    print(
+        f"content in content store:          {(dir_size(new_dir) - content_size) / 1e6:10.1f} MB index"
+        f" + {content_size / 1e6:.1f} MB content store"
+    )
+    print(f"Average time of {RUNS} history searches (100 hits, highlighted):")
+    bench("content stored in ALL_REVS", old_ix, old_schema, indexer)
+    bench("content in content store", new_ix, new_schema, indexer)
+    old_ix.close()
+    new_ix.close()
@@ -0,0 +1,90 @@
+"""
+MoinMoin - index_sort_bench
+
+Measure the cost of the sorts done by hot views (+index, history, feeds, blogs)
+for column-backed (sortable) fields compared to the previous approaches
+(sorting by stored fields or by indexed terms).
+
+Usage: python scripts/index_sort_bench.py [DOCS]
+
+@copyright: 2026 MoinMoin project
+@license: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+"""
+
+import sys
+import tempfile
+import time
+
+from whoosh.query import Every
+from whoosh.sorting import FunctionFacet
+
+from moin.constants.keys import (
+    ITEMID,
+    ITEMTYPE,
+    LATEST_REVS,
+    MTIME,
+    NAME,
+    NAME_EXACT,
+    NAMESPACE,
+    PTIME,
+    PTIME_SORT,
+    REVID,
+    REV_NUMBER,
+)
+from moin.storage.middleware.indexing import IndexingMiddleware, backend_to_index
+from moin.utils.crypto import make_uuid
+
+DOCS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+RUNS = 5
+
+
+def build(indexer):
+    schema = indexer.schemas[LATEST_REVS]
+    with indexer.ix[LATEST_REVS].writer(limitmb=256) as writer:
+        for i in range(DOCS):
+            meta = {
+                NAMESPACE: "",
+                NAME: [f"Item{(i * 7919) % DOCS:08d}"],
+                ITEMID: make_uuid(),
+                REVID: make_uuid(),
+                REV_NUMBER: 1,
+                ITEMTYPE: "default",
+                MTIME: 1000000000 + i * 60,
+            }
+            if i % 3:
+                meta[PTIME] = 1000000000 + (DOCS - i) * 60
+            writer.add_document(**backend_to_index(meta, "", schema, "default"))
+
+
+def ptime_sort_key(searcher, docnum):
+    # what Blog.do_show did before PTIME_SORT existed
+    fields = searcher.stored_fields(docnum)
+    return fields.get(PTIME, fields[MTIME])
+
+
+def bench(searcher, label, sortedby, reverse=False):
+    timing = time.time()
+    for run in range(RUNS):
+        results = searcher.search(Every(), sortedby=sortedby, reverse=reverse, limit=None)
+        assert len(results) == DOCS
+    timing = (time.time() - timing) / RUNS
+    print(f"{label:<45} {timing * 1000:10.1f} ms")
+
+
+with tempfile.TemporaryDirectory() as index_dir:
+    indexer = IndexingMiddleware(("FileStorage", (index_dir,), {}), backend=None)
+    indexer.create()
+    indexer.open()
+    print(f"Indexing {DOCS} documents ...")
+    timing = time.time()
+    build(indexer)
+    print(f"Finished indexing in {time.time() - timing:.2f} seconds")
+    print(f"Average time of {RUNS} sorted searches over all {DOCS} documents:")
+    with indexer.ix[LATEST_REVS].searcher() as searcher:
+        bench(searcher, "NAME (terms, old +index / admin sort)", NAME)
+        bench(searcher, "NAME_EXACT (column)", NAME_EXACT)
+        bench(searcher, "MTIME reverse (column)", MTIME, reverse=True)
+        bench(searcher, "MTIME, REV_NUMBER reverse (columns)", [MTIME, REV_NUMBER], reverse=True)
+        bench(searcher, "ptime-or-mtime (stored fields, old blog)", FunctionFacet(ptime_sort_key), reverse=True)
+        bench(searcher, "PTIME_SORT (column)", PTIME_SORT, reverse=True)
+    indexer.close()
@@ -0,0 +1,91 @@
+"""
+MoinMoin - load_bench
+
+Compare loading a backup (moin load, i.e. deserialize) with one transaction per
+revision (batch size 1) to loading it in batches of revisions, for backends using
+the sqlite, sqla (SQLAlchemy with SQLite) and fs stores.
+
+Usage: python scripts/load_bench.py [REVISIONS [BATCH_SIZE]]
+
+@copyright: 2026 MoinMoin project
+@license: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from io import BytesIO
+
+from moin.constants.keys import CONTENTTYPE, ITEMID, ITEMTYPE, NAME, NAMESPACE, REV_NUMBER
+from moin.storage.backends import WRITE_BATCH_SIZE, stores
+from moin.storage.middleware.serialization import deserialize, serialize
+from moin.storage.stores import fs, memory, sqla, sqlite
+from moin.utils.crypto import make_uuid
+
+REVISIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+BATCH_SIZE = int(sys.argv[2]) if len(sys.argv) > 2 else WRITE_BATCH_SIZE
+
+
+def backup():
+    backend = stores.Backend(memory.BytesStore(), memory.FileStore())
+    backend.create()
+    backend.open()
+    rnd = random.Random(42)
+    for number in range(REVISIONS):
+        meta = {
+            NAME: [f"item{number}"],
+            NAMESPACE: "",
+            ITEMID: make_uuid(),
+            REV_NUMBER: 1,
+            ITEMTYPE: "default",
+            CONTENTTYPE: "text/plain;charset=utf-8",
+        }
+        backend.store(meta, BytesIO(rnd.randbytes(rnd.randint(100, 5000))))
+    dump = BytesIO()
+    serialize(backend, dump)
+    backend.close()
+    return dump
+
+
+def bench(label, make_backend, dump, tmp):
+    for batch_size in (1, BATCH_SIZE):
+        path = os.path.join(tmp, f"{label}-{batch_size}")
+        backend = make_backend(path)
+        backend.create()
+        backend.open()
+        dump.seek(0)
+        timing = time.time()
+        deserialize(dump, backend, batch_size=batch_size)
+        runtime = time.time() - timing
+        backend.close()
+        print(f"{label:7s} batch size {batch_size:5d} {runtime:7.2f}s {REVISIONS / runtime:9.0f} revisions/s")
+
+
+def main():
+    print(f"{REVISIONS} revisions")
+    dump = backup()
+    with tempfile.TemporaryDirectory() as tmp:
+        bench(
+            "sqlite",
+            lambda path: stores.Backend(
+                sqlite.BytesStore(f"{path}.db", "meta"), sqlite.FileStore(f"{path}.db", "data")
+            ),
+            dump,
+            tmp,
+        )
+        bench(
+            "sqla",
+            lambda path: stores.Backend(
+                sqla.BytesStore(f"sqlite:///{path}.db", "meta"), sqla.FileStore(f"sqlite:///{path}.db", "data")
+            ),
+            dump,
+            tmp,
+        )
+        bench("fs", lambda path: stores.Backend(fs.BytesStore(f"{path}/meta"), fs.FileStore(f"{path}/data")), dump, tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+MoinMoin - retrieve_many_bench
+
+Compare retrieving all revisions of a backend one by one (retrieve) to retrieving
+them in batches (retrieve_many), as an index rebuild does, for backends using the
+sqlite, sqla (SQLAlchemy with SQLite) and fs stores. With DROP_CACHES, the page
+cache is dropped before every run (needs root), so the stores are measured with
+a cold cache.
+
+Usage: python scripts/retrieve_many_bench.py [REVISIONS [DROP_CACHES]]
+
+@copyright: 2026 MoinMoin project
+@license: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from io import BytesIO
+
+from moin.storage.backends import stores
+from moin.storage.stores import fs, sqla, sqlite
+
+REVISIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+DROP_CACHES = len(sys.argv) > 2 and sys.argv[2] == "1"
+
+
+def drop_caches():
+    if DROP_CACHES:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+
+
+def retrieve(backend, revids):
+    for revid in revids:
+        meta, data = backend.retrieve(revid)
+        data.read()
+        data.close()
+
+
+def retrieve_many(backend, revids):
+    for revid, meta, data in backend.retrieve_many(revids):
+        data.read()
+        data.close()
+
+
+def bench(label, backend):
+    backend.create()
+    backend.open()
+    rnd = random.Random(42)
+    for number in range(REVISIONS):
+        backend.store({"name": [f"item{number}"]}, BytesIO(rnd.randbytes(rnd.randint(100, 5000))))
+    revids = list(backend)
+    backend.close()
+    for func in (retrieve, retrieve_many):
+        drop_caches()
+        backend.open()
+        timing = time.time()
+        func(backend, revids)
+        runtime = time.time() - timing
+        backend.close()
+        print(f"{label:7s} {func.__name__:14s} {runtime:7.2f}s {len(revids) / runtime:9.0f} revisions/s")
+
+
+def main():
+    print(f"{REVISIONS} revisions")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "sqlite", "store.sqlite")
+        bench("sqlite", stores.Backend(sqlite.BytesStore(db, "meta"), sqlite.FileStore(db, "data")))
+        uri = "sqlite:///" + os.path.join(tmp, "sqla", "store.sqlite")
+        bench("sqla", stores.Backend(sqla.BytesStore(uri, "meta"), sqla.FileStore(uri, "data")))
+        path = os.path.join(tmp, "fs")
+        bench("fs", stores.Backend(fs.BytesStore(f"{path}/meta"), fs.FileStore(f"{path}/data")))
+
+
+if __name__ == "__main__":
+    main()
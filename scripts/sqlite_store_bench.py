@@ -0,0 +1,82 @@
+"""
+MoinMoin - sqlite_store_bench
+
+Compare the read / write throughput of the SQLite FileStore with the v1 table
+format (base64 encoded values) to the v2 format (raw BLOBs streamed with
+incremental BLOB I/O), with and without compression.
+The peak Python memory used for the values is shown, too.
+
+Usage: python scripts/sqlite_store_bench.py [VALUES [MEGABYTES]]
+
+@copyright: 2026 MoinMoin project
+@license: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from moin.storage.stores.sqlite import FileStore, CHUNK_SIZE
+
+VALUES = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+MEGABYTES = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+
+class ValueStream:
+    """
+    A file-like value of MEGABYTES (compressible, but not trivially) generated while reading.
+    """
+
+    def __init__(self):
+        self.remaining = MEGABYTES * 1024 * 1024
+        self.chunk = b"".join(b"%08d " % i for i in range(CHUNK_SIZE // 9 + 1))[:CHUNK_SIZE]
+
+    def read(self, size=-1):
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        self.remaining -= size
+        return (self.chunk * (size // CHUNK_SIZE + 1))[:size]
+
+
+def create_v1(db_name, table_name):
+    conn = sqlite3.connect(db_name)
+    with conn:
+        conn.execute(f"create table {table_name} (key text primary key, value blob)")
+    conn.close()
+
+
+def bench(label, store):
+    total = VALUES * MEGABYTES
+    tracemalloc.start()
+    timing = time.time()
+    for i in range(VALUES):
+        store[f"key{i}"] = ValueStream()
+    write_time = time.time() - timing
+    timing = time.time()
+    for i in range(VALUES):
+        f = store[f"key{i}"]
+        while f.read(CHUNK_SIZE):
+            pass
+        f.close()
+    read_time = time.time() - timing
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<18} {total / write_time:10.1f} {total / read_time:10.1f} {peak / 1e6:10.1f}")
+
+
+print(f"Writing and reading {VALUES} values of {MEGABYTES} MB each ...")
+print(f"{'format':<18} {'write MB/s':>10} {'read MB/s':>10} {'peak MB':>10}")
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for compression_level in (0, 1):
+        for fmt in ("v1", "v2"):
+            db_name = os.path.join(tmp_dir, f"{fmt}_{compression_level}.sqlite")
+            store = FileStore(db_name, "bench", compression_level=compression_level)
+            if fmt == "v1":
+                create_v1(db_name, "bench")
+            else:
+                store.create()
+            store.open()
+            bench(f"{fmt} compression {compression_level}", store)
+            store.close()
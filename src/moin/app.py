@@ -42,12 +42,17 @@ from moin.apps.frontend.views import bad_request
 from moin.i18n import i18n_init
 from moin.search import SearchForm
 from moin.security.csp import configure_csp, set_csp_nonce
+from moin.storage.error import IndexSchemaError
 from moin.storage.middleware import protecting, indexing, routing
+from moin.storage.middleware.changefeed import ChangeFeed, ChangeFollower
+from moin.storage.middleware.merging import MERGE_SCHEDULER_SERVER, MergeScheduler, check_merge_scheduler
+from moin.storage.middleware.retention import RevisionRetention, check_revision_retention
 from moin.themes import setup_jinja_env, themed_error, ThemeSupport
 from moin.utils import get_xstatic_module_path_map
 from moin.utils import monkeypatch  # noqa
 from moin.utils.clock import Clock
 from moin.utils.forms import make_generator
+from moin.utils.warmup import Warmup
 from moin.wikiutil import WikiLinkAnalyzer
 
 logger = log.getLogger(__name__)
@@ -105,6 +110,31 @@ class MoinApp(Flask):
         with clock.timeit("create_app init backends"):
             self.init_backends()
 
+        # the wiki server (not the other moin commands) merges the index segments in the background
+        self.merge_scheduler: MergeScheduler | None = None
+        if self.cfg.index_merge_scheduler == MERGE_SCHEDULER_SERVER and info_name in ("", "run"):
+            self.merge_scheduler = MergeScheduler(
+                self.storage, interval=self.cfg.index_merge_interval, idle=self.cfg.index_merge_idle
+            ).start()
+
+        # the wiki server applies the index changes of other wiki servers sharing the backend
+        self.changefeed_follower: ChangeFollower | None = None
+        if self.storage.changefeed is not None and info_name in ("", "run"):
+            self.changefeed_follower = ChangeFollower(
+                self,
+                self.storage,
+                interval=self.cfg.index_changefeed_interval,
+                retention=self.cfg.index_changefeed_retention,
+            ).start()
+
+        # the wiki server applies the revision retention rules periodically (otherwise: moin maint-retention),
+        # in one of its processes (see RevisionRetention.run)
+        self.revision_retention: RevisionRetention | None = None
+        if self.cfg.revision_retention and self.cfg.revision_retention_interval and info_name in ("", "run"):
+            self.revision_retention = RevisionRetention(
+                self, self.storage, self.cfg.revision_retention, interval=self.cfg.revision_retention_interval
+            ).start()
+
         with clock.timeit("create_app flask-babel"):
             i18n_init(self)
 
@@ -123,6 +153,17 @@ class MoinApp(Flask):
         self.csp_last_date: str = ""
         configure_csp(self.cfg)
 
+        # the wiki server (not the other moin commands) replays the index changes of a process that died
+        # while saving or destroying revisions
+        if self.storage.journal is not None and info_name in ("", "run"):
+            with self.app_context():
+                self.storage.replay_journal()
+
+        # the wiki server warms up in the background, /+misc/ready reports when it is done
+        self.warmup: Warmup | None = None
+        if self.cfg.warmup and info_name in ("", "run"):
+            self.warmup = Warmup(self, self.cfg.warmup_urls).start()
+
         clock.stop("create_app total")
         del clock
 
@@ -252,6 +293,16 @@ class MoinApp(Flask):
                     logger.error(f"Error: Wiki index {missing_indexes} missing, please check.")
                 raise SystemExit(1)
             logger.debug("Wiki index not found.")
+        except IndexSchemaError as err:
+            # the index-* subcommands are the tools to fix this, so let them run
+            info_name = self.get_info_name()
+            if not info_name.startswith("index-"):
+                logger.error(
+                    f"Error: Wiki index is outdated ({err}). Please rebuild it: "
+                    "moin index-destroy; moin index-create; moin index-build"
+                )
+                raise SystemExit(1)
+            logger.debug("Wiki index schema is outdated.")
 
     def _init_backends(self, create_backend: bool) -> None:
         """
@@ -265,11 +316,20 @@ class MoinApp(Flask):
         if create_backend or getattr(self.cfg, "create_backend", False):
             self.router.create()
         self.router.open()
+        check_merge_scheduler(self.cfg.index_merge_scheduler)
+        check_revision_retention(self.cfg.revision_retention)
         self.storage = indexing.IndexingMiddleware(
             self.cfg.index_storage,
             self.router,
             wiki_name=self.cfg.interwikiname,
             acl_rights_contents=self.cfg.acl_rights_contents,
+            ngram_indexing=self.cfg.ngram_indexing,
+            partitioning=self.cfg.index_partitioning,
+            shards=self.cfg.index_shards,
+            defer_merges=self.cfg.index_merge_scheduler is not None,
+            changefeed=ChangeFeed.from_uri(self.cfg.index_changefeed) if self.cfg.index_changefeed else None,
+            node=self.cfg.index_changefeed_node,
+            journal=self.cfg.index_journal,
         )
 
         logger.debug("create_backend: %s ", str(create_backend))
@@ -278,6 +338,17 @@ class MoinApp(Flask):
         self.storage.open()
 
     def deinit_backends(self) -> None:
+        if getattr(self, "warmup", None) is not None:
+            self.warmup.wait()
+        if getattr(self, "merge_scheduler", None) is not None:
+            self.merge_scheduler.stop()
+            self.merge_scheduler = None
+        if getattr(self, "changefeed_follower", None) is not None:
+            self.changefeed_follower.stop()
+            self.changefeed_follower = None
+        if getattr(self, "revision_retention", None) is not None:
+            self.revision_retention.stop()
+            self.revision_retention = None
         self.storage.close()
         self.router.close()
         if self.cfg.destroy_backend:
@@ -492,6 +563,9 @@ def teardown_wiki(response):
             pass
 
     if logger.isEnabledFor(logging.DEBUG):
+        if loads := indexing.lazy_meta_loads():
+            # listing views should use index_only, so they do not load the metadata of every listed revision
+            logger.debug(f"{loads} lazy metadata loads from the backend for {request_path}")
         try:
             # whoosh cache performance
             storage = flaskg.storage
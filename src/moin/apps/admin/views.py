@@ -58,6 +58,7 @@ from moin.datastructures.backends.wiki_groups import WikiGroup
 from moin.datastructures.backends import GroupDoesNotExistError
 from moin.items import Item, acl_validate
 from moin.storage.middleware.exceptions import AccessDenied
+from moin.storage.middleware.indexing import index_only
 from moin.utils.names import CompositeName, gen_fqnames, parent_names, split_fqname
 from moin.config import default as defaultconfig
 from moin.forms import RequiredText, YourEmail
@@ -178,25 +179,26 @@ def userbrowser():
 
     revs = user.search_users()  # all users
     user_accounts = []
-    for rev in revs:
-        user_names = rev.meta[NAME]
-        display_name = rev.meta.get(DISPLAY_NAME, "")
-        user_groups = member_groups.get(user_names[0], [])
-        for name in user_names[1:]:
-            user_groups = user_groups + member_groups.get(name, [])
-        subscriptions = rev.meta[SUBSCRIPTIONS]
-        user_accounts.append(
-            dict(
-                uid=rev.meta[ITEMID],
-                name=user_names,
-                display_name=display_name,
-                fqname=CompositeName(NAMESPACE_USERS, NAME_EXACT, rev.name),
-                email=rev.meta[EMAIL] if EMAIL in rev.meta else rev.meta[EMAIL_UNVALIDATED],
-                disabled=rev.meta[DISABLED],
-                groups=user_groups,
-                subscriptions=subscriptions,
+    with index_only(NAME, NAMESPACE, ITEMID, DISPLAY_NAME, EMAIL, EMAIL_UNVALIDATED, DISABLED, SUBSCRIPTIONS):
+        for rev in revs:
+            user_names = rev.meta[NAME]
+            display_name = rev.meta.get(DISPLAY_NAME, "")
+            user_groups = member_groups.get(user_names[0], [])
+            for name in user_names[1:]:
+                user_groups = user_groups + member_groups.get(name, [])
+            subscriptions = rev.meta[SUBSCRIPTIONS]
+            user_accounts.append(
+                dict(
+                    uid=rev.meta[ITEMID],
+                    name=user_names,
+                    display_name=display_name,
+                    fqname=CompositeName(NAMESPACE_USERS, NAME_EXACT, rev.name),
+                    email=rev.meta[EMAIL] if EMAIL in rev.meta else rev.meta[EMAIL_UNVALIDATED],
+                    disabled=rev.meta[DISABLED],
+                    groups=user_groups,
+                    subscriptions=subscriptions,
+                )
             )
-        )
     return render_template("admin/userbrowser.html", user_accounts=user_accounts, title_name=_("Users"))
 
 
@@ -389,7 +391,7 @@ def itemsize():
     """Display a table with item sizes."""
     headings = [_("Size"), _("Item name")]
     query = And([Not(Term(NAMESPACE, NAMESPACE_USERPROFILES)), Not(Term(TRASH, True))])
-    revs = flaskg.storage.search_meta(query, idx_name=LATEST_REVS, sortedby=[NAME], limit=None)
+    revs = flaskg.storage.search_meta(query, idx_name=LATEST_REVS, sortedby=[NAME_EXACT], limit=None)
     rows = [(rev[SIZE], CompositeName(rev[NAMESPACE], NAME_EXACT, rev[NAME][0])) for rev in revs]
     rows = sorted(rows, reverse=True)
     return render_template("user/itemsize.html", title_name=_("Item Sizes"), headings=headings, rows=rows)
@@ -435,7 +437,7 @@ def _trashed(namespace):
 @require_permission(SUPERUSER)
 def user_acl_report(uid):
     query = Not(Term(NAMESPACE, NAMESPACE_USERPROFILES))
-    all_metas = flaskg.storage.search_meta(query, idx_name=LATEST_REVS, sortedby=[NAMESPACE, NAME], limit=None)
+    all_metas = flaskg.storage.search_meta(query, idx_name=LATEST_REVS, sortedby=[NAMESPACE, NAME_EXACT], limit=None)
     theuser = user.User(uid=uid)
     itemwise_acl = []
     for meta in all_metas:
@@ -500,7 +502,7 @@ def item_acl_report():
     If there are multiple names, the first name is used for sorting.
     """
     query = Not(Term(NAMESPACE, NAMESPACE_USERPROFILES))
-    all_metas = flaskg.storage.search_meta(query, idx_name=LATEST_REVS, sortedby=[NAMESPACE, NAME], limit=None)
+    all_metas = flaskg.storage.search_meta(query, idx_name=LATEST_REVS, sortedby=[NAMESPACE, NAME_EXACT], limit=None)
     items_acls = []
     number_modified_acls = 0
     for meta in all_metas:
@@ -559,7 +561,7 @@ def group_acl_report(group_name):
     WikiGroup or ConfigGroup name.
     """
     query = Not(Term(NAMESPACE, NAMESPACE_USERPROFILES))
-    all_metas = flaskg.storage.search_meta(query, idx_name=LATEST_REVS, sortedby=[NAMESPACE, NAME], limit=None)
+    all_metas = flaskg.storage.search_meta(query, idx_name=LATEST_REVS, sortedby=[NAMESPACE, NAME_EXACT], limit=None)
     group_items = []
     for meta in all_metas:
         acl_iterator = ACLStringIterator(ACL_RIGHTS_CONTENTS, meta.get(ACL, ""))
@@ -12,6 +12,8 @@ from io import BytesIO
 
 import json
 import pytest
+import random
+import re
 
 from flask import url_for
 from werkzeug.datastructures import FileStorage
@@ -27,6 +29,7 @@ from moin.apps._tests.utils import (
     set_user_in_client_session,
 )
 from moin.apps.frontend import views
+from moin._tests import update_item
 
 if TYPE_CHECKING:
     from flask.testing import FlaskClient
@@ -404,6 +407,94 @@ class TestFrontendNew:
             {"new_type": "text/x-markdown;charset=utf-8", "comment": "test"},
         )
 
+    def test_search_facet_counts(self, client):
+        create_user("björn", "Xiwejr622")
+        login(client, "björn", "Xiwejr622")
+        modify_item(client, "wombat1", make_modify_form_data("wombat1", content="wombat", meta_form_tags="a, b"))
+        modify_item(client, "wombat2", make_modify_form_data("wombat2", content="wombat", meta_form_tags="a"))
+        modify_item(
+            client,
+            "wombat3",
+            make_modify_form_data("wombat3", content="wombat", contenttype="text/plain;charset=utf-8"),
+        )
+        response = client.get(url_for("frontend.search", q="wombat", boolajax="true"))
+        assert response.status_code == 200
+        data = response.data.decode()
+        facet_counts = json.loads(re.search(r"data-facets='([^']*)'", data).group(1))
+        assert facet_counts["namespace"] == {"~": 3}
+        assert facet_counts["contenttype"] == {"Markup Text Items": 2, "Other Text Items": 1}
+        assert facet_counts["tags"] == {"a": 2, "b": 1}
+        assert facet_counts["mtime"] == {"day": 3}
+        # the facet counts are cached for the query, a new revision invalidates them
+        modify_item(client, "wombat3", make_modify_form_data("wombat3", content="wombat", meta_form_tags="b"))
+        response = client.get(url_for("frontend.search", q="wombat", boolajax="true", time_sorting="name"))
+        facet_counts = json.loads(re.search(r"data-facets='([^']*)'", response.data.decode()).group(1))
+        assert facet_counts["tags"] == {"a": 2, "b": 2}
+        response = client.get(url_for("frontend.search", q="wombat", boolajax="true", time_sorting="new"))
+        assert json.loads(re.search(r"data-facets='([^']*)'", response.data.decode()).group(1)) == facet_counts
+
+    def test_search_facet_counts_acl(self, client, monkeypatch):
+        create_user("björn", "Xiwejr622")
+        login(client, "björn", "Xiwejr622")
+        modify_item(client, "wombat1", make_modify_form_data("wombat1", content="wombat", meta_form_tags="a"))
+        modify_item(
+            client,
+            "wombat2",
+            make_modify_form_data(
+                "wombat2", content="wombat", meta_form_tags="secret", meta_form_acl="björn:read,write,admin"
+            ),
+        )
+        response = client.get(url_for("frontend.search", q="wombat", boolajax="true"))
+        facet_counts = json.loads(re.search(r"data-facets='([^']*)'", response.data.decode()).group(1))
+        assert facet_counts["tags"] == {"a": 1, "secret": 1}
+        # other users do not see the counts of items they may not read, the cached counts are per user
+        client.get(url_for("frontend.logout"))
+        response = client.get(url_for("frontend.search", q="wombat", boolajax="true"))
+        facet_counts = json.loads(re.search(r"data-facets='([^']*)'", response.data.decode()).group(1))
+        assert facet_counts["tags"] == {"a": 1}
+        assert facet_counts["namespace"] == {"~": 1}
+        # with the counts cached, the results are not filtered while collecting them
+        monkeypatch.setattr(views, "ReadableCollector", None)
+        response = client.get(url_for("frontend.search", q="wombat", boolajax="true"))
+        assert json.loads(re.search(r"data-facets='([^']*)'", response.data.decode()).group(1)) == facet_counts
+        assert "wombat1" in response.data.decode() and "wombat2" not in response.data.decode()
+
+    def test_search_history_highlights(self, client):
+        # ALL_REVS does not store the content, it gets loaded from the content store for highlighting
+        create_user("björn", "Xiwejr622")
+        login(client, "björn", "Xiwejr622")
+        modify_item(client, "test1", make_modify_form_data("test1", content="the old wombat."))
+        modify_item(client, "test1", make_modify_form_data("test1", content="the new wombat."))
+        response = client.get(url_for("frontend.search", q="old", history="true", boolajax="true"))
+        assert response.status_code == 200
+        assert '<b class="match term0">old</b>' in response.data.decode()
+
+    def test_search_ajax_session(self, client, monkeypatch):
+        create_user("björn", "Xiwejr622")
+        login(client, "björn", "Xiwejr622")
+        modify_item(client, "wombat1", make_modify_form_data("wombat1", content="wombat big"))
+        modify_item(client, "wombat2", make_modify_form_data("wombat2", content="wombat"))
+        response = client.get(url_for("frontend.search", q="wombat", boolajax="true", seq=10))
+        assert response.status_code == 200
+        assert "2 items found" in response.data.decode()
+        # too quickly after the previous search, older searches are superseded nevertheless
+        assert client.get(url_for("frontend.search", q="wombat ", boolajax="true", seq=11)).status_code == 429
+        assert client.get(url_for("frontend.search", q="wombat", boolajax="true", seq=10)).status_code == 204
+        monkeypatch.setattr(current_app.cfg, "search_ajax_interval", 0)
+        # unchanged search, answered from the session state
+        assert client.get(url_for("frontend.search", q="wombat ", boolajax="true", seq=12)).data == response.data
+        # refined search, searching within the previous results
+        response = client.get(url_for("frontend.search", q="wombat big", boolajax="true", seq=13))
+        assert response.status_code == 200
+        assert "1 items found" in response.data.decode()
+
+    def test_refines_query(self):
+        assert views.refines_query("wombat big", "wombat")
+        assert not views.refines_query("wombat", "wombat")
+        assert not views.refines_query("wombats", "wombat")
+        assert not views.refines_query("wombat OR big", "wombat")
+        assert not views.refines_query("name:wombat big", "name:wombat")
+
 
 @pytest.fixture
 def custom_setup():
@@ -616,3 +707,51 @@ def test_history_shows_revisions_from_before_a_rename(client):
     assert b"first revision" in rv.data
     assert b"before rename" in rv.data
     assert b"after rename" in rv.data
+
+
+@pytest.mark.usefixtures("_req_ctx")
+def test_get_item_byte_ranges():
+    """
+    Range requests for media items (e.g. seeking in a video) get 206 responses
+    with just the requested bytes.
+    """
+    rnd = random.Random(42)
+    data = rnd.randbytes(300000)
+    update_item("Video.mp4", {"contenttype": "video/mp4"}, data)
+    url = url_for("frontend.get_item", item_name="Video.mp4")
+    with current_app.test_client() as client:
+        rv = client.get(url)
+        assert rv.status_code == 200
+        assert rv.headers["Accept-Ranges"] == "bytes"
+        assert rv.data == data
+        for _ in range(20):
+            start = rnd.randrange(len(data))
+            stop = rnd.randrange(start, len(data))
+            rv = client.get(url, headers={"Range": f"bytes={start}-{stop}"})
+            assert rv.status_code == 206
+            assert rv.headers["Content-Range"] == f"bytes {start}-{stop}/{len(data)}"
+            assert rv.data == data[start : stop + 1]
+        rv = client.get(url, headers={"Range": "bytes=-100"})
+        assert rv.data == data[-100:]
+        # multiple ranges, adjacent ones are coalesced
+        ranges = [(0, 99), (1000, 1999), (2000, 2499), (299900, 400000)]
+        header = ",".join(f"{start}-{stop}" for start, stop in ranges)
+        rv = client.get(url, headers={"Range": f"bytes={header}"})
+        assert rv.status_code == 206
+        content_type, boundary = rv.headers["Content-Type"].split("; boundary=")
+        assert content_type == "multipart/byteranges"
+        assert int(rv.headers["Content-Length"]) == len(rv.data)
+        parts = rv.data.split(f"--{boundary}".encode())
+        assert parts[0] == b"" and parts[-1] == b"--\r\n"
+        for part, (start, stop) in zip(parts[1:-1], [(0, 99), (1000, 2499), (299900, 299999)]):
+            headers, body = part.split(b"\r\n\r\n", 1)
+            assert f"Content-Range: bytes {start}-{stop}/{len(data)}".encode() in headers
+            assert body == data[start : stop + 1] + b"\r\n"
+        # a changed item is sent completely
+        rv = client.get(url, headers={"Range": "bytes=0-9,20-29", "If-Range": '"outdated"'})
+        assert rv.status_code == 200
+        assert rv.data == data
+        rv = client.get(url, headers={"Range": "bytes=400000-500000"})
+        assert rv.status_code == 416
+        rv = client.get(url, headers={"Range": "bytes=400000-500000,600000-"})
+        assert rv.status_code == 416
@@ -33,6 +33,7 @@ import urllib.error
 from ast import literal_eval
 from io import BytesIO
 from datetime import datetime
+from datetime import timedelta
 from datetime import timezone
 from collections import namedtuple
 from functools import wraps, partial
@@ -55,7 +56,7 @@ from markupsafe import Markup
 
 import pytz
 
-from whoosh import sorting
+from whoosh import collectors, sorting
 from whoosh.query import Term, Prefix, And, Or, Not, DateRange
 from whoosh.query.qcore import QueryError, TermNotFound
 from whoosh.analysis import StandardAnalyzer
@@ -446,6 +447,198 @@ def add_facets(facets, time_sorting):
     return facets
 
 
+# MTIME buckets of the search facet counts: (name, maximum age), items that are older go to "older"
+MTIME_FACET_BUCKETS = [
+    ("day", timedelta(days=1)),
+    ("week", timedelta(days=7)),
+    ("month", timedelta(days=31)),
+    ("year", timedelta(days=366)),
+]
+
+
+def search_facets(now):
+    """
+    Create the facets to count the search results by namespace, contenttype group, tags and MTIME bucket.
+
+    :param now: UTC datetime the MTIME buckets are relative to
+    :returns: dict facet name -> whoosh facet, to be used as groupedby of a search
+    """
+    contenttype_groups = {
+        group: Or(
+            [
+                And([Term(CONTENTTYPE, entry.content_type.type), Term(CONTENTTYPE, entry.content_type.subtype)])
+                for entry in entries
+            ]
+        )
+        for group, entries in content_registry.groups.items()
+        if entries
+    }
+    mtime_buckets = {}
+    end = None
+    for name, age in MTIME_FACET_BUCKETS:
+        start = now - age
+        mtime_buckets[name] = DateRange(MTIME, start, end, endexcl=True)
+        end = start
+    mtime_buckets["older"] = DateRange(MTIME, None, end, endexcl=True)
+    return {
+        NAMESPACE: sorting.FieldFacet(NAMESPACE),
+        CONTENTTYPE: sorting.QueryFacet(contenttype_groups),
+        TAGS: sorting.FieldFacet(TAGS, allow_overlap=True),
+        MTIME: sorting.QueryFacet(mtime_buckets),
+    }
+
+
+def search_facet_counts(results, groupedby):
+    """
+    Get the facet counts computed while collecting the search results.
+
+    :returns: dict facet name -> dict facet value -> number of results, largest counts first
+    """
+    facet_counts = {}
+    for name in groupedby:
+        # results without a value (e.g. no tags, contenttype in no group) are grouped under None
+        counts = {value: count for value, count in results.groups(name).items() if value is not None}
+        if name == NAMESPACE:
+            counts = {namespace or NAMESPACE_UI_DEFAULT: count for namespace, count in counts.items()}
+        facet_counts[name] = dict(sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])))
+    return facet_counts
+
+
+# as-you-type (ajax) searches of a session, see AjaxSearchSession
+AJAX_SEARCH_RESULTS = 8  # number of recent result sets kept for searching refined queries within them
+AJAX_SEARCH_RESULTS_MAX = 10000  # bigger result sets are not kept
+AJAX_SEARCH_CHECK = 1000  # check for a newer search of the session after collecting this many documents
+AJAX_SEARCH_TIMEOUT = 600  # seconds the state of a session is kept in the cache
+# queries consisting of words only, the query parser combines their words with AND
+SIMPLE_QUERY_RE = re.compile(r"[\w\s]*")
+QUERY_OPERATORS = {"AND", "OR", "NOT", "ANDNOT", "ANDMAYBE", "TO"}
+
+
+def refines_query(query, previous):
+    """
+    Check if a (normalized) query refines the previous one by adding words, so it matches a subset of its results.
+    """
+    if not query.startswith(previous + " ") or not previous:
+        return False
+    return all(SIMPLE_QUERY_RE.fullmatch(q) and not QUERY_OPERATORS & set(q.split()) for q in (previous, query))
+
+
+class SearchSuperseded(Exception):
+    """
+    A newer ajax search of the same session was started.
+    """
+
+
+class SupersededCollector(collectors.WrappingCollector):
+    """
+    Collector aborting the search with SearchSuperseded when a newer ajax search of the same session was started.
+    """
+
+    def __init__(self, child, superseded):
+        super().__init__(child)
+        self.superseded = superseded
+
+    def matches(self):
+        for count, sub_docnum in enumerate(self.child.matches(), 1):
+            if not count % AJAX_SEARCH_CHECK and self.superseded():
+                raise SearchSuperseded
+            yield sub_docnum
+
+    def collect_matches(self):
+        collect = self.child.collect
+        for sub_docnum in self.matches():
+            collect(sub_docnum)
+
+
+class ReadableCollector(collectors.WrappingCollector):
+    """
+    Collector skipping the documents the current user may not read, so neither the results
+    nor the facet counts grouped while collecting them reveal anything about such items.
+
+    It filters in collect(), the wrapping collectors (SupersededCollector, FilterCollector) call it.
+    """
+
+    def __init__(self, child, may_read):
+        super().__init__(child)
+        self.may_read = may_read
+
+    def collect(self, sub_docnum):
+        if self.may_read(self.subsearcher.stored_fields(sub_docnum)):
+            return self.child.collect(sub_docnum)
+
+
+class AjaxSearchSession:
+    """
+    State of the as-you-type (ajax) searches of the current session, kept in the app cache.
+
+    search.js numbers the searches (seq) and only sends one after a pause in typing. A search is
+    abandoned as soon as a newer search of the session was started and searches following each other
+    more quickly than search_ajax_interval are refused. The latest response is kept to answer an
+    unchanged search and some recent result sets are kept to only search within them for refined queries.
+    """
+
+    def __init__(self, seq):
+        search_id = session.get("search_id")
+        if search_id is None:
+            search_id = session["search_id"] = make_uuid()
+        self.seq = seq
+        self.seq_cid = crypto.cache_key(usage="ajax_search_seq", search_id=search_id)
+        self.state_cid = crypto.cache_key(usage="ajax_search_state", search_id=search_id)
+
+    def start(self):
+        """
+        Register the search as the latest one of the session.
+
+        :returns: None if the search may run, else the HTTP status code for refusing it:
+                  204 if a newer search was started already, 429 if it follows the previous search too quickly
+        """
+        latest_seq, started = current_app.cache.get(self.seq_cid) or (0, 0.0)
+        if latest_seq >= self.seq:
+            return 204
+        now = time.time()
+        if now - started < current_app.cfg.search_ajax_interval:
+            # older searches still running are superseded nevertheless
+            current_app.cache.set(self.seq_cid, (self.seq, started), timeout=AJAX_SEARCH_TIMEOUT)
+            return 429
+        current_app.cache.set(self.seq_cid, (self.seq, now), timeout=AJAX_SEARCH_TIMEOUT)
+
+    def superseded(self):
+        latest_seq, started = current_app.cache.get(self.seq_cid) or (0, 0.0)
+        return latest_seq > self.seq
+
+    def response(self, key):
+        """
+        Get the kept response of the latest search of the session if it was done for the same key.
+        """
+        state = current_app.cache.get(self.state_cid) or {}
+        if state.get("key") == key:
+            return state["html"]
+
+    def candidates(self, scope, query):
+        """
+        Get the smallest kept result set (docnums) of a query that the given query refines, or None.
+        """
+        state = current_app.cache.get(self.state_cid) or {}
+        if state.get("scope") != scope:
+            return None
+        docsets = [docs for previous, docs in state["results"].items() if refines_query(query, previous)]
+        return min(docsets, key=len, default=None)
+
+    def save(self, key, html, scope, query, results):
+        """
+        Keep the response and the result set of a search.
+        """
+        state = current_app.cache.get(self.state_cid) or {}
+        kept = state["results"] if state.get("scope") == scope else {}
+        kept.pop(query, None)
+        if len(results) <= AJAX_SEARCH_RESULTS_MAX:
+            kept[query] = set(results.docs())
+            while len(kept) > AJAX_SEARCH_RESULTS:
+                del kept[next(iter(kept))]
+        state = dict(key=key, html=html, scope=scope, results=kept)
+        current_app.cache.set(self.state_cid, state, timeout=AJAX_SEARCH_TIMEOUT)
+
+
 def parse_scoped_query(query):
     """
     Parses a scoped query starting with '>' into (scope, actual_query).
@@ -568,13 +761,68 @@ def search():
         if terms:
             q = And([q, Or(terms)])
 
-        with flaskg.storage.indexer.ix[idx_name].searcher() as searcher:
+        ix = flaskg.storage.indexer.ix[idx_name]
+        with ix.searcher() as searcher:
             # terms is set to retrieve list of terms which matched, in the searchtemplate, for highlight.
             facets = []
             facets = add_facets(facets, time_sorting)
+            now = utcfromtimestamp(int(time.time()) // 3600 * 3600)  # MTIME buckets change hourly
+            # search.js numbers the as-you-type searches, they may be refused, abandoned or answered from the state
+            ajax_session = candidates = None
+            seq = request.args.get("seq", type=int) if ajax else None
+            if seq is not None:
+                ajax_session = AjaxSearchSession(seq)
+                status = ajax_session.start()
+                if status:
+                    return Response("", status)
+                # the docnums of kept result sets are only valid for the same index generation
+                scope = (
+                    idx_name,
+                    searcher.reader().generation(),
+                    trash,
+                    namespaces,
+                    leading_ns,
+                    filetypes,
+                    item_name,
+                    flaskg.user.name,
+                )
+                normalized_query = " ".join(query.split())
+                response_key = (scope, normalized_query, time_sorting, now)
+                html = ajax_session.response(response_key)
+                if html is not None:
+                    return html
+                candidates = ajax_session.candidates(scope, normalized_query)
+            # the facet counts do not depend on sorting, cache them for the query, index generation and user
+            # (only readable items are counted); they are computed by grouping while collecting the results
+            # (not by additional searches)
+            facet_cid = crypto.cache_key(
+                usage="search_facets",
+                idx_name=idx_name,
+                query=repr(q),
+                generation=ix.latest_generation(),
+                now=now,
+                user=flaskg.user.name,
+            )
+            facet_counts = current_app.cache.get(facet_cid)
+            groupedby = search_facets(now) if facet_counts is None else None
             flaskg.clock.start("search")
             try:
-                results = searcher.search(q, limit=100, terms=True, sortedby=facets)
+                collector = searcher.collector(
+                    limit=100, terms=True, sortedby=facets, groupedby=groupedby, maptype=sorting.Count
+                )
+                if groupedby is not None:
+                    # the templates skip unreadable results, only the grouping needs them filtered here
+                    collector = ReadableCollector(collector, flaskg.storage.may_read_rev)
+                if ajax_session:
+                    collector = SupersededCollector(collector, ajax_session.superseded)
+                    if candidates is not None:
+                        # a refined query only matches documents the previous query matched
+                        collector = collectors.FilterCollector(collector, candidates)
+                searcher.search_with_collector(q, collector)
+                results = collector.results()
+            except SearchSuperseded:
+                # search.js ignores the responses to superseded searches
+                return Response("", 204)
             # this may be an ajax transaction, search.js will handle a full page response
             except QueryError:
                 flash(_("""QueryError: invalid search term: {search_term}""").format(search_term=q), "error")
@@ -587,15 +835,22 @@ def search():
                 return render_template("search.html", query=query, medium_search_form=search_form, item_name=item_name)
 
             flaskg.clock.stop("search")
+            if facet_counts is None:
+                facet_counts = search_facet_counts(results, groupedby)
+                current_app.cache.set(facet_cid, facet_counts)
 
             if best_match and results:
                 return redirect(url_for_item(results[0][NAMES]))
 
+            if ajax_session and ajax_session.superseded():
+                return Response("", 204)
+
             flaskg.clock.start("search render")
             if ajax:
                 html = render_template(
                     "ajaxsearch.html",
                     results=results,
+                    facet_counts=facet_counts,
                     query=query,
                     omitted_words=", ".join(omitted_words),
                     history=history,
@@ -603,10 +858,13 @@ def search():
                     flaskg=flaskg,
                     subitem_target=item_name,
                 )
+                if ajax_session:
+                    ajax_session.save(response_key, html, scope, normalized_query, results)
             else:
                 html = render_template(
                     "search.html",
                     results=results,
+                    facet_counts=facet_counts,
                     query=query,
                     omitted_words=", ".join(omitted_words),
                     history=history,
@@ -2096,7 +2354,7 @@ def _compute_item_sets(wanted=False):
     existing = set()
     who_wants = {}
     query = And([Not(Term(NAMESPACE, NAMESPACE_USERPROFILES)), Not(Term(TRASH, True))])
-    metas = flaskg.storage.search_meta(query, idx_name=LATEST_REVS, sortedby=[NAME], limit=None)
+    metas = flaskg.storage.search_meta(query, idx_name=LATEST_REVS, sortedby=[NAME_EXACT], limit=None)
     if wanted:
         for meta in metas:
             existing |= set(meta[FQNAMES])
@@ -3266,7 +3524,7 @@ def global_tags(namespace):
         headline = _("Global Tags in All Namespaces")
     else:
         headline = _("Tags in Namespace '{namespace}'").format(namespace=namespace)
-    metas = flaskg.storage.search_meta(query, idx_name=LATEST_REVS, sortedby=[NAME], limit=None)
+    metas = flaskg.storage.search_meta(query, idx_name=LATEST_REVS, sortedby=[NAME_EXACT], limit=None)
     tags_counts = {}
     for meta in metas:
         tags = meta.get(TAGS, [])
@@ -7,6 +7,9 @@ MoinMoin - Tests for misc views
 
 from flask import url_for
 
+from moin.storage.middleware.changefeed import CHANGE_REMOVE, ChangeFeed, ChangeFollower
+from moin.utils.warmup import Warmup
+
 
 def test_global_sitemap(client):
     rv = client.get(url_for("misc.sitemap"))
@@ -21,3 +24,42 @@ def test_urls_names(client):
     rv = client.get(url_for("misc.urls_names"))
     assert rv.status == "200 OK"
     assert rv.headers["Content-Type"] == "text/plain; charset=utf-8"
+
+
+def test_ready(app, client):
+    rv = client.get(url_for("misc.ready"))
+    assert rv.status == "200 OK"
+    assert rv.data == b"ready\n"
+    warmup = app.warmup = Warmup(app, ["/", "/+misc/urls_names"])
+    try:
+        rv = client.get(url_for("misc.ready"))
+        assert rv.status == "503 SERVICE UNAVAILABLE"
+        # the steps work (run() logs their errors)
+        warmup.warm_indexes()
+        warmup.warm_datastructures()
+        warmup.run()
+        assert set(warmup.seconds) == {"warm_indexes", "warm_datastructures", "warm_urls"}
+        rv = client.get(url_for("misc.ready"))
+        assert rv.status == "200 OK"
+    finally:
+        app.warmup = None
+
+
+def test_metrics(app, client):
+    rv = client.get(url_for("misc.metrics"))
+    assert rv.status == "200 OK"
+    assert rv.data == b""
+    feed = ChangeFeed()
+    storage = app.storage
+    storage.changefeed, storage.node = feed, "a"
+    feed.open()
+    app.changefeed_follower = ChangeFollower(app, storage)
+    try:
+        feed.append("b", CHANGE_REMOVE, "default", "0" * 32)
+        rv = client.get(url_for("misc.metrics"))
+        assert b"# TYPE moin_index_changefeed_lag_seconds gauge\n" in rv.data
+        assert b"\nmoin_index_changefeed_behind 1\n" in rv.data
+    finally:
+        app.changefeed_follower = None
+        storage.changefeed = None
+        feed.close()
@@ -17,7 +17,8 @@ from flask import Blueprint, Response
 from whoosh.query import Term, Or, And
 
 from moin import current_app, flaskg
-from moin.constants.keys import MTIME, NAME_EXACT, NAMESPACE, NAME
+from moin.constants.keys import ITEMID, MTIME, NAME_EXACT, NAMESPACE, NAME
+from moin.storage.middleware.indexing import index_only
 from moin.themes import render_template
 from moin.utils.names import CompositeName
 
@@ -42,22 +43,23 @@ def sitemap():
         for namespace, _ in current_app.cfg.namespace_mapping
     ]
     query = Or([And([Term(NAME_EXACT, root), Term(NAMESPACE, namespace)]) for namespace, root in root_mapping])
-    for rev in flaskg.storage.search(q=query):
-        root_fqnames.append(CompositeName(rev.meta[NAMESPACE], NAME_EXACT, rev.meta[NAME][0]))
-
     sitemap = []
-    for rev in flaskg.storage.documents():
-        fqnames = rev.fqnames
-        mtime = rev.meta[MTIME]
-        # default for content items:
-        changefreq = "daily"
-        priority = "0.5"
-        for fqname in fqnames:
-            if fqname in root_fqnames:
-                # values for root items
-                changefreq = "hourly"
-                priority = "1.0"
-            sitemap.append((fqname, format_timestamp(mtime), changefreq, priority))
+    with index_only(ITEMID, MTIME, NAME, NAMESPACE):
+        for rev in flaskg.storage.search(q=query):
+            root_fqnames.append(CompositeName(rev.meta[NAMESPACE], NAME_EXACT, rev.meta[NAME][0]))
+
+        for rev in flaskg.storage.documents():
+            fqnames = rev.fqnames
+            mtime = rev.meta[MTIME]
+            # default for content items:
+            changefreq = "daily"
+            priority = "0.5"
+            for fqname in fqnames:
+                if fqname in root_fqnames:
+                    # values for root items
+                    changefreq = "hourly"
+                    priority = "1.0"
+                sitemap.append((fqname, format_timestamp(mtime), changefreq, priority))
 
     sitemap.sort()
     content = render_template("misc/sitemap.xml", sitemap=sitemap)
@@ -75,7 +77,38 @@ def urls_names():
     """
     # TODO: We currently also get deleted items; fix this.
     fq_names = []
-    for rev in flaskg.storage.documents():
-        fq_names += [fqname for fqname in rev.fqnames]
+    with index_only(ITEMID, NAME, NAMESPACE):
+        for rev in flaskg.storage.documents():
+            fq_names += [fqname for fqname in rev.fqnames]
     content = render_template("misc/urls_names.txt", fq_names=fq_names)
     return Response(content, mimetype="text/plain")
+
+
+@misc.route("/ready")
+def ready():
+    """
+    Readiness check for load balancers: 200 after the wiki server warmed up, 503 before.
+    """
+    warmup = getattr(current_app, "warmup", None)
+    if warmup is not None and not warmup.ready:
+        return Response("warming up\n", status=503, mimetype="text/plain", headers={"Retry-After": "1"})
+    return Response("ready\n", mimetype="text/plain")
+
+
+@misc.route("/metrics")
+def metrics():
+    """
+    Metrics of this wiki server in the Prometheus text format.
+    """
+    lines = []
+    follower = getattr(current_app, "changefeed_follower", None)
+    if follower is not None:
+        follower.update_lag()
+        for name, description, value in [
+            ("moin_index_changefeed_lag_seconds", "Age of the oldest change not applied yet.", follower.lag),
+            ("moin_index_changefeed_behind", "Number of changes not applied yet.", follower.behind),
+            ("moin_index_changefeed_position", "Sequence number of the last change applied.", follower.position or 0),
+            ("moin_index_changefeed_applied", "Changes of other wiki servers applied.", follower.applied),
+        ]:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return Response("".join(f"{line}\n" for line in lines), mimetype="text/plain")
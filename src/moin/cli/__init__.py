@@ -21,6 +21,7 @@ from moin.cli.maint import (
     modify_item,
     set_meta,
     serialization,
+    storage,
     reduce_revisions,
     validate_metadata,
 )
@@ -77,8 +78,12 @@ cli.add_command(index.IndexBuild)
 cli.add_command(index.IndexUpdate)
 cli.add_command(index.IndexDestroy)
 cli.add_command(index.IndexMove)
+cli.add_command(index.IndexSnapshot)
+cli.add_command(index.IndexRestore)
 cli.add_command(index.cli_IndexOptimize)
+cli.add_command(index.IndexMerge)
 cli.add_command(index.IndexDump)
+cli.add_command(index.IndexNgramBench)
 
 cli.add_command(serialization.Serialize)
 cli.add_command(serialization.Deserialize)
@@ -96,8 +101,13 @@ cli.add_command(modify_item.DumpHelp)
 cli.add_command(modify_item.LoadWelcome)
 
 cli.add_command(reduce_revisions.ReduceRevisions)
+cli.add_command(reduce_revisions.ApplyRetention)
 
 cli.add_command(set_meta.SetMeta)
+cli.add_command(storage.MigrateSqlite)
+cli.add_command(storage.MigrateFsLayout)
+cli.add_command(storage.Deduplicate)
+cli.add_command(storage.GarbageCollect)
 cli.add_command(validate_metadata.cli_ValidateMetadata)
 
 cli.add_command(import19.ImportMoin19)
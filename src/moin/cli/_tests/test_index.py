@@ -50,3 +50,36 @@ def test_index_dump(load_help):
     assert cat["namespace"] == "help-common"
     assert "rev_number" in cat
     assert cat["rev_number"] == 1
+
+
+def test_index_ngram_bench(load_help):
+    bench = run(["moin", "index-ngram-bench", "-p", "full", "-p", "1", "-p", "names", "-q", "help", "--saves", "2"])
+    assert_p_succcess(bench)
+    lines = bench.stdout.decode().splitlines()
+    assert lines[0].split() == ["policy", "index", "size", "build", "save", "avg", "save", "max", "search", "recall"]
+    assert [line.split()[0] for line in lines[1:]] == ["full", "1", "names"]
+    assert lines[1].split()[-1] == "100.0%"
+
+
+def test_index_merge(load_help):
+    merge = run(["moin", "index-merge", "--min-segments", "2"])
+    assert_p_succcess(merge)
+    lines = merge.stdout.decode().splitlines()
+    assert lines[0].split() == ["index", "status", "segments", "time"]
+    assert [line.split()[0] for line in lines[1:]] == ["latest_revs", "all_revs", "latest_meta"]
+    assert {line.split()[1] for line in lines[1:]} <= {"merged", "unchanged"}
+    assert run(["moin", "index-merge", "--daemon", "--tmp"]).returncode != 0
+
+
+def test_index_snapshot_restore(load_help):
+    dump_before = list(read_index_dump_latest_revs(run(["moin", "index-dump", "--no-truncate"]).stdout.decode()))
+    snapshot = run(["moin", "index-snapshot", "-f", "index.tgz"])
+    assert_p_succcess(snapshot)
+    assert "revisions" in snapshot.stdout.decode()
+    assert_p_succcess(run(["moin", "index-destroy"]))
+    restore = run(["moin", "index-restore", "-f", "index.tgz"])
+    assert_p_succcess(restore)
+    assert restore.stdout.decode().splitlines()[-1] == "up to date"
+    dump_after = list(read_index_dump_latest_revs(run(["moin", "index-dump", "--no-truncate"]).stdout.decode()))
+    assert dump_after == dump_before
+    assert run(["moin", "index-restore", "-f", "missing.tgz"]).returncode != 0
@@ -47,7 +47,7 @@ from whoosh.query import Every, Regex
 from moin import current_app, flaskg, log
 from moin.app import create_app, before_wiki, setup_user_anon
 from moin.apps.frontend.views import show_item
-from moin.constants.keys import CONTENTTYPE, CURRENT, NAME_EXACT, THEME_NAME, LATEST_REVS
+from moin.constants.keys import CONTENTTYPE, CURRENT, NAME_EXACT, NAMESPACE, THEME_NAME, LATEST_REVS
 from moin.constants.contenttypes import (
     CONTENTTYPE_MEDIA,
     CONTENTTYPE_MEDIA_SUFFIX,
@@ -165,7 +165,7 @@ def Dump(
 
         # In the filesystem the item cannot have the same name as the directory.
         # so we append .html to the filename for items in used_dirs.
-        for current_rev in current_app.storage.search(q, limit=None, sortedby=("namespace", "name")):
+        for current_rev in current_app.storage.search(q, limit=None, sortedby=(NAMESPACE, NAME_EXACT)):
 
             if current_rev.namespace in excluded_namespaces:
                 # we usually do not copy userprofiles, no one can login to a static wiki
@@ -4,16 +4,41 @@
 
 """
 MoinMoin - CLI commands to manage Whoosh indexes (creating, destroying, building,
-updating, moving, optimizing, and displaying).
+updating, moving, snapshotting, restoring, optimizing, merging, displaying, and
+benchmarking).
 """
 
+import os
+import random
+import re
+import tempfile
+import time
+
 import click
 
 from flask.cli import FlaskGroup
 
 from moin import current_app, flaskg, log
 from moin.app import create_app
-from moin.constants.keys import LATEST_REVS, ALL_REVS, LATEST_META
+from moin.constants.keys import (
+    ALL_REVS,
+    BACKENDNAME,
+    COMMENT,
+    CONTENT,
+    CONTENTNGRAM,
+    ITEMID,
+    LATEST_META,
+    LATEST_REVS,
+    NAMENGRAM,
+    NAMES,
+    REVID,
+    SUMMARY,
+    SUMMARYNGRAM,
+    TAGS,
+)
+from moin.storage.middleware.indexing import NGRAM_FULL, NGRAM_NAMES, backend_to_index, check_ngram_indexing
+from moin.storage.middleware.merging import MergeScheduler, SizeTieredMergePolicy
+from moin.storage.middleware.snapshot import SNAPSHOT_LOCK_TIMEOUT, SnapshotError, create_snapshot, restore_snapshot
 from moin.utils.filesys import wiki_index_exists
 
 logging = log.getLogger(__name__)
@@ -105,6 +130,50 @@ def IndexMove():
     logging.info("Index move finished")
 
 
+@cli.command("index-snapshot", help="Write a snapshot of the indexes to an archive")
+@click.option("--file", "-f", type=str, required=True, help="Filename of the archive (.tar, .tar.gz or .tgz).")
+@click.option("--tmp", is_flag=True, required=False, default=False, help="Use the temporary location.")
+@click.option(
+    "--timeout", type=float, default=SNAPSHOT_LOCK_TIMEOUT, help="Seconds to wait for index writers to finish."
+)
+def IndexSnapshot(file, tmp, timeout):
+    if not wiki_index_exists():
+        logging.error(ERR_NO_INDEX)
+        raise SystemExit(1)
+    logging.info("Index snapshot started")
+    try:
+        manifest = create_snapshot(current_app.storage, file, tmp=tmp, timeout=timeout)
+    except SnapshotError as err:
+        logging.error(f"Error: {err}")
+        raise SystemExit(1)
+    position = manifest["position"]
+    print(f"{len(manifest['files'])} files, {position['revisions']} revisions, newest mtime {position['mtime']}")
+    logging.info("Index snapshot finished")
+
+
+@cli.command("index-restore", help="Restore the indexes from a snapshot and update them")
+@click.option("--file", "-f", type=str, required=True, help="Filename of the archive.")
+@click.option("--tmp", is_flag=True, required=False, default=False, help="Use the temporary location.")
+@click.option(
+    "--update/--no-update",
+    default=True,
+    help="Update the restored indexes with the changes since the snapshot was taken.",
+)
+def IndexRestore(file, tmp, update):
+    logging.info("Index restore started")
+    try:
+        manifest = restore_snapshot(current_app.storage, file, tmp=tmp)
+    except SnapshotError as err:
+        logging.error(f"Error: {err}")
+        raise SystemExit(1)
+    position = manifest["position"]
+    print(f"restored {position['revisions']} revisions, newest mtime {position['mtime']}")
+    if update:
+        changed = current_app.storage.update(tmp=tmp)
+        print("updated" if changed else "up to date")
+    logging.info("Index restore finished")
+
+
 @cli.command("index-optimize", help="Optimize the indexes")
 @click.option("--tmp", is_flag=True, required=False, default=False, help="Use the temporary location.")
 def cli_IndexOptimize(tmp):
@@ -123,6 +192,54 @@ def IndexOptimize(tmp):
     logging.info("Index optimization finished")
 
 
+@cli.command("index-merge", help="Merge index segments of about the same size")
+@click.option("--tmp", is_flag=True, required=False, default=False, help="Use the temporary location.")
+@click.option(
+    "--min-segments", type=int, default=4, help="Merge segments of about the same size if there are this many."
+)
+@click.option("--tier-factor", type=int, default=10, help="Size ratio of the segment size tiers.")
+@click.option("--daemon", is_flag=True, default=False, help="Keep running, merge every --interval seconds.")
+@click.option(
+    "--interval", type=float, default=None, help="Seconds between merge runs (default: index_merge_interval)."
+)
+@click.option(
+    "--idle",
+    type=float,
+    default=None,
+    help="Skip indexes written to within this many seconds (default: index_merge_idle, without --daemon: 0).",
+)
+def IndexMerge(tmp, min_segments, tier_factor, daemon, interval, idle):
+    if not wiki_index_exists():
+        logging.error(ERR_NO_INDEX)
+        raise SystemExit(1)
+    if daemon and tmp:
+        logging.error("Error: --daemon can not be used with --tmp.")
+        raise SystemExit(1)
+    try:
+        policy = SizeTieredMergePolicy(min_segments=min_segments, tier_factor=tier_factor)
+    except ValueError as err:
+        logging.error(str(err))
+        raise SystemExit(1)
+    cfg = current_app.cfg
+    if daemon:
+        interval = cfg.index_merge_interval if interval is None else interval
+        idle = cfg.index_merge_idle if idle is None else idle
+        logging.info(f"Index merge daemon started, merging every {interval} s")
+        try:
+            MergeScheduler(current_app.storage, policy, interval=interval, idle=idle).run()
+        except KeyboardInterrupt:
+            pass
+        logging.info("Index merge daemon stopped")
+        return
+    logging.info("Index merge started")
+    reports = current_app.storage.merge_segments(policy, idle=idle or 0, tmp=tmp)
+    print(f"{'index':<40} {'status':<10} {'segments':>14} {'time':>9}")
+    for report in reports:
+        segments = f"{report.segments_before} -> {report.segments_after}"
+        print(f"{report.name:<40} {report.status:<10} {segments:>14} {report.seconds:>7.2f} s")
+    logging.info("Index merge finished")
+
+
 @cli.command("index-dump", help="Dump the indexes in readable form to stdout")
 @click.option("--tmp", is_flag=True, required=False, default=False, help="Use the temporary location.")
 @click.option("--truncate/--no-truncate", default=True, help="Truncate long entries.")
@@ -141,3 +258,128 @@ def IndexDump(tmp, truncate):
                 print(k, v)
             print()
     logging.info("Index dump finished")
+
+
+@cli.command("index-ngram-bench", help="Benchmark n-gram indexing policies using the latest revisions of the wiki")
+@click.option(
+    "--policy",
+    "-p",
+    "policies",
+    multiple=True,
+    help=f"Policy to benchmark: {NGRAM_FULL}, {NGRAM_NAMES} or a number of KB (default: {NGRAM_FULL}, 64, 16, "
+    f"{NGRAM_NAMES}).",
+)
+@click.option(
+    "--query",
+    "-q",
+    "queries",
+    multiple=True,
+    help="Search query to measure (default: 20 word fragments sampled from the wiki content).",
+)
+@click.option("--saves", type=int, default=50, help="Number of single document saves to measure.")
+def IndexNgramBench(policies, queries, saves):
+    if not wiki_index_exists():
+        logging.error(ERR_NO_INDEX)
+        raise SystemExit(1)
+    policies = [int(policy) if policy.isdigit() else policy for policy in policies] or [NGRAM_FULL, 64, 16, NGRAM_NAMES]
+    try:
+        check_ngram_indexing([(None, "", policy) for policy in policies])
+    except ValueError as err:
+        logging.error(str(err))
+        raise SystemExit(1)
+    indexer = current_app.storage
+    docs = _latest_revisions(indexer)
+    if not queries:
+        queries = _sample_queries(docs)
+    logging.info(f"Benchmarking {len(policies)} policies with {len(docs)} items and {len(queries)} queries")
+    # full n-gram indexing is the reference for the recall of the other policies
+    results = {
+        policy: _bench_ngram_policy(indexer, docs, queries, policy, saves)
+        for policy in dict.fromkeys([NGRAM_FULL, *policies])
+    }
+    full_hits = results[NGRAM_FULL][-1]
+    print(
+        f"{'policy':>8} {'index size':>12} {'build':>9} {'save avg':>10} {'save max':>10} {'search':>10} {'recall':>7}"
+    )
+    for policy in policies:
+        size, build_time, save_times, search_time, hits = results[policy]
+        save_avg = sum(save_times) / len(save_times) if save_times else 0
+        found = sum(len(hits[query] & full_hits[query]) for query in queries)
+        expected = sum(len(full_hits[query]) for query in queries)
+        print(
+            f"{policy:>8} {size / 1e6:>9.2f} MB {build_time:>7.2f} s {save_avg * 1000:>7.2f} ms "
+            f"{max(save_times, default=0) * 1000:>7.2f} ms {search_time * 1000 / max(len(queries), 1):>7.2f} ms "
+            f"{found / expected if expected else 1.0:>7.1%}"
+        )
+
+
+def _latest_revisions(indexer):
+    """
+    Return (meta, content, backend name) of all latest revisions.
+
+    The content is taken from the index, so we do not need to convert the revision data again.
+    """
+    with indexer.ix[LATEST_REVS].searcher() as searcher:
+        stored = [(doc[BACKENDNAME], doc[REVID], doc.get(CONTENT, "")) for doc in searcher.all_stored_fields()]
+    docs = []
+    for backend_name, revid, content in stored:
+        meta, data = indexer.backend.retrieve(backend_name, revid)
+        data.close()
+        docs.append((meta, content, backend_name))
+    return docs
+
+
+def _sample_queries(docs, count=20):
+    """
+    Sample word fragments (which need the n-gram index to be found) from the content.
+    """
+    words = sorted({word for _, content, _ in docs for word in re.findall(r"\w{6,}", content)})
+    rnd = random.Random(0)
+    queries = []
+    for word in rnd.sample(words, min(count, len(words))):
+        start = rnd.randrange(len(word) - 3)
+        queries.append(word[start : start + 4])
+    return queries
+
+
+def _bench_ngram_policy(indexer, docs, queries, policy, saves):
+    """
+    Build a LATEST_REVS index in a temporary directory using policy for all items and measure it.
+
+    :returns: index size, build time, list of save times, total search time, dict query -> set of found itemids
+    """
+    from whoosh.filedb.filestore import FileStorage
+    from whoosh.qparser import MultifieldParser
+
+    ngram_indexing = [(None, "", policy)]
+    schema = indexer.schemas[LATEST_REVS]
+    with tempfile.TemporaryDirectory() as index_dir:
+        ix = FileStorage(index_dir).create_index(schema)
+        try:
+            build_time = time.time()
+            with ix.writer(limitmb=256) as writer:
+                for meta, content, backend_name in docs:
+                    writer.add_document(**backend_to_index(meta, content, schema, backend_name, ngram_indexing))
+            build_time = time.time() - build_time
+            # saving a revision updates the latest revision in its own (committed) write
+            save_times = []
+            for meta, content, backend_name in random.Random(0).sample(docs, min(saves, len(docs))):
+                save_time = time.time()
+                with ix.writer() as writer:
+                    writer.update_document(**backend_to_index(meta, content, schema, backend_name, ngram_indexing))
+                save_times.append(time.time() - save_time)
+            ix.optimize()
+            size = sum(os.path.getsize(os.path.join(index_dir, fn)) for fn in os.listdir(index_dir))
+            # same default fields as the search view
+            qp = MultifieldParser(
+                [NAMES, NAMENGRAM, TAGS, SUMMARY, SUMMARYNGRAM, CONTENT, CONTENTNGRAM, COMMENT], schema
+            )
+            hits = {}
+            search_time = time.time()
+            with ix.searcher() as searcher:
+                for query in queries:
+                    hits[query] = {hit[ITEMID] for hit in searcher.search(qp.parse(query), limit=None)}
+            search_time = time.time() - search_time
+        finally:
+            ix.close()
+    return size, build_time, save_times, search_time, hits
@@ -6,9 +6,10 @@
 # License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
 
 """
-MoinMoin - CLI command to reduce item revisions.
+MoinMoin - CLI commands to reduce item revisions.
 
-Remove all revisions except the latest one from selected items.
+Remove all revisions except the latest one from selected items, or the revisions
+not kept by the revision retention rules.
 """
 
 import click
@@ -22,6 +23,7 @@ from moin import current_app, flaskg, log
 from moin.constants.keys import NAME, NAME_SORT, NAME_EXACT, NAMESPACE, REVID, PARENTID, REV_NUMBER, MTIME
 from moin.constants.namespaces import NAMESPACE_USERPROFILES
 from moin.app import create_app, before_wiki
+from moin.storage.middleware.retention import RETENTION_BATCH_SIZE, RevisionRetention
 
 logging = log.getLogger(__name__)
 
@@ -112,3 +114,27 @@ def ReduceRevisions(query, namespace, test):
             print("... (no historical revisions)")
 
     logging.info("Reduce revisions finished")
+
+
+@cli.command("maint-retention", help="Destroy the revisions not kept by the revision_retention rules.")
+@click.option("--dry-run", "-d", is_flag=True, help="Only report the revisions to destroy, do not destroy them.")
+@click.option(
+    "--batch-size", type=int, default=RETENTION_BATCH_SIZE, show_default=True, help="Revisions per index commit."
+)
+def ApplyRetention(dry_run, batch_size):
+    rules = current_app.cfg.revision_retention
+    if not rules:
+        logging.error("No revision_retention rules configured.")
+        raise SystemExit(1)
+    logging.info("Revision retention started")
+    retention = RevisionRetention(current_app, current_app.storage, rules, batch_size=batch_size)
+    for report in retention.run_once(dry_run=dry_run):
+        namespace = "(namespaces without a rule)" if report.namespace is None else repr(report.namespace)
+        if dry_run:
+            print(f"Namespace {namespace}: {report.destroyed} revisions of {report.items} items to destroy")
+        else:
+            print(
+                f"Namespace {namespace}: {report.destroyed} revisions of {report.items} items destroyed, "
+                f"{report.relinked} relinked in {report.seconds:.1f}s"
+            )
+    logging.info("Revision retention finished")
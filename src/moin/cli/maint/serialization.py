@@ -13,6 +13,7 @@ import click
 from flask.cli import FlaskGroup
 
 from moin import current_app, log
+from moin.storage.backends import WRITE_BATCH_SIZE
 from moin.storage.middleware.serialization import serialize, deserialize
 from moin.app import create_app
 from moin.cli._util import get_backends, drop_and_recreate_index
@@ -93,10 +94,15 @@ def Serialize(file=None, backends=None, all_backends=False):
     default=None,
     help="Namespace to delete; items within this namespace will not be loaded.",
 )
-def Deserialize(file=None, new_ns=None, old_ns=None, kill_ns=None):
+@click.option(
+    "--batch-size", type=int, default=WRITE_BATCH_SIZE, show_default=True, help="Revisions stored per transaction."
+)
+def Deserialize(file=None, new_ns=None, old_ns=None, kill_ns=None, batch_size=WRITE_BATCH_SIZE):
     logging.info("Load backup started")
     with open_file(file, "rb") as f:
-        deserialize(f, current_app.storage.backend, new_ns=new_ns, old_ns=old_ns, kill_ns=kill_ns)
+        deserialize(
+            f, current_app.storage.backend, new_ns=new_ns, old_ns=old_ns, kill_ns=kill_ns, batch_size=batch_size
+        )
     logging.info("Rebuilding the index ...")
     drop_and_recreate_index(current_app.storage)
     logging.info("Load Backup finished.")
@@ -0,0 +1,94 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - CLI commands to maintain the storage backends.
+"""
+
+import click
+import os
+
+from flask.cli import FlaskGroup
+
+from moin import current_app, log
+from moin.app import create_app
+from moin.storage.backends.dedup import Backend as DedupBackend
+from moin.storage.backends.stores import Backend as StoresBackend
+from moin.storage.gc import GC_BATCH_SIZE, GC_DIR, GC_GRACE, GC_WORKERS, GarbageCollector
+from moin.storage.stores.fs import FileStoreMixin
+from moin.storage.stores.sqlite import SqliteStoreMixin
+
+logging = log.getLogger(__name__)
+
+
+@click.group(cls=FlaskGroup, create_app=create_app)
+def cli():
+    pass
+
+
+@cli.command("maint-migrate-sqlite", help="Convert the tables of the SQLite stores to the current store format.")
+def MigrateSqlite():
+    logging.info("SQLite store migration started")
+    for backend_name, backend in current_app.router.backends.items():
+        for store in (getattr(backend, "meta_store", None), getattr(backend, "data_store", None)):
+            if isinstance(store, SqliteStoreMixin):
+                count = store.migrate()
+                logging.info(f"Backend {backend_name}: converted {count} values of {store.db_name}::{store.table_name}")
+    logging.info("SQLite store migration finished")
+
+
+@cli.command("maint-fs-layout", help="Move the files of the fs stores into the configured fan-out directory layout.")
+@click.option("--levels", "-l", type=int, default=None, help="Fan-out levels (default: as configured in the uri).")
+def MigrateFsLayout(levels):
+    logging.info("fs store layout migration started")
+    for backend_name, backend in current_app.router.backends.items():
+        for store in vars(backend).values():
+            if isinstance(store, FileStoreMixin):
+                target = store.fanout if levels is None else levels
+                count = store.migrate(target)
+                logging.info(f"Backend {backend_name}: moved {count} files of {store.path} ({target} fan-out levels)")
+    logging.info("fs store layout migration finished")
+
+
+@cli.command("maint-dedup", help="Convert the data of the dedup backends to content-addressed data, stored once.")
+def Deduplicate():
+    logging.info("Deduplication started")
+    for backend_name, backend in current_app.router.backends.items():
+        if isinstance(backend, DedupBackend):
+            report = backend.deduplicate()
+            current_app.storage.reindex_meta(backend_name, report.revids)
+            logging.info(
+                f"Backend {backend_name}: {len(report.revids)} revisions converted, {report.stored} values stored,"
+                f" {report.removed} values removed, {report.reclaimed} bytes reclaimed"
+            )
+    logging.info("Deduplication finished")
+
+
+@cli.command("maint-gc", help="Remove the data no revision references (garbage collection).")
+@click.option("--backend", "-b", "backends", multiple=True, help="Only collect the garbage of these backends.")
+@click.option("--dry-run", "-d", is_flag=True, help="Only report the unreferenced data, do not remove it.")
+@click.option("--workers", "-w", type=int, default=GC_WORKERS, show_default=True, help="Threads removing data.")
+@click.option("--batch-size", type=int, default=GC_BATCH_SIZE, show_default=True, help="Data values per batch.")
+@click.option("--work-dir", type=str, default=None, help="Directory for the state of an interrupted run.")
+@click.option(
+    "--grace",
+    type=float,
+    default=GC_GRACE,
+    show_default=True,
+    help="Seconds unreferenced data is kept after storing it.",
+)
+def GarbageCollect(backends, dry_run, workers, batch_size, work_dir, grace):
+    logging.info("Garbage collection started")
+    work_dir = work_dir or os.path.join(current_app.cfg.instance_dir, GC_DIR)
+    for backend_name, backend in current_app.router.backends.items():
+        if (backends and backend_name not in backends) or not isinstance(backend, StoresBackend):
+            continue
+        gc = GarbageCollector(backend_name, backend, work_dir, workers=workers, batch_size=batch_size, grace=grace)
+        report = gc.run(dry_run=dry_run)
+        logging.info(
+            f"Backend {backend_name}: {report.live} values referenced, {report.orphans} unreferenced"
+            f" (and {report.young} younger than {grace:g}s),"
+            f" {report.removed} removed, {report.reclaimed} bytes {'reclaimable' if dry_run else 'reclaimed'},"
+            f" {report.refcounts} reference counts repaired in {report.runtime:.1f}s"
+        )
+    logging.info("Garbage collection finished")
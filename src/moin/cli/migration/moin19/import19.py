@@ -37,6 +37,7 @@ from moin.constants.contenttypes import CONTENTTYPE_USER, CHARSET19, CONTENTTYPE
 from moin.constants.itemtypes import ITEMTYPE_DEFAULT
 from moin.constants.namespaces import NAMESPACE_DEFAULT, NAMESPACE_USERPROFILES, NAMESPACE_USERS
 from moin.constants.rights import SPECIAL_USERS
+from moin.storage.backends import WRITE_BATCH_SIZE, WriteBatch
 from moin.storage.error import NoSuchRevisionError
 from moin.utils.mimetype import MimeType
 from moin.utils.crypto import generate_token, make_uuid, hash_hexdigest
@@ -195,7 +196,18 @@ def add_missing_parents(missing_parents):
     default=256,
     help="Maximum memory (in megabytes) each index writer will use for the indexing pool.",
 )
-def ImportMoin19(data_dir=None, markup_out=None, namespace=None, procs=None, limitmb=None, latest_rev_only=False):
+@click.option(
+    "--batch-size", type=int, default=WRITE_BATCH_SIZE, show_default=True, help="Revisions stored per transaction."
+)
+def ImportMoin19(
+    data_dir=None,
+    markup_out=None,
+    namespace=None,
+    procs=None,
+    limitmb=None,
+    latest_rev_only=False,
+    batch_size=WRITE_BATCH_SIZE,
+):
     """Import content and user data from a Moin 1.9 wiki."""
 
     target_namespace = namespace
@@ -209,117 +221,124 @@ def ImportMoin19(data_dir=None, markup_out=None, namespace=None, procs=None, lim
     custom_namespaces = namespaces()
     missing_parents = set()
 
-    logging.info("PHASE1: Converting Users ...")
-    user_dir = os.path.join(data_dir, "user")
-    if os.path.isdir(user_dir):
-        for rev in UserBackend(user_dir):
-            global user_names
-            user_names.append(rev.meta[NAME][0])
-            userid_old2new[rev.uid] = rev.meta[ITEMID]  # map old userid to new userid
+    # phases 1-3 store the revisions without indexing them, in batches of batch_size revisions
+    with WriteBatch(backend, batch_size) as batch:
+        logging.info("PHASE1: Converting Users ...")
+        user_dir = os.path.join(data_dir, "user")
+        if os.path.isdir(user_dir):
+            for rev in UserBackend(user_dir):
+                global user_names
+                user_names.append(rev.meta[NAME][0])
+                userid_old2new[rev.uid] = rev.meta[ITEMID]  # map old userid to new userid
+                backend.store(rev.meta, rev.data)
+                batch.stored()
+
+        logging.info("PHASE2: Converting Pages and Attachments ...")
+        for rev in PageBackend(
+            data_dir,
+            deleted_mode=DELETED_MODE_KILL,
+            default_markup="wiki",
+            target_namespace=target_namespace,
+            latest_rev_only=latest_rev_only,
+        ):
+            for user_name in user_names:
+                if rev.meta[NAME][0] == user_name or rev.meta[NAME][0].startswith(user_name + "/"):
+                    rev.meta[NAMESPACE] = "users"
+                    users_itemlist.add(rev.meta[NAME][0])  # save itemname for link migration
+                    break
+
+            if USERID in rev.meta:
+                try:
+                    rev.meta[USERID] = userid_old2new[rev.meta[USERID]]
+                except KeyError:
+                    # user profile lost, but userid referred by revision
+                    migr_logging(
+                        "missing_user",
+                        "Missing userid {!r}, editor of {} revision {}".format(
+                            rev.meta[USERID], rev.meta[NAME][0], rev.meta[REVID]
+                        ),
+                    )
+                    del rev.meta[USERID]
+            migr_stat["revs"] += 1
             backend.store(rev.meta, rev.data)
-
-    logging.info("PHASE2: Converting Pages and Attachments ...")
-    for rev in PageBackend(
-        data_dir,
-        deleted_mode=DELETED_MODE_KILL,
-        default_markup="wiki",
-        target_namespace=target_namespace,
-        latest_rev_only=latest_rev_only,
-    ):
-        for user_name in user_names:
-            if rev.meta[NAME][0] == user_name or rev.meta[NAME][0].startswith(user_name + "/"):
-                rev.meta[NAMESPACE] = "users"
-                users_itemlist.add(rev.meta[NAME][0])  # save itemname for link migration
-                break
-
-        if USERID in rev.meta:
+            batch.stored()
+            # item_name to itemid xref required for migrating user subscriptions
+            flaskg.item_name2id[rev.meta[NAME][0]] = rev.meta[ITEMID]
+
+        logging.info("PHASE3: Converting last revision of Moin 1.9 items to Moin 2.0 markup ...")
+        conv_in = ConverterFormat19()
+        conv_out_module = importlib.import_module("moin.converters." + markup_out + "_out")
+        conv_out = conv_out_module.Converter()
+        reg = default_registry
+        refs_conv = reg.get(type_moin_document, type_moin_document, items="refs")
+        for item_name, (revno, namespace) in sorted(last_moin19_rev.items()):
             try:
-                rev.meta[USERID] = userid_old2new[rev.meta[USERID]]
-            except KeyError:
-                # user profile lost, but userid referred by revision
-                migr_logging(
-                    "missing_user",
-                    "Missing userid {!r}, editor of {} revision {}".format(
-                        rev.meta[USERID], rev.meta[NAME][0], rev.meta[REVID]
-                    ),
+                logging.debug(f'Processing item "{item_name}", namespace "{namespace}", revision "{revno}"')
+            except UnicodeEncodeError:
+                logging.debug(
+                    'Processing item "{}", namespace "{}", revision "{}"'.format(
+                        item_name.encode("ascii", errors="replace"), namespace, revno
+                    )
                 )
-                del rev.meta[USERID]
-        migr_stat["revs"] += 1
-        backend.store(rev.meta, rev.data)
-        # item_name to itemid xref required for migrating user subscriptions
-        flaskg.item_name2id[rev.meta[NAME][0]] = rev.meta[ITEMID]
-
-    logging.info("PHASE3: Converting last revision of Moin 1.9 items to Moin 2.0 markup ...")
-    conv_in = ConverterFormat19()
-    conv_out_module = importlib.import_module("moin.converters." + markup_out + "_out")
-    conv_out = conv_out_module.Converter()
-    reg = default_registry
-    refs_conv = reg.get(type_moin_document, type_moin_document, items="refs")
-    for item_name, (revno, namespace) in sorted(last_moin19_rev.items()):
-        try:
-            logging.debug(f'Processing item "{item_name}", namespace "{namespace}", revision "{revno}"')
-        except UnicodeEncodeError:
-            logging.debug(
-                'Processing item "{}", namespace "{}", revision "{}"'.format(
-                    item_name.encode("ascii", errors="replace"), namespace, revno
+            missing_parents.update(check_parents(item_name, namespace))
+            if namespace == "":
+                namespace = "default"
+            meta, data = backend.retrieve(namespace, revno)
+            data_in = data.read().decode(CHARSET19)
+            dom = conv_in(data_in, CONTENTTYPE_MOINWIKI)
+
+            iri = Iri(scheme="wiki", authority="", path="/" + item_name)
+            dom.set(moin_page.page_href, str(iri))
+            refs_conv(dom)
+
+            # migrate itemlinks to users namespace or new target namespace
+            # links to items with the name of a custom namespace and their subitems are kept untouched
+            itemlinks_19 = refs_conv.get_links()
+            user_itemlinks2chg = []
+            namespace_itemlinks2chg = []
+            for link in itemlinks_19:
+                if link in users_itemlist or link.split("/")[0] in users_itemlist:
+                    user_itemlinks2chg.append(link)
+                elif target_namespace and link not in custom_namespaces and link.split("/")[0] not in custom_namespaces:
+                    namespace_itemlinks2chg.append(link)
+            if len(user_itemlinks2chg) > 0:
+                migrate_itemlinks(dom, NAMESPACE_USERS, user_itemlinks2chg)
+            if len(namespace_itemlinks2chg) > 0:
+                migrate_itemlinks(dom, target_namespace, namespace_itemlinks2chg)
+
+            # migrate macros that need update from 1.9 to 2.0
+            migrate_macros(dom)  # in-place conversion
+
+            out = conv_out(dom)
+            out = out.encode(CHARSET19)
+            if len(user_itemlinks2chg) > 0 or len(namespace_itemlinks2chg):
+                refs_conv(dom)  # refresh changed itemlinks
+            meta[ITEMLINKS] = refs_conv.get_links()
+            meta[ITEMTRANSCLUSIONS] = refs_conv.get_transclusions()
+            meta[EXTERNALLINKS] = refs_conv.get_external_links()
+            size, hash_name, hash_digest = hash_hexdigest(out)
+            out = BytesIO(out)
+            meta[hash_name] = hash_digest
+            meta[SIZE] = size
+            meta[PARENTID] = meta[REVID]
+            meta[REVID] = make_uuid()
+            meta[REV_NUMBER] = meta[REV_NUMBER] + 1
+            # bumping modified time makes global and item history views more useful
+            meta[MTIME] = meta[MTIME] + 1
+            meta[COMMENT] = "Converted moin 1.9 markup to " + markup_out + " markup"
+            if meta[NAME][0].endswith("Group") and meta[USERGROUP]:
+                msg = "Moin1.x user list moved to User Group metadata; item content ignored. Use ShowUserGroup macro. "
+                meta[COMMENT] = msg + meta[COMMENT]
+            if meta[NAME][0].endswith("Dict") and meta[WIKIDICT]:
+                msg = (
+                    "Moin1.x Wiki Dict data moved to Wiki Dict metadata; item content ignored. Use ShowWikiDict macro. "
                 )
-            )
-        missing_parents.update(check_parents(item_name, namespace))
-        if namespace == "":
-            namespace = "default"
-        meta, data = backend.retrieve(namespace, revno)
-        data_in = data.read().decode(CHARSET19)
-        dom = conv_in(data_in, CONTENTTYPE_MOINWIKI)
-
-        iri = Iri(scheme="wiki", authority="", path="/" + item_name)
-        dom.set(moin_page.page_href, str(iri))
-        refs_conv(dom)
-
-        # migrate itemlinks to users namespace or new target namespace
-        # links to items with the name of a custom namespace and their subitems are kept untouched
-        itemlinks_19 = refs_conv.get_links()
-        user_itemlinks2chg = []
-        namespace_itemlinks2chg = []
-        for link in itemlinks_19:
-            if link in users_itemlist or link.split("/")[0] in users_itemlist:
-                user_itemlinks2chg.append(link)
-            elif target_namespace and link not in custom_namespaces and link.split("/")[0] not in custom_namespaces:
-                namespace_itemlinks2chg.append(link)
-        if len(user_itemlinks2chg) > 0:
-            migrate_itemlinks(dom, NAMESPACE_USERS, user_itemlinks2chg)
-        if len(namespace_itemlinks2chg) > 0:
-            migrate_itemlinks(dom, target_namespace, namespace_itemlinks2chg)
-
-        # migrate macros that need update from 1.9 to 2.0
-        migrate_macros(dom)  # in-place conversion
-
-        out = conv_out(dom)
-        out = out.encode(CHARSET19)
-        if len(user_itemlinks2chg) > 0 or len(namespace_itemlinks2chg):
-            refs_conv(dom)  # refresh changed itemlinks
-        meta[ITEMLINKS] = refs_conv.get_links()
-        meta[ITEMTRANSCLUSIONS] = refs_conv.get_transclusions()
-        meta[EXTERNALLINKS] = refs_conv.get_external_links()
-        size, hash_name, hash_digest = hash_hexdigest(out)
-        out = BytesIO(out)
-        meta[hash_name] = hash_digest
-        meta[SIZE] = size
-        meta[PARENTID] = meta[REVID]
-        meta[REVID] = make_uuid()
-        meta[REV_NUMBER] = meta[REV_NUMBER] + 1
-        # bumping modified time makes global and item history views more useful
-        meta[MTIME] = meta[MTIME] + 1
-        meta[COMMENT] = "Converted moin 1.9 markup to " + markup_out + " markup"
-        if meta[NAME][0].endswith("Group") and meta[USERGROUP]:
-            msg = "Moin1.x user list moved to User Group metadata; item content ignored. Use ShowUserGroup macro. "
-            meta[COMMENT] = msg + meta[COMMENT]
-        if meta[NAME][0].endswith("Dict") and meta[WIKIDICT]:
-            msg = "Moin1.x Wiki Dict data moved to Wiki Dict metadata; item content ignored. Use ShowWikiDict macro. "
-            meta[COMMENT] = msg + meta[COMMENT]
-        meta[CONTENTTYPE] = CONTENTTYPE_MARKUP_OUT[markup_out]
-        del meta[DATAID]
-        out.seek(0)
-        backend.store(meta, out)
+                meta[COMMENT] = msg + meta[COMMENT]
+            meta[CONTENTTYPE] = CONTENTTYPE_MARKUP_OUT[markup_out]
+            del meta[DATAID]
+            out.seek(0)
+            backend.store(meta, out)
+            batch.stored()
 
     logging.info("PHASE4: Adding missing parents ...")
 
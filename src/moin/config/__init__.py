@@ -15,6 +15,12 @@ if TYPE_CHECKING:
 
 NamespaceMapping: TypeAlias = list[tuple[str, str]]
 
+# (namespace or None for all namespaces, contenttype prefix, n-gram indexing policy)
+NgramIndexing: TypeAlias = list[tuple[str | None, str, str | int]]
+
+# namespace (None for all other namespaces) -> revision retention rule
+RevisionRetentionRules: TypeAlias = dict[str | None, dict[str, Any]]
+
 BackendMapping: TypeAlias = dict[str, "BackendBase"]
 
 ItemViews: TypeAlias = list[tuple[str, str, str, bool]]
@@ -79,6 +85,16 @@ class WikiConfigProtocol(Protocol):
     endpoints_excluded: list[str]
     expanded_quicklinks_size: int
     groups: Callable[[], BaseGroupsBackend]
+    index_changefeed: str | None
+    index_changefeed_interval: float
+    index_changefeed_node: str | None
+    index_changefeed_retention: float
+    index_journal: bool
+    index_merge_idle: float
+    index_merge_interval: float
+    index_merge_scheduler: str | None
+    index_partitioning: str | None
+    index_shards: dict[str, str]
     index_storage: IndexStorageConfig
     instance_dir: str
     interwikiname: str
@@ -95,12 +111,16 @@ class WikiConfigProtocol(Protocol):
     mimetypes_to_index_as_empty: list[str] = []
     mimetypes_xss_protect: list[str]
     namespace_mapping: NamespaceMapping
+    ngram_indexing: NgramIndexing
     navi_bar: NaviBarEntries
     password_checker: PasswordChecker | None
     plugin_dirs: list[str]
     registration_hint: str
     registration_only_by_superuser: bool
+    revision_retention: RevisionRetentionRules
+    revision_retention_interval: float | None
     root_mapping: dict[str, str]
+    search_ajax_interval: float
     secrets: dict[str, str] | str
     SecurityPolicy: type[DefaultSecurityPolicy]
     serve_files: dict[str, str]
@@ -117,6 +137,8 @@ class WikiConfigProtocol(Protocol):
     user_gravatar_default_img: str
     user_homewiki: str
     user_use_gravatar: bool
+    warmup: bool
+    warmup_urls: list[str]
     wiki_local_dir: str
     wikiconfig_dir: str
 
@@ -35,7 +35,16 @@ from moin.security import AccessControlList, DefaultSecurityPolicy
 if TYPE_CHECKING:
     from collections.abc import Callable
     from moin.auth import BaseAuth
-    from moin.config import AclMapping, BackendMapping, ItemViews, NamespaceMapping, NaviBarEntries, PasswordChecker
+    from moin.config import (
+        AclMapping,
+        BackendMapping,
+        ItemViews,
+        NamespaceMapping,
+        NaviBarEntries,
+        NgramIndexing,
+        RevisionRetentionRules,
+    )
+    from moin.config import PasswordChecker
     from moin.datastructures.backends import BaseDictsBackend, BaseGroupsBackend
 
 logging = log.getLogger(__name__)
@@ -106,6 +115,16 @@ class ConfigFunctionality:
     endpoints_excluded: list[str]
     expanded_quicklinks_size: int
     groups: Callable[[], BaseGroupsBackend]
+    index_changefeed: str | None
+    index_changefeed_interval: float
+    index_changefeed_node: str | None
+    index_changefeed_retention: float
+    index_journal: bool
+    index_merge_idle: float
+    index_merge_interval: float
+    index_merge_scheduler: str | None
+    index_partitioning: str | None
+    index_shards: dict[str, str]
     index_storage: IndexStorageConfig
     instance_dir: str
     interwikiname: str
@@ -124,13 +143,17 @@ class ConfigFunctionality:
     mimetypes_to_index_as_empty: list[str] = []
     mimetypes_xss_protect: list[str]
     namespace_mapping: NamespaceMapping
+    ngram_indexing: NgramIndexing
     navi_bar: NaviBarEntries
     password_checker: PasswordChecker | None
     password_hasher_config: PasswordHasherConfig
     plugin_dirs: list[str]
     registration_hint: str
     registration_only_by_superuser: bool
+    revision_retention: RevisionRetentionRules
+    revision_retention_interval: float | None
     root_mapping: dict[str, str]
+    search_ajax_interval: float
     secrets: dict[str, str] | str
     serve_files: dict[str, str]
     show_hosts: bool
@@ -146,6 +169,8 @@ class ConfigFunctionality:
     user_gravatar_default_img: str
     user_homewiki: str
     user_use_gravatar: bool
+    warmup: bool
+    warmup_urls: list[str]
     wiki_local_dir: str
     wikiconfig_dir: str
 
@@ -639,6 +664,82 @@ options_no_group_name: dict[str, OptionsGroup] = {
                 + "E.g.: [('', dict(default='All:read,write,create,admin')), ].",
             ),
             Option("mimetypes_to_index_as_empty", [], "List of mimetypes which are indexed as though they were empty."),
+            Option(
+                "ngram_indexing",
+                [],
+                "A list of tuples, each tuple containing: namespace (None: all namespaces), contenttype prefix, "
+                + "n-gram indexing policy for the content of matching items: 'full', 'names' (only names and summary) "
+                + "or the number of KB of content to index. The first matching tuple wins, default is 'full'. "
+                + "E.g.: [('users', '', 'names'), (None, 'image/', 'names'), (None, '', 64)].",
+            ),
+            Option(
+                "index_partitioning",
+                None,
+                "Split the index of all revisions into time partitions by modification time: None (no partitions), "
+                + "'year' or 'month'. Changing it requires rebuilding the indexes.",
+            ),
+            Option(
+                "index_shards",
+                {},
+                "Map namespaces to index shards (dict namespace -> shard name made of a-z and 0-9), e.g. "
+                + "{'userprofiles': 'users'}. Other namespaces use the default shard. Changing it requires "
+                + "rebuilding the indexes.",
+            ),
+            Option(
+                "index_merge_scheduler",
+                None,
+                "Merge index segments in the background instead of when saving: None (merge when saving), "
+                + "'server' (a thread of the wiki server merges them) or 'daemon' (run 'moin index-merge --daemon').",
+            ),
+            Option("index_merge_interval", 300, "Seconds between the runs of the index merge scheduler."),
+            Option(
+                "index_merge_idle",
+                30,
+                "The index merge scheduler only merges the segments of indexes not written to for this many seconds.",
+            ),
+            Option(
+                "index_changefeed",
+                None,
+                "SQLAlchemy database URI (optionally followed by '::table_name') of the index change feed shared by "
+                + "several wiki servers using the same backend, every server applies the changes of the others to its "
+                + "local indexes. None: no change feed.",
+            ),
+            Option(
+                "index_changefeed_node", None, "Name of this wiki server in the index change feed (None: host name)."
+            ),
+            Option(
+                "index_changefeed_interval",
+                1.0,
+                "Seconds between polls of the index change feed (about the maximum lag of the local indexes).",
+            ),
+            Option(
+                "index_changefeed_retention",
+                7 * 24 * 3600,
+                "Seconds the changes are kept in the index change feed, a wiki server offline for longer updates its "
+                + "indexes from the backend.",
+            ),
+            Option(
+                "index_journal",
+                False,
+                "Record index changes in a write-ahead journal before changing the backend, the changes of a wiki "
+                + "process that died before writing them to the indexes are replayed when a wiki server starts "
+                + "(the indexes are written synchronously then).",
+            ),
+            Option(
+                "revision_retention",
+                {},
+                "Map namespaces (None: all other namespaces) to revision retention rules, dicts with the keys "
+                + "keep_last (keep the newest N revisions), keep_days (keep the revisions newer than D days) and "
+                + "thin ('daily' or 'weekly': of the other revisions keep the newest one per day / week). The latest "
+                + "revision is always kept. E.g.: {'userprofiles': {}, None: dict(keep_last=50, thin='weekly')}. "
+                + "Applied by 'moin maint-retention' or, see revision_retention_interval, by the wiki server.",
+            ),
+            Option(
+                "revision_retention_interval",
+                None,
+                "Seconds between the runs of the revision retention in a thread of the wiki server "
+                + "(None: only apply it with 'moin maint-retention').",
+            ),
         ),
     ),
     # ==========================================================================
@@ -722,6 +823,11 @@ options_no_group_name: dict[str, OptionsGroup] = {
             Option("config_check_enabled", False, "if True, check configuration for unknown settings."),
             Option("timezone_default", "UTC", "Default time zone."),
             Option("locale_default", "en_US", "Default locale for user interface and content."),
+            Option(
+                "search_ajax_interval",
+                0.2,
+                "Minimum time, in seconds, between the as-you-type searches of a session (0: no limit).",
+            ),
             # ('log_remote_addr', True, "if True, log the remote IP address (and maybe hostname)."),
             Option(
                 "log_reverse_dns_lookups",
@@ -755,6 +861,13 @@ options_no_group_name: dict[str, OptionsGroup] = {
             ),
             Option("content_security_policy_limit_per_day", 100, "Limit of reports logged per day."),
             Option("allow_style_attributes", False, "Allow style attributes in HTML or MarkDown content"),
+            Option(
+                "warmup",
+                False,
+                "if True, the wiki server warms up at startup (opens the indexes, loads the groups and dicts, "
+                + "renders warmup_urls) in the background, /+misc/ready reports when it is done.",
+            ),
+            Option("warmup_urls", ["/"], "URLs (paths) of views rendered when the wiki server warms up."),
             # admin emails
             Option("admin_emails", [], 'Administrator email addresses, e.g. ["admin <admin@example.org>"]'),
         ),
@@ -300,6 +300,7 @@ SESSION_COOKIE_SAMESITE = "Lax"  # flask default is None
 SEND_FILE_MAX_AGE_DEFAULT = 86400
 
 # USE_X_SENDFILE = False
+# X_ACCEL_REDIRECT = [("/srv/mywiki/wiki/data", "/moin-data")]  # nginx: data directory, internal location
 # LOGGER_NAME = 'MoinMoin'
 # set TRUSTED_HOSTS to prevent host header injection (e.g. for public or intranet wikis)
 TRUSTED_HOSTS = ["localhost", "127.0.0.1"]  # add your webserver hostnames
@@ -47,8 +47,13 @@ def cfg():
 
 
 @pytest.fixture
-def app(cfg):
-    namespace_mapping, backend_mapping, acl_mapping = create_simple_mapping("stores:memory:", cfg.default_acl)
+def storage_uri():
+    return "stores:memory:"
+
+
+@pytest.fixture
+def app(cfg, storage_uri):
+    namespace_mapping, backend_mapping, acl_mapping = create_simple_mapping(storage_uri, cfg.default_acl)
     more_config = dict(
         namespace_mapping=namespace_mapping,
         backend_mapping=backend_mapping,
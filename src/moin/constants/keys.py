@@ -65,6 +65,7 @@ PARENTNAMES = "parentnames"
 DATAID = "dataid"
 WIKINAME = "wikiname"
 CONTENT = "content"
+CONTENT_HASH = "content_hash"  # index only: key of the extracted content in the indexed content store
 REFERS_TO = "refers_to"
 # list of metadata fields that editors cannot modify
 # excludes COMMENT, SUMMARY, TAG, USERGROUP and WIKIDICT
@@ -159,6 +160,7 @@ LOGO = "logo"
 SUPERTAGS = "supertags"
 # keys for blog entries
 PTIME = "ptime"
+PTIME_SORT = "ptime_sort"  # index only: PTIME or, if not given, MTIME - used for sorting blog entries
 
 # Index names
 LATEST_REVS = "latest_revs"
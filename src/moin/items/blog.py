@@ -15,7 +15,6 @@ from datetime import datetime
 from flask import request, abort
 
 from whoosh.query import Term, And, Prefix
-from whoosh.sorting import FunctionFacet
 
 from moin import flaskg
 from moin.apps.frontend.views import get_item_permissions
@@ -24,7 +23,7 @@ from moin.themes import render_template
 from moin.forms import Text, Tags, DateTime
 from moin.storage.middleware.exceptions import AccessDenied
 from moin.constants.itemtypes import ITEMTYPE_BLOG, ITEMTYPE_BLOG_ENTRY
-from moin.constants.keys import NAME_EXACT, ITEMTYPE, MTIME, PTIME, TAGS
+from moin.constants.keys import NAME_EXACT, ITEMTYPE, PTIME_SORT, TAGS
 from moin.items import Item, Default, register, BaseMetaForm
 from moin.utils.names import split_fqname
 
@@ -74,20 +73,9 @@ class Blog(Default):
         if tag:
             terms.append(Term(TAGS, tag))
         query = And(terms)
-
-        def ptime_sort_key(searcher, docnum):
-            """
-            Compute the publication time key for blog entries sorting.
-
-            If PTIME is not defined, we use MTIME.
-            """
-            fields = searcher.stored_fields(docnum)
-            ptime = fields.get(PTIME, fields[MTIME])
-            return ptime
-
-        ptime_sort_facet = FunctionFacet(ptime_sort_key)
-
-        revs = flaskg.storage.search(query, sortedby=ptime_sort_facet, reverse=True, limit=None)
+        # PTIME_SORT is the publication time (or MTIME, if PTIME is not defined),
+        # precomputed at indexing time and stored in a sortable column.
+        revs = flaskg.storage.search(query, sortedby=PTIME_SORT, reverse=True, limit=None)
         blog_entry_items = [Item.create(rev.name, rev_id=rev.revid) for rev in revs]
         item_may = get_item_permissions(self.name, self)
         return render_template(
@@ -539,6 +539,7 @@ class Binary(Content):
         return self._do_get(hash, member, force_attachment=force_attachment, mimetype=mimetype)
 
     def _do_get(self, hash, member=None, force_attachment=False, mimetype=None):
+        local_path = None
         if member:  # content = file contained within a archive item revision
             path, filename = os.path.split(member)
             mt = MimeType.from_filename(filename)
@@ -555,13 +556,16 @@ class Binary(Content):
                 mt = MimeType.from_filename(filename)
             else:
                 mt = MimeType(mimestr)
-            file_to_send = rev.data
+            # a plain file can be sent by the WSGI / web server (sendfile, X-Sendfile, X-Accel-Redirect)
+            local_path = rev.local_path()
+            file_to_send = None if local_path else rev.data
         if mimetype:
             content_type = mimetype
         else:
             content_type = mt.content_type()
         as_attachment = force_attachment or mt.as_attachment(current_app.cfg)
         return send_file(
+            filename=local_path,
             file=file_to_send,
             mimetype=content_type,
             as_attachment=as_attachment,
@@ -1076,7 +1080,7 @@ class Text(Binary):
         """
         from moin.items import Item  # XXX causes import error if placed near top
 
-        diffs = self._get_data_diff_html(oldrev.data, newrev.data)
+        diffs = self._get_data_diff_html(oldrev.data, newrev.data, opcodes=newrev.delta_opcodes(oldrev))
         item = Item.create(fqname.fullname, rev_id=newrev.meta[REVID])
         rendered = safe_markup(item.content.render_data())
         return render_template(
@@ -1089,17 +1093,18 @@ class Text(Binary):
             rev_links=rev_links,
         )
 
-    def _get_data_diff_html(self, oldfile, newfile):
+    def _get_data_diff_html(self, oldfile, newfile, opcodes=None):
         """Get the HTML diff of 2 versions of file contents
 
         :param oldfile: file that contains old content data (bytes)
         :param newfile: file that contains new content data (bytes)
+        :param opcodes: line opcodes of the change, if the storage backend knows them
         :return: list of tuples of the format (left lineno, deleted Markup content,
                  right lineno, added Markup content)
         """
         old_text = self.data_storage_to_internal(oldfile.read())
         new_text = self.data_storage_to_internal(newfile.read())
-        return [(d[0], safe_markup(d[1]), d[2], safe_markup(d[3])) for d in html_diff(old_text, new_text)]
+        return [(d[0], safe_markup(d[1]), d[2], safe_markup(d[3])) for d in html_diff(old_text, new_text, opcodes)]
 
     def _get_data_diff_text(self, oldfile, newfile):
         """Get the text diff of 2 versions of file contents
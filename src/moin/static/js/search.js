@@ -6,9 +6,9 @@
 
     search.js is loaded by search.html which includes ajaxsearch.html.
 
-    These functions monitor changes to the Search Options form and create an ajax transaction after each
-    key stroke or mouse click. When the transaction completes the ajaxsearch.html content is updated
-    with the transaction results.
+    These functions monitor changes to the Search Options form and create an ajax transaction after a
+    pause in keying or a mouse click. When the transaction completes the ajaxsearch.html content is updated
+    with the transaction results. The transactions are numbered, the server abandons superseded ones.
 */
 
 $(document).ready(function(){
@@ -31,14 +31,50 @@ $(document).ready(function(){
     // TODO: Basic theme should do this some other way
     $('.moin-loginsettings').addClass('navbar-right');
 
+    // show the number of results per namespace and content type group next to the search options
+    function show_facet_counts() {
+        var facets = $('#moin-search-facets').data('facets') || {};
+        $('[name="itemtype"], [name="namespace"]').each(function() {
+            var counts, key, text = "";
+            if ($(this).attr('name') === "namespace") {
+                counts = facets.namespace;
+                key = $(this).val();
+            } else {
+                counts = facets.contenttype;
+                key = $(this).data('facet');
+            }
+            if (counts && key !== undefined) {
+                text = "(" + (counts[key] || 0) + ")";
+            }
+            $(this).siblings('.moin-facet-count').text(text);
+        });
+    }
+    show_facet_counts();
+
+    // minimum time between transactions, the server refuses faster ones of the same session
+    var search_interval = parseFloat($('#moin-search-interval').val() || "0") * 1000;
+    // number of the latest transaction, it must increase across page loads of the session
+    var search_seq = 0;
+    var search_request = null;
+    var search_timer = null;
+
     // execute ajax transaction and replace old ajaxsearch.html content with updated ajaxsearch.html results
     function ajaxify(query, allrevs, time_sorting, filetypes, namespaces, trash) {
         var wiki_root = $('#moin-wiki-root').val();
-        $.ajax({
+        var seq = search_seq = Math.max(Date.now(), search_seq + 1);
+        if (search_request) {
+            // superseded, the server stops working on it with the next transaction
+            search_request.abort();
+        }
+        search_request = $.ajax({
             type: "GET",
             url: wiki_root + "/+search",
-            data: { q: query, history: allrevs, time_sorting: time_sorting, filetypes: filetypes, namespaces: namespaces, trash: trash, boolajax: true }
-        }).done(function(data) {
+            data: { q: query, history: allrevs, time_sorting: time_sorting, filetypes: filetypes, namespaces: namespaces, trash: trash, boolajax: true, seq: seq }
+        }).done(function(data, status, xhr) {
+            if (seq !== search_seq || xhr.status === 204) {
+                // superseded by a newer transaction
+                return;
+            }
             if (data.search(/doctype/i) > 0) {
                 // this is a full page with a flash error message, replace everything
                 $("body").html(data);
@@ -48,9 +84,17 @@ $(document).ready(function(){
             } else {
                 // normal response replaces old ajaxsearch.html
                 $('#finalresults').html(data);
+                show_facet_counts();
                 // ajax search does not support search by item name; hide "item search' heading if present
                 $('#moin-content h2').hide();
             }
+        }).fail(function(xhr) {
+            if (xhr.status === 429 && seq === search_seq) {
+                // too many transactions, e.g. from several pages of the session, try again later
+                search_timer = setTimeout(function() {
+                    ajaxify(query, allrevs, time_sorting, filetypes, namespaces, trash);
+                }, search_interval);
+            }
         });
     }
 
@@ -60,8 +104,10 @@ $(document).ready(function(){
     }));
 
     // detects change in search text field, or is called by function above. Collects form data and passes it to `ajaxify` function above
+    // after a pause in keying
     $('.moin-search-query').keyup(function() {
         var allrev, time_sorting;
+        var query = $(this).val();
         var filetypes = "";
         var namespaces = "";
         var trash = "";
@@ -76,6 +122,9 @@ $(document).ready(function(){
             namespaces += $(this).val() + ',';
         });
 
-        ajaxify($(this).val(), allrev, time_sorting, filetypes, namespaces, trash);
+        clearTimeout(search_timer);
+        search_timer = setTimeout(function() {
+            ajaxify(query, allrev, time_sorting, filetypes, namespaces, trash);
+        }, search_interval);
     });
 });
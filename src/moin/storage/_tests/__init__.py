@@ -0,0 +1,6 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - storage tests.
+"""
@@ -8,11 +8,13 @@ MoinMoin - backend base classes.
 
 from __future__ import annotations
 
-from typing import Any, Iterator
+from typing import Any, Iterable, Iterator
 from typing_extensions import Self
 
 from abc import abstractmethod, ABCMeta
 
+WRITE_BATCH_SIZE = 1000  # revisions stored per batch (transaction) by WriteBatch
+
 
 class BackendBase(metaclass=ABCMeta):
     """
@@ -69,6 +71,20 @@ class BackendBase(metaclass=ABCMeta):
         Return meta and data related to metaid.
         """
 
+    def retrieve_many(self, metaids: Iterable[str]) -> Iterator[tuple[str, Any, Any]]:
+        """
+        Yield (metaid, meta, data) for the given metaids, in the order of the metaids.
+        Metaids not in the backend are skipped.
+
+        Backends that can retrieve many revisions at once override this.
+        """
+        for metaid in metaids:
+            try:
+                meta, data = self.retrieve(metaid)
+            except KeyError:
+                continue
+            yield metaid, meta, data
+
     @abstractmethod
     def store(self, meta, data) -> str:
         """
@@ -80,3 +96,51 @@ class BackendBase(metaclass=ABCMeta):
         """
         Delete meta and data related to metaid from the backend.
         """
+
+    def begin_batch(self) -> None:
+        """
+        Begin a batch of writes, see begin_batch of the stores.
+        """
+
+    def commit_batch(self) -> None:
+        """
+        Commit the writes of the batch and end it.
+        """
+
+
+class WriteBatch:
+    """
+    Store many revisions in batches of batch_size revisions: one transaction per batch
+    for the stores supporting it, instead of one per revision (e.g. for moin load)::
+
+        with WriteBatch(backend) as batch:
+            for meta, data in revisions:
+                backend.store(meta, data)
+                batch.stored()
+
+    The writes done so far are committed also if an exception is raised.
+    """
+
+    def __init__(self, backend, batch_size: int = WRITE_BATCH_SIZE) -> None:
+        """
+        :param backend: a backend or the routing middleware
+        """
+        self.backend = backend
+        self.batch_size = batch_size
+        self.count = 0
+
+    def __enter__(self) -> Self:
+        self.backend.begin_batch()
+        return self
+
+    def stored(self) -> None:
+        """
+        Count a stored revision, commit the batch when it is full.
+        """
+        self.count += 1
+        if self.count % self.batch_size == 0:
+            self.backend.commit_batch()
+            self.backend.begin_batch()
+
+    def __exit__(self, *exc_info) -> None:
+        self.backend.commit_batch()
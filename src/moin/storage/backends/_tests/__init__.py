@@ -12,7 +12,7 @@ import pytest
 from io import BytesIO
 
 from moin.constants.keys import SIZE, HASH_ALGORITHM
-from moin.storage.backends import BackendBase
+from moin.storage.backends import BackendBase, WriteBatch
 
 
 class WithBE(Protocol):
@@ -133,3 +133,19 @@ class MutableBackendTestBase(BackendTestBase):
             m = tuple(sorted(m.items()))
             result.add((k, m, d.read()))
         assert result == expected_result
+
+    def test_retrieve_many(self):
+        revids = [self.be.store(dict(name=str(i)), BytesIO(b"data %d" % i)) for i in range(5)]
+        wanted = revids[::-1] + ["doesnotexist"]
+        result = [(revid, meta["name"], data.read()) for revid, meta, data in self.be.retrieve_many(wanted)]
+        assert result == [(revid, str(i), b"data %d" % i) for i, revid in reversed(list(enumerate(revids)))]
+
+    def test_write_batch(self):
+        with WriteBatch(self.be, batch_size=2) as batch:
+            revids = []
+            for i in range(5):
+                revids.append(self.be.store(dict(name=str(i)), BytesIO(b"data %d" % i)))
+                batch.stored()
+            assert sorted(self.be) == sorted(revids)
+        assert batch.count == 5
+        assert [self.be.retrieve(revid)[1].read() for revid in revids] == [b"data %d" % i for i in range(5)]
@@ -0,0 +1,170 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - dedup backend tests.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pytest
+
+from moin.constants.keys import DATAID, HASH_ALGORITHM, NAME, REVID, SIZE
+from moin.storage.backends import dedup, stores
+from moin.storage.stores import fs, sqla, sqlite
+
+STORES = ["fs", "sqlite", "sqla"]
+
+
+def make_stores(path, kind="fs"):
+    if kind == "sqlite":
+        db = str(path / "store.sqlite")
+        return sqlite.BytesStore(db, "meta"), sqlite.FileStore(db, "data"), sqlite.BytesStore(db, "refs")
+    if kind == "sqla":
+        uri = f"sqlite:///{path / 'store.sqlite'}"
+        return sqla.BytesStore(uri, "meta"), sqla.FileStore(uri, "data"), sqla.BytesStore(uri, "refs")
+    return fs.BytesStore(str(path / "meta")), fs.FileStore(str(path / "data")), fs.BytesStore(str(path / "refs"))
+
+
+@pytest.fixture(params=STORES)
+def backend(request, tmp_path):
+    be = dedup.Backend(*make_stores(tmp_path, request.param))
+    be.create()
+    be.open()
+    yield be
+    be.close()
+
+
+def test_store_remove(backend):
+    revid1 = backend.store({NAME: ["a"]}, BytesIO(b"same data"))
+    revid2 = backend.store({NAME: ["b"]}, BytesIO(b"same data"))
+    revid3 = backend.store({NAME: ["c"]}, BytesIO(b"other data"))
+    meta1, data1 = backend.retrieve(revid1)
+    meta2, data2 = backend.retrieve(revid2)
+    assert meta1[DATAID] == meta2[DATAID] == meta1[HASH_ALGORITHM]
+    assert data2.read() == b"same data"
+    data1.close()
+    data2.close()
+    assert sorted(backend.data_store) == sorted([meta1[DATAID], backend.retrieve(revid3)[0][DATAID]])
+    assert backend.refcount(meta1[DATAID]) == 2
+    # data referenced by another revision is not destroyed
+    backend.remove(revid1, destroy_data=True)
+    assert backend.refcount(meta1[DATAID]) == 1
+    assert meta1[DATAID] in set(backend.data_store)
+    backend.remove(revid2, destroy_data=True)
+    assert backend.refcount(meta1[DATAID]) == 0
+    assert meta1[DATAID] not in set(backend.data_store)
+    assert list(backend.ref_store) == [backend.retrieve(revid3)[0][DATAID]]
+
+
+def test_retrieve_many(backend):
+    revids = [backend.store({NAME: [name]}, BytesIO(b"same data")) for name in "ab"]
+    # revisions sharing data get a file object each
+    [(_, meta1, data1), (_, meta2, data2)] = backend.retrieve_many(revids)
+    assert meta1[DATAID] == meta2[DATAID]
+    assert data1.read() == data2.read() == b"same data"
+    data1.close()
+    data2.close()
+
+
+def test_overwrite_revision(backend):
+    revid = backend.store({NAME: ["a"]}, BytesIO(b"spam"))
+    old_dataid = backend.retrieve(revid)[0][DATAID]
+    backend.store({NAME: ["a"], REVID: revid}, BytesIO(b""))
+    assert old_dataid not in set(backend.data_store)
+    assert backend.refcount(old_dataid) == 0
+
+
+def test_store_unreferenced_data(backend):
+    # data without references (removed without destroying it, interrupted store) is not stored again
+    revid = backend.store({NAME: ["a"]}, BytesIO(b"same data"))
+    dataid = backend.retrieve(revid)[0][DATAID]
+    backend.remove(revid, destroy_data=False)
+    assert backend.refcount(dataid) == 0
+    revid = backend.store({NAME: ["b"]}, BytesIO(b"same data"))
+    assert backend.refcount(dataid) == 1
+    assert backend.retrieve(revid)[1].read() == b"same data"
+
+
+def test_concurrent_refs(backend):
+    revid = backend.store({NAME: ["a"]}, BytesIO(b"same data"))
+    dataid = backend.retrieve(revid)[0][DATAID]
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda i: backend.store({NAME: [f"item{i}"]}, BytesIO(b"same data")), range(20)))
+    assert backend.refcount(dataid) == 21
+
+
+@pytest.mark.parametrize("kind", STORES)
+def test_deduplicate(tmp_path, kind):
+    meta_store, data_store, ref_store = make_stores(tmp_path, kind)
+    old = stores.Backend(meta_store, data_store)
+    old.create()
+    old.open()
+    revids = [old.store({NAME: [f"item{i}"]}, BytesIO(b"same data" if i < 3 else b"other")) for i in range(4)]
+    old.close()
+    backend = dedup.Backend(meta_store, data_store, ref_store)
+    backend.open()
+    report = backend.deduplicate()
+    assert sorted(report.revids) == sorted(revids)
+    assert (report.stored, report.removed, report.reclaimed) == (2, 4, 2 * len(b"same data"))
+    assert len(list(backend.data_store)) == 2
+    for i, revid in enumerate(revids):
+        meta, data = backend.retrieve(revid)
+        assert meta[DATAID] == meta[HASH_ALGORITHM]
+        assert data.read() == (b"same data" if i < 3 else b"other")
+        assert meta[SIZE] == len(b"same data" if i < 3 else b"other")
+        data.close()
+    assert backend.refcount(backend.retrieve(revids[0])[0][DATAID]) == 3
+    assert backend.deduplicate().revids == []
+    backend.close()
+
+
+@pytest.mark.parametrize("kind", STORES)
+def test_deduplicate_rerun(tmp_path, kind):
+    meta_store, data_store, ref_store = make_stores(tmp_path, kind)
+    old = stores.Backend(meta_store, data_store)
+    old.create()
+    old.open()
+    revid = old.store({NAME: ["a"]}, BytesIO(b"same data"))
+    old.close()
+    backend = dedup.Backend(meta_store, data_store, ref_store)
+    backend.open()
+    backend._ensure_ref_store()
+    # interrupted after storing the data by hash digest, before counting the reference
+    meta = backend._get_meta(revid)
+    backend.data_store[meta[HASH_ALGORITHM]] = BytesIO(b"same data")
+    report = backend.deduplicate()
+    assert (report.revids, report.stored, report.removed) == ([revid], 0, 1)
+    assert backend.refcount(meta[HASH_ALGORITHM]) == 1
+    assert backend.retrieve(revid)[1].read() == b"same data"
+    backend.close()
+
+
+@pytest.mark.parametrize("kind", STORES)
+def test_deduplicate_interrupted(tmp_path, kind):
+    meta_store, data_store, ref_store = make_stores(tmp_path, kind)
+    old = stores.Backend(meta_store, data_store)
+    old.create()
+    old.open()
+    revids = [old.store({NAME: [f"item{i}"]}, BytesIO(b"same data")) for i in range(3)]
+    old.close()
+    backend = dedup.Backend(meta_store, data_store, ref_store)
+    backend.open()
+    backend._ensure_ref_store()
+    old_dataids = [backend._get_meta(revid)[DATAID] for revid in revids]
+    # interrupted after converting the first revision and counting the second one's reference
+    meta = backend._get_meta(revids[0])
+    digest = meta[HASH_ALGORITHM]
+    backend._ref(digest, lambda: backend._get_data(meta[DATAID]))
+    meta[DATAID] = digest
+    backend._store_meta(meta)
+    backend._ref(digest, None)
+    report = backend.deduplicate()
+    # the index of the revision converted before is outdated too
+    assert sorted(report.revids) == sorted(revids)
+    assert report.removed == 3
+    assert list(backend.data_store) == [digest]
+    assert not set(old_dataids) & set(backend.data_store)
+    assert backend.refcount(digest) == 3
+    backend.close()
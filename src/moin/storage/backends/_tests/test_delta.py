@@ -0,0 +1,190 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - delta backend tests.
+"""
+
+import difflib
+import hashlib
+
+from io import BytesIO
+
+import pytest
+
+from moin.constants.keys import CONTENTTYPE, DATAID, HASH_ALGORITHM, NAME, PARENTID, REVID, SIZE
+from moin.storage.backends import delta, stores
+from moin.storage.stores.fs import BytesStore, FileStore
+
+TEXT = "text/plain;charset=utf-8"
+
+
+@pytest.fixture
+def backend(tmp_path):
+    be = delta.Backend(
+        BytesStore(str(tmp_path / "meta")),
+        FileStore(str(tmp_path / "data")),
+        BytesStore(str(tmp_path / "deltas")),
+        chain=3,
+    )
+    be.create()
+    be.open()
+    yield be
+    be.close()
+
+
+def page(number):
+    lines = [b"line %d of a page with some text\n" % i for i in range(100)]
+    lines[number % 100] = b"changed in revision %d\n" % number
+    return b"".join(lines)
+
+
+def store_revisions(backend, count, contenttype=TEXT):
+    revids = []
+    for number in range(count):
+        meta = {NAME: ["page"], CONTENTTYPE: contenttype}
+        if revids:
+            meta[PARENTID] = revids[-1]
+        revids.append(backend.store(meta, BytesIO(page(number))))
+    return revids
+
+
+def dataid(backend, revid):
+    return backend._get_meta(revid)[DATAID]
+
+
+def test_delta_roundtrip():
+    base = page(1)
+    for text in (page(2), page(2).rstrip(), b"", base + b"more\nlines", b"\r\n".join(base.splitlines())):
+        changes = delta.make_delta(base, text)
+        assert delta.apply_delta(base, changes) == text
+        old, new = base.splitlines(keepends=True), text.splitlines(keepends=True)
+        assert delta.delta_opcodes(changes) == difflib.SequenceMatcher(None, old, new).get_opcodes()
+
+
+def test_store_retrieve(backend):
+    revids = store_revisions(backend, 8)
+    depths = [getattr(backend.delta_info(dataid(backend, revid)), "depth", 0) for revid in revids]
+    assert depths == [0, 1, 2, 3, 0, 1, 2, 3]  # a keyframe after 3 deltas
+    for number, revid in enumerate(revids):
+        meta, data = backend.retrieve(revid)
+        content = data.read()
+        assert content == page(number)
+        assert meta[SIZE] == len(content)
+        assert meta[HASH_ALGORITHM] == hashlib.new(HASH_ALGORITHM, content).hexdigest()
+    stored = sum(len(backend._read(dataid)) for dataid in backend.data_store)
+    assert stored < 3 * len(page(0))
+    # binary data is stored in full
+    revids = store_revisions(backend, 2, contenttype="application/octet-stream")
+    assert backend.delta_info(dataid(backend, revids[1])) is None
+
+
+def test_retrieve_many(backend):
+    revids = store_revisions(backend, 5)
+    result = [(revid, data.read()) for revid, meta, data in backend.retrieve_many(revids)]
+    assert result == [(revid, page(number)) for number, revid in enumerate(revids)]
+
+
+def test_delta_opcodes(backend):
+    revid1, revid2 = store_revisions(backend, 2)
+    old, new = dataid(backend, revid1), dataid(backend, revid2)
+    opcodes = difflib.SequenceMatcher(None, page(0).splitlines(), page(1).splitlines()).get_opcodes()
+    assert backend.delta_opcodes(old, new) == opcodes
+    assert backend.delta_opcodes(new, old) is None
+
+
+def test_remove(backend):
+    revids = store_revisions(backend, 4)
+    dataids = [dataid(backend, revid) for revid in revids]
+    # the data of the first revisions is needed to reconstruct the later ones
+    for revid in revids[:3]:
+        backend.remove(revid, destroy_data=True)
+    assert set(backend.data_store) == set(dataids)
+    assert backend.retrieve(revids[3])[1].read() == page(3)
+    backend.remove(revids[3], destroy_data=True)
+    assert list(backend.data_store) == []
+    assert list(backend.delta_store) == []
+
+
+def test_overwrite_revision(backend):
+    revid1, revid2 = store_revisions(backend, 2)
+    old_dataid = dataid(backend, revid1)
+    # the revision's data is replaced, the revision stored as a delta against it is not changed
+    backend.store({NAME: ["page"], CONTENTTYPE: TEXT, REVID: revid1}, BytesIO(b""))
+    assert backend.retrieve(revid1)[1].read() == b""
+    assert backend.retrieve(revid2)[1].read() == page(1)
+    assert old_dataid in set(backend.data_store)
+    backend.remove(revid2, destroy_data=True)
+    assert old_dataid not in set(backend.data_store)
+
+
+class BrokenFile(BytesIO):
+    def read(self, size=-1):
+        raise OSError("connection reset")
+
+
+def test_store_failed(backend):
+    (revid,) = store_revisions(backend, 1)
+    base = dataid(backend, revid)
+    with pytest.raises(OSError):
+        backend.store({NAME: ["page"], CONTENTTYPE: TEXT, PARENTID: revid}, BrokenFile())
+    # the delta counted against the base is not counted anymore, the base can be removed
+    assert backend._deps(base) == 0
+    backend.remove(revid, destroy_data=True)
+    assert base not in set(backend.data_store)
+
+
+def test_store_counts_base_first(backend, monkeypatch):
+    (revid,) = store_revisions(backend, 1)
+    base = dataid(backend, revid)
+    make_delta = delta.make_delta
+
+    def counted_make_delta(base_text, text):
+        # a concurrent destroy of the parent keeps the base, it is counted already
+        assert backend._deps(base) == 1
+        return make_delta(base_text, text)
+
+    monkeypatch.setattr(delta, "make_delta", counted_make_delta)
+    backend.store({NAME: ["page"], CONTENTTYPE: TEXT, PARENTID: revid}, BytesIO(page(1)))
+    assert backend._deps(base) == 1
+
+
+def test_store_base_removed_meanwhile(backend, monkeypatch):
+    (revid,) = store_revisions(backend, 1)
+    base = dataid(backend, revid)
+
+    def failing_make_delta(base_text, text):
+        # the delta is made without holding the lock, the parent is destroyed meanwhile
+        assert not backend._lock._depth
+        backend.remove(revid, destroy_data=True)
+        raise OSError("out of memory")
+
+    monkeypatch.setattr(delta, "make_delta", failing_make_delta)
+    with pytest.raises(OSError):
+        backend.store({NAME: ["page"], CONTENTTYPE: TEXT, PARENTID: revid}, BytesIO(page(1)))
+    # removed with the delta counted against it
+    assert backend._deps(base) == 0
+    assert base not in set(backend.data_store)
+    assert list(backend.delta_store) == []
+
+
+def test_from_stores_backend(tmp_path):
+    meta_store, data_store = BytesStore(str(tmp_path / "meta")), FileStore(str(tmp_path / "data"))
+    old = stores.Backend(meta_store, data_store)
+    old.create()
+    old.open()
+    revid = old.store({NAME: ["page"], CONTENTTYPE: TEXT}, BytesIO(page(0)))
+    old.close()
+    backend = delta.Backend(meta_store, data_store, BytesStore(str(tmp_path / "deltas")))
+    backend.open()
+    revid2 = backend.store({NAME: ["page"], CONTENTTYPE: TEXT, PARENTID: revid}, BytesIO(page(1)))
+    assert backend.delta_info(dataid(backend, revid2)).base == dataid(backend, revid)
+    assert backend.retrieve(revid2)[1].read() == page(1)
+    backend.close()
+
+
+def test_local_path(backend):
+    revid1, revid2 = store_revisions(backend, 2)
+    with open(backend.local_path(revid1), "rb") as f:
+        assert f.read() == page(0)
+    assert backend.local_path(revid2) is None  # stored as a delta
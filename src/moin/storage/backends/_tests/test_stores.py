@@ -9,8 +9,12 @@ both a file system store and a memory store.
 """
 
 import os
+import sqlite3
 import tempfile
 
+from io import BytesIO
+
+from moin.storage.backends import WriteBatch
 from moin.storage.backends.stores import Backend
 from moin.storage.stores.memory import BytesStore as MemoryBytesStore
 from moin.storage.stores.memory import FileStore as MemoryFileStore
@@ -18,6 +22,8 @@ from moin.storage.stores.fs import BytesStore as FSBytesStore
 from moin.storage.stores.fs import FileStore as FSFileStore
 from moin.storage.stores.sqla import BytesStore as SQLABytesStore
 from moin.storage.stores.sqla import FileStore as SQLAFileStore
+from moin.storage.stores.sqlite import BytesStore as SqliteBytesStore
+from moin.storage.stores.sqlite import FileStore as SqliteFileStore
 
 from . import MutableBackendTestBase
 
@@ -53,3 +59,23 @@ class TestSQLABackend(MutableBackendTestBase):
         self.be = Backend(meta_store, data_store)
         self.be.create()
         self.be.open()
+
+
+def test_write_batch_commits(tmpdir):
+    dbfile = str(tmpdir.join("store.sqlite"))
+    be = Backend(SqliteBytesStore(dbfile, "meta"), SqliteFileStore(dbfile, "data"))
+    be.create()
+    be.open()
+
+    def committed():
+        with sqlite3.connect(dbfile) as conn:
+            return conn.execute("select count(*) from meta").fetchone()[0]
+
+    with WriteBatch(be, batch_size=2) as batch:
+        for i in range(3):
+            be.store(dict(name=str(i)), BytesIO(b"data %d" % i))
+            batch.stored()
+        assert committed() == 2  # the first batch is full
+        assert len(list(be)) == 3
+    assert committed() == 3
+    be.close()
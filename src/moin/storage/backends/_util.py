@@ -9,8 +9,16 @@ MoinMoin - backend utilities.
 from __future__ import annotations
 from typing import Any
 import hashlib
+import os
+import threading
 from io import BytesIO
 
+from whoosh.util.filelock import FileLock, try_for
+
+from moin.storage.error import StorageError
+
+LOCK_TIMEOUT = 60.0  # seconds to wait for a StoreLock held by another process
+
 
 class TrackingFileWrapper:
     """
@@ -52,3 +60,66 @@ class TrackingFileWrapper:
         if not self._finished:
             raise AttributeError("Do not access the hash attribute before having read all data")
         return self._hash
+
+
+def store_lock_path(store) -> str | None:
+    """
+    Return the path of a lock file next to a store with local files (fs, sqlite, sqla with SQLite),
+    None for other stores (memory, database servers).
+    """
+    path = getattr(store, "path", None)  # fs
+    if path is not None:
+        return os.path.normpath(path) + ".lock"
+    db_name = getattr(store, "db_name", None)  # sqlite
+    db_uri = getattr(store, "db_uri", None)  # sqla
+    if db_name is None and db_uri is not None and db_uri.startswith("sqlite:///"):
+        db_name = db_uri.split("sqlite:///", 1)[1]
+    if db_name:
+        return f"{db_name}.{store.table_name}.lock"
+    return None
+
+
+class StoreLock:
+    """
+    Reentrant lock for read-modify-write updates of a store (e.g. reference counts), held by one
+    thread of one process at a time: a thread lock and, if there is a lock file path, a file lock
+    for the other processes (e.g. the WSGI worker processes and the CLI).
+    """
+
+    def __init__(self, path: str | None) -> None:
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._file_lock: FileLock | None = None
+        self._depth = 0
+
+    def __enter__(self) -> StoreLock:
+        self._thread_lock.acquire()
+        if not self._depth and self.path is not None:
+            # a new FileLock for every acquire, its file descriptor is the lock
+            file_lock = FileLock(self.path)
+            if not try_for(file_lock.acquire, LOCK_TIMEOUT):
+                self._thread_lock.release()
+                raise StorageError(f"could not lock {self.path} within {LOCK_TIMEOUT} s")
+            self._file_lock = file_lock
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._depth -= 1
+        if not self._depth and self._file_lock is not None:
+            self._file_lock.release()
+            self._file_lock = None
+        self._thread_lock.release()
+
+
+def replace_value(store, key: str, value: bytes | None) -> None:
+    """
+    Set the value of key in a BytesStore, replacing an existing value (delete it for None).
+    """
+    if value is None:
+        try:
+            del store[key]
+        except KeyError:
+            pass
+    else:
+        store.replace(key, value)
@@ -0,0 +1,266 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - backend storing identical data only once (content-addressed).
+
+Like the stores backend, but the key of the data store is the hash digest
+(HASH_ALGORITHM) of the data, not a random UUID. Storing a revision with data
+that is already in the data store (e.g. an attachment uploaded again, a revert)
+only adds a reference to it.
+
+A refs store (a ByteStore) counts the references of the revisions:
+
+- key = hash digest (ASCII)
+- value = number of revisions referencing the data (ASCII)
+
+The data is removed when the last revision referencing it is destroyed.
+The counts are updated holding a StoreLock (a lock file next to the refs store,
+if it has local files), so concurrent saves of several processes do not lose
+references. Data may exist without references (e.g. after remove() with
+destroy_data=False or an interrupted store), it is not stored again then.
+
+Backend URIs look like the ones of the stores backend, e.g.::
+
+    dedup:fs:/srv/mywiki/data/%(backend)s/%(kind)s
+
+Existing stores backends can be converted with deduplicate()
+(moin maint-dedup).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import shutil
+import tempfile
+
+from collections import Counter
+from typing import NamedTuple
+from typing_extensions import override, Self
+
+from moin.constants.keys import DATAID, HASH_ALGORITHM, REVID, SIZE
+from moin.storage.stores import BytesStoreBase, FileStoreBase
+from moin.storage.types import MetaData
+
+from . import stores
+from ._util import StoreLock, TrackingFileWrapper, replace_value, store_lock_path
+
+CHUNK_SIZE = 64 * 1024  # bytes copied at once
+SPOOL_SIZE = 1024 * 1024  # data is spooled in memory up to this size, in a temporary file if bigger
+
+
+class DedupReport(NamedTuple):
+    revids: list[str]  # revisions changed to reference their data by hash digest
+    stored: int  # distinct data values stored by hash digest
+    removed: int  # data values removed (stored by UUID)
+    reclaimed: int  # bytes saved by storing identical data once
+
+
+class Backend(stores.Backend):
+    """
+    Tie together a store for metadata, a content-addressed store for data and a store for reference counts.
+    """
+
+    @classmethod
+    def from_uri(cls, uri: str) -> Self:
+        store_name_uri = uri.split(":", 1)
+        if len(store_name_uri) != 2:
+            raise ValueError(f"malformed store uri: {uri}")
+        store_name, store_uri = store_name_uri
+        module = __import__(stores.STORES_PACKAGE + "." + store_name, globals(), locals(), ["BytesStore", "FileStore"])
+        meta_store_uri = store_uri % dict(kind="meta")
+        data_store_uri = store_uri % dict(kind="data")
+        ref_store_uri = store_uri % dict(kind="refs")
+        return cls(
+            module.BytesStore.from_uri(meta_store_uri),
+            module.FileStore.from_uri(data_store_uri),
+            module.BytesStore.from_uri(ref_store_uri),
+        )
+
+    def __init__(
+        self, meta_store: BytesStoreBase, data_store: FileStoreBase, ref_store: BytesStoreBase, read_only: bool = False
+    ):
+        """
+        :param meta_store: a ByteStore for metadata
+        :param data_store: a FileStore for data
+        :param ref_store: a ByteStore for the reference counts of the data
+        :param read_only: indicates if the backend is read-only or not
+        """
+        super().__init__(meta_store, data_store, read_only)
+        self.ref_store = ref_store
+        self._lock = StoreLock(store_lock_path(ref_store))  # protects the reference counts
+
+    @override
+    def create(self) -> None:
+        super().create()
+        self.ref_store.create()
+
+    @override
+    def destroy(self) -> None:
+        super().destroy()
+        self.ref_store.destroy()
+
+    @override
+    def open(self) -> None:
+        super().open()
+        self.ref_store.open()
+
+    @override
+    def close(self) -> None:
+        super().close()
+        self.ref_store.close()
+
+    @override
+    def begin_batch(self) -> None:
+        super().begin_batch()
+        self.ref_store.begin_batch()
+
+    @override
+    def commit_batch(self) -> None:
+        self.ref_store.commit_batch()
+        super().commit_batch()
+
+    def refcount(self, dataid: str) -> int:
+        """
+        Return the number of revisions referencing the data (0 for data not stored by hash digest).
+        """
+        try:
+            return int(self.ref_store[dataid])
+        except KeyError:
+            return 0
+
+    def _set_refcount(self, dataid: str, count: int) -> None:
+        replace_value(self.ref_store, dataid, str(count).encode() if count else None)
+
+    def _has_data(self, dataid: str) -> bool:
+        for _, data in self.data_store.retrieve_many([dataid]):
+            data.close()
+            return True
+        return False
+
+    def _ref(self, dataid: str, data) -> bool:
+        """
+        Add a reference to the data, store it if it is not stored yet.
+
+        :param data: file to read the data from or a callable returning it
+        :returns: True if the data was stored
+        """
+        with self._lock:
+            count = self.refcount(dataid)
+            # data without references may exist, it is the same data (the key is its hash digest)
+            stored = not count and not self._has_data(dataid)
+            if stored:
+                data = data() if callable(data) else data
+                try:
+                    self.data_store[dataid] = data
+                finally:
+                    data.close()
+            self._set_refcount(dataid, count + 1)
+        return stored
+
+    def _unref(self, dataid: str, destroy_data: bool) -> None:
+        """
+        Remove a reference to the data, remove the data with the last one (if destroy_data is True).
+        """
+        with self._lock:
+            count = self.refcount(dataid)
+            if count:
+                count -= 1
+                self._set_refcount(dataid, count)
+            if destroy_data and not count:
+                self._del_data(dataid)
+
+    @override
+    def store(self, meta: MetaData, data) -> str:
+        self._ensure_mutable()
+        # the hash digest (the key) is only known after reading all data
+        tfw = TrackingFileWrapper(data, hash_method=HASH_ALGORITHM)
+        with tempfile.SpooledTemporaryFile(SPOOL_SIZE) as spool:
+            shutil.copyfileobj(tfw, spool, CHUNK_SIZE)
+            dataid = tfw.hash.hexdigest()
+            self._check_data(meta, tfw)
+            spool.seek(0)
+            self._ref(dataid, spool)
+        revid = meta.get(REVID)
+        if revid is not None:
+            # Item.clear_revision overwrites a revision: release the data of the old one
+            try:
+                old_dataid = self._get_meta(revid)[DATAID]
+            except KeyError:
+                pass
+            else:
+                self._unref(old_dataid, destroy_data=True)
+        meta[DATAID] = dataid
+        return self._store_meta(meta)
+
+    @override
+    def remove(self, metaid: str, destroy_data: bool = False) -> None:
+        self._ensure_mutable()
+        meta = self._get_meta(metaid)
+        self._del_meta(metaid)
+        # the data is only destroyed if no other revision references it
+        self._unref(meta[DATAID], destroy_data)
+
+    def _ensure_ref_store(self) -> None:
+        """
+        Create the refs store if it is missing (a stores backend converted to a dedup backend).
+        """
+        try:
+            next(iter(self.ref_store), None)
+        except Exception:  # missing directory, table, ... depending on the kind of store
+            self.ref_store.close()
+            self.ref_store.create()
+            self.ref_store.open()
+
+    def deduplicate(self) -> DedupReport:
+        """
+        Convert the data stored by UUID (by the stores backend) to data stored by hash digest.
+
+        The revisions are changed to reference their data by hash digest first, then the
+        reference counts are recounted from all revisions and the data stored by UUID is
+        removed. If this is interrupted, running it again completes the conversion (and
+        reports all revisions referencing their data by hash digest, their index may be
+        outdated). Run it while the wiki is stopped.
+        """
+        self._ensure_mutable()
+        self._ensure_ref_store()
+        digest_size = hashlib.new(HASH_ALGORITHM).digest_size * 2
+        # the data left over by an interrupted run is found in the data store
+        old_dataids = {dataid for dataid in self.data_store if len(dataid) != digest_size}
+        revids: list[str] = []
+        converted: list[str] = []  # by an interrupted run
+        refs: Counter[str] = Counter()
+        old_sizes: dict[str, int] = {}
+        stored = stored_size = 0
+        for revid in list(self.meta_store):
+            meta = self._get_meta(revid)
+            dataid, digest = meta[DATAID], meta[HASH_ALGORITHM]
+            refs[digest] += 1
+            if dataid == digest:
+                converted.append(revid)
+                continue
+            if self._ref(digest, lambda: self._get_data(dataid)):
+                stored += 1
+                stored_size += meta[SIZE]
+            meta[DATAID] = digest
+            self._store_meta(meta)
+            revids.append(revid)
+            old_sizes[dataid] = meta[SIZE]
+        if old_dataids - set(old_sizes):
+            revids += converted
+        # recounted, so a reference added before an interruption is not counted twice
+        with self._lock:
+            for dataid in list(self.ref_store):
+                if dataid not in refs:
+                    self._set_refcount(dataid, 0)
+            for dataid, count in refs.items():
+                if self.refcount(dataid) != count:
+                    self._set_refcount(dataid, count)
+        removed = 0
+        for dataid in old_dataids | set(old_sizes):
+            try:
+                self._del_data(dataid)
+            except KeyError:
+                continue
+            removed += 1
+        return DedupReport(revids, stored, removed, sum(old_sizes.values()) - stored_size)
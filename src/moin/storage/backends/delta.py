@@ -0,0 +1,428 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - backend storing text revisions as deltas.
+
+Like the stores backend, but the data of a text revision (contenttype text/*)
+is stored as a line-based delta against the data of its parent revision, if
+that is smaller. Every DELTA_CHAIN revisions, the full data is stored again
+(a keyframe), so reconstructing the data of a revision applies at most
+DELTA_CHAIN deltas. retrieve() returns the reconstructed data, so the size and
+hash of the revisions do not change.
+
+A deltas store (a ByteStore) records how the data is stored:
+
+- key = dataid of a delta, value = "<dataid of the base> <chain length>" (ASCII)
+- key = "<dataid>.deps", value = number of deltas against the data (ASCII)
+- key = "<dataid>.gone", the revision of the data was destroyed, but deltas
+  against the data still need it: it is removed with the last of them
+
+The counts are updated holding a StoreLock (a lock file next to the deltas
+store, if it has local files). A delta is counted before it is made, so the
+data it is against is not removed by a concurrent destroy meanwhile.
+
+Backend URIs look like the ones of the stores backend, e.g.::
+
+    delta:fs:/srv/mywiki/data/%(backend)s/%(kind)s
+"""
+
+from __future__ import annotations
+
+import difflib
+import shutil
+import tempfile
+import zlib
+
+from io import BytesIO
+from typing import Any, Iterator, NamedTuple
+from typing_extensions import override, Self
+
+from moin.constants.keys import CONTENTTYPE, DATAID, HASH_ALGORITHM, PARENTID, REVID
+from moin.storage.stores import BytesStoreBase, FileStoreBase
+from moin.storage.types import MetaData
+from moin.utils.crypto import make_uuid
+
+from . import stores
+from ._util import StoreLock, TrackingFileWrapper, replace_value, store_lock_path
+
+DELTA_CHAIN = 16  # maximum number of deltas between a revision and a keyframe
+DELTA_MAX_SIZE = 4 * 1024 * 1024  # bigger texts are always stored in full
+DELTA_RATIO = 0.5  # a delta is only stored if it is smaller than this part of the full data
+CHUNK_SIZE = 64 * 1024  # bytes copied at once
+SPOOL_SIZE = 1024 * 1024  # data is spooled in memory up to this size, in a temporary file if bigger
+
+Opcode = tuple[str, int, int, int, int]  # like difflib.SequenceMatcher.get_opcodes()
+
+
+class DeltaInfo(NamedTuple):
+    base: str  # dataid of the data the delta is against
+    depth: int  # number of deltas between the data and a keyframe (1 for a delta against a keyframe)
+
+
+def make_delta(base: bytes, text: bytes) -> bytes:
+    """
+    Return a delta reconstructing text from base (both split into lines).
+
+    Records (zlib compressed): a header "#<base lines> <lines>", "=<from> <to>" to copy
+    lines of base, "+<lines> <size>" followed by size bytes of new lines.
+    """
+    old_lines, new_lines = base.splitlines(keepends=True), text.splitlines(keepends=True)
+    records = [b"#%d %d\n" % (len(old_lines), len(new_lines))]
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines).get_opcodes():
+        if tag == "equal":
+            records.append(b"=%d %d\n" % (i1, i2))
+        elif tag in ("insert", "replace"):
+            lines = b"".join(new_lines[j1:j2])
+            records.append(b"+%d %d\n%s" % (j2 - j1, len(lines), lines))
+    return zlib.compress(b"".join(records))
+
+
+def _records(delta: bytes):
+    data = zlib.decompress(delta)
+    pos = 0
+    while pos < len(data):
+        end = data.index(b"\n", pos)
+        kind, first, second = data[pos : pos + 1], *map(int, data[pos + 1 : end].split())
+        pos = end + 1
+        if kind == b"+":
+            yield kind, first, data[pos : pos + second]
+            pos += second
+        else:
+            yield kind, first, second
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """
+    Reconstruct the text a delta was made from.
+    """
+    old_lines = base.splitlines(keepends=True)
+    parts = []
+    for kind, first, second in _records(delta):
+        if kind == b"=":
+            parts += old_lines[first:second]
+        elif kind == b"+":
+            parts.append(second)
+    return b"".join(parts)
+
+
+def delta_opcodes(delta: bytes) -> list[Opcode]:
+    """
+    Return the opcodes (see difflib.SequenceMatcher) of the lines changed by a delta.
+    """
+    opcodes: list[Opcode] = []
+    i = j = 0  # line in base, in text
+    inserted = 0
+
+    def changed(i2: int) -> None:
+        if i2 > i and inserted:
+            opcodes.append(("replace", i, i2, j, j + inserted))
+        elif i2 > i:
+            opcodes.append(("delete", i, i2, j, j))
+        elif inserted:
+            opcodes.append(("insert", i, i, j, j + inserted))
+
+    for kind, first, second in _records(delta):
+        if kind == b"#":
+            old_count = first
+        elif kind == b"+":
+            inserted = first
+        else:
+            changed(first)
+            j += inserted
+            inserted = 0
+            opcodes.append(("equal", first, second, j, j + second - first))
+            i, j = second, j + second - first
+    changed(old_count)
+    return opcodes
+
+
+def _read_upto(f, size: int) -> bytes:
+    """
+    Read size bytes (less only at the end of the file).
+    """
+    parts = []
+    while size > 0 and (part := f.read(min(size, CHUNK_SIZE))):
+        parts.append(part)
+        size -= len(part)
+    return b"".join(parts)
+
+
+class Backend(stores.Backend):
+    """
+    Tie together a store for metadata, a store for data (full or delta) and a store for the delta chains.
+    """
+
+    @classmethod
+    def from_uri(cls, uri: str) -> Self:
+        store_name_uri = uri.split(":", 1)
+        if len(store_name_uri) != 2:
+            raise ValueError(f"malformed store uri: {uri}")
+        store_name, store_uri = store_name_uri
+        module = __import__(stores.STORES_PACKAGE + "." + store_name, globals(), locals(), ["BytesStore", "FileStore"])
+        meta_store_uri = store_uri % dict(kind="meta")
+        data_store_uri = store_uri % dict(kind="data")
+        delta_store_uri = store_uri % dict(kind="deltas")
+        return cls(
+            module.BytesStore.from_uri(meta_store_uri),
+            module.FileStore.from_uri(data_store_uri),
+            module.BytesStore.from_uri(delta_store_uri),
+        )
+
+    def __init__(
+        self,
+        meta_store: BytesStoreBase,
+        data_store: FileStoreBase,
+        delta_store: BytesStoreBase,
+        read_only: bool = False,
+        chain: int = DELTA_CHAIN,
+    ):
+        """
+        :param meta_store: a ByteStore for metadata
+        :param data_store: a FileStore for data
+        :param delta_store: a ByteStore for the delta chains of the data
+        :param read_only: indicates if the backend is read-only or not
+        :param chain: maximum number of deltas between a revision and a keyframe
+        """
+        super().__init__(meta_store, data_store, read_only)
+        self.delta_store = delta_store
+        self.chain = chain
+        self._lock = StoreLock(store_lock_path(delta_store))  # protects the counts of deltas against the data
+
+    @override
+    def create(self) -> None:
+        super().create()
+        self.delta_store.create()
+
+    @override
+    def destroy(self) -> None:
+        super().destroy()
+        self.delta_store.destroy()
+
+    @override
+    def open(self) -> None:
+        super().open()
+        self.delta_store.open()
+        if not self.read_only:
+            self._ensure_delta_store()
+
+    @override
+    def close(self) -> None:
+        super().close()
+        self.delta_store.close()
+
+    @override
+    def begin_batch(self) -> None:
+        super().begin_batch()
+        self.delta_store.begin_batch()
+
+    @override
+    def commit_batch(self) -> None:
+        self.delta_store.commit_batch()
+        super().commit_batch()
+
+    def _ensure_delta_store(self) -> None:
+        """
+        Create the deltas store if it is missing (a stores backend changed to a delta backend).
+        """
+        try:
+            next(iter(self.delta_store), None)
+        except Exception:  # missing directory, table, ... depending on the kind of store
+            self.delta_store.close()
+            self.delta_store.create()
+            self.delta_store.open()
+
+    def delta_info(self, dataid: str) -> DeltaInfo | None:
+        """
+        Return how the data is stored as a delta (None for data stored in full).
+        """
+        try:
+            base, depth = self.delta_store[dataid].split()
+        except KeyError:
+            return None
+        return DeltaInfo(base.decode(), int(depth))
+
+    def delta_chain(self, dataid: str) -> list[str]:
+        """
+        Return the dataids of the data needed to reconstruct the data (up to the keyframe).
+        """
+        chain = []
+        while (info := self.delta_info(dataid)) is not None:
+            dataid = info.base
+            chain.append(dataid)
+        return chain
+
+    def _has_record(self, key: str) -> bool:
+        try:
+            self.delta_store[key]
+        except KeyError:
+            return False
+        return True
+
+    def _deps(self, dataid: str) -> int:
+        try:
+            return int(self.delta_store[f"{dataid}.deps"])
+        except KeyError:
+            return 0
+
+    def _set_deps(self, dataid: str, count: int) -> None:
+        replace_value(self.delta_store, f"{dataid}.deps", str(count).encode() if count else None)
+
+    def _read(self, dataid: str) -> bytes:
+        data = self.data_store[dataid]
+        try:
+            return data.read()
+        finally:
+            data.close()
+
+    def _text(self, dataid: str) -> bytes:
+        """
+        Reconstruct the data of a text revision.
+        """
+        deltas = []
+        while (info := self.delta_info(dataid)) is not None:
+            deltas.append(dataid)
+            dataid = info.base
+        text = self._read(dataid)
+        for dataid in reversed(deltas):
+            text = apply_delta(text, self._read(dataid))
+        return text
+
+    @override
+    def _get_data(self, dataid):
+        if self.delta_info(dataid) is None:
+            return self.data_store[dataid]
+        return BytesIO(self._text(dataid))
+
+    @override
+    def _get_data_many(self, dataids: list[str]) -> Iterator[tuple[str, Any]]:
+        deltas = {dataid for dataid, record in self.delta_store.retrieve_many(dataids)}
+        yield from self.data_store.retrieve_many([dataid for dataid in dataids if dataid not in deltas])
+        for dataid in dataids:
+            if dataid in deltas:
+                yield dataid, BytesIO(self._text(dataid))
+
+    @override
+    def _local_data_path(self, dataid: str) -> str | None:
+        if self.delta_info(dataid) is not None:
+            return None  # only the delta is in the file
+        return super()._local_data_path(dataid)
+
+    @override
+    def _del_data(self, dataid: str):
+        with self._lock:
+            if self._deps(dataid):
+                # removed with the last delta against it
+                replace_value(self.delta_store, f"{dataid}.gone", b"1")
+                return
+            while True:
+                info = self.delta_info(dataid)
+                del self.data_store[dataid]
+                for key in (dataid, f"{dataid}.gone"):
+                    if self._has_record(key):
+                        del self.delta_store[key]
+                if info is None:
+                    return
+                deps = self._deps(info.base) - 1
+                self._set_deps(info.base, deps)
+                if deps or not self._has_record(f"{info.base}.gone"):
+                    return
+                dataid = info.base
+
+    def _release_base(self, dataid: str) -> None:
+        """
+        Uncount a delta against the data that is not stored, remove the data if it was removed meanwhile.
+        """
+        with self._lock:
+            deps = self._deps(dataid) - 1
+            self._set_deps(dataid, deps)
+            gone = not deps and self._has_record(f"{dataid}.gone")
+        if gone:
+            self._del_data(dataid)
+
+    def _delta_base(self, meta: MetaData) -> DeltaInfo | None:
+        """
+        Return the data of the parent revision to store the data as a delta against (None: store in full).
+        """
+        parentid = meta.get(PARENTID)
+        if not isinstance(parentid, str) or not meta.get(CONTENTTYPE, "").startswith("text/"):
+            return None
+        try:
+            parent_meta = self._get_meta(parentid)
+        except KeyError:
+            return None
+        if not parent_meta.get(CONTENTTYPE, "").startswith("text/"):
+            return None
+        if self._has_record(f"{parent_meta[DATAID]}.gone"):
+            return None
+        info = self.delta_info(parent_meta[DATAID])
+        depth = 0 if info is None else info.depth
+        if depth >= self.chain:
+            return None  # time for a keyframe
+        return DeltaInfo(parent_meta[DATAID], depth + 1)
+
+    @override
+    def store(self, meta: MetaData, data) -> str:
+        self._ensure_mutable()
+        # data is never overwritten (other revisions may be stored as deltas against it), an
+        # overwritten revision (Item.clear_revision, ...) gets new data, the old data is released
+        old_dataid = None
+        revid = meta.get(REVID)
+        if revid is not None:
+            try:
+                old_dataid = self._get_meta(revid)[DATAID]
+            except KeyError:
+                pass
+        dataid = make_uuid()
+        tfw = TrackingFileWrapper(data, hash_method=HASH_ALGORITHM)
+        base = self._delta_base(meta)  # no lock needed for the data stored in full (most data)
+        if base is not None:
+            with self._lock:
+                # read again, the base may be removed meanwhile; counted, it is not removed
+                # while the delta is made and stored
+                base = self._delta_base(meta)
+                if base is not None:
+                    self._set_deps(base.base, self._deps(base.base) + 1)
+        delta = None
+        try:
+            with tempfile.SpooledTemporaryFile(SPOOL_SIZE) as spool:
+                text = _read_upto(tfw, DELTA_MAX_SIZE + 1) if base is not None else b""
+                if base is not None and len(text) <= DELTA_MAX_SIZE:
+                    try:
+                        delta = make_delta(self._text(base.base), text)
+                    except KeyError:
+                        pass  # parent data missing
+                    if delta is not None and len(delta) >= len(text) * DELTA_RATIO:
+                        delta = None
+                if delta is not None:
+                    spool.write(delta)
+                else:
+                    spool.write(text)
+                    shutil.copyfileobj(tfw, spool, CHUNK_SIZE)
+                self._check_data(meta, tfw)
+                spool.seek(0)
+                self.data_store[dataid] = spool  # type: ignore
+            if delta is not None:
+                assert base is not None
+                self.delta_store[dataid] = f"{base.base} {base.depth}".encode()
+        except BaseException:
+            delta = None
+            raise
+        finally:
+            if base is not None and delta is None:
+                self._release_base(base.base)
+        meta[DATAID] = dataid
+        revid = self._store_meta(meta)
+        if old_dataid is not None:
+            self._del_data(old_dataid)
+        return revid
+
+    def delta_opcodes(self, old_dataid: str, new_dataid: str) -> list[Opcode] | None:
+        """
+        Return the opcodes of the lines changed from the old to the new data if the new data
+        is stored as a delta against the old data (None otherwise).
+        """
+        info = self.delta_info(new_dataid)
+        if info is None or info.base != old_dataid:
+            return None
+        return delta_opcodes(self._read(new_dataid))
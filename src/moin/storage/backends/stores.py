@@ -22,18 +22,18 @@ from __future__ import annotations
 
 import json
 
-from typing import Any, Iterator, TYPE_CHECKING
+from typing import Any, Iterable, Iterator, TYPE_CHECKING
 from typing_extensions import override
 
 from moin import log
 from moin.constants.keys import REVID, DATAID, SIZE, HASH_ALGORITHM, NAME, NAMESPACE
 from moin.storage.error import ReadOnlyBackendError
-from moin.storage.stores import BytesStoreBase, FileStoreBase
+from moin.storage.stores import RETRIEVE_BATCH_SIZE, BytesStoreBase, FileStoreBase, batches
 from moin.storage.types import MetaData
 from moin.utils.crypto import make_uuid
 
 from . import BackendBase
-from ._util import TrackingFileWrapper
+from ._util import TrackingFileWrapper, replace_value
 
 STORES_PACKAGE = "moin.storage.stores"
 
@@ -107,6 +107,17 @@ class Backend(BackendBase):
         self.meta_store.close()
         self.data_store.close()
 
+    @override
+    def begin_batch(self) -> None:
+        self.data_store.begin_batch()
+        self.meta_store.begin_batch()
+
+    @override
+    def commit_batch(self) -> None:
+        # data first: metadata must not reference missing data
+        self.data_store.commit_batch()
+        self.meta_store.commit_batch()
+
     @override
     def __iter__(self) -> Iterator[str]:
         yield from self.meta_store
@@ -126,15 +137,31 @@ class Backend(BackendBase):
     def _get_data(self, dataid):
         return self.data_store[dataid]
 
+    def _get_data_many(self, dataids: list[str]) -> Iterator[tuple[str, Any]]:
+        return self.data_store.retrieve_many(dataids)
+
     def _store_meta(self, meta: MetaData) -> str:
         try:
             # Item.clear_revision calls us with REVID already present
             metaid = meta[REVID]
         except KeyError:
             metaid = meta[REVID] = make_uuid()
-        self.meta_store[metaid] = self._serialize(meta)
+            self.meta_store[metaid] = self._serialize(meta)
+        else:
+            replace_value(self.meta_store, metaid, self._serialize(meta))
         return metaid
 
+    def _local_data_path(self, dataid: str) -> str | None:
+        local_path = getattr(self.data_store, "local_path", None)
+        return None if local_path is None else local_path(dataid)
+
+    def local_path(self, metaid: str) -> str | None:
+        """
+        Return the filesystem path of the data of a revision, if the data store keeps it
+        in a plain file (None otherwise).
+        """
+        return self._local_data_path(self._get_meta(metaid)[DATAID])
+
     def _del_meta(self, metaid: str):
         del self.meta_store[metaid]
 
@@ -149,18 +176,31 @@ class Backend(BackendBase):
         return meta, data
 
     @override
-    def store(self, meta: MetaData, data) -> str:
-        self._ensure_mutable()
-
-        try:
-            dataid = meta[DATAID]
-        except KeyError:
-            dataid = make_uuid()
-
-        tfw = TrackingFileWrapper(data, hash_method=HASH_ALGORITHM)
-        self.data_store[dataid] = tfw  # type: ignore
-        meta[DATAID] = dataid
-
+    def retrieve_many(self, metaids: Iterable[str]) -> Iterator[tuple[str, MetaData, Any]]:
+        """
+        Retrieve the revisions in batches, getting the metadata and the data of a batch
+        from the stores at once (see retrieve_many of the stores).
+        """
+        for batch in batches(metaids, RETRIEVE_BATCH_SIZE):
+            metas = [(metaid, self._deserialize(meta)) for metaid, meta in self.meta_store.retrieve_many(batch)]
+            data: dict[str, list] = {}
+            for dataid, value in self._get_data_many([meta[DATAID] for metaid, meta in metas]):
+                data.setdefault(dataid, []).append(value)
+            try:
+                for metaid, meta in metas:
+                    values = data.get(meta[DATAID])
+                    if not values:
+                        raise KeyError(meta[DATAID])  # like retrieve
+                    yield metaid, meta, values.pop(0)
+            finally:
+                for values in data.values():  # not yielded, the caller stopped early
+                    for value in values:
+                        value.close()
+
+    def _check_data(self, meta: MetaData, tfw: TrackingFileWrapper) -> None:
+        """
+        Check the size and hash declared in meta against the data read, set them to the real values.
+        """
         # check whether size is consistent:
         size_expected = meta.get(SIZE)
         size_real = tfw.size
@@ -184,6 +224,20 @@ class Backend(BackendBase):
         meta[SIZE] = size_real
         meta[HASH_ALGORITHM] = hash_real
 
+    @override
+    def store(self, meta: MetaData, data) -> str:
+        self._ensure_mutable()
+
+        try:
+            dataid = meta[DATAID]
+        except KeyError:
+            dataid = make_uuid()
+
+        tfw = TrackingFileWrapper(data, hash_method=HASH_ALGORITHM)
+        self.data_store[dataid] = tfw  # type: ignore
+        meta[DATAID] = dataid
+        self._check_data(meta, tfw)
+
         return self._store_meta(meta)
 
     @override
@@ -16,6 +16,18 @@ class StorageError(CompositeError):
     """
 
 
+class IndexSchemaError(StorageError):
+    """
+    Raised if an index was created with an outdated schema and needs a rebuild.
+    """
+
+
+class MetaNotIndexedError(StorageError):
+    """
+    Raised if index-only metadata does not have a field (instead of loading the metadata from the backend).
+    """
+
+
 class BackendError(StorageError):
     """
     Raised if the backend couldn't commit the action.
@@ -0,0 +1,268 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - garbage collection of unreferenced data.
+
+Destroying revisions (or interrupted maintenance) can leave data in the data store
+of a stores or dedup backend that no revision references any more. The garbage
+collector finds and removes it (mark and sweep):
+
+* mark: read the metadata of all revisions and record the referenced DATAIDs
+  (with the number of references) in an SQLite database in a work directory,
+  so the set of live DATAIDs does not need to fit into memory
+* sweep: remove the data not in that set, in batches run by several threads
+
+The state is committed while marking and sweeping: if the garbage collection is
+interrupted, running it again resumes where it stopped. Before sweeping, the
+metadata of revisions stored meanwhile is marked, too.
+
+Data is stored before the metadata of its revision, so data stored less than
+GC_GRACE seconds ago is not removed, even if no revision references it (yet).
+Its age is the modification time of its file or, for stores without files, the
+time a garbage collection found it unreferenced first (recorded in the work
+directory).
+
+For a dedup backend, the reference counts of the data are repaired. For a delta
+backend, the data other revisions are stored as deltas against is live, too, and
+orphans are removed like destroyed data (with their delta chain records).
+"""
+
+from __future__ import annotations
+
+from typing import Iterator, NamedTuple
+
+import os
+import sqlite3
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from moin import log
+from moin.constants.keys import DATAID, HASH_LEN
+from moin.storage.backends import dedup, delta, stores
+from moin.storage.stores import batches
+
+logging = log.getLogger(__name__)
+
+GC_DIR = "gc"  # work directory in the instance directory
+GC_WORKERS = 4  # threads removing data
+GC_BATCH_SIZE = 100  # data values removed (or revisions marked) per batch / transaction
+GC_GRACE = 3600  # seconds: younger unreferenced data may belong to a revision being stored
+
+
+class GCReport(NamedTuple):
+    backend_name: str
+    live: int  # data values referenced by revisions
+    orphans: int  # data values not referenced by any revision
+    young: int  # orphans kept, stored less than grace seconds ago
+    removed: int  # orphans removed (0 for a dry run)
+    reclaimed: int  # bytes of the orphans (removed or, for a dry run, removable)
+    refcounts: int  # reference counts repaired (dedup backend)
+    runtime: float  # seconds
+
+
+class GarbageCollector:
+    """
+    Remove the data of a backend that no revision references.
+    """
+
+    def __init__(
+        self,
+        backend_name: str,
+        backend: stores.Backend,
+        path: str,
+        workers: int = GC_WORKERS,
+        batch_size: int = GC_BATCH_SIZE,
+        grace: float = GC_GRACE,
+    ) -> None:
+        """
+        :param backend: a stores (or dedup) backend
+        :param path: work directory for the state of the garbage collection
+        :param grace: seconds unreferenced data is kept after it was stored
+        """
+        self.backend_name = backend_name
+        self.backend = backend
+        self.path = path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.grace = grace
+        self.db_name = os.path.join(path, f"gc-{backend_name}.sqlite")
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self.path, exist_ok=True)
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        with conn:
+            conn.execute("create table if not exists live (dataid text primary key, refs integer not null)")
+            conn.execute("create table if not exists marked (revid text primary key)")
+            conn.execute("create table if not exists data (dataid text primary key)")
+            conn.execute("create table if not exists swept (dataid text primary key, size integer not null)")
+            conn.execute("create table if not exists state (key text primary key, value text)")
+            # kept for the next runs: when data of a store without files was found unreferenced first
+            conn.execute("create table if not exists unreferenced (dataid text primary key, since real not null)")
+        return conn
+
+    def _mark(self, conn: sqlite3.Connection, revids: Iterator[str]) -> None:
+        """
+        Record the DATAIDs referenced by the revisions not marked yet.
+        """
+        for batch in batches(revids, self.batch_size):
+            marked = {
+                row[0]
+                for row in conn.execute(
+                    f"select revid from marked where revid in ({','.join('?' * len(batch))})", batch
+                )
+            }
+            with conn:
+                for revid in batch:
+                    if revid in marked:
+                        continue
+                    try:
+                        dataid = self.backend._get_meta(revid)[DATAID]
+                    except KeyError:
+                        continue  # destroyed meanwhile
+                    conn.execute("insert into marked values (?)", (revid,))
+                    conn.execute(
+                        "insert into live values (?, 1) on conflict(dataid) do update set refs = refs + 1", (dataid,)
+                    )
+                    if isinstance(self.backend, delta.Backend):
+                        # the data the revision's delta is made against is live, too
+                        for base in self.backend.delta_chain(dataid):
+                            conn.execute("insert or ignore into live values (?, 0)", (base,))
+
+    def _size(self, dataid: str) -> int:
+        try:
+            data = self.backend.data_store[dataid]
+        except KeyError:
+            return 0
+        try:
+            return data.seek(0, os.SEEK_END)
+        finally:
+            data.close()
+
+    def _old(self, conn: sqlite3.Connection, orphans: list[str], started: float) -> tuple[list[str], set[str]]:
+        """
+        Split the orphans into the ones stored at least grace seconds before the run started and younger ones.
+        """
+        local_path = getattr(self.backend.data_store, "local_path", None)
+        old = []
+        young = set()
+        with conn:
+            conn.execute("create temporary table orphans (dataid text primary key)")
+            conn.executemany("insert into orphans values (?)", ((dataid,) for dataid in orphans))
+            conn.execute("delete from unreferenced where dataid not in (select dataid from orphans)")
+            conn.execute("drop table orphans")
+            for dataid in orphans:
+                path = local_path(dataid) if local_path is not None else None
+                if path is not None:
+                    try:
+                        stored = os.stat(path).st_mtime
+                    except FileNotFoundError:
+                        continue  # removed meanwhile
+                else:
+                    conn.execute("insert or ignore into unreferenced values (?, ?)", (dataid, started))
+                    stored = conn.execute("select since from unreferenced where dataid=?", (dataid,)).fetchone()[0]
+                if stored <= started - self.grace:
+                    old.append(dataid)
+                else:
+                    young.add(dataid)
+        return old, young
+
+    def _remove(self, dataid: str) -> int:
+        size = self._size(dataid)
+        try:
+            if isinstance(self.backend, delta.Backend):
+                # also removes the delta chain records and releases the data the delta is against
+                self.backend._del_data(dataid)
+            else:
+                del self.backend.data_store[dataid]
+        except KeyError:
+            pass
+        return size
+
+    def _repair_refcounts(self, conn: sqlite3.Connection, young: set[str]) -> int:
+        """
+        Make the reference counts of a dedup backend match the references found
+        (except for young data, its revision may be stored right now).
+        """
+        backend = self.backend
+        repaired = 0
+        for dataid in list(backend.ref_store):
+            if dataid in young or conn.execute("select 1 from live where dataid=?", (dataid,)).fetchone():
+                continue
+            with backend._lock:
+                # unreferenced data listed (old enough) or removed; not data stored after listing the data
+                listed = conn.execute("select 1 from data where dataid=?", (dataid,)).fetchone() is not None
+                if listed or not backend._has_data(dataid):
+                    del backend.ref_store[dataid]
+                    repaired += 1
+        for dataid, refs in conn.execute("select dataid, refs from live"):
+            with backend._lock:
+                count = backend.refcount(dataid)
+                # data stored by UUID (not converted by maint-dedup yet) has no reference count
+                if count != refs and (count or len(dataid) == HASH_LEN):
+                    backend._set_refcount(dataid, refs)
+                    repaired += 1
+        return repaired
+
+    def run(self, dry_run: bool = False) -> GCReport:
+        """
+        Mark and sweep (or, for a dry run, only find the orphans), resuming an interrupted run.
+        """
+        started = time.time()
+        conn = self._connect()
+        try:
+            if conn.execute("select value from state where key='marked'").fetchone() is None:
+                self._mark(conn, iter(self.backend.meta_store))
+                with conn:
+                    conn.execute("insert into state values ('marked', ?)", (str(time.time()),))
+            # data is stored before the metadata: list the data first, then mark the revisions stored meanwhile
+            with conn:
+                conn.execute("delete from data")
+                for batch in batches(self.backend.data_store, self.batch_size):
+                    conn.executemany("insert or ignore into data values (?)", ((dataid,) for dataid in batch))
+            self._mark(conn, iter(self.backend.meta_store))
+            live = conn.execute("select count(*) from live").fetchone()[0]
+            orphans, young = self._old(
+                conn,
+                [
+                    row[0]
+                    for row in conn.execute("select dataid from data where dataid not in (select dataid from live)")
+                ],
+                started,
+            )
+            if dry_run:
+                removed = reclaimed = 0
+                for dataid in orphans:
+                    removed += 1
+                    reclaimed += self._size(dataid)
+            else:
+                removed, reclaimed = conn.execute("select count(*), coalesce(sum(size), 0) from swept").fetchone()
+                with ThreadPoolExecutor(self.workers) as executor:
+                    for batch in batches(orphans, self.batch_size):
+                        sizes = list(executor.map(self._remove, batch))
+                        with conn:
+                            conn.executemany("insert or replace into swept values (?, ?)", zip(batch, sizes))
+                            conn.executemany("delete from unreferenced where dataid=?", ((dataid,) for dataid in batch))
+                        removed += len(batch)
+                        reclaimed += sum(sizes)
+            refcounts = 0
+            if isinstance(self.backend, dedup.Backend) and not dry_run:
+                refcounts = self._repair_refcounts(conn, young)
+            # done, the next run starts from scratch (but knows since when data is unreferenced)
+            with conn:
+                for table in ("live", "marked", "data", "swept", "state"):
+                    conn.execute(f"delete from {table}")
+            conn.execute("vacuum")
+        finally:
+            conn.close()
+        return GCReport(
+            self.backend_name,
+            live=live,
+            orphans=removed,
+            young=len(young),
+            removed=0 if dry_run else removed,
+            reclaimed=reclaimed,
+            refcounts=refcounts,
+            runtime=time.time() - started,
+        )
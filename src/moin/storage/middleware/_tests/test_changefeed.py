@@ -0,0 +1,163 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - index change feed tests.
+"""
+
+from io import BytesIO
+
+import time
+
+import pytest
+
+from moin import current_app, flaskg
+from moin.constants.itemtypes import ITEMTYPE_DEFAULT
+from moin.constants.keys import ALL_REVS, ITEMTYPE, LATEST_REVS, NAME, REVID
+from moin.storage.middleware.changefeed import (
+    CHANGE_INDEX,
+    CHANGE_REMOVE,
+    POSITION_FILE,
+    GAP_TIMEOUT,
+    ChangeFeed,
+    ChangeFollower,
+    store_position,
+    stored_gaps,
+    stored_position,
+)
+from moin.storage.middleware.indexing import IndexingMiddleware
+
+
+@pytest.fixture
+def feed(tmp_path):
+    # SQLite stands in for the database shared by the wiki servers
+    feed = ChangeFeed.from_uri(f"sqlite:///{tmp_path / 'shared.db'}::changes")
+    feed.open()
+    yield feed
+    feed.close()
+
+
+def test_change_feed(feed):
+    assert (feed.first_seq(), feed.last_seq()) == (0, 0)
+    seq1 = feed.append("a", CHANGE_INDEX, "default", "rev1")
+    seq2 = feed.append("b", CHANGE_REMOVE, "default", "rev1")
+    assert seq2 > seq1
+    changes = feed.read()
+    assert [(c.seq, c.node, c.action, c.revid, c.latest) for c in changes] == [
+        (seq1, "a", CHANGE_INDEX, "rev1", True),
+        (seq2, "b", CHANGE_REMOVE, "rev1", True),
+    ]
+    assert feed.read(seq1) == changes[1:]
+    assert feed.read(seq2) == []
+    assert feed.read_seqs([seq2, seq1, seq2 + 1]) == changes
+    assert feed.trim(time.time() + 1) == 2
+    assert feed.read() == []
+    # sequence numbers are not reused
+    assert feed.append("a", CHANGE_INDEX, "default", "rev2") > seq2
+
+
+@pytest.mark.usefixtures("_req_ctx")
+class TestChangeFollower:
+
+    @pytest.fixture
+    def nodes(self, feed, tmp_path):
+        """
+        Two wiki servers (nodes) with their own indexes sharing the backend and the change feed.
+        """
+        node_a = flaskg.unprotected_storage
+        node_a.changefeed, node_a.node = feed, "a"
+        node_b = IndexingMiddleware(
+            ("FileStorage", (str(tmp_path / "index_b"),), {}),
+            node_a.backend,
+            acl_rights_contents=current_app.cfg.acl_rights_contents,
+            changefeed=feed,
+            node="b",
+        )
+        node_b.create()
+        node_b.open()
+        store_position(node_b.get_storage(), feed.last_seq())
+        yield node_a, node_b
+        node_b.close()
+        node_a.changefeed = None
+        if node_a.get_storage().file_exists(POSITION_FILE):
+            node_a.get_storage().delete_file(POSITION_FILE)
+
+    def revids(self, indexer, idx_name):
+        # searchers are cached per app context, every node needs its own
+        with current_app.app_context():
+            return sorted(doc[REVID] for doc in indexer._documents(idx_name=idx_name))
+
+    def run_once(self, follower):
+        with current_app.app_context():
+            return follower.run_once()
+
+    def test_follow(self, nodes):
+        node_a, node_b = nodes
+        follower = ChangeFollower(current_app, node_b)
+        item = node_a["foo"]
+        meta = {NAME: ["foo"], ITEMTYPE: ITEMTYPE_DEFAULT}
+        rev1 = item.store_revision(dict(meta), BytesIO(b"1st"), return_rev=True)
+        rev2 = item.store_revision(dict(meta), BytesIO(b"2nd"), return_rev=True)
+        assert self.revids(node_b, ALL_REVS) == []
+        follower.update_lag()
+        assert follower.behind == 2 and follower.lag > 0
+        assert self.run_once(follower) == 2
+        assert (follower.lag, follower.behind, follower.applied) == (0.0, 0, 2)
+        assert self.revids(node_b, ALL_REVS) == sorted([rev1.revid, rev2.revid])
+        assert self.revids(node_b, LATEST_REVS) == [rev2.revid]
+        with current_app.app_context():
+            assert node_b.document(revid=rev2.revid).meta[NAME] == ["foo"]
+        node_a["foo"].destroy_revision(rev2.revid)
+        assert self.run_once(follower) == 1
+        assert self.revids(node_b, ALL_REVS) == [rev1.revid]
+        assert self.revids(node_b, LATEST_REVS) == self.revids(node_a, LATEST_REVS)
+        # node a applies the changes of node b, but not its own ones
+        follower_a = ChangeFollower(current_app, node_a)
+        store_position(node_a.get_storage(), follower.position)
+        with current_app.app_context():
+            node_b.remove_revision(rev1.revid, async_=False)
+        assert self.run_once(follower_a) == 1
+        assert self.revids(node_a, ALL_REVS) == []
+        assert stored_position(node_a.get_storage()) == follower.position + 1
+        assert self.run_once(follower) == 1
+        assert follower.applied == 3
+
+    def test_catch_up(self, nodes, feed):
+        node_a, node_b = nodes
+        follower = ChangeFollower(current_app, node_b, retention=0)
+        rev = node_a["foo"].store_revision({NAME: ["foo"], ITEMTYPE: ITEMTYPE_DEFAULT}, BytesIO(b"x"), return_rev=True)
+        self.run_once(follower)
+        # the changes were trimmed (retention 0) before node b saw the new one
+        node_a["bar"].store_revision({NAME: ["bar"], ITEMTYPE: ITEMTYPE_DEFAULT}, BytesIO(b"y"))
+        feed.trim(time.time() + 1)
+        feed.append("a", CHANGE_INDEX, "default", rev.revid)
+        self.run_once(follower)
+        assert len(self.revids(node_b, LATEST_REVS)) == 2
+
+    def test_late_commit(self, nodes, feed, monkeypatch):
+        node_a, node_b = nodes
+        follower = ChangeFollower(current_app, node_b)
+        meta = {NAME: ["foo"], ITEMTYPE: ITEMTYPE_DEFAULT}
+        revs = [node_a["foo"].store_revision(dict(meta), BytesIO(b"%d" % i), return_rev=True) for i in range(3)]
+        # the change of the 2nd revision is not committed yet (a later one is)
+        late = feed.read_seqs([feed.last_seq() - 1])[0]
+        with feed.engine.begin() as conn:
+            conn.execute(feed.table.delete().where(feed.table.c.seq == late.seq))
+        assert self.run_once(follower) == 2
+        assert late.revid not in self.revids(node_b, ALL_REVS)
+        assert list(stored_gaps(node_b.get_storage())) == [late.seq]
+        with feed.engine.begin() as conn:
+            conn.execute(feed.table.insert().values(**late._asdict()))
+        assert self.run_once(follower) == 1
+        assert self.revids(node_b, ALL_REVS) == sorted(rev.revid for rev in revs)
+        assert stored_gaps(node_b.get_storage()) == {}
+        # a rolled back change is not waited for longer than GAP_TIMEOUT
+        with feed.engine.begin() as conn:
+            conn.execute(feed.table.delete().where(feed.table.c.seq == late.seq))
+        store_position(node_b.get_storage(), follower.position, {late.seq: time.time()})
+        self.run_once(follower)
+        assert list(stored_gaps(node_b.get_storage())) == [late.seq]
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + GAP_TIMEOUT + 1)
+        self.run_once(follower)
+        assert stored_gaps(node_b.get_storage()) == {}
@@ -15,6 +15,8 @@ from typing import TYPE_CHECKING
 
 from io import BytesIO
 import hashlib
+import os
+import tarfile
 import pytest
 
 from whoosh.query import Term
@@ -35,8 +37,11 @@ from moin.constants.keys import (
     DATAID,
     HASH_ALGORITHM,
     CONTENT,
+    CONTENT_HASH,
+    CONTENTNGRAM,
     COMMENT,
     LATEST_REVS,
+    LATEST_META,
     ALL_REVS,
     NAMESPACE,
     NAMERE,
@@ -48,9 +53,31 @@ from moin.constants.keys import (
     PARENTID,
     MTIME,
     SUBSCRIPTIONS,
+    USERID,
 )
-from moin.constants.namespaces import NAMESPACE_USERS
-from moin.storage.middleware.indexing import IndexingMiddleware, Item, Revision
+from moin.constants.namespaces import NAMESPACE_DEFAULT, NAMESPACE_USERS
+from moin.storage.error import IndexSchemaError, MetaNotIndexedError
+from moin.storage.middleware.indexing import (
+    INDEX_SCHEMA_VERSION,
+    INDEX_SCHEMA_VERSION_FILE,
+    INDEXES,
+    NGRAM_FULL,
+    NGRAM_NAMES,
+    IndexingMiddleware,
+    Item,
+    Revision,
+    backend_to_index,
+    check_ngram_indexing,
+    index_only,
+    lazy_meta_loads,
+    ngram_policy,
+)
+from moin.storage.middleware import indexing
+from moin.storage.middleware.journal import JOURNAL_INDEX, JOURNAL_REMOVE
+from moin.storage.middleware.merging import MERGE_MERGED, SizeTieredMergePolicy, leaf_indexes
+from moin.storage.middleware.snapshot import SnapshotError, create_snapshot, read_manifest, restore_snapshot
+from moin.storage.middleware.partitioning import PARTITION_YEAR, PartitionedIndex
+from moin.storage.middleware.sharding import DEFAULT_SHARD, ShardedIndex
 from moin.storage.middleware.protecting import ProtectedItem, ProtectedRevision, ProtectingMiddleware
 from moin.utils.names import split_fqname
 
@@ -65,6 +92,30 @@ def dumper(indexer, idx_name):
         print()
 
 
+def test_ngram_policy():
+    ngram_indexing = [("users", "", NGRAM_NAMES), (None, "image/", NGRAM_NAMES), (None, "text/", 1)]
+    assert ngram_policy(ngram_indexing, "users", "text/x.moin.wiki;charset=utf-8") == NGRAM_NAMES
+    assert ngram_policy(ngram_indexing, "", "image/png") == NGRAM_NAMES
+    assert ngram_policy(ngram_indexing, "", "text/plain;charset=utf-8") == 1
+    assert ngram_policy(ngram_indexing, "", "application/pdf") == NGRAM_FULL
+    assert ngram_policy([], "", "text/plain;charset=utf-8") == NGRAM_FULL
+    with pytest.raises(ValueError):
+        check_ngram_indexing([(None, "", "everything")])
+
+
+def test_backend_to_index_ngram_indexing():
+    schema = IndexingMiddleware(("FileStorage", ("unused",), {}), None).schemas[LATEST_REVS]
+    meta = {NAME: ["foo"], NAMESPACE: "", CONTENTTYPE: "text/plain;charset=utf-8"}
+    content = "ä" * 1000
+    assert backend_to_index(meta, content, schema, "default")[CONTENTNGRAM] == content
+    doc = backend_to_index(meta, content, schema, "default", [(None, "", 1)])
+    assert doc[CONTENTNGRAM] == "ä" * 512  # 1 KB of utf-8
+    assert doc[CONTENT] == content
+    doc = backend_to_index(meta, content, schema, "default", [(None, "", NGRAM_NAMES)])
+    assert CONTENTNGRAM not in doc
+    assert doc[CONTENT] == content
+
+
 class TestIndexingMiddlewareBase:
 
     reinit_storage = True  # Clean up after each test method
@@ -89,6 +140,7 @@ class TestIndexingMiddlewareBase:
         mtime: int | None = None,
         acl: str | None = None,
         parent: Revision | None = None,
+        contenttype: str | None = None,
     ) -> Revision:
         meta = {ACTION: ACTION_SAVE, ADDRESS: "127.0.0.1", NAME: item.names.copy(), ITEMTYPE: ITEMTYPE_DEFAULT}
         if acl:
@@ -97,6 +149,8 @@ class TestIndexingMiddlewareBase:
             meta[MTIME] = mtime
         if parent:
             meta[PARENTID] = parent.revid
+        if contenttype:
+            meta[CONTENTTYPE] = contenttype
         revision = item.store_revision(meta, BytesIO(data), trusted=True, return_rev=True)
         assert revision
         return revision
@@ -190,7 +244,12 @@ class TestIndexingMiddleware(TestIndexingMiddlewareBase):
         revid = rev.revid
 
         # hold the write lock ourselves, simulating a concurrent writer
-        lock = self.imw.ix[ALL_REVS].lock("WRITELOCK")
+        index = self.imw.ix[ALL_REVS]
+        if isinstance(index, ShardedIndex):
+            index = index.indexes[index.shard_for(item.meta[NAMESPACE])]
+        if isinstance(index, PartitionedIndex):
+            index = index.partition_index(index.current_key())
+        lock = index.lock("WRITELOCK")
         assert lock.acquire()
 
         def release_soon():
@@ -304,6 +363,18 @@ class TestIndexingMiddleware(TestIndexingMiddlewareBase):
         assert len(revs) == 1  # there is only 1 latest revision
         assert expected_rev.revid == revs[0].revid  # it is really the latest one
 
+    def test_find_latest_backends_revids(self):
+        item, item_name, revid1, revid2, revid3 = self.store_three_revisions()
+        other = self.get_item("bar")
+        other_rev1 = self.store_revision(other, b"1st", mtime=5)
+        other_rev2 = self.store_revision(other, b"2nd", mtime=4, parent=other_rev1)
+        latest = self.imw._find_latest_backends_revids(self.imw.ix[ALL_REVS])
+        # the latest revision by MTIME, not the last one stored
+        assert sorted(revid for backend_name, revid in latest) == sorted([revid3, other_rev1.revid])
+        assert {backend_name for backend_name, revid in latest} == {other_rev2.backend_name}
+        latest = self.imw._find_latest_backends_revids(self.imw.ix[ALL_REVS], Term(ITEMID, item.itemid))
+        assert latest == [(other_rev2.backend_name, revid3)]
+
     def test_auto_meta(self):
         item_name = "foo"
         data = b"bar"
@@ -485,6 +556,125 @@ class TestIndexingMiddleware(TestIndexingMiddlewareBase):
         assert sorted(all_revids) == sorted(expected_all_revids)
         assert sorted(latest_revids) == sorted(expected_latest_revids)
 
+    def test_merge_segments(self):
+        self.imw.defer_merges = True
+        try:
+            item, item_name, revid1, revid2, revid3 = self.store_three_revisions()
+        finally:
+            self.imw.defer_merges = False
+        policy = SizeTieredMergePolicy(min_segments=2)
+        reports = self.imw.merge_segments(policy)
+        assert MERGE_MERGED in {report.status for report in reports}
+        for name in INDEXES:
+            for ix in leaf_indexes(self.imw.ix[name]):
+                assert policy.select(ix._segments()) == []
+        revids = {rev.revid for rev in self.imw.documents(idx_name=ALL_REVS)}
+        assert revids == {revid1, revid2, revid3}
+
+    def test_index_snapshot(self, tmp_path):
+        item, item_name, revid1, revid2, revid3 = self.store_three_revisions()
+        path = str(tmp_path / "index.tar.gz")
+        manifest = create_snapshot(self.imw, path)
+        assert manifest["position"] == {"revisions": 3, "mtime": 3, "changefeed": None}
+        assert manifest["schema_version"] == INDEX_SCHEMA_VERSION
+        assert read_manifest(path)["files"] == manifest["files"]
+        rev4 = self.store_revision(item, b"new", mtime=4, parent=item[revid3])
+        # restore to the tmp location and catch up with the new revision
+        restore_snapshot(self.imw, path, tmp=True)
+        storage = self.imw.get_storage(tmp=True)
+        with self.imw._open_index(storage, ALL_REVS).searcher() as searcher:
+            assert searcher.doc_count() == 3
+        assert self.imw.update(tmp=True)
+        with self.imw._open_index(storage, ALL_REVS).searcher() as searcher:
+            assert searcher.doc_count() == 4
+        with self.imw._open_index(storage, LATEST_REVS).searcher() as searcher:
+            assert [doc[REVID] for doc in searcher.all_stored_fields()] == [rev4.revid]
+        self.imw.destroy(tmp=True)
+        # a corrupted snapshot is rejected
+        with tarfile.open(path, "r:gz") as archive, tarfile.open(str(tmp_path / "bad.tar"), "w") as bad:
+            for tarinfo in archive:
+                data = archive.extractfile(tarinfo).read()
+                if tarinfo.name.startswith("index/content/"):
+                    data = data[:-1] + bytes([data[-1] ^ 1])
+                bad.addfile(tarinfo, BytesIO(data))
+        with pytest.raises(SnapshotError):
+            restore_snapshot(self.imw, str(tmp_path / "bad.tar"), tmp=True)
+        assert not os.path.exists(self.imw.get_storage_params(tmp=True)[2][0])
+
+    def test_journal(self, monkeypatch):
+        assert self.imw.journal is None  # opt-in
+        journal = self.imw.get_journal()
+        monkeypatch.setattr(self.imw, "journal", journal)
+        item, item_name, revid1, revid2, revid3 = self.store_three_revisions()
+        item.destroy_revision(revid3)
+        assert journal.entries() == []
+        # the process died after storing a revision in the backend, before indexing it
+        meta = {key: value for key, value in item[revid1].meta.items() if key not in (DATAID, SIZE, HASH_ALGORITHM)}
+        meta.update({REVID: "4" * 32, MTIME: 4, PARENTID: revid2})
+        backend_name = self.imw.backend.store_backend_name(meta)
+        journal.begin(JOURNAL_INDEX, backend_name, meta[REVID])
+        self.imw.backend.store(meta, BytesIO(b"4th"))
+        # ... and after destroying a revision in the backend, before removing it from the indexes
+        journal.begin(JOURNAL_REMOVE, backend_name, revid2)
+        self.imw.backend.remove(backend_name, revid2, destroy_data=True)
+        # ... and before storing a revision
+        journal.begin(JOURNAL_INDEX, backend_name, "5" * 32)
+        assert [entry.action for entry in journal.entries()] == [JOURNAL_INDEX, JOURNAL_REMOVE, JOURNAL_INDEX]
+        # another wiki process is replaying the entries
+        lock = journal.lock()
+        assert lock.acquire()
+        assert self.imw.replay_journal() == 0
+        lock.release()
+        assert self.imw.replay_journal() == 3
+        assert journal.entries() == []
+        assert {rev.revid for rev in self.imw.documents(idx_name=ALL_REVS)} == {revid1, "4" * 32}
+        assert [rev.revid for rev in self.imw.documents(idx_name=LATEST_REVS)] == ["4" * 32]
+        assert self.imw.replay_journal() == 0
+
+    def test_index_only(self):
+        item, item_name, revid1, revid2, revid3 = self.store_three_revisions()
+        flaskg.lazy_meta_loads = 0
+        with index_only(MTIME, NAME, REVID, DATAID, USERID, idx_name=ALL_REVS):
+            revs = list(self.imw.documents(idx_name=ALL_REVS))
+            assert sorted(rev.meta[MTIME] for rev in revs) == [1, 2, 3]
+            assert set(dict(revs[0].meta)) == {MTIME, NAME, REVID, DATAID}
+            assert USERID not in revs[0].meta  # declared, but not in the revision
+            with pytest.raises(MetaNotIndexedError):
+                revs[0].meta[ITEMTYPE]
+            with pytest.raises(MetaNotIndexedError):
+                revs[0].meta.get(ITEMTYPE)
+        with pytest.raises(ValueError):
+            with index_only(CONTENT, idx_name=ALL_REVS):
+                pass
+        assert lazy_meta_loads() == 0
+        # outside of index_only, the metadata is loaded from the backend
+        assert revs[0].meta[HASH_ALGORITHM]
+        assert lazy_meta_loads() == 1
+
+    def test_schema_version(self):
+        assert self.imw.schema_version() == INDEX_SCHEMA_VERSION
+        # simulate an index created before schema versioning was introduced
+        self.imw.get_storage().delete_file(INDEX_SCHEMA_VERSION_FILE)
+        assert self.imw.schema_version() == 1
+        self.imw.close()
+        with pytest.raises(IndexSchemaError):
+            self.imw.open()
+        # the indexes are open nevertheless, so index-* commands can still work
+        assert set(self.imw.ix) == {LATEST_REVS, ALL_REVS, LATEST_META}
+
+    def test_sortable_columns(self):
+        for name, mtime in [("b", 1), ("c", 3), ("a", 2)]:
+            item = self.get_item(name)
+            self.store_revision(item, name.encode(), mtime=mtime)
+        for idx_name in [LATEST_REVS, ALL_REVS, LATEST_META]:
+            with self.imw.ix[idx_name].searcher() as searcher:
+                assert searcher.reader().has_column(NAME_EXACT)
+                assert searcher.reader().has_column(MTIME)
+        names = [rev.name for rev in self.imw.search(Term(NAMESPACE, ""), sortedby=NAME_EXACT, limit=None)]
+        assert names == ["a", "b", "c"]
+        names = [rev.name for rev in self.imw.search(Term(NAMESPACE, ""), sortedby=MTIME, reverse=True, limit=None)]
+        assert names == ["c", "a", "b"]
+
     def test_revision_contextmanager(self):
         # check if rev.data is closed after leaving the with-block
         item_name = "foo"
@@ -519,6 +709,49 @@ class TestIndexingMiddleware(TestIndexingMiddlewareBase):
         assert expected_revid == doc[REVID]
         assert doc[CONTENT] == data.decode()
 
+    def test_indexed_content_store(self, monkeypatch):
+        item = self.get_item("foo")
+        ct = "text/plain;charset=utf-8"
+        rev1 = self.store_revision(item, b"same content\n", mtime=1, contenttype=ct)
+        rev2 = self.store_revision(item, b"same content\n", mtime=2, parent=rev1, contenttype=ct)
+        rev3 = self.store_revision(item, b"other content\n", mtime=3, parent=rev2, contenttype=ct)
+        content_store = self.imw.content_store
+        monkeypatch.setattr(content_store, "release_grace", 0)
+        with self.imw.ix[ALL_REVS].searcher() as searcher:
+            docs = {revid: searcher.document(revid=revid) for revid in [rev1.revid, rev2.revid, rev3.revid]}
+            # content is indexed, but not stored in ALL_REVS
+            assert {doc[REVID] for doc in searcher.documents(content="other")} == {rev3.revid}
+        assert all(CONTENT not in doc for doc in docs.values())
+        key1, key2, key3 = (docs[revid][CONTENT_HASH] for revid in [rev1.revid, rev2.revid, rev3.revid])
+        assert key1 == key2 != key3
+        assert self.imw.indexed_content(docs[rev1.revid]) == "same content\n"
+        assert self.imw.indexed_content(docs[rev3.revid]) == "other content\n"
+        # removing the latest revision gets the content of the new latest revision from the content store
+        item.destroy_revision(rev3.revid)
+        assert key3 not in content_store
+        assert self.imw._document(itemid=item.itemid)[CONTENT] == "same content\n"
+        # content is only removed from the store when no revision refers to it any more
+        item.destroy_revision(rev2.revid)
+        assert key1 in content_store
+        item.destroy_revision(rev1.revid)
+        assert key1 not in content_store
+
+    def test_indexed_content_release_grace(self, monkeypatch):
+        # content put recently is kept, the document of a concurrently indexed revision may refer to it
+        item = self.get_item("foo")
+        ct = "text/plain;charset=utf-8"
+        rev1 = self.store_revision(item, b"content\n", mtime=1, contenttype=ct)
+        with self.imw.ix[ALL_REVS].searcher() as searcher:
+            key = searcher.document(revid=rev1.revid)[CONTENT_HASH]
+        content_store = self.imw.content_store
+        self.store_revision(self.get_item("bar"), b"other\n", mtime=2, contenttype=ct)
+        item.destroy_revision(rev1.revid)
+        assert key in content_store
+        # later, the unreferenced content is swept by optimize_index
+        monkeypatch.setattr(indexing, "CONTENT_RELEASE_GRACE", 0)
+        self.imw.optimize_index()
+        assert key not in content_store
+
     def test_indexing_subscriptions(self):
         item_name = "foo"
         meta = {NAME: [item_name], ITEMTYPE: ITEMTYPE_DEFAULT, SUBSCRIPTIONS: [f"{NAME}::foo", f"{NAMERE}::.*"]}
@@ -577,6 +810,122 @@ class TestIndexingMiddleware(TestIndexingMiddlewareBase):
         assert item.parentnames == {"p1", "p2", "p3/p4"}  # one p2 duplicate removed
 
 
+class TestPartitionedIndexingMiddleware(TestIndexingMiddleware):
+    """
+    All indexing middleware tests again, with the ALL_REVS index partitioned by year.
+    """
+
+    @pytest.fixture
+    def cfg(self):
+        class Config(wikiconfig.Config):
+            index_partitioning = PARTITION_YEAR
+
+        return Config
+
+    def test_partitions(self):
+        item, item_name, revid1, revid2, revid3 = self.store_three_revisions()
+        rev4 = self.store_revision(item, b"now", parent=item[revid3])
+        index = self.imw.ix[ALL_REVS]
+        assert index.partitions() == ["1970", index.current_key()]
+        query = Term(ITEMID, item.itemid)
+        revs = self.imw.search(query, idx_name=ALL_REVS, sortedby=[MTIME], reverse=True, limit=None)
+        assert [rev.revid for rev in revs] == [rev4.revid, revid3, revid2, revid1]
+        # the latest revision is in the partition of the current year
+        with self.imw._searcher(ALL_REVS, query, sortedby=[MTIME], reverse=True, limit=1) as searcher:
+            assert searcher.doc_count() == 1
+        item.destroy_revision(rev4.revid)
+        assert self.imw._document(itemid=item.itemid)[REVID] == revid3
+        # an index with another partitioning must be rebuilt
+        self.imw.close()
+        self.imw.partitioning = None
+        with pytest.raises(IndexSchemaError):
+            self.imw.open()
+        self.imw.partitioning = PARTITION_YEAR
+
+    def test_overwrite_moved(self):
+        item, item_name, revid1, revid2, revid3 = self.store_three_revisions()
+        index = self.imw.ix[ALL_REVS]
+        # overwriting gives the revision a new MTIME, it moves to the partition of the current year
+        meta = {NAME: [item_name], ITEMTYPE: ITEMTYPE_DEFAULT, COMMENT: "no spam", REVID: revid1}
+        item.store_revision(meta, BytesIO(b"new"), overwrite=True)
+        revs = self.imw.search(Term(REVID, revid1), idx_name=ALL_REVS, limit=None)
+        assert [rev.meta[COMMENT] for rev in revs] == ["no spam"]
+        with index.searcher([index.current_key()]) as searcher:
+            assert searcher.document(revid=revid1) is not None
+
+
+class TestShardedIndexingMiddleware(TestIndexingMiddleware):
+    """
+    All indexing middleware tests again, with the default and the users namespace in their own index shards.
+    """
+
+    @pytest.fixture
+    def cfg(self):
+        class Config(wikiconfig.Config):
+            index_shards = {NAMESPACE_DEFAULT: "main", NAMESPACE_USERS: "users"}
+
+        return Config
+
+    def test_rename_to_other_shard(self):
+        item, item_name, revid1, revid2, revid3 = self.store_three_revisions()
+        meta = {NAME: [item_name], NAMESPACE: NAMESPACE_USERS, ITEMTYPE: ITEMTYPE_DEFAULT}
+        revid4 = item.store_revision(meta, BytesIO(b"moved"), return_rev=True).revid
+        for idx_name in [LATEST_REVS, LATEST_META]:
+            revs = self.imw.search(Term(ITEMID, item.itemid), idx_name=idx_name, limit=None)
+            assert [rev.revid for rev in revs] == [revid4]
+        # back to the old shard, when the revision is destroyed
+        item.destroy_revision(revid4)
+        for idx_name in [LATEST_REVS, LATEST_META]:
+            revs = self.imw.search(Term(ITEMID, item.itemid), idx_name=idx_name, limit=None)
+            assert [rev.revid for rev in revs] == [revid3]
+
+    def test_remove_moved(self):
+        item, item_name, revid1, revid2, revid3 = self.store_three_revisions()
+        deleted = []
+
+        class Writer:
+            def delete_by_term(self, fieldname, text):
+                deleted.append((fieldname, text))
+
+        self.imw.close_searchers()
+        doc = {ITEMID: item.itemid, NAMESPACE: NAMESPACE_DEFAULT}
+        self.imw._remove_moved(Writer(), LATEST_REVS, ITEMID, doc)
+        assert deleted == []
+        self.imw._remove_moved(Writer(), LATEST_REVS, ITEMID, dict(doc, **{NAMESPACE: NAMESPACE_USERS}))
+        assert deleted == [(ITEMID, item.itemid)]
+        # the other shards are searched with readers closed at once, no searchers are cached or retired
+        assert not self.imw._searcher_cache(create=False)
+        assert not getattr(flaskg, "_whoosh_retired_searchers", [])
+
+    def test_shards(self):
+        item, item_name, revid1, revid2, revid3 = self.store_three_revisions()
+        index = self.imw.ix[LATEST_REVS]
+        assert list(index.indexes) == [DEFAULT_SHARD, "main", "users"]
+        main_generation = index.indexes["main"].latest_generation()
+        query = Term(NAMESPACE, NAMESPACE_DEFAULT)
+        with self.imw._searcher(LATEST_REVS, query) as main_searcher:
+            assert main_searcher.doc_count() == 1
+        user_item = self.imw.get_item(**split_fqname(f"{NAMESPACE_USERS}/foo").query)
+        meta = {NAME: ["foo"], NAMESPACE: NAMESPACE_USERS, ITEMTYPE: ITEMTYPE_DEFAULT}
+        user_revid = user_item.store_revision(meta, BytesIO(b"user data"), return_rev=True).revid
+        # writes only go to the shard of the namespace, its cached searchers stay valid
+        assert index.indexes["main"].latest_generation() == main_generation
+        with self.imw._searcher(LATEST_REVS, query) as searcher:
+            assert searcher is main_searcher
+        # searches over all namespaces are federated
+        revids = {rev.revid for rev in self.imw.documents(idx_name=LATEST_REVS)}
+        assert revids == {revid3, user_revid}
+        revids = {rev.revid for rev in self.imw.documents(idx_name=ALL_REVS)}
+        assert revids == {revid1, revid2, revid3, user_revid}
+        assert self.imw._document(idx_name=LATEST_REVS, itemid=user_item.itemid)[REVID] == user_revid
+        # an index with other shards must be rebuilt
+        self.imw.close()
+        self.imw.shards = {}
+        with pytest.raises(IndexSchemaError):
+            self.imw.open()
+        self.imw.shards = {NAMESPACE_DEFAULT: "main", NAMESPACE_USERS: "users"}
+
+
 @pytest.mark.usefixtures("_req_ctx", "_pmw")
 class TestProtectedIndexingMiddleware:
 
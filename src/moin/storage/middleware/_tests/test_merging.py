@@ -0,0 +1,108 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - index segment merging tests.
+"""
+
+import pytest
+
+from whoosh.fields import ID, Schema
+from whoosh.filedb.filestore import FileStorage
+
+from moin.constants.keys import REVID
+from moin.storage.middleware.merging import (
+    MERGE_BUSY,
+    MERGE_LOCKED,
+    MERGE_MERGED,
+    MERGE_UNCHANGED,
+    DeferredMergeWriter,
+    MergeScheduler,
+    SizeTieredMergePolicy,
+    check_merge_scheduler,
+    merge_index,
+)
+
+
+class FakeSegment:
+
+    def __init__(self, docs, deleted=0):
+        self.docs, self.deleted = docs, deleted
+
+    def doc_count_all(self):
+        return self.docs
+
+    def doc_count(self):
+        return self.docs - self.deleted
+
+
+def test_size_tiered_merge_policy():
+    policy = SizeTieredMergePolicy(min_segments=3, tier_factor=10)
+    small = [FakeSegment(1), FakeSegment(5), FakeSegment(9)]
+    medium = [FakeSegment(10), FakeSegment(50)]
+    assert policy.select(small + medium) == small
+    assert policy.select(small[:2] + medium) == []
+    medium.append(FakeSegment(99))
+    assert policy.select(small[:2] + medium) == medium
+    big = FakeSegment(1000, deleted=500)
+    assert policy.select(small[:2] + [big]) == [big]
+    with pytest.raises(ValueError):
+        SizeTieredMergePolicy(min_segments=1)
+    check_merge_scheduler(None)
+    check_merge_scheduler("daemon")
+    with pytest.raises(ValueError):
+        check_merge_scheduler("cron")
+
+
+class TestMergeIndex:
+
+    @pytest.fixture
+    def ix(self, tmp_path):
+        ix = FileStorage(str(tmp_path)).create_index(Schema(**{REVID: ID(stored=True, unique=True)}))
+        yield ix
+        ix.close()
+
+    def add(self, ix, count):
+        for i in range(count):
+            with DeferredMergeWriter(ix.writer()) as writer:
+                writer.add_document(**{REVID: str(i)})
+
+    def test_merge_index(self, ix):
+        policy = SizeTieredMergePolicy(min_segments=4)
+        self.add(ix, 3)
+        # the writes did not merge the segments
+        assert len(ix._segments()) == 3
+        assert merge_index(ix, policy) == (ix.indexname, MERGE_UNCHANGED, 3, 3, 0.0)
+        self.add(ix, 1)
+        assert merge_index(ix, policy, idle=60).status == MERGE_BUSY
+        report = merge_index(ix, policy)
+        assert (report.status, report.segments_before, report.segments_after) == (MERGE_MERGED, 4, 1)
+        assert ix.doc_count() == 4
+
+    def test_merge_locked(self, ix):
+        self.add(ix, 4)
+        writer = ix.writer()
+        try:
+            report = merge_index(ix, SizeTieredMergePolicy(min_segments=4))
+        finally:
+            writer.cancel()
+        assert (report.status, report.segments_after) == (MERGE_LOCKED, 4)
+
+
+class FakeIndexer:
+
+    def __init__(self):
+        self.runs = 0
+
+    def merge_segments(self, policy, idle=0):
+        self.runs += 1
+        return []
+
+
+def test_merge_scheduler():
+    indexer = FakeIndexer()
+    scheduler = MergeScheduler(indexer, interval=0.01).start()
+    while indexer.runs < 2:
+        pass
+    scheduler.stop()
+    assert scheduler.thread is None
@@ -0,0 +1,158 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - time-partitioned index tests.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from whoosh.fields import DATETIME, ID, Schema, TEXT
+from whoosh.filedb.filestore import FileStorage
+from whoosh.index import EmptyIndexError
+from whoosh.query import And, DateRange, Every, Term
+from whoosh.sorting import FieldFacet
+
+from moin.constants.keys import CONTENT, MTIME, REVID
+from moin.storage.middleware.partitioning import (
+    PARTITION_MONTH,
+    PARTITION_YEAR,
+    PartitionedIndex,
+    check_partitioning,
+    mtime_span,
+    partition_key,
+    partition_span,
+    sorts_newest_first,
+)
+from moin.utils import utcnow
+
+
+def test_partition_key_span():
+    mtime = datetime(2024, 12, 31, 23, 59)
+    assert partition_key(PARTITION_YEAR, mtime) == "2024"
+    assert partition_key(PARTITION_MONTH, mtime) == "2024_12"
+    assert partition_span(PARTITION_YEAR, "2024") == (datetime(2024, 1, 1), datetime(2025, 1, 1))
+    assert partition_span(PARTITION_MONTH, "2024_12") == (datetime(2024, 12, 1), datetime(2025, 1, 1))
+    assert partition_span(PARTITION_MONTH, "2024_02") == (datetime(2024, 2, 1), datetime(2024, 3, 1))
+    check_partitioning(None)
+    with pytest.raises(ValueError):
+        check_partitioning("week")
+
+
+def test_mtime_span():
+    start, end = datetime(2020, 1, 1), datetime(2022, 1, 1)
+    assert mtime_span(Every()) == (None, None)
+    assert mtime_span(DateRange(MTIME, start, None)) == (start, None)
+    q = And([Term(CONTENT, "foo"), DateRange(MTIME, start, None), DateRange(MTIME, None, end)])
+    assert mtime_span(q) == (start, end)
+
+
+def test_sorts_newest_first():
+    assert sorts_newest_first([MTIME], True)
+    assert not sorts_newest_first([MTIME], False)
+    assert sorts_newest_first(FieldFacet(MTIME, reverse=True), False)
+    assert not sorts_newest_first(REVID, True)
+    assert not sorts_newest_first(None, False)
+
+
+class TestPartitionedIndex:
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        schema = Schema(**{REVID: ID(stored=True, unique=True), MTIME: DATETIME(stored=True), CONTENT: TEXT()})
+        storage = FileStorage(str(tmp_path))
+        with pytest.raises(EmptyIndexError):
+            PartitionedIndex(storage, "revs", schema, PARTITION_YEAR)
+        index = PartitionedIndex.create(storage, "revs", schema, PARTITION_YEAR)
+        yield index
+        index.close()
+
+    def add(self, index, *docs):
+        with index.writer() as writer:
+            for revid, year in docs:
+                writer.add_document(**{REVID: revid, MTIME: datetime(year, 6, 1), CONTENT: "foo"})
+
+    def revids(self, searcher, q=None, **kw):
+        return [hit[REVID] for hit in searcher.search(q or Every(), **kw)]
+
+    def test_partitions(self, index):
+        current = index.current_key()
+        assert index.partitions() == [current]
+        self.add(index, ("a", 2020), ("b", 2021), ("c", 2021))
+        assert index.partitions() == sorted(["2020", "2021", current])
+        assert index.doc_count() == 3
+        with index.searcher() as searcher:
+            assert self.revids(searcher, sortedby=MTIME) == ["a", "b", "c"]
+            assert searcher.document(revid="b")[MTIME] == datetime(2021, 6, 1)
+        # only the partitions a query or a sort with limit needs
+        assert index.partitions_for(DateRange(MTIME, datetime(2021, 1, 1), None)) == sorted(["2021", current])
+        assert index.partitions_for(DateRange(MTIME, None, datetime(2020, 12, 31))) == ["2020"]
+        assert index.newest_partitions(Term(CONTENT, "foo"), ["2020", "2021"], 2) == ["2021"]
+        assert index.newest_partitions(Term(CONTENT, "foo"), ["2020", "2021"], 3) == ["2020", "2021"]
+        with index.searcher(["2021"]) as searcher:
+            assert self.revids(searcher, sortedby=MTIME, reverse=True, limit=2) == ["c", "b"]
+
+    def test_writer(self, index):
+        self.add(index, ("a", 2020), ("b", 2021))
+        generation = index.partition_index("2020").latest_generation()
+        with index.writer() as writer:
+            writer.delete_by_term(REVID, "b")
+            writer.update_document(**{REVID: "c", MTIME: datetime(2021, 6, 1), CONTENT: "foo"})
+        # partitions not having the documents are not written to
+        assert index.partition_index("2020").latest_generation() == generation
+        with index.writer() as writer:
+            # the revision moves to another partition
+            writer.delete_by_term(REVID, "c")
+            writer.update_document(**{REVID: "c", MTIME: datetime(2020, 6, 1), CONTENT: "foo"})
+        with index.searcher() as searcher:
+            assert sorted(self.revids(searcher)) == ["a", "c"]
+        with index.searcher(["2021"]) as searcher:
+            assert self.revids(searcher) == []
+
+    def test_writer_update(self, index, monkeypatch):
+        self.add(index, ("a", 2020), ("b", 2021))
+        for key in index.partitions():
+            monkeypatch.setattr(index.partition_index(key), "reader", pytest.fail)
+        # updating only writes to the partition of the MTIME, no other partition is read
+        with index.writer() as writer:
+            writer.update_document(**{REVID: "b", MTIME: datetime(2021, 6, 1), CONTENT: "bar"})
+        monkeypatch.undo()
+        with index.searcher() as searcher:
+            assert sorted(self.revids(searcher)) == ["a", "b"]
+
+    def test_generation(self, index):
+        self.add(index, ("a", 2020))
+        searcher = index.searcher()
+        assert searcher.up_to_date()
+        assert searcher.refresh() is searcher
+        self.add(index, ("b", 2021))
+        assert not searcher.up_to_date()
+        searcher = searcher.refresh()
+        assert searcher.up_to_date()
+        assert sorted(self.revids(searcher)) == ["a", "b"]
+        searcher.close()
+        with index.searcher(["2021"]) as searcher:
+            assert searcher.up_to_date()
+
+    def test_freeze(self, index):
+        self.add(index, ("a", 2020))
+        self.add(index, ("b", 2020))
+        self.add(index, ("c", utcnow().year))
+        self.add(index, ("d", utcnow().year))
+        index.freeze()
+        assert len(index.partition_index("2020")._segments()) == 1
+        assert len(index.partition_index(index.current_key())._segments()) == 2
+        index.optimize()
+        assert len(index.partition_index(index.current_key())._segments()) == 1
+
+    def test_create_removes_partitions(self, index):
+        self.add(index, ("a", 2020))
+        index.close()
+        index = PartitionedIndex.create(index.storage, "revs", index.schema, PARTITION_MONTH)
+        assert index.partitions() == [index.current_key()]
+        assert index.doc_count() == 0
+        PartitionedIndex.remove(index.storage, "revs")
+        assert not PartitionedIndex.exists(index.storage, "revs")
+        assert index.partitions() == []
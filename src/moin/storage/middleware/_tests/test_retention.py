@@ -0,0 +1,147 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - revision retention tests.
+"""
+
+import time
+
+import pytest
+
+from flask import current_app as app
+
+from moin.constants.keys import ALL_REVS, PARENTID, REVID
+from moin.storage.middleware.retention import (
+    RETENTION_DAILY,
+    RETENTION_WEEKLY,
+    RevInfo,
+    RevisionRetention,
+    check_revision_retention,
+    select_revisions,
+)
+
+from .test_indexing import TestIndexingMiddlewareBase
+
+DAY = 86400
+NOW = 1005 * DAY  # a Monday, 00:00 UTC
+
+
+def revisions(*ages):
+    return [RevInfo(f"r{age}", NOW - age, None, None, "default") for age in ages]
+
+
+def revids(revisions):
+    return [rev.revid for rev in revisions]
+
+
+def test_check_revision_retention():
+    check_revision_retention({})
+    check_revision_retention({None: {"keep_last": 5, "thin": RETENTION_WEEKLY}, "userprofiles": {}})
+    for rule in ({"keep": 5}, {"keep_last": 0}, {"keep_days": "7"}, {"thin": "monthly"}):
+        with pytest.raises(ValueError):
+            check_revision_retention({"": rule})
+
+
+def test_select_revisions():
+    revs = revisions(0, DAY, 2 * DAY, 3 * DAY)
+    # the latest revision is always kept
+    assert select_revisions(revs, {}, NOW) == (revs[:1], revs[1:])
+    assert select_revisions(revs, {"keep_last": 2}, NOW) == (revs[1::-1], revs[2:])
+    kept, destroyed = select_revisions(revs, {"keep_days": 2.5}, NOW)
+    assert revids(kept) == ["r172800", "r86400", "r0"]
+    assert revids(destroyed) == ["r259200"]
+    assert select_revisions(revs, {"keep_last": 10}, NOW)[1] == []
+
+
+def test_select_revisions_thin():
+    hour = 3600
+    revs = revisions(0, hour, 25 * hour, 26 * hour, 8 * DAY, 9 * DAY, 10 * DAY)
+    kept, destroyed = select_revisions(revs, {"thin": RETENTION_DAILY}, NOW)
+    assert revids(kept) == ["r864000", "r777600", "r691200", "r90000", "r3600", "r0"]
+    assert revids(destroyed) == ["r93600"]
+    # NOW - 1 hour is in the week before NOW (Monday, 00:00)
+    kept, destroyed = select_revisions(revs, {"thin": RETENTION_WEEKLY}, NOW)
+    assert revids(kept) == ["r691200", "r3600", "r0"]
+    kept, destroyed = select_revisions(revs, {"keep_last": 3, "thin": RETENTION_WEEKLY}, NOW)
+    assert revids(kept) == ["r691200", "r90000", "r3600", "r0"]
+
+
+@pytest.mark.usefixtures("_req_ctx", "_imw")
+class TestRevisionRetention(TestIndexingMiddlewareBase):
+
+    def store_revisions(self, name, count):
+        item = self.get_item(name)
+        revs = []
+        for number in range(count):
+            data = b"same" if number % 2 else str(number).encode()  # revisions sharing data
+            revs.append(self.store_revision(item, data, mtime=number + 1, parent=revs[-1] if revs else None))
+        return [rev.revid for rev in revs]
+
+    def all_revids(self):
+        return {rev.revid for rev in self.imw.documents(idx_name=ALL_REVS)}
+
+    def test_apply(self):
+        foo = self.store_revisions("foo", 5)
+        bar = self.store_revisions("bar", 2)
+        retention = RevisionRetention(app, self.imw, {None: {"keep_last": 2}}, batch_size=2)
+        [report] = retention.run_once(dry_run=True)
+        assert (report.items, report.destroyed, report.relinked) == (1, 3, 1)
+        assert self.all_revids() == set(foo + bar)
+        [report] = retention.run_once()
+        assert (report.items, report.destroyed, report.relinked) == (1, 3, 1)
+        assert self.all_revids() == set(foo[3:] + bar)
+        item = self.get_item("foo")
+        assert PARENTID not in item[foo[3]].meta
+        assert item[foo[4]].meta[PARENTID] == foo[3]
+        assert item.meta[REVID] == foo[4]
+        assert item[foo[4]].data.read() == b"4"
+        assert item[foo[3]].data.read() == b"same"
+        # the rule of a namespace replaces the default rule
+        retention = RevisionRetention(app, self.imw, {None: {}, "": {"keep_last": 2}})
+        assert [report.destroyed for report in retention.run_once()] == [0, 0]
+
+    def test_run_one_process(self, monkeypatch):
+        runs = []
+        monkeypatch.setattr(RevisionRetention, "run_once", lambda self: runs.append(self))
+        # e.g. the threads of two WSGI worker processes, only the one holding the lock applies the rules
+        first = RevisionRetention(app._get_current_object(), self.imw, {None: {}}, interval=0.01).start()
+        time.sleep(0.1)
+        second = RevisionRetention(app._get_current_object(), self.imw, {None: {}}, interval=0.01).start()
+        time.sleep(0.1)
+        assert runs and set(runs) == {first}
+        first.stop()
+        # the other one takes over
+        time.sleep(0.1)
+        second.stop()
+        assert runs[-1] is second
+
+    def test_apply_interrupted(self, monkeypatch):
+        foo = self.store_revisions("foo", 4)
+        retention = RevisionRetention(app, self.imw, {None: {"keep_last": 2}})
+
+        def crash(self, rev, parentid):
+            raise OSError("crash")
+
+        # interrupted after destroying the revisions, before relinking the kept ones
+        with monkeypatch.context() as m:
+            m.setattr(RevisionRetention, "_relink", crash)
+            with pytest.raises(OSError):
+                retention.run_once()
+        assert self.all_revids() == set(foo[2:])
+        [report] = retention.run_once()
+        assert (report.items, report.destroyed, report.relinked) == (0, 0, 1)
+        item = self.get_item("foo")
+        assert PARENTID not in item[foo[2]].meta
+        assert item[foo[2]].data.read() == b"2"
+        assert item[foo[3]].meta[PARENTID] == foo[2]
+
+
+class TestRevisionRetentionSqlite(TestRevisionRetention):
+    """
+    The revision retention tests again, with the revisions stored in sqlite stores.
+    """
+
+    @pytest.fixture
+    def storage_uri(self, tmp_path):
+        return f"stores:sqlite:{tmp_path}/%(backend)s.db::%(kind)s"
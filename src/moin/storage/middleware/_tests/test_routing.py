@@ -73,6 +73,13 @@ def test_store_get_del(router):
     router.remove(other_backend_name, other_revid, destroy_data=True)
 
 
+def test_retrieve_many(router):
+    revids = [router.store(dict(name=[name]), BytesIO(name.encode())) for name in ("foo", "other:bar", "baz")]
+    result = {revid: (meta[NAME], data.read()) for revid, meta, data in router.retrieve_many(revids)}
+    assert result == {revids[0]: (["foo"], b"foo"), revids[1]: (["bar"], b"other:bar"), revids[2]: (["baz"], b"baz")}
+    assert [revid for revid, meta, data in router.retrieve_many(list(router))] == list(router)
+
+
 def test_store_readonly_fails(router):
     with pytest.raises(ReadOnlyBackendError):
         router.store(dict(name=["ro:testing"]), BytesIO(b""))
@@ -87,3 +87,18 @@ def test_serialize_deserialize(source, target):
     print(sorted(source.backend))
     print(sorted(target.backend))
     assert sorted(source.backend) == sorted(target.backend)
+
+
+@pytest.mark.usefixtures("_app_ctx")
+def test_serialize_deserialize_batched(source, target):
+    for i, (name, meta, data) in enumerate(contents):
+        source[name].store_revision(dict(meta, mtime=i), BytesIO(data))
+
+    io = BytesIO()
+    serialize(source.backend, io)
+    io.seek(0)
+    # more revisions than fit in one batch
+    deserialize(io, target.backend, batch_size=2)
+    target.rebuild()
+
+    assert sorted(source.backend) == sorted(target.backend)
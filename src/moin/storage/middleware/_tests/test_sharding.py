@@ -0,0 +1,123 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - namespace-sharded index tests.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from whoosh.fields import DATETIME, ID, Schema
+from whoosh.filedb.filestore import FileStorage
+from whoosh.query import And, Every, Not, Or, Term
+
+from moin.constants.keys import MTIME, NAMESPACE, REVID
+from moin.storage.middleware.partitioning import PARTITION_YEAR, PartitionedIndex
+from moin.storage.middleware.sharding import (
+    DEFAULT_SHARD,
+    ShardedIndex,
+    check_shards,
+    namespace_span,
+    shard_index_name,
+    shard_names,
+)
+
+
+def test_check_shards():
+    check_shards({"userprofiles": "users", "": "main"})
+    with pytest.raises(ValueError):
+        check_shards({"userprofiles": "Users"})
+    with pytest.raises(ValueError):
+        check_shards({"userprofiles": DEFAULT_SHARD})
+    assert shard_names({"a": "x", "b": "x", "c": "y"}) == [DEFAULT_SHARD, "x", "y"]
+    assert shard_index_name(DEFAULT_SHARD, "latest_revs") == "latest_revs"
+    assert shard_index_name("x", "latest_revs") == "x__latest_revs"
+
+
+def test_namespace_span():
+    assert namespace_span(Every()) == (None, set())
+    assert namespace_span(Term(NAMESPACE, "a")) == ({"a"}, set())
+    assert namespace_span(Or([Term(NAMESPACE, "a"), Term(NAMESPACE, "b")])) == ({"a", "b"}, set())
+    assert namespace_span(Or([Term(NAMESPACE, "a"), Term(REVID, "b")])) == (None, set())
+    q = And([Term(REVID, "x"), Not(Term(NAMESPACE, "a")), Not(Term(NAMESPACE, "b"))])
+    assert namespace_span(q) == (None, {"a", "b"})
+    q = And([Or([Term(NAMESPACE, "a"), Term(NAMESPACE, "b")]), Not(Term(NAMESPACE, "b"))])
+    assert namespace_span(q) == ({"a", "b"}, {"b"})
+
+
+class TestShardedIndex:
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        schema = Schema(
+            **{REVID: ID(stored=True, unique=True), NAMESPACE: ID(stored=True), MTIME: DATETIME(stored=True)}
+        )
+        storage = FileStorage(str(tmp_path))
+        shards = {"userprofiles": "users"}
+        indexes = {
+            DEFAULT_SHARD: storage.create_index(schema, indexname="revs"),
+            "users": PartitionedIndex.create(storage, shard_index_name("users", "revs"), schema, PARTITION_YEAR),
+        }
+        index = ShardedIndex(indexes, shards, schema)
+        yield index
+        index.close()
+
+    def add(self, index, *docs):
+        with index.writer() as writer:
+            for revid, namespace in docs:
+                writer.update_document(**{REVID: revid, NAMESPACE: namespace, MTIME: datetime(2020, 6, 1)})
+
+    def revids(self, searcher, q=None):
+        return sorted(hit[REVID] for hit in searcher.search(q or Every(), limit=None))
+
+    def test_shards(self, index):
+        self.add(index, ("a", ""), ("b", "userprofiles"))
+        generation = index.indexes[DEFAULT_SHARD].latest_generation()
+        self.add(index, ("c", "userprofiles"))
+        # writes only go to the shard of the namespace
+        assert index.indexes[DEFAULT_SHARD].latest_generation() == generation
+        assert index.doc_count() == 3
+        with index.searcher() as searcher:
+            assert self.revids(searcher) == ["a", "b", "c"]
+        # only the shards a query needs
+        assert index.shards_for(Term(NAMESPACE, "")) == [DEFAULT_SHARD]
+        assert index.shards_for(Term(NAMESPACE, "userprofiles")) == ["users"]
+        assert index.shards_for(Not(Term(NAMESPACE, "userprofiles"))) == [DEFAULT_SHARD]
+        assert index.shards_for(Term(REVID, "a")) == [DEFAULT_SHARD, "users"]
+        assert index.select(Term(REVID, "a")) is None
+        selection = index.select(Term(NAMESPACE, "userprofiles"))
+        assert selection == (("users", None),)
+        with index.searcher(selection) as searcher:
+            assert self.revids(searcher) == ["b", "c"]
+
+    def test_generation(self, index):
+        searcher = index.searcher()
+        assert searcher.up_to_date()
+        self.add(index, ("a", "userprofiles"))
+        assert not searcher.up_to_date()
+        searcher = searcher.refresh()
+        assert searcher.up_to_date()
+        assert self.revids(searcher) == ["a"]
+        searcher.close()
+
+    def test_writer(self, index):
+        self.add(index, ("a", ""), ("b", "userprofiles"))
+        generation = index.indexes["users"].latest_generation()
+        # updating only writes to the shard of the namespace
+        self.add(index, ("a", ""))
+        assert index.indexes["users"].latest_generation() == generation
+        assert index.location({NAMESPACE: "userprofiles", MTIME: datetime(2020, 6, 1)}) == ("users", "2020")
+        assert index.location({NAMESPACE: ""}) == (DEFAULT_SHARD, None)
+        # the document moves to another shard
+        with index.writer() as writer:
+            writer.delete_by_term(REVID, "b")
+            writer.update_document(**{REVID: "b", NAMESPACE: "", MTIME: datetime(2020, 6, 1)})
+        with index.searcher() as searcher:
+            assert self.revids(searcher, Term(NAMESPACE, "")) == ["a", "b"]
+            assert self.revids(searcher, Term(NAMESPACE, "userprofiles")) == []
+        with index.writer() as writer:
+            writer.delete_by_term(REVID, "a")
+            writer.delete_by_query(Term(NAMESPACE, ""))
+        assert index.doc_count() == 0
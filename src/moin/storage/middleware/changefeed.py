@@ -0,0 +1,341 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - index change feed for several wiki servers sharing the backend.
+
+Every wiki server (node) has its own local whoosh indexes, but the indexing
+middleware only indexes the revisions stored or destroyed by the node itself.
+With a change feed configured, every node appends these changes to an ordered
+table in a database shared by all nodes (usually the database of the sqla
+stores), and a ChangeFollower on every node applies the changes of the other
+nodes to its local indexes.
+
+The follower records the sequence number of the last change applied (its
+position) in the index storage, so it continues where it stopped after a
+restart (or after restoring an index snapshot).
+
+The sequence numbers are assigned when a change is appended, but the changes
+become visible when their transactions commit, not necessarily in that order
+(e.g. on PostgreSQL or MySQL). The follower records the sequence numbers it
+skipped (gaps) with the position and reads them again, until their changes
+appear or GAP_TIMEOUT passed (the append was rolled back).
+"""
+
+from __future__ import annotations
+
+from typing import Any, NamedTuple, TYPE_CHECKING
+
+import json
+import threading
+import time
+
+from sqlalchemy import Boolean, Column, Float, Integer, MetaData, String, Table, create_engine, func, select
+from sqlalchemy.pool import StaticPool
+
+from moin import log
+from moin.storage.error import StorageError
+
+if TYPE_CHECKING:
+    from flask import Flask
+    from sqlalchemy import Engine
+    from whoosh.filedb.filestore import Storage
+    from moin.storage.middleware.indexing import IndexingMiddleware
+
+logging = log.getLogger(__name__)
+
+# change actions
+CHANGE_INDEX = "index"  # a revision was stored, index it
+CHANGE_REMOVE = "remove"  # a revision was destroyed, remove it from the indexes
+
+# file in the index storage recording the position of the follower
+POSITION_FILE = "changefeed_position"
+# lock of the follower, so only one process per index storage follows the feed
+FOLLOW_LOCK = "changefeed_follow"
+
+KEY_LEN = 128
+READ_LIMIT = 1000  # number of changes read (and applied) at once
+GAP_TIMEOUT = 600.0  # seconds a skipped sequence number is read again, waiting for a late commit
+
+
+class Change(NamedTuple):
+    seq: int  # sequence number, ascending in the order the changes were appended
+    node: str  # node that made the change
+    action: str  # CHANGE_INDEX or CHANGE_REMOVE
+    backend_name: str
+    revid: str
+    latest: bool  # CHANGE_INDEX: the revision is the latest one of its item (see index_revision force_latest)
+    time: float  # time the change was appended
+
+
+class ChangeFeed:
+    """
+    Ordered table of index changes in a database shared by the wiki servers (using SQLAlchemy).
+    """
+
+    @classmethod
+    def from_uri(cls, uri: str) -> ChangeFeed:
+        """
+        Create a change feed from "db_uri" or "db_uri::table_name" (like the sqla stores).
+        """
+        params = uri.split("::")
+        kwargs: dict[str, Any] = {"db_uri": params[0]}
+        if len(params) > 1:
+            kwargs["table_name"] = params[1]
+        return cls(**kwargs)
+
+    def __init__(self, db_uri: str | None = None, table_name: str = "index_changes") -> None:
+        """
+        :param db_uri: The database URI that we pass on to SQLAlchemy (None: in-memory SQLite, for tests).
+        """
+        self.db_uri = db_uri
+        self.table_name = table_name
+        self.engine: Engine | None = None
+        self.metadata = MetaData()
+        self.table = Table(
+            table_name,
+            self.metadata,
+            Column("seq", Integer, primary_key=True, autoincrement=True),
+            Column("node", String(KEY_LEN), nullable=False),
+            Column("action", String(16), nullable=False),
+            Column("backend_name", String(KEY_LEN), nullable=False),
+            Column("revid", String(KEY_LEN), nullable=False),
+            Column("latest", Boolean, nullable=False),
+            Column("time", Float, nullable=False, index=True),
+            sqlite_autoincrement=True,  # never reuse the seq of trimmed changes
+        )
+
+    def _engine(self) -> Engine:
+        if self.engine is None:
+            raise StorageError("change feed: not open")
+        return self.engine
+
+    def open(self) -> None:
+        """
+        Open the change feed, create its table if it does not exist yet.
+        """
+        if self.db_uri is None:
+            self.engine = create_engine(
+                "sqlite:///:memory:", poolclass=StaticPool, connect_args={"check_same_thread": False}
+            )
+        else:
+            self.engine = create_engine(self.db_uri)
+        self.metadata.create_all(self.engine)
+
+    def close(self) -> None:
+        if self.engine is not None:
+            self.engine.dispose()
+            self.engine = None
+
+    def destroy(self) -> None:
+        self.metadata.drop_all(self._engine())
+
+    def append(self, node: str, action: str, backend_name: str, revid: str, latest: bool = True) -> int:
+        """
+        Append a change, return its sequence number.
+        """
+        values = dict(node=node, action=action, backend_name=backend_name, revid=revid, latest=latest)
+        with self._engine().begin() as conn:
+            result = conn.execute(self.table.insert().values(time=time.time(), **values))
+            return result.inserted_primary_key[0]
+
+    def read(self, after: int = 0, limit: int = READ_LIMIT) -> list[Change]:
+        """
+        Return the changes after sequence number after, oldest first.
+        """
+        query = select(self.table).where(self.table.c.seq > after).order_by(self.table.c.seq).limit(limit)
+        with self._engine().connect() as conn:
+            return [Change(*row) for row in conn.execute(query)]
+
+    def read_seqs(self, seqs: list[int]) -> list[Change]:
+        """
+        Return the changes with the given sequence numbers (if they exist), oldest first.
+        """
+        changes = []
+        with self._engine().connect() as conn:
+            for start in range(0, len(seqs), READ_LIMIT):
+                query = select(self.table).where(self.table.c.seq.in_(seqs[start : start + READ_LIMIT]))
+                changes += [Change(*row) for row in conn.execute(query)]
+        return sorted(changes)
+
+    def first_seq(self) -> int:
+        """
+        Return the sequence number of the oldest change (0 if there is none).
+        """
+        with self._engine().connect() as conn:
+            return conn.execute(select(func.min(self.table.c.seq))).scalar() or 0
+
+    def last_seq(self) -> int:
+        """
+        Return the sequence number of the newest change (0 if there is none).
+        """
+        with self._engine().connect() as conn:
+            return conn.execute(select(func.max(self.table.c.seq))).scalar() or 0
+
+    def trim(self, before: float) -> int:
+        """
+        Remove the changes appended before the given time, return how many were removed.
+        """
+        with self._engine().begin() as conn:
+            return conn.execute(self.table.delete().where(self.table.c.time < before)).rowcount
+
+
+def stored_position(storage: Storage) -> int | None:
+    """
+    Return the sequence number of the last change applied to the indexes, None if unknown.
+    """
+    if not storage.file_exists(POSITION_FILE):
+        return None
+    with storage.open_file(POSITION_FILE) as f:
+        return json.loads(f.read().decode())["seq"]
+
+
+def stored_gaps(storage: Storage) -> dict[int, float]:
+    """
+    Return the sequence numbers skipped below the position (changes not committed yet) and when they were skipped.
+    """
+    if not storage.file_exists(POSITION_FILE):
+        return {}
+    with storage.open_file(POSITION_FILE) as f:
+        return {int(seq): since for seq, since in json.loads(f.read().decode()).get("gaps", {}).items()}
+
+
+def store_position(storage: Storage, seq: int, gaps: dict[int, float] | None = None) -> None:
+    with storage.create_file(POSITION_FILE) as f:
+        f.write(json.dumps({"seq": seq, "gaps": gaps or {}}).encode())
+
+
+class ChangeFollower:
+    """
+    Apply the changes of the other nodes in the change feed to the local indexes.
+    """
+
+    def __init__(
+        self, app: Flask, indexer: IndexingMiddleware, interval: float = 1.0, retention: float | None = None
+    ) -> None:
+        """
+        :param interval: seconds between polling the change feed (about the maximum lag)
+        :param retention: trim changes older than this many seconds from the change feed (None: keep them)
+        """
+        self.app = app
+        self.indexer = indexer
+        self.feed: ChangeFeed = indexer.changefeed
+        self.interval = interval
+        self.retention = retention
+        self.position: int | None = None
+        self.lag = 0.0  # seconds since the oldest change not applied yet was appended
+        self.behind = 0  # number of changes not applied yet
+        self.applied = 0  # number of changes of other nodes applied
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def apply(self, change: Change) -> None:
+        from moin.storage.middleware.indexing import convert_to_indexable
+
+        indexer = self.indexer
+        if change.action == CHANGE_INDEX:
+            try:
+                meta, data = indexer.backend.retrieve(change.backend_name, change.revid)
+            except KeyError:
+                logging.debug(f"change feed: revision {change.revid} does not exist any more")
+                return
+            try:
+                content = convert_to_indexable(meta, data, is_new=False)
+            finally:
+                data.close()
+            indexer.index_revision(
+                meta, content, change.backend_name, async_=False, force_latest=change.latest, publish=False
+            )
+        elif change.action == CHANGE_REMOVE:
+            indexer.remove_revision(change.revid, async_=False, publish=False)
+        else:
+            logging.warning(f"change feed: unknown action {change.action!r} of change {change.seq}")
+
+    def _apply(self, change: Change) -> None:
+        if change.node != self.indexer.node:
+            self.apply(change)
+            self.applied += 1
+
+    def catch_up(self) -> None:
+        """
+        Update the indexes from the backend (the position is unknown or changes were trimmed).
+        """
+        seq = self.feed.last_seq()
+        self.indexer.update()
+        self.position = seq
+        store_position(self.indexer.get_storage(), seq)
+
+    def run_once(self) -> int:
+        """
+        Apply the new changes of other nodes, return how many changes were read.
+        """
+        storage = self.indexer.get_storage()
+        lock = storage.lock(FOLLOW_LOCK)
+        if not lock.acquire():
+            return 0  # another process follows the feed for these indexes
+        count = 0
+        try:
+            self.position = stored_position(storage)
+            gaps = stored_gaps(storage)
+            if self.position is None or self.position < self.feed.first_seq() - 1:
+                logging.warning("change feed: position unknown or changes missing, updating the indexes")
+                self.catch_up()
+                gaps = {}
+            now = time.time()
+            if gaps:
+                # changes committed after changes with higher sequence numbers were applied
+                for change in self.feed.read_seqs(sorted(gaps)):
+                    self._apply(change)
+                    del gaps[change.seq]
+                    count += 1
+                for seq, since in list(gaps.items()):
+                    if now - since > GAP_TIMEOUT:
+                        del gaps[seq]  # the change was rolled back (or trimmed)
+                store_position(storage, self.position, gaps)
+            while changes := self.feed.read(self.position):
+                for change in changes:
+                    gaps.update(dict.fromkeys(range(self.position + 1, change.seq), now))
+                    self._apply(change)
+                    self.position = change.seq
+                count += len(changes)
+                store_position(storage, self.position, gaps)
+            if self.retention is not None:
+                self.feed.trim(time.time() - self.retention)
+        finally:
+            lock.release()
+        self.update_lag()
+        return count
+
+    def update_lag(self) -> None:
+        """
+        Update the lag metrics from the change feed and the stored position.
+        """
+        self.position = stored_position(self.indexer.get_storage())
+        position = self.position or 0
+        pending = self.feed.read(position, limit=1)
+        self.lag = max(time.time() - pending[0].time, 0.0) if pending else 0.0
+        self.behind = self.feed.last_seq() - position if pending else 0
+
+    def run(self) -> None:
+        """
+        Follow the change feed every interval seconds until stopped.
+        """
+        while not self.stopped.is_set():
+            try:
+                # a new app context per run, so no searchers are cached across runs
+                with self.app.app_context():
+                    self.run_once()
+            except Exception as err:  # keep following, the next run may succeed
+                logging.exception(f"following the change feed failed: {err}")
+            self.stopped.wait(self.interval)
+
+    def start(self) -> ChangeFollower:
+        self.thread = threading.Thread(target=self.run, name="moin-changefeed", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -53,36 +53,55 @@ from __future__ import annotations
 from typing import Any, Generator, Iterator, TYPE_CHECKING
 
 import gc
+import hashlib
 import io
 import os
 import re
 import shutil
+import socket
+import tempfile
 import time
+import zlib
 
-from collections.abc import Mapping
-from contextlib import contextmanager
+from collections.abc import Iterable, Mapping
+from contextlib import contextmanager, nullcontext
 
 from flask import request
 
-from whoosh.fields import Schema, TEXT, ID, NUMERIC, DATETIME, KEYWORD, BOOLEAN, NGRAMWORDS
+from whoosh.fields import Schema, TEXT, ID, NUMERIC, DATETIME, KEYWORD, BOOLEAN, NGRAMWORDS, STORED
 from whoosh.writing import AsyncWriter
 from whoosh.qparser import QueryParser, MultifieldParser, RegexPlugin, PseudoFieldPlugin
 from whoosh.qparser import WordNode
-from whoosh.query import Every, Prefix, Term
+from whoosh.query import Prefix, Term
 from whoosh.sorting import FieldFacet
 
 from moin import current_app, flaskg, log, user
 from moin.constants.keys import *  # noqa
 from moin.constants.contenttypes import CONTENTTYPE_USER
+from moin.constants.namespaces import NAMESPACE_DEFAULT
 from moin.converters import default_registry as converter_registry
 from moin.i18n import _
 from moin.search.analyzers import item_name_analyzer, MimeTokenizer, AclTokenizer
-from moin.storage.error import NoSuchItemError, ItemAlreadyExistsError
+from moin.storage.error import NoSuchItemError, ItemAlreadyExistsError, IndexSchemaError, MetaNotIndexedError
+from moin.storage.middleware.changefeed import CHANGE_INDEX, CHANGE_REMOVE, ChangeFeed
+from moin.storage.middleware.journal import JOURNAL_INDEX, JOURNAL_REMOVE, IndexJournal
+from moin.storage.middleware.merging import DeferredMergeWriter, MergeReport, leaf_indexes, merge_index
+from moin.storage.middleware.partitioning import PartitionedIndex, check_partitioning, sorts_newest_first
+from moin.storage.middleware.sharding import (
+    DEFAULT_SHARD,
+    ShardedIndex,
+    check_shards,
+    shard_index_name,
+    shard_names,
+    store_shards,
+    stored_shards,
+)
 from moin.storage.middleware.routing import Backend
 from moin.storage.middleware.validation import ContentMetaSchema, UserMetaSchema, validate_data
 from moin.storage.types import Document, ItemData, MetaData, ValidationState
 from moin.themes import utctimestamp
 from moin.utils import utcfromtimestamp
+from moin.utils.crypto import make_uuid
 from moin.utils.iri import Iri
 from moin.utils.mime import Type, type_moin_document, type_text_plain
 from moin.utils.names import CompositeName, parent_names, split_fqname
@@ -90,6 +109,7 @@ from moin.utils.tree import moin_page
 
 if TYPE_CHECKING:
     from whoosh.index import FileIndex
+    from moin.config import NgramIndexing
 
 logging = log.getLogger(__name__)
 
@@ -97,8 +117,139 @@ logging = log.getLogger(__name__)
 WHOOSH_FILESTORAGE = "FileStorage"
 INDEXES = [LATEST_REVS, ALL_REVS, LATEST_META]
 
+# Increment this whenever a schema change below requires existing indexes to be rebuilt.
+# Version history:
+# 1 - (no version file) initial schemas
+# 2 - sortable columns for NAMESPACE, NAME_EXACT, NAME_SORT, MTIME, REV_NUMBER, PTIME, new PTIME_SORT
+# 3 - ALL_REVS: CONTENT not stored any more, new CONTENT_HASH referring to the indexed content store
+# 4 - ALL_REVS: sortable columns for ITEMID, REVID, BACKENDNAME
+# 5 - LATEST_REVS: DISPLAY_NAME, EMAIL_UNVALIDATED and SUBSCRIPTIONS stored (for the user browser)
+INDEX_SCHEMA_VERSION = 5
+INDEX_SCHEMA_VERSION_FILE = "schema_version"
+# directory (within the index directory) of the indexed content store
+INDEX_CONTENT_DIR = "content"
+# seconds content is kept in the indexed content store after it was last put, even if no ALL_REVS
+# document refers to it: the document of a revision is committed after putting its content
+CONTENT_RELEASE_GRACE = 3600
+# directory (in the index directory) of the index journal
+INDEX_JOURNAL_DIR = "journal"
+
 INDEXER_TIMEOUT = 20.0
 
+# n-gram indexing policies (see ngram_indexing configuration), besides these a policy
+# can be an int N: n-grams of the names, the summary and the first N KB of the content
+NGRAM_FULL = "full"  # n-grams of the names, the summary and the full content
+NGRAM_NAMES = "names"  # n-grams of the names and the summary only
+
+
+class SortableID(ID):
+    """
+    ID field type with a sortable column holding the first value only.
+
+    NAME_EXACT gets the list of names, which might be empty (e.g. for deleted items).
+    """
+
+    def __init__(self, **kw):
+        super().__init__(sortable=True, **kw)
+
+    def to_column_value(self, value):
+        if isinstance(value, (list, tuple)):
+            value = value[0] if value else ""
+        return super().to_column_value(value)
+
+
+def content_hash(content: str) -> str:
+    """
+    Return the key of the indexable content in the indexed content store.
+    """
+    return hashlib.new(HASH_ALGORITHM, content.encode()).hexdigest()
+
+
+class IndexedContentStore:
+    """
+    Deduplicated store for the indexable content of revisions, keyed by content hash.
+
+    The ALL_REVS index has one document per revision, but the revisions of an item
+    usually have (nearly) identical content. Storing the content in each document made
+    the index bigger than the wiki data, so ALL_REVS only stores the CONTENT_HASH and
+    the content is stored (compressed) here, once for all revisions having it.
+
+    The content files are spread over 256 subdirectories (first 2 hex digits of the key).
+
+    Index writers do not coordinate with removing unreferenced content (see release),
+    so put() refreshes the mtime of existing content and release() keeps content put
+    less than release_grace seconds ago (a document referring to it may not be committed yet).
+    Content kept that way is removed by a later sweep (IndexingMiddleware.optimize_index).
+    """
+
+    def __init__(self, path: str, release_grace: float | None = None) -> None:
+        self.path = path
+        self.release_grace = CONTENT_RELEASE_GRACE if release_grace is None else release_grace
+
+    def _mkpath(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    def create(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+
+    def put(self, content: str) -> str:
+        """
+        Store content (if we do not have it yet) and return its key.
+        """
+        key = content_hash(content)
+        path = self._mkpath(key)
+        try:
+            os.utime(path)  # protects the content from a concurrent release, see release()
+        except FileNotFoundError:
+            dirname = os.path.dirname(path)
+            os.makedirs(dirname, exist_ok=True)
+            # write to a temporary file and rename, so readers never see partial content
+            fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".put-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(zlib.compress(content.encode()))
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        return key
+
+    def get(self, key: str) -> str:
+        """
+        Return the content stored under key, raise KeyError if there is none.
+        """
+        try:
+            with open(self._mkpath(key), "rb") as f:
+                return zlib.decompress(f.read()).decode()
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def release(self, key: str) -> None:
+        """
+        Remove content no ALL_REVS document refers to, unless it was put less than release_grace seconds ago.
+        """
+        path = self._mkpath(key)
+        # move it away first: a concurrent put() either touched it before (we see the new mtime below)
+        # or does not find it and writes it again
+        release_path = os.path.join(os.path.dirname(path), f".release-{make_uuid()}")
+        try:
+            os.rename(path, release_path)
+        except FileNotFoundError:
+            return
+        if time.time() - os.stat(release_path).st_mtime < self.release_grace:
+            os.replace(release_path, path)  # the key is the hash of the content, so a new file has the same one
+        else:
+            os.remove(release_path)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._mkpath(key))
+
+    def __iter__(self) -> Iterator[str]:
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                if not filename.startswith("."):  # no temporary files
+                    yield filename
+
 
 def search_names(name_prefix: str, limit: int | None = None) -> list[str]:
     """
@@ -117,13 +268,52 @@ def search_names(name_prefix: str, limit: int | None = None) -> list[str]:
     return result_names
 
 
-def backend_to_index(meta: MetaData, content: str, schema: Schema, backend_name: str) -> Document:
+def check_ngram_indexing(ngram_indexing: NgramIndexing) -> None:
+    """
+    Raise ValueError if the ngram_indexing configuration has an invalid policy.
+    """
+    for namespace, contenttype_prefix, policy in ngram_indexing:
+        if policy not in (NGRAM_FULL, NGRAM_NAMES) and not (isinstance(policy, int) and policy >= 0):
+            raise ValueError(
+                f"ngram_indexing policy must be {NGRAM_FULL!r}, {NGRAM_NAMES!r} or a number of KB, not {policy!r}"
+            )
+
+
+def ngram_policy(ngram_indexing: NgramIndexing | None, namespace: str, contenttype: str) -> str | int:
+    """
+    Get the n-gram indexing policy for an item.
+
+    :param ngram_indexing: list of (namespace, contenttype prefix, policy) tuples, the first
+                           matching entry wins, a namespace of None matches all namespaces
+    :returns: policy of the first matching entry, NGRAM_FULL if there is none
+    """
+    for ns, contenttype_prefix, policy in ngram_indexing or []:
+        if ns in (None, namespace) and contenttype.startswith(contenttype_prefix):
+            return policy
+    return NGRAM_FULL
+
+
+def ngram_content(content: str, policy: str | int) -> str | None:
+    """
+    Return the part of the content to index as n-grams according to policy (None: nothing).
+    """
+    if policy == NGRAM_FULL:
+        return content
+    if policy == NGRAM_NAMES:
+        return None
+    return content.encode()[: policy * 1024].decode(errors="ignore")
+
+
+def backend_to_index(
+    meta: MetaData, content: str, schema: Schema, backend_name: str, ngram_indexing: NgramIndexing | None = None
+) -> Document:
     """
     Convert backend metadata/data to a whoosh document.
 
     :param meta: revision meta from moin backend
     :param content: revision data converted to indexable content
     :param schema: whoosh schema
+    :param ngram_indexing: n-gram indexing policies, see ngram_policy (default: full n-gram indexing)
     :returns: document to put into whoosh index
     """
     doc = {key: value for key, value in meta.items() if key in schema}
@@ -136,9 +326,14 @@ def backend_to_index(meta: MetaData, content: str, schema: Schema, backend_name:
     doc[NAME_EXACT] = doc[NAME]
     if CONTENT in schema:
         doc[CONTENT] = content
+    if CONTENT_HASH in schema:
+        doc[CONTENT_HASH] = content_hash(content)
     doc[BACKENDNAME] = backend_name
     if CONTENTNGRAM in schema:
-        doc[CONTENTNGRAM] = content
+        policy = ngram_policy(ngram_indexing, meta.get(NAMESPACE, ""), meta.get(CONTENTTYPE, ""))
+        contentngram = ngram_content(content, policy)
+        if contentngram is not None:
+            doc[CONTENTNGRAM] = contentngram
     if SUMMARYNGRAM in schema and SUMMARY in meta:
         doc[SUMMARYNGRAM] = meta[SUMMARY]
     if NAMENGRAM in schema and NAME in meta:
@@ -157,6 +352,8 @@ def backend_to_index(meta: MetaData, content: str, schema: Schema, backend_name:
         doc_name_sort = ""
     if NAME_SORT in schema:
         doc[NAME_SORT] = doc_name_sort
+    if PTIME_SORT in schema and MTIME in doc:
+        doc[PTIME_SORT] = doc.get(PTIME, doc[MTIME])
     return doc
 
 
@@ -286,15 +483,48 @@ def convert_to_indexable(meta: MetaData, data: ItemData, item_name: str | None =
 
 
 class IndexingMiddleware:
-    def __init__(self, index_storage: tuple, backend: Backend, acl_rights_contents=[], **kw):
+    def __init__(
+        self,
+        index_storage: tuple,
+        backend: Backend,
+        acl_rights_contents=[],
+        ngram_indexing: NgramIndexing | None = None,
+        partitioning: str | None = None,
+        shards: dict[str, str] | None = None,
+        defer_merges: bool = False,
+        changefeed: ChangeFeed | None = None,
+        node: str | None = None,
+        journal: bool = False,
+        **kw,
+    ):
         """
         Store params, create schemas.
 
         See https://whoosh.readthedocs.io/en/latest/schema.html#built-in-field-types
+
+        :param ngram_indexing: n-gram indexing policies, see ngram_policy
+        :param partitioning: None or time partitioning of the ALL_REVS index ("year" or "month")
+        :param shards: namespace -> index shard name, other namespaces are in the default shard
+        :param defer_merges: commit index writes without merging segments (a merge scheduler merges them)
+        :param changefeed: change feed shared with other nodes (wiki servers) using the same backend
+        :param node: name of this node in the change feed (default: the host name)
+        :param journal: record index changes in a write-ahead journal (replayed after a crash)
         """
         self.index_storage = index_storage
         self.backend = backend
+        self.ngram_indexing = ngram_indexing or []
+        check_ngram_indexing(self.ngram_indexing)
+        self.partitioning = partitioning
+        check_partitioning(partitioning)
+        self.shards = shards or {}
+        check_shards(self.shards)
+        self.defer_merges = defer_merges
+        self.changefeed = changefeed
+        self.node = node or socket.gethostname()
+        self.use_journal = journal
         self.ix: dict[str, Any] = {}  # open indexes
+        self.content_store: IndexedContentStore | None = None  # content store of the open indexes
+        self.journal: IndexJournal | None = None  # journal of the open indexes (if used)
         self.schemas: dict[str, Schema] = {}  # existing schemas
 
         # field_boosts favor hits on names, tags, summary, comment, content, namengram,
@@ -304,30 +534,31 @@ class IndexingMiddleware:
         # Note *NGRAMS are only present in latest_revs index, see below
         common_fields = {
             # namespace, so we can have different namespaces within a wiki, always check this!
-            NAMESPACE: ID(stored=True),
+            NAMESPACE: ID(stored=True, sortable=True),
             # since name is a list whoosh will think it is a list of tokens see #364
             # we store list of names, but do not use for searching
             NAME: TEXT(stored=True),
             # string created by joining list of Name strings, we use NAMES for searching
             NAMES: TEXT(stored=True, multitoken_query="or", analyzer=item_name_analyzer(), field_boost=30.0),
             # names without slashes, slashes cause strange sort sequences
-            NAME_SORT: TEXT(stored=True),
+            NAME_SORT: TEXT(stored=True, sortable=True),
             # unmodified NAME from metadata - use this for precise lookup by the code.
             # also needed for wildcard search, so the original string as well as the query
             # (with the wildcard) is not cut into pieces.
-            NAME_EXACT: ID(field_boost=1.0),
+            # sortable: a column of the first name makes sortedby=NAME_EXACT cheap
+            NAME_EXACT: SortableID(field_boost=1.0),
             # history and mychanges views show old name for deleted items
             NAME_OLD: TEXT(stored=True),
             # revision id (aka meta id)
             REVID: ID(unique=True, stored=True),
             # sequential revision number for humans: 1, 2, 3...
-            REV_NUMBER: NUMERIC(stored=True),
+            REV_NUMBER: NUMERIC(stored=True, sortable=True),
             # parent revision id
             PARENTID: ID(stored=True),
             # backend name (which backend is this rev stored in?)
             BACKENDNAME: ID(stored=True),
             # MTIME from revision metadata (converted to UTC datetime)
-            MTIME: DATETIME(stored=True),
+            MTIME: DATETIME(stored=True, sortable=True),
             # ITEMTYPE from metadata, always matched exactly hence ID
             ITEMTYPE: ID(stored=True),
             # tokenized CONTENTTYPE from metadata
@@ -385,6 +616,10 @@ class IndexingMiddleware:
             MAILTO_AUTHOR: BOOLEAN(stored=True),
             DISABLED: BOOLEAN(stored=True),
             LOCALE: ID(stored=True),
+            # only stored, so listing the users does not load their profiles from the backend
+            DISPLAY_NAME: STORED(),
+            EMAIL_UNVALIDATED: STORED(),
+            SUBSCRIPTIONS: STORED(),
             SUBSCRIPTION_IDS: ID(),
             SUBSCRIPTION_PATTERNS: ID(),
         }
@@ -392,27 +627,40 @@ class IndexingMiddleware:
 
         blog_entry_fields = {
             # blog publish time from metadata (converted to UTC datetime)
-            PTIME: DATETIME(stored=True)
+            PTIME: DATETIME(stored=True, sortable=True),
+            # PTIME if given, MTIME otherwise - precomputed key for sorting blog entries
+            PTIME_SORT: DATETIME(sortable=True),
         }
         latest_revs_fields.update(**blog_entry_fields)
 
-        all_revs_fields = {ITEMID: ID(stored=True)}
+        all_revs_fields = {ITEMID: ID(stored=True, sortable=True)}
         all_revs_fields.update(**common_fields)
+        all_revs_fields.update(
+            {
+                # columns for finding the latest revisions without sorting all revisions
+                REVID: ID(unique=True, stored=True, sortable=True),
+                BACKENDNAME: ID(stored=True, sortable=True),
+                # content is indexed, but only stored once per distinct content in the indexed content store
+                CONTENT: TEXT(stored=False, spelling=True),
+                # key of the content in the indexed content store
+                CONTENT_HASH: ID(stored=True),
+            }
+        )
 
         # Small index for the latest revisions, used for queries such as has_item, authorization checks and
         # the +index route. This index has no content or *NGRAMS, which improves query speed for large wikis
         latest_meta_fields = {
             # ITEMID from metadata - as there is only latest rev of same item here, it is unique
             ITEMID: ID(unique=True, stored=True),
-            NAMESPACE: ID(stored=True),
+            NAMESPACE: ID(stored=True, sortable=True),
             NAME: TEXT(stored=True),
             NAMES: TEXT(stored=True, multitoken_query="or", analyzer=item_name_analyzer(), field_boost=30.0),
-            NAME_EXACT: ID(field_boost=1.0),
+            NAME_EXACT: SortableID(field_boost=1.0),
             REVID: ID(unique=True, stored=True),
-            REV_NUMBER: NUMERIC(stored=True),
+            REV_NUMBER: NUMERIC(stored=True, sortable=True),
             PARENTID: ID(stored=True),
             BACKENDNAME: ID(stored=True),
-            MTIME: DATETIME(stored=True),
+            MTIME: DATETIME(stored=True, sortable=True),
             ITEMTYPE: ID(stored=True),
             CONTENTTYPE: TEXT(stored=True, multitoken_query="and", analyzer=MimeTokenizer()),
             USERID: ID(stored=True),
@@ -484,13 +732,79 @@ class IndexingMiddleware:
                     # in case there are problems with the index_dir
         return cls(*params, **kw)
 
+    def get_content_store(self, tmp=False) -> IndexedContentStore:
+        """
+        Get the store for the indexable content of the ALL_REVS index.
+        """
+        # XXX this is whoosh backend specific and currently only works for FileStorage.
+        kind, cls, params, kw = self.get_storage_params(tmp)
+        return IndexedContentStore(os.path.join(params[0], INDEX_CONTENT_DIR))
+
+    def get_journal(self, tmp=False) -> IndexJournal:
+        """
+        Get the write-ahead journal of the index changes.
+        """
+        # XXX this is whoosh backend specific and currently only works for FileStorage.
+        kind, cls, params, kw = self.get_storage_params(tmp)
+        return IndexJournal(os.path.join(params[0], INDEX_JOURNAL_DIR))
+
+    def _open_index(self, storage, name: str, partitioning: str | None = None, shards: dict[str, str] | None = None):
+        """
+        Open an index, it may be sharded by namespace and the ALL_REVS index may be partitioned.
+
+        :param partitioning: partitioning of the ALL_REVS index, default: the configured one
+        :param shards: namespace -> shard mapping, default: the configured one
+        """
+        partitioning = partitioning or self.partitioning
+        if shards is None:
+            shards = self.shards
+        indexes = {}
+        for shard in shard_names(shards):
+            indexname = shard_index_name(shard, name)
+            if name == ALL_REVS and partitioning:
+                indexes[shard] = PartitionedIndex(storage, indexname, self.schemas[name], partitioning)
+            else:
+                indexes[shard] = storage.open_index(indexname)
+        if not shards:
+            return indexes[shard]
+        return ShardedIndex(indexes, shards, self.schemas[name])
+
     def open(self):
         """
         Open all indexes.
+
+        Raises IndexSchemaError (after opening the indexes) if they were created
+        with an older schema version, another partitioning or other shards and need to be rebuilt.
         """
+        if self.changefeed is not None:
+            self.changefeed.open()
         storage = self.get_storage()
+        partitioning = PartitionedIndex.stored_partitioning(storage, ALL_REVS)
+        shards = stored_shards(storage)
         for name in INDEXES:
-            self.ix[name] = storage.open_index(name)
+            self.ix[name] = self._open_index(storage, name, partitioning, shards)
+        self.content_store = self.get_content_store()
+        schema_version = self.schema_version()
+        if schema_version != INDEX_SCHEMA_VERSION:
+            raise IndexSchemaError(
+                f"index schema version is {schema_version}, but version {INDEX_SCHEMA_VERSION} is required"
+            )
+        if partitioning != self.partitioning:
+            raise IndexSchemaError(f"index partitioning is {partitioning}, but {self.partitioning} is configured")
+        if shards != self.shards:
+            raise IndexSchemaError(f"index shards are {shards}, but {self.shards} are configured")
+        if self.use_journal:
+            self.journal = self.get_journal()
+
+    def schema_version(self, tmp=False) -> int:
+        """
+        Return the schema version the indexes were created with.
+        """
+        storage = self.get_storage(tmp)
+        if not storage.file_exists(INDEX_SCHEMA_VERSION_FILE):
+            return 1  # created before we started versioning the schemas
+        with storage.open_file(INDEX_SCHEMA_VERSION_FILE) as f:
+            return int(f.read().decode().strip())
 
     def missing_index_check(self):
         """
@@ -498,7 +812,9 @@ class IndexingMiddleware:
         return: "all" or string with list of missing indexes
         """
         storage = self.get_storage()
-        missing_indexes = [name for name in INDEXES if not storage.index_exists(name)]
+        missing_indexes = [
+            name for name in INDEXES if not (storage.index_exists(name) or PartitionedIndex.exists(storage, name))
+        ]
         return "all" if len(missing_indexes) == len(INDEXES) else str(missing_indexes)[1:-1]
 
     def close(self):
@@ -509,6 +825,10 @@ class IndexingMiddleware:
         for name in self.ix:
             self.ix[name].close()
         self.ix = {}
+        self.content_store = None
+        self.journal = None
+        if self.changefeed is not None:
+            self.changefeed.close()
 
     # Searcher reuse -----------------------------------------------------
     # Opening a whoosh searcher re-opens a reader over all index segments,
@@ -539,7 +859,7 @@ class IndexingMiddleware:
         return cache
 
     @contextmanager
-    def _searcher(self, idx_name: str):
+    def _searcher(self, idx_name: str, q=None, limit=None, sortedby=None, reverse=False, **kw):
         """
         Yield a searcher for idx_name, reusing a context-cached one if possible.
 
@@ -547,19 +867,27 @@ class IndexingMiddleware:
         its lifetime is tied to the context and it is closed by close_searchers()
         at request teardown (or index close()). When there is no context to cache
         on, a fresh searcher is opened and closed per call.
+
+        For a partitioned or sharded index, the searcher only covers the partitions
+        and shards needed for searching q with the given limit and sort order.
         """
+        index = self.ix[idx_name]
+        selection = None
+        if q is not None and isinstance(index, (PartitionedIndex, ShardedIndex)):
+            selection = index.select(q, limit if sorts_newest_first(sortedby, reverse) else None)
+        key = (idx_name, selection)
         cache = self._searcher_cache()
         if cache is None:
-            with self.ix[idx_name].searcher() as searcher:
+            with index.searcher() if selection is None else index.searcher(selection) as searcher:
                 yield searcher
             return
-        searcher = cache.get(idx_name)
+        searcher = cache.get(key)
         if searcher is None:
-            searcher = self.ix[idx_name].searcher()
-            cache[idx_name] = searcher
+            searcher = index.searcher() if selection is None else index.searcher(selection)
+            cache[key] = searcher
         yield searcher
 
-    def invalidate_searchers(self):
+    def invalidate_searchers(self, namespace: str | None = None):
         """
         Drop cached searchers after an index write so later reads reopen and
         see fresh data.
@@ -569,12 +897,20 @@ class IndexingMiddleware:
         iterating). Closing it now would raise ReaderClosed; instead we keep it
         open until close_searchers() runs at teardown. Reads after this point
         open new searchers reflecting the write.
+
+        :param namespace: only the indexes of this namespace were written to (default: any),
+                          searchers of other index shards stay valid
         """
         cache = self._searcher_cache(create=False)
         if not cache:
             return
-        flaskg._whoosh_retired_searchers.extend(cache.values())
-        cache.clear()
+        if namespace is None or not self.shards:
+            keys = list(cache)
+        else:
+            shard = self.shards.get(namespace, DEFAULT_SHARD)
+            keys = [key for key in cache if key[1] is None or shard in dict(key[1])]
+        for key in keys:
+            flaskg._whoosh_retired_searchers.append(cache.pop(key))
 
     def close_searchers(self):
         """
@@ -599,8 +935,19 @@ class IndexingMiddleware:
         Create all indexes (empty).
         """
         storage = self.get_storage(tmp, create=True)
-        for name in INDEXES:
-            storage.create_index(self.schemas[name], indexname=name)
+        for shard in shard_names(self.shards):
+            for name in INDEXES:
+                indexname = shard_index_name(shard, name)
+                if name == ALL_REVS and self.partitioning:
+                    PartitionedIndex.create(storage, indexname, self.schemas[name], self.partitioning).close()
+                else:
+                    if name == ALL_REVS:
+                        PartitionedIndex.remove(storage, indexname)
+                    storage.create_index(self.schemas[name], indexname=indexname)
+        store_shards(storage, self.shards)
+        self.get_content_store(tmp).create()
+        with storage.create_file(INDEX_SCHEMA_VERSION_FILE) as f:
+            f.write(str(INDEX_SCHEMA_VERSION).encode())
 
     def destroy(self, tmp=False):
         """
@@ -625,8 +972,64 @@ class IndexingMiddleware:
             index_dir, index_dir_tmp = params[0], params_tmp[0]
             os.rename(index_dir_tmp, index_dir)
 
+    def _writer(self, idx_name: str, async_: bool):
+        """
+        Return a writer for an open index.
+
+        :param async_: if True, use the AsyncWriter, otherwise use normal writer
+        """
+        index = self.ix[idx_name]
+        if isinstance(index, (PartitionedIndex, ShardedIndex)):
+            # only opens writers for the partitions / shards written to
+            writer = index.writer(async_=async_, timeout=INDEXER_TIMEOUT)
+        elif async_:
+            writer = AsyncWriter(index)
+        else:
+            # default timeout=0 fails instantly on a concurrent writer
+            # instead of waiting it out (e.g. two near-simultaneous logins).
+            writer = index.writer(timeout=INDEXER_TIMEOUT)
+        if self.defer_merges:
+            writer = DeferredMergeWriter(writer)
+        return writer
+
+    @staticmethod
+    def _moved(index, searcher, fieldname: str, doc: dict) -> bool:
+        """
+        Return True if the document doc replaces (same fieldname value) is in another partition or shard.
+        """
+        if not isinstance(index, (PartitionedIndex, ShardedIndex)):
+            return False
+        old = searcher.document(**{fieldname: doc[fieldname]})
+        return old is not None and index.location(old) != index.location(doc)
+
+    def _remove_moved(self, writer, idx_name: str, fieldname: str, doc: dict) -> None:
+        """
+        Remove the document doc replaces (same fieldname value) if it is in another partition or shard.
+
+        The writers of partitioned and sharded indexes only replace documents in the partition
+        of the doc MTIME and the shard of the doc NAMESPACE, so a revision overwritten with
+        another MTIME or an item renamed to the namespace of another shard is deleted from
+        its old one.
+        """
+        index = self.ix[idx_name]
+        if not isinstance(index, (PartitionedIndex, ShardedIndex)):
+            return
+        # only the other partitions and shards are searched, with short-lived readers
+        for other in index.other_indexes(doc):
+            with other.searcher() as searcher:
+                moved = searcher.document_number(**{fieldname: doc[fieldname]}) is not None
+            if moved:
+                writer.delete_by_term(fieldname, doc[fieldname])
+                return
+
     def index_revision(
-        self, meta: MetaData, content: str, backend_name: str, async_: bool = True, force_latest: bool = True
+        self,
+        meta: MetaData,
+        content: str,
+        backend_name: str,
+        async_: bool = True,
+        force_latest: bool = True,
+        publish: bool = True,
     ) -> None:
         """
         Index a single revision, add it to all-revs and latest-revs index.
@@ -637,17 +1040,17 @@ class IndexingMiddleware:
         :param force_latest: True - unconditionally store this rev in LATEST_REVS
                              False - store in LATEST_REVS if this rev MTIME is most recent
                                      overrides async_ parameter to False
+        :param publish: append the change to the change feed (if there is one)
         """
         if not force_latest:
             async_ = False  # must wait for storage in ALL_REVS before check for latest
         doc = backend_to_index(meta, content, self.schemas[ALL_REVS], backend_name)
-        if async_:
-            writer = AsyncWriter(self.ix[ALL_REVS])
-        else:
-            # default timeout=0 fails instantly on a concurrent writer
-            # instead of waiting it out (e.g. two near-simultaneous logins).
-            writer = self.ix[ALL_REVS].writer(timeout=INDEXER_TIMEOUT)
+        self.content_store.put(content)
+        writer = self._writer(ALL_REVS, async_)
         with writer as writer:
+            if not force_latest:
+                # an existing revision may be overwritten (new revisions are always the latest)
+                self._remove_moved(writer, ALL_REVS, REVID, doc)
             writer.update_document(**doc)  # update, because store_revision() may give us an existing revid
         if force_latest:
             is_latest = True
@@ -661,27 +1064,24 @@ class IndexingMiddleware:
                 )
         if is_latest:
             for idx_name in [LATEST_REVS, LATEST_META]:
-                doc = backend_to_index(meta, content, self.schemas[idx_name], backend_name)
-                if async_:
-                    writer = AsyncWriter(self.ix[idx_name])
-                else:
-                    writer = self.ix[idx_name].writer(timeout=INDEXER_TIMEOUT)
-                with writer as writer:
+                doc = backend_to_index(meta, content, self.schemas[idx_name], backend_name, self.ngram_indexing)
+                with self._writer(idx_name, async_) as writer:
+                    # the item may have been renamed to another namespace
+                    self._remove_moved(writer, idx_name, ITEMID, doc)
                     writer.update_document(**doc)
         # the index changed: drop cached searchers so later reads see fresh data
-        self.invalidate_searchers()
+        self.invalidate_searchers(meta.get(NAMESPACE, NAMESPACE_DEFAULT))
+        if publish:
+            self._publish(CHANGE_INDEX, backend_name, meta[REVID], force_latest)
 
     def remove_index_revision(self, revid: str, async_: bool = True, idx_name: str = LATEST_REVS) -> None:
-        if async_:
-            writer = AsyncWriter(self.ix[idx_name])
-        else:
-            writer = self.ix[idx_name].writer(timeout=INDEXER_TIMEOUT)
-        with writer as writer:
+        with self._writer(idx_name, async_) as writer:
             # find out itemid related to the revid we want to remove:
             with self.ix[idx_name].searcher() as searcher:
                 docnum_remove = searcher.document_number(revid=revid)
                 if docnum_remove is not None:
-                    itemid = searcher.stored_fields(docnum_remove)[ITEMID]
+                    removed = searcher.stored_fields(docnum_remove)
+                    itemid = removed[ITEMID]
             if docnum_remove is not None:
                 # we are removing a revid that is in latest revs index
                 latest_backends_revids = self._find_latest_backends_revids(self.ix[ALL_REVS], Term(ITEMID, itemid))
@@ -693,32 +1093,107 @@ class IndexingMiddleware:
                     # (and we can't be sure we have all fields stored, too)
                     meta, _ = self.backend.retrieve(*latest_backend_revid)
                     # we only use meta (not data), because we do not want to transform data->content again (this
-                    # is potentially expensive) as we already have the transformed content stored in ALL_REVS index:
+                    # is potentially expensive) as we already have the transformed content in the content store:
                     with self.ix[ALL_REVS].searcher() as searcher:
                         doc = searcher.document(revid=latest_backend_revid[1])
-                        content = doc[CONTENT]
-                    doc = backend_to_index(meta, content, self.schemas[idx_name], backend_name=latest_backend_revid[0])
+                    content = self.indexed_content(doc)
+                    doc = backend_to_index(
+                        meta, content, self.schemas[idx_name], latest_backend_revid[0], self.ngram_indexing
+                    )
+                    index = self.ix[idx_name]
+                    if isinstance(index, ShardedIndex) and index.location(removed) != index.location(doc):
+                        # the item was renamed to the namespace of another shard
+                        writer.delete_by_term(REVID, revid)
                     writer.update_document(**doc)
                 else:
                     # this is no revision left in this item that could be the new "latest rev", just kill the rev
-                    writer.delete_document(docnum_remove)
+                    writer.delete_by_term(REVID, revid)
 
-    def remove_revision(self, revid: str, async_: bool = True) -> None:
+    def remove_revision(self, revid: str, async_: bool = True, publish: bool = True) -> None:
         """
         Remove a single revision from indexes.
+
+        :param publish: append the change to the change feed (if there is one)
         """
-        if async_:
-            writer = AsyncWriter(self.ix[ALL_REVS])
-        else:
-            # default timeout=0 fails instantly on a concurrent writer
-            # instead of waiting it out (e.g. two near-simultaneous logins).
-            writer = self.ix[ALL_REVS].writer(timeout=INDEXER_TIMEOUT)
+        writer = self._writer(ALL_REVS, async_)
+        with self.ix[ALL_REVS].searcher() as searcher:
+            doc = searcher.document(revid=revid)
         with writer as writer:
             writer.delete_by_term(REVID, revid)
         for idx_name in [LATEST_REVS, LATEST_META]:
             self.remove_index_revision(revid, async_=async_, idx_name=idx_name)
+        if doc and CONTENT_HASH in doc:
+            self._release_content(self.ix[ALL_REVS], self.content_store, [doc[CONTENT_HASH]])
         # the index changed: drop cached searchers so later reads see fresh data
-        self.invalidate_searchers()
+        self.invalidate_searchers(doc.get(NAMESPACE, NAMESPACE_DEFAULT) if doc else None)
+        if publish and doc:
+            self._publish(CHANGE_REMOVE, doc[BACKENDNAME], revid)
+
+    def remove_revisions(self, revids: list[str], publish: bool = True) -> None:
+        """
+        Remove several revisions from the ALL_REVS index, committing once.
+
+        The revisions must not be the latest revisions of their items (the LATEST_REVS
+        and LATEST_META indexes are not changed), e.g. old revisions removed by a
+        revision retention policy.
+
+        :param publish: append the changes to the change feed (if there is one)
+        """
+        with self.ix[ALL_REVS].searcher() as searcher:
+            docs = [doc for doc in (searcher.document(revid=revid) for revid in revids) if doc]
+        with self._writer(ALL_REVS, async_=False) as writer:
+            for revid in revids:
+                writer.delete_by_term(REVID, revid)
+        self._release_content(
+            self.ix[ALL_REVS], self.content_store, [doc[CONTENT_HASH] for doc in docs if CONTENT_HASH in doc]
+        )
+        for namespace in {doc.get(NAMESPACE, NAMESPACE_DEFAULT) for doc in docs}:
+            self.invalidate_searchers(namespace)
+        if publish:
+            for doc in docs:
+                self._publish(CHANGE_REMOVE, doc[BACKENDNAME], doc[REVID])
+
+    def _publish(self, action: str, backend_name: str, revid: str, latest: bool = True) -> None:
+        """
+        Append a change of the indexes to the change feed, so the other nodes apply it too.
+        """
+        if self.changefeed is not None:
+            self.changefeed.append(self.node, action, backend_name, revid, latest)
+
+    def indexed_content(self, doc: Mapping[str, Any], content_store: IndexedContentStore | None = None) -> str:
+        """
+        Return the indexable content of an indexed document (or search hit).
+
+        LATEST_REVS documents have the content stored, ALL_REVS documents only have
+        the CONTENT_HASH, so we load the content lazily from the content store.
+
+        :param content_store: content store to use, default: the one of the open indexes
+        """
+        content = doc.get(CONTENT)
+        if content is not None:
+            return content
+        key = doc.get(CONTENT_HASH)
+        if key is None:
+            return ""
+        if content_store is None:
+            content_store = self.content_store
+        try:
+            return content_store.get(key)
+        except KeyError:
+            logging.warning(f"indexed content {key} of revision {doc.get(REVID)} is missing in the content store")
+            return ""
+
+    def _release_content(self, index: FileIndex, content_store: IndexedContentStore, keys: Iterable[str]) -> None:
+        """
+        Remove content that is not referenced by any ALL_REVS document any more from the content store
+        (content put recently is kept, see IndexedContentStore.release).
+
+        :param index: an up-to-date and open ALL_REVS index
+        """
+        with index.searcher() as searcher:
+            for key in set(keys):
+                if searcher.document_number(**{CONTENT_HASH: key}) is None:
+                    content_store.release(key)
 
     def _modify_index(
         self,
@@ -729,32 +1204,49 @@ class IndexingMiddleware:
         procs: int | None = None,
         limitmb: int | None = None,
         multisegment: bool = False,
+        content_store: IndexedContentStore | None = None,
     ) -> None:
         """
         modify index contents - add, update, delete the indexed documents for all given revids
 
         Note: mode == 'add' is faster but you need to make sure to not create duplicate
               documents in the index.
+
+        :param content_store: store the indexable content there (only for the ALL_REVS index)
         """
+        if mode not in ["add", "update", "delete"]:
+            raise ValueError(f"mode must be 'update', 'add' or 'delete', not '{mode}'")
         if procs is None:
             procs = 1
         if limitmb is None:
             limitmb = 256
         logging.info(f"Using options procs={procs}, limitmb={limitmb}, multisegment={multisegment}")
-        with index.writer(procs=procs, limitmb=limitmb, multisegment=multisegment) as writer:
-            for backend_name, revid in revids:
-                if mode in ["add", "update"]:
-                    meta, data = self.backend.retrieve(backend_name, revid)
-                    content = convert_to_indexable(meta, data, is_new=False)
-                    doc = backend_to_index(meta, content, schema, backend_name)
-                if mode == "update":
-                    writer.update_document(**doc)
-                elif mode == "add":
-                    writer.add_document(**doc)
-                elif mode == "delete":
+        # the writers of partitioned and sharded indexes do not replace documents in other partitions or shards
+        moving = mode == "update" and isinstance(index, (PartitionedIndex, ShardedIndex))
+        fieldname = ITEMID if getattr(schema[ITEMID], "unique", False) else REVID
+        with (
+            index.writer(procs=procs, limitmb=limitmb, multisegment=multisegment) as writer,
+            index.searcher() if moving else nullcontext() as searcher,
+        ):
+            if mode == "delete":
+                for backend_name, revid in revids:
                     writer.delete_by_term(REVID, revid)
-                else:
-                    raise ValueError(f"mode must be 'update', 'add' or 'delete', not '{mode}'")
+            else:
+                # the revisions are retrieved in batches (e.g. one query for many revisions of a SQL store)
+                for (backend_name, revid), meta, data in self.backend.retrieve_many(revids):
+                    try:
+                        content = convert_to_indexable(meta, data, is_new=False)
+                    finally:
+                        data.close()
+                    doc = backend_to_index(meta, content, schema, backend_name, self.ngram_indexing)
+                    if content_store is not None:
+                        content_store.put(content)
+                    if mode == "update":
+                        if moving and self._moved(index, searcher, fieldname, doc):
+                            writer.delete_by_term(fieldname, doc[fieldname])
+                        writer.update_document(**doc)
+                    else:
+                        writer.add_document(**doc)
         # the index changed: drop cached searchers so later reads see fresh data
         self.invalidate_searchers()
 
@@ -762,20 +1254,42 @@ class IndexingMiddleware:
         """
         find the latest revision identifiers using the all-revs index
 
+        This is a single pass over the ITEMID, MTIME, BACKENDNAME and REVID columns (no sorting
+        or grouping of the revisions), keeping only the latest revision found so far per item.
+
         :param index: an up-to-date and open ALL_REVS index
         :param query: query to search only specific revisions (optional, default: all items/revisions)
         :returns: a list of tuples (backend name, latest revid)
         """
-        if query is None:
-            query = Every()
+        latest: dict[bytes, tuple[int, int, int]] = {}  # itemid -> (mtime, leaf number, docnum)
         with index.searcher() as searcher:
-            result = searcher.search(query, groupedby=ITEMID, sortedby=FieldFacet(MTIME, reverse=True))
-            by_item = result.groups(ITEMID)
-            # values in v list are in same relative order as in results, so latest MTIME is first:
-            latest_backends_revids = [
-                (searcher.stored_fields(v[0])[BACKENDNAME], searcher.stored_fields(v[0])[REVID])
-                for v in by_item.values()
-            ]
+            reader = searcher.reader()
+            if not reader.doc_count_all():
+                return []
+            leaves, offsets = zip(*reader.leaf_readers())
+            docnums = None if query is None else sorted(searcher.docs_for_query(query))
+            for number, leaf in enumerate(leaves):
+                if not leaf.doc_count_all():
+                    continue
+                itemids = leaf.column_reader(ITEMID, translate=False)
+                mtimes = leaf.column_reader(MTIME, translate=False)
+                if docnums is None:
+                    leaf_docnums = leaf.all_doc_ids()
+                else:
+                    start, end = offsets[number], offsets[number] + leaf.doc_count_all()
+                    leaf_docnums = (docnum - start for docnum in docnums if start <= docnum < end)
+                for docnum in leaf_docnums:
+                    itemid, mtime = itemids[docnum], mtimes[docnum]
+                    current = latest.get(itemid)
+                    if current is None or mtime > current[0]:
+                        latest[itemid] = mtime, number, docnum
+            columns = {}  # leaf number -> (BACKENDNAME column, REVID column)
+            latest_backends_revids = []
+            for _, number, docnum in latest.values():
+                if number not in columns:
+                    columns[number] = (leaves[number].column_reader(BACKENDNAME), leaves[number].column_reader(REVID))
+                backend_names, revids = columns[number]
+                latest_backends_revids.append((backend_names[docnum], revids[docnum]))
         return latest_backends_revids
 
     def rebuild(self, tmp=False, procs=None, limitmb=None, multisegment=False):
@@ -788,7 +1302,7 @@ class IndexingMiddleware:
               create (tmp), rebuild wiki1, rebuild wiki2, ..., move
         """
         storage = self.get_storage(tmp)
-        index = storage.open_index(ALL_REVS)
+        index = self._open_index(storage, ALL_REVS)
         try:
             # build an index of all we have (so we know what we have)
             all_revids = self.backend  # the backend is an iterator over all revids
@@ -800,14 +1314,17 @@ class IndexingMiddleware:
                 procs=procs,
                 limitmb=limitmb,
                 multisegment=multisegment,
+                content_store=self.get_content_store(tmp),
             )
+            if isinstance(index, (PartitionedIndex, ShardedIndex)):
+                index.freeze()
             latest_backends_revids = self._find_latest_backends_revids(index)
         finally:
             index.close()
 
         # now build the indexes for latest revisions:
         for idx_name in [LATEST_REVS, LATEST_META]:
-            index = storage.open_index(idx_name)
+            index = self._open_index(storage, idx_name)
             try:
                 self._modify_index(
                     index,
@@ -835,7 +1352,7 @@ class IndexingMiddleware:
         :returns: index changed (bool)
         """
         storage = self.get_storage(tmp)
-        index_all = storage.open_index(ALL_REVS)
+        index_all = self._open_index(storage, ALL_REVS)
         try:
             # NOTE: self.backend iterator gives (backend_name, revid) tuples, which is NOT
             # the same as (name, revid), thus we do the set operations just on the revids.
@@ -843,7 +1360,8 @@ class IndexingMiddleware:
             revids_backends = {revid: backend_name for backend_name, revid in self.backend}
             backend_revids = set(revids_backends)
             with index_all.searcher() as searcher:
-                ix_revids_backends = {doc[REVID]: doc[BACKENDNAME] for doc in searcher.all_stored_fields()}
+                ix_docs = {doc[REVID]: doc for doc in searcher.all_stored_fields()}
+            ix_revids_backends = {revid: doc[BACKENDNAME] for revid, doc in ix_docs.items()}
             revids_backends.update(ix_revids_backends)  # this is needed for stuff that was deleted from storage
             ix_revids = set(ix_revids_backends)
             add_revids = backend_revids - ix_revids
@@ -851,8 +1369,13 @@ class IndexingMiddleware:
             changed = add_revids or del_revids
             add_revids = [(revids_backends[revid], revid) for revid in add_revids]
             del_revids = [(revids_backends[revid], revid) for revid in del_revids]
-            self._modify_index(index_all, self.schemas[ALL_REVS], add_revids, "add")
+            content_store = self.get_content_store(tmp)
+            self._modify_index(index_all, self.schemas[ALL_REVS], add_revids, "add", content_store=content_store)
             self._modify_index(index_all, self.schemas[ALL_REVS], del_revids, "delete")
+            del_keys = [ix_docs[revid][CONTENT_HASH] for _, revid in del_revids if CONTENT_HASH in ix_docs[revid]]
+            self._release_content(index_all, content_store, del_keys)
+            if changed and isinstance(index_all, (PartitionedIndex, ShardedIndex)):
+                index_all.freeze()
 
             backend_latest_backends_revids = set(self._find_latest_backends_revids(index_all))
         finally:
@@ -860,7 +1383,7 @@ class IndexingMiddleware:
 
         # update LATEST_REVS and LATEST_META
         for idx_name in [LATEST_REVS, LATEST_META]:
-            index_latest = storage.open_index(idx_name)
+            index_latest = self._open_index(storage, idx_name)
             try:
                 with index_latest.searcher() as searcher:
                     ix_revids = {doc[REVID] for doc in searcher.all_stored_fields()}
@@ -874,6 +1397,63 @@ class IndexingMiddleware:
 
         return changed
 
+    def replay_journal(self) -> int:
+        """
+        Replay the journal entries left over by processes that died while changing the backend and the indexes.
+
+        The indexes are made consistent with the backend for the revision of every entry:
+        a revision in the backend is (re-)indexed, a revision not in the backend (any more)
+        is removed from the indexes.
+
+        :returns: number of entries replayed
+        """
+        if self.journal is None:
+            return 0
+        lock = self.journal.lock()
+        if not lock.acquire(blocking=False):
+            return 0  # another wiki process is replaying the entries
+        try:
+            return self._replay_journal()
+        finally:
+            lock.release()
+
+    def _replay_journal(self) -> int:
+        assert self.journal is not None
+        entries = self.journal.pending()
+        for entry in entries:
+            logging.info(f"index journal: replaying {entry.action} of revision {entry.revid}")
+            try:
+                meta, data = self.backend.retrieve(entry.backend_name, entry.revid)
+            except KeyError:
+                if self._document(idx_name=ALL_REVS, revid=entry.revid) is not None:
+                    self.remove_revision(entry.revid, async_=False)
+            else:
+                try:
+                    content = convert_to_indexable(meta, data, is_new=False)
+                finally:
+                    data.close()
+                self.index_revision(meta, content, entry.backend_name, async_=False, force_latest=False)
+            self.journal.complete(entry.name)
+        return len(entries)
+
+    def reindex_meta(self, backend_name: str, revids: Iterable[str]) -> int:
+        """
+        Re-index revisions after their metadata was changed in the backend (e.g. by a backend
+        maintenance command), reusing the indexed content instead of converting the data again.
+
+        :returns: number of revisions re-indexed (revisions not in the index are skipped)
+        """
+        count = 0
+        for revid in revids:
+            doc = self._document(idx_name=ALL_REVS, revid=revid)
+            if doc is None:
+                continue
+            meta, data = self.backend.retrieve(backend_name, revid)
+            data.close()
+            self.index_revision(meta, self.indexed_content(doc), backend_name, async_=False, force_latest=False)
+            count += 1
+        return count
+
     def optimize_backend(self):
         """
         Optimize backend / collect garbage to safe space:
@@ -881,37 +1461,62 @@ class IndexingMiddleware:
         * deleted items: destroy them? use a deleted_max_age?
         * user profiles: only keep latest revision?
         * normal wiki items: keep by max_revisions_count / max_age
-        * deduplicate data (determine dataids with same hash, fix references to point to one of them)
-        * remove unreferenced dataids (destroyed revisions, deduplicated stuff)
+        * deduplicate data: see the dedup backend (moin maint-dedup)
+        * remove unreferenced dataids: see moin.storage.gc (moin maint-gc)
         """
         # TODO
 
     def optimize_index(self, tmp=False):
         """
         Optimize whoosh index.
+
+        Also remove the content not referenced by any ALL_REVS document from the content store,
+        e.g. content kept as it was put shortly before its revision was removed.
         """
         storage = self.get_storage(tmp)
         for name in INDEXES:
-            ix = storage.open_index(name)
+            ix = self._open_index(storage, name)
             try:
                 ix.optimize()
+                if name == ALL_REVS:
+                    content_store = self.get_content_store(tmp)
+                    self._release_content(ix, content_store, content_store)
             finally:
                 ix.close()
 
+    def merge_segments(self, policy, idle: float = 0, tmp: bool = False) -> list[MergeReport]:
+        """
+        Merge index segments according to a merge policy, see merging.SizeTieredMergePolicy.
+
+        :param idle: skip indexes written to within the last idle seconds
+        :returns: a MergeReport for every whoosh index (partition, shard)
+        """
+        storage = self.get_storage(tmp)
+        reports = []
+        for name in INDEXES:
+            ix = self._open_index(storage, name)
+            try:
+                reports.extend(merge_index(leaf, policy, idle) for leaf in leaf_indexes(ix))
+            finally:
+                ix.close()
+        return reports
+
     def dump(self, tmp=False, idx_name=LATEST_REVS):
         """
         Yield key/value tuple lists for all documents in the indexes, fields sorted.
         """
         storage = self.get_storage(tmp)
-        ix = storage.open_index(idx_name)
+        ix = self._open_index(storage, idx_name)
         while not ix.up_to_date():
             logging.info("waiting for ix.up_to_date()")
             time.sleep(0.1)
         try:
+            content_store = self.get_content_store(tmp)
             with ix.searcher() as searcher:
                 for doc in searcher.all_stored_fields():
                     name = doc.pop(NAME, "")
-                    content = doc.pop(CONTENT, "")
+                    content = self.indexed_content(doc, content_store)
+                    doc.pop(CONTENT, None)
                     yield [(NAME, name)] + sorted(doc.items()) + [(CONTENT, content)]
         finally:
             ix.close()
@@ -960,7 +1565,7 @@ class IndexingMiddleware:
         """
         Search with query q, yield Revisions.
         """
-        with self._searcher(idx_name) as searcher:
+        with self._searcher(idx_name, q, **kw) as searcher:
             # Note: callers must consume everything we yield, so the for loop
             # ends and the "with" is left to close the index files.
             for hit in searcher.search(q, **kw):
@@ -973,7 +1578,7 @@ class IndexingMiddleware:
         """
         Same as search, but with paging support.
         """
-        with self._searcher(idx_name) as searcher:
+        with self._searcher(idx_name, q, limit=pagenum * pagelen, **kw) as searcher:
             # Note: callers must consume everything we yield, so the for loop
             # ends and the "with" is left to close the index files.
             for hit in searcher.search_page(q, pagenum, pagelen=pagelen, **kw):
@@ -986,7 +1591,7 @@ class IndexingMiddleware:
         """
         Search with query q, yield Revision metadata from index.
         """
-        with self._searcher(idx_name) as searcher:
+        with self._searcher(idx_name, q, **kw) as searcher:
             # Note: callers must consume everything we yield, so the for loop
             # ends and the "with" is left to close the index files.
             if regex:
@@ -1001,7 +1606,7 @@ class IndexingMiddleware:
         """
         Same as search_meta, but with paging support.
         """
-        with self._searcher(idx_name) as searcher:
+        with self._searcher(idx_name, q, limit=pagenum * pagelen, **kw) as searcher:
             # Note: callers must consume everything we yield, so the for loop
             # ends and the "with" is left to close the index files.
             for hit in searcher.search_page(q, pagenum, pagelen=pagelen, **kw):
@@ -1012,7 +1617,7 @@ class IndexingMiddleware:
         """
         Return the number of matching revisions.
         """
-        with self._searcher(idx_name) as searcher:
+        with self._searcher(idx_name, q) as searcher:
             return len(searcher.search(q, **kw))
 
     def documents(self, idx_name: str = LATEST_REVS, **kw) -> Generator[Revision]:
@@ -1492,14 +2097,22 @@ class Item(PropertiesMixin):
         # validate the updated meta data before it is being stored
         self.validate_metadata(meta, state, update=False)
 
+        journal = self.indexer.journal
+        if journal is not None:
+            # record the intent before changing the backend, replayed if we die before the index commit
+            entry = journal.begin(JOURNAL_INDEX, backend.store_backend_name(meta), meta.setdefault(REVID, make_uuid()))
+
         backend_name, revid = backend.store(meta, data)
         assert revid
         assert meta[REVID] == revid
 
-        self.indexer.index_revision(meta, content, backend_name, force_latest=not overwrite)
+        # with the journal, write the indexes synchronously, so they are committed when completing the entry
+        self.indexer.index_revision(meta, content, backend_name, async_=journal is None, force_latest=not overwrite)
         gc.collect()  # triggers close of index files from is_latest search
         if not overwrite:
             self._current = self.indexer.get_document(revid=revid, retry=True)
+        if journal is not None:
+            journal.complete(entry)
 
         return Revision(self, revid, retry=True) if return_rev else None
 
@@ -1519,8 +2132,13 @@ class Item(PropertiesMixin):
         query = {DATAID: rev.meta[DATAID]}
         with flaskg.storage.indexer.ix[ALL_REVS].searcher() as searcher:
             refcount = len(list(searcher.document_numbers(**query)))
+        journal = self.indexer.journal
+        if journal is not None:
+            entry = journal.begin(JOURNAL_REMOVE, rev.backend_name, revid)
         self.backend.remove(rev.backend_name, revid, destroy_data=refcount == 1)
-        self.indexer.remove_revision(revid)
+        self.indexer.remove_revision(revid, async_=journal is None)
+        if journal is not None:
+            journal.complete(entry)
         my_parent = rev.meta.get(PARENTID)
         with flaskg.storage.indexer.ix[ALL_REVS].searcher() as searcher:
             for hit in searcher.search(Term(PARENTID, revid)):
@@ -1594,6 +2212,25 @@ class Revision(PropertiesMixin):
         if self._data is not None:
             self._data.close()
 
+    def local_path(self) -> str | None:
+        """
+        Return the filesystem path of the data of this revision if the backend keeps it
+        in a plain file (None otherwise), e.g. to let the web server send it.
+        """
+        return self.backend.local_path(self.backend_name, self.revid)
+
+    def delta_opcodes(self, oldrev: Revision) -> list | None:
+        """
+        Return the opcodes of the lines changed since oldrev if the backend stores the data
+        of this revision as a delta against the data of oldrev (None otherwise).
+        """
+        if oldrev.backend_name != self.backend_name:
+            return None
+        old_dataid, new_dataid = oldrev.meta.get(DATAID), self.meta.get(DATAID)
+        if old_dataid is None or new_dataid is None:
+            return None
+        return self.backend.delta_opcodes(self.backend_name, old_dataid, new_dataid)
+
     def __enter__(self):
         return self
 
@@ -1613,6 +2250,52 @@ class Revision(PropertiesMixin):
         return f"<Revision {self.revid[:6]} of Item {self.name}>"
 
 
+@contextmanager
+def index_only(*fields: str, idx_name: str = LATEST_REVS):
+    """
+    Use only the index documents for the metadata of revisions within the context.
+
+    Listing views declare the metadata fields they need (and the index the listed
+    revisions come from). Accessing other fields raises MetaNotIndexedError instead
+    of loading the metadata of every listed revision from the backend.
+
+    Raises ValueError if the index does not store a declared field.
+    """
+    schema = flaskg.unprotected_storage.schemas[idx_name]
+    missing = [field for field in fields if field not in schema or not schema[field].stored]
+    if missing:
+        raise ValueError(f"index {idx_name} does not store the fields {', '.join(missing)}")
+    previous = _index_only_fields()
+    flaskg.index_only_fields = frozenset(fields)
+    try:
+        yield
+    finally:
+        flaskg.index_only_fields = previous
+
+
+def _index_only_fields() -> frozenset[str] | None:
+    """
+    Return the fields of the active index_only context, None if there is none.
+    """
+    try:
+        return getattr(flaskg, "index_only_fields", None)
+    except RuntimeError:
+        # no application context bound
+        return None
+
+
+def lazy_meta_loads() -> int:
+    """
+    Return how many times metadata was loaded from the backend because the index document did not have a field.
+
+    Counted per app context, i.e. per request for web requests.
+    """
+    try:
+        return getattr(flaskg, "lazy_meta_loads", 0)
+    except RuntimeError:
+        return 0
+
+
 class Meta(Mapping):
 
     def __init__(self, revision: Revision, doc: Document, meta: MetaData | None = None) -> None:
@@ -1631,14 +2314,30 @@ class Meta(Mapping):
 
     def __iter__(self):
         if not self._meta:
-            self._meta, _ = self.revision._load()
+            fields = _index_only_fields()
+            if fields is not None:
+                return iter([key for key in self._doc if key in fields])
+            self._load()
         return iter(self._meta)
 
+    def _load(self) -> None:
+        try:
+            flaskg.lazy_meta_loads = lazy_meta_loads() + 1
+        except RuntimeError:
+            pass  # no application context bound
+        self._meta, _ = self.revision._load()
+
     def __getitem__(self, key):
         if self._meta:
             # we have real metadata (e.g. from storage)
             return self._meta[key]
-        elif self._doc and key in self._common_fields:
+        fields = _index_only_fields()
+        if fields is not None:
+            if key not in fields:
+                raise MetaNotIndexedError(f"metadata field {key!r} is not declared for index-only access")
+            if not self._doc:
+                raise MetaNotIndexedError(f"no index document for metadata field {key!r}")
+        if self._doc and (key in self._doc or key in self._common_fields or fields is not None):
             # we have a result document from whoosh, which has quite a lot
             # of the usually wanted metadata, avoid storage access, use this.
             value = self._doc[key]
@@ -1646,9 +2345,8 @@ class Meta(Mapping):
                 # whoosh has a datetime object, but we want a UNIX timestamp
                 value = utctimestamp(value)
             return value
-        else:
-            self._meta, _ = self.revision._load()
-            return self._meta[key]
+        self._load()
+        return self._meta[key]
 
     def __hash__(self):
         return hash(self[REVID])
@@ -0,0 +1,161 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - write-ahead journal of the index changes.
+
+Saving an item first stores the revision in the backend and then writes it to
+the indexes (destroying a revision removes it from both). If the process dies in
+between (or before an AsyncWriter committed the deferred index writes), the
+indexes miss the change until the next index update.
+
+With the journal, the indexing middleware records its intent in a small file
+(flushed to disk) before changing the backend and removes the file after the
+indexes were written. Entries left over by a process that died are replayed when
+a wiki server starts (one process at a time, holding the replay lock): the
+indexes are made consistent with the backend for every revision in them.
+"""
+
+from __future__ import annotations
+
+from typing import NamedTuple
+
+import json
+import os
+import tempfile
+import time
+
+from whoosh.util.filelock import FileLock
+
+from moin import log
+from moin.utils.crypto import make_uuid
+
+logging = log.getLogger(__name__)
+
+# journal actions
+JOURNAL_INDEX = "index"  # a revision is stored and indexed
+JOURNAL_REMOVE = "remove"  # a revision is destroyed and removed from the indexes
+
+# entries older than this many seconds are replayed even if a process with their pid exists
+# (the pid was reused or, not on POSIX, it is unknown whether the process exists)
+JOURNAL_REPLAY_AGE = 24 * 3600.0
+
+JOURNAL_LOCK = "replay.lock"  # lock file (in the journal directory) of the process replaying the entries
+
+
+class JournalEntry(NamedTuple):
+    name: str  # file name of the entry
+    action: str  # JOURNAL_INDEX or JOURNAL_REMOVE
+    backend_name: str
+    revid: str
+    pid: int  # process that recorded the entry
+    time: float  # time the entry was recorded
+
+
+def _process_exists(pid: int) -> bool:
+    """
+    Return whether the process may exist (True if unknown).
+    """
+    if pid == os.getpid():
+        return False  # replaying at startup, so a dead process with the same pid recorded the entry
+    if os.name != "posix":
+        return True  # unknown, os.kill(pid, 0) would terminate the process on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # process of another user
+    return True
+
+
+def _sync_dir(path: str) -> None:
+    """
+    Flush a directory to disk (so a new or renamed file in it is durable).
+    """
+    if os.name == "posix":
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class IndexJournal:
+    """
+    Journal of the index changes in progress, one JSON file per entry.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def create(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+
+    def lock(self) -> FileLock:
+        """
+        Return the lock a process holds while replaying the entries.
+        """
+        self.create()
+        return FileLock(os.path.join(self.path, JOURNAL_LOCK))
+
+    def begin(self, action: str, backend_name: str, revid: str) -> str:
+        """
+        Durably record an index change about to be made, return the name of the entry.
+        """
+        self.create()
+        # time first, so sorting by name sorts by time
+        name = f"{time.time():017.6f}-{make_uuid()}.json"
+        entry = dict(action=action, backend_name=backend_name, revid=revid, pid=os.getpid())
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(entry).encode())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.path, name))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        _sync_dir(self.path)
+        return name
+
+    def complete(self, name: str) -> None:
+        """
+        Remove an entry after the change was written to the backend and the indexes.
+        """
+        try:
+            os.unlink(os.path.join(self.path, name))
+        except FileNotFoundError:
+            pass  # already replayed
+
+    def entries(self) -> list[JournalEntry]:
+        """
+        Return all entries, oldest first.
+        """
+        try:
+            names = sorted(name for name in os.listdir(self.path) if name.endswith(".json"))
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            try:
+                with open(os.path.join(self.path, name), "rb") as f:
+                    entry = json.loads(f.read().decode())
+            except FileNotFoundError:
+                continue  # completed meanwhile
+            except ValueError:
+                logging.warning(f"index journal: ignoring invalid entry {name}")
+                continue
+            entries.append(JournalEntry(name, time=float(name.split("-", 1)[0]), **entry))
+        return entries
+
+    def pending(self, age: float = JOURNAL_REPLAY_AGE) -> list[JournalEntry]:
+        """
+        Return the entries to replay: the ones of processes that died and the ones older than age seconds.
+
+        The entries of running processes are not replayed (they are still changing the backend
+        and the indexes), unless they are so old that the pid must have been reused.
+        """
+        now = time.time()
+        return [entry for entry in self.entries() if not _process_exists(entry.pid) or now - entry.time > age]
@@ -0,0 +1,237 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - background merging of whoosh index segments.
+
+Every commit of an index writer adds a segment to the index and, by default,
+merges small segments while the writer still holds the write lock (so saving
+an item pays for it). With a merge scheduler configured, the writers of the
+indexing middleware commit without merging and the MergeScheduler merges the
+segments later, when the index was idle for a while: segments of about the
+same size (same tier) are merged together, so every document is only rewritten
+a few times while the number of segments stays small.
+"""
+
+from __future__ import annotations
+
+from typing import Any, NamedTuple, TYPE_CHECKING
+
+import math
+import threading
+import time
+
+from whoosh.index import TOC, LockError
+from whoosh.reading import SegmentReader
+
+from moin import log
+from moin.storage.middleware.partitioning import PartitionedIndex
+from moin.storage.middleware.sharding import ShardedIndex
+
+if TYPE_CHECKING:
+    from whoosh.index import FileIndex
+    from moin.storage.middleware.indexing import IndexingMiddleware
+
+logging = log.getLogger(__name__)
+
+# where to run the merge scheduler (see index_merge_scheduler configuration)
+MERGE_SCHEDULER_SERVER = "server"
+MERGE_SCHEDULER_DAEMON = "daemon"
+MERGE_SCHEDULERS = (MERGE_SCHEDULER_SERVER, MERGE_SCHEDULER_DAEMON)
+
+# results of merging an index
+MERGE_MERGED = "merged"
+MERGE_UNCHANGED = "unchanged"  # nothing to merge
+MERGE_BUSY = "busy"  # the index was written to recently
+MERGE_LOCKED = "locked"  # another writer holds the write lock
+
+
+def check_merge_scheduler(merge_scheduler: str | None) -> None:
+    """
+    Raise ValueError if the merge scheduler is invalid.
+    """
+    if merge_scheduler is not None and merge_scheduler not in MERGE_SCHEDULERS:
+        raise ValueError(f"index merge scheduler must be None or one of {MERGE_SCHEDULERS}, not {merge_scheduler!r}")
+
+
+class SizeTieredMergePolicy:
+    """
+    A whoosh merge policy (use as mergetype when committing) merging segments of about the same size.
+
+    The segments are grouped into tiers by their number of documents (tier n has tier_factor ** n
+    up to tier_factor ** (n + 1) documents). If a tier has min_segments segments, they are merged
+    (the smallest tier first, one tier per commit). A segment with many deleted documents is
+    rewritten to purge them.
+    """
+
+    def __init__(self, min_segments: int = 4, tier_factor: int = 10, deleted_ratio: float = 0.3) -> None:
+        if min_segments < 2 or tier_factor < 2:
+            raise ValueError("min_segments and tier_factor must be at least 2")
+        self.min_segments = min_segments
+        self.tier_factor = tier_factor
+        self.deleted_ratio = deleted_ratio
+
+    def tier(self, segment) -> int:
+        return int(math.log(max(segment.doc_count_all(), 1), self.tier_factor))
+
+    def select(self, segments: list) -> list:
+        """
+        Return the segments to merge next, an empty list if there is nothing to merge.
+        """
+        tiers: dict[int, list] = {}
+        for segment in segments:
+            tiers.setdefault(self.tier(segment), []).append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.min_segments:
+                return tiers[tier]
+        for segment in segments:
+            count = segment.doc_count_all()
+            if count and (count - segment.doc_count()) / count >= self.deleted_ratio:
+                return [segment]
+        return []
+
+    def __call__(self, writer, segments: list) -> list:
+        selected = self.select(segments)
+        for segment in selected:
+            reader = SegmentReader(writer.storage, writer.schema, segment)
+            writer.add_reader(reader)
+            reader.close()
+        return [segment for segment in segments if segment not in selected]
+
+
+class DeferredMergeWriter:
+    """
+    Wrap an index writer to commit without merging segments, the merge scheduler merges them later.
+    """
+
+    def __init__(self, writer) -> None:
+        self.writer = writer
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.writer, name)
+
+    def commit(self, **kw) -> None:
+        kw.setdefault("merge", False)
+        self.writer.commit(**kw)
+
+    def __enter__(self) -> DeferredMergeWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type:
+            self.writer.cancel()
+        else:
+            self.commit()
+
+
+class MergeReport(NamedTuple):
+    name: str  # name of the whoosh index
+    status: str  # MERGE_MERGED, MERGE_UNCHANGED, MERGE_BUSY or MERGE_LOCKED
+    segments_before: int
+    segments_after: int
+    seconds: float  # time spent merging
+
+
+def leaf_indexes(index) -> list[FileIndex]:
+    """
+    Return the whoosh indexes a (maybe sharded and/or partitioned) index consists of.
+    """
+    if isinstance(index, ShardedIndex):
+        return [leaf for shard_index in index.indexes.values() for leaf in leaf_indexes(shard_index)]
+    if isinstance(index, PartitionedIndex):
+        return [index.partition_index(key) for key in index.partitions()]
+    return [index]
+
+
+def idle_seconds(ix: FileIndex) -> float:
+    """
+    Return the time since the last commit to a whoosh index.
+    """
+    return time.time() - ix.storage.file_modified(TOC._filename(ix.indexname, ix.latest_generation()))
+
+
+def merge_index(ix: FileIndex, policy: SizeTieredMergePolicy, idle: float = 0) -> MergeReport:
+    """
+    Merge the segments of a whoosh index according to the policy.
+
+    Nothing is done if the index was written to within the last idle seconds or if another
+    writer holds the write lock (merging then stops after the current tier).
+    """
+    segments_before = len(ix._segments())
+    if not policy.select(ix._segments()):
+        return MergeReport(ix.indexname, MERGE_UNCHANGED, segments_before, segments_before, 0.0)
+    if idle and idle_seconds(ix) < idle:
+        return MergeReport(ix.indexname, MERGE_BUSY, segments_before, segments_before, 0.0)
+    status = MERGE_LOCKED
+    start = time.monotonic()
+    while policy.select(ix._segments()):
+        try:
+            writer = ix.writer(timeout=0)
+        except LockError:
+            break
+        writer.commit(mergetype=policy)
+        status = MERGE_MERGED
+    seconds = time.monotonic() - start
+    return MergeReport(ix.indexname, status, segments_before, len(ix._segments()), seconds)
+
+
+def log_reports(reports: list[MergeReport]) -> None:
+    for report in reports:
+        if report.status == MERGE_MERGED:
+            logging.info(
+                f"merged index {report.name}: {report.segments_before} -> {report.segments_after} segments "
+                f"in {report.seconds:.2f} s"
+            )
+        else:
+            logging.debug(f"index {report.name} {report.status}: {report.segments_before} segments")
+
+
+class MergeScheduler:
+    """
+    Merge the segments of the indexes periodically (in a background thread or in the foreground).
+    """
+
+    def __init__(
+        self,
+        indexer: IndexingMiddleware,
+        policy: SizeTieredMergePolicy | None = None,
+        interval: float = 300,
+        idle: float = 30,
+    ) -> None:
+        """
+        :param interval: seconds between the merge runs
+        :param idle: only merge indexes not written to within the last idle seconds
+        """
+        self.indexer = indexer
+        self.policy = policy or SizeTieredMergePolicy()
+        self.interval = interval
+        self.idle = idle
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def run_once(self) -> list[MergeReport]:
+        reports = self.indexer.merge_segments(self.policy, idle=self.idle)
+        log_reports(reports)
+        return reports
+
+    def run(self) -> None:
+        """
+        Merge the segments every interval seconds until stopped.
+        """
+        while not self.stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as err:  # keep running, the next run may succeed
+                logging.exception(f"merging index segments failed: {err}")
+            self.stopped.wait(self.interval)
+
+    def start(self) -> MergeScheduler:
+        self.thread = threading.Thread(target=self.run, name="moin-index-merge", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,438 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - time-partitioned whoosh indexes.
+
+The "all revisions" index grows with the total history of the wiki. Optionally,
+it is split into one sub-index (partition) per year or month of the revision
+MTIME. New revisions are only written to the partition of the current period,
+older partitions are optimized (one segment) and otherwise left alone.
+
+A PartitionedIndex provides the part of the whoosh index API moin uses, searching
+is federated over the partitions (a whoosh MultiReader), optionally limited to
+the partitions a query (MTIME range) or a sort by MTIME with a limit needs. The
+generation of a partitioned index is the tuple of the generations of its partitions.
+"""
+
+from __future__ import annotations
+
+from typing import Any, TYPE_CHECKING
+
+import re
+
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from itertools import islice
+
+from whoosh.index import EmptyIndexError
+from whoosh.query import And, DateRange, Every
+from whoosh.reading import EmptyReader, MultiReader
+from whoosh.searching import Searcher
+from whoosh.writing import AsyncWriter
+
+from moin import log
+from moin.constants.keys import MTIME
+from moin.utils import utcnow
+
+if TYPE_CHECKING:
+    from whoosh.fields import Schema
+    from whoosh.filedb.filestore import Storage
+    from whoosh.index import FileIndex
+
+logging = log.getLogger(__name__)
+
+PARTITION_YEAR = "year"
+PARTITION_MONTH = "month"
+# partitioning -> (strftime format, regex) of the partition keys
+PARTITIONINGS = {PARTITION_YEAR: ("%Y", r"\d{4}"), PARTITION_MONTH: ("%Y_%m", r"\d{4}_\d{2}")}
+
+# file in the index storage recording the partitioning of a partitioned index
+PARTITIONING_FILE = "{indexname}_partitioning"
+PARTITION_CREATE_LOCK = "{indexname}_partition_create"
+
+
+def check_partitioning(partitioning: str | None) -> None:
+    """
+    Raise ValueError if the partitioning is invalid.
+    """
+    if partitioning is not None and partitioning not in PARTITIONINGS:
+        raise ValueError(f"index partitioning must be None or one of {sorted(PARTITIONINGS)}, not {partitioning!r}")
+
+
+def naive_utc(dt: datetime) -> datetime:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def partition_key(partitioning: str, mtime: datetime) -> str:
+    """
+    Return the key of the partition holding documents with the given MTIME.
+    """
+    return naive_utc(mtime).strftime(PARTITIONINGS[partitioning][0])
+
+
+def partition_span(partitioning: str, key: str) -> tuple[datetime, datetime]:
+    """
+    Return the MTIME range [start, end) of a partition.
+    """
+    start = datetime.strptime(key, PARTITIONINGS[partitioning][0])
+    if partitioning == PARTITION_YEAR:
+        end = start.replace(year=start.year + 1)
+    elif start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+def mtime_span(q) -> tuple[datetime | None, datetime | None]:
+    """
+    Return the MTIME range (start, end, both inclusive, None: open) a query can match.
+
+    Only DateRange queries on MTIME, alone or within an And, restrict the range.
+    """
+    if isinstance(q, DateRange) and q.fieldname == MTIME:
+        start = naive_utc(q.startdate) if q.startdate else None
+        end = naive_utc(q.enddate) if q.enddate else None
+        return start, end
+    start = end = None
+    if isinstance(q, And):
+        for subquery in q.subqueries:
+            sub_start, sub_end = mtime_span(subquery)
+            if sub_start is not None and (start is None or sub_start > start):
+                start = sub_start
+            if sub_end is not None and (end is None or sub_end < end):
+                end = sub_end
+    return start, end
+
+
+def sorts_newest_first(sortedby, reverse: bool) -> bool:
+    """
+    Check if a search with the given sortedby/reverse arguments returns the newest revisions first.
+    """
+    if isinstance(sortedby, (list, tuple)):
+        sortedby = sortedby[0] if sortedby else None
+    if isinstance(sortedby, str):
+        return sortedby == MTIME and reverse
+    return getattr(sortedby, "fieldname", None) == MTIME and getattr(sortedby, "reverse", False) != reverse
+
+
+class PartitionedIndex:
+    """
+    A whoosh index split by MTIME into partitions (one whoosh index per year or month).
+    """
+
+    def __init__(self, storage: Storage, indexname: str, schema: Schema, partitioning: str) -> None:
+        """
+        Open an existing partitioned index, raise EmptyIndexError if there is none.
+        """
+        check_partitioning(partitioning)
+        if not self.exists(storage, indexname):
+            raise EmptyIndexError(f"partitioned index {indexname} does not exist")
+        self.storage = storage
+        self.indexname = indexname
+        self.schema = schema
+        self.partitioning = partitioning
+        self._indexes: dict[str, FileIndex] = {}  # open partitions
+        self._toc_re = re.compile(rf"_{re.escape(indexname)}_({PARTITIONINGS[partitioning][1]})_(\d+)\.toc")
+
+    @classmethod
+    def create(cls, storage: Storage, indexname: str, schema: Schema, partitioning: str) -> PartitionedIndex:
+        """
+        Create an empty partitioned index (with the partition of the current period).
+        """
+        check_partitioning(partitioning)
+        cls.remove(storage, indexname)
+        with storage.create_file(PARTITIONING_FILE.format(indexname=indexname)) as f:
+            f.write(partitioning.encode())
+        index = cls(storage, indexname, schema, partitioning)
+        index.partition_index(index.current_key())
+        return index
+
+    @staticmethod
+    def remove(storage: Storage, indexname: str) -> None:
+        """
+        Remove all partitions (of any partitioning) and the partitioning file of an index.
+        """
+        keys = "|".join(regex for _, regex in PARTITIONINGS.values())
+        partition_file_re = re.compile(rf"_?{re.escape(indexname)}_({keys})_.+")
+        for filename in storage.list():
+            if partition_file_re.fullmatch(filename) or filename == PARTITIONING_FILE.format(indexname=indexname):
+                storage.delete_file(filename)
+
+    @staticmethod
+    def exists(storage: Storage, indexname: str) -> bool:
+        return storage.file_exists(PARTITIONING_FILE.format(indexname=indexname))
+
+    @staticmethod
+    def stored_partitioning(storage: Storage, indexname: str) -> str | None:
+        """
+        Return the partitioning an index was created with, None if it is not partitioned.
+        """
+        filename = PARTITIONING_FILE.format(indexname=indexname)
+        if not storage.file_exists(filename):
+            return None
+        with storage.open_file(filename) as f:
+            return f.read().decode().strip()
+
+    def current_key(self) -> str:
+        return partition_key(self.partitioning, utcnow())
+
+    def partition_name(self, key: str) -> str:
+        return f"{self.indexname}_{key}"
+
+    def generations(self) -> dict[str, int]:
+        """
+        Return the latest generation of every existing partition (from one listing of the storage).
+        """
+        generations: dict[str, int] = {}
+        for m in map(self._toc_re.fullmatch, self.storage.list()):
+            if m:
+                generations[m.group(1)] = max(int(m.group(2)), generations.get(m.group(1), -1))
+        return generations
+
+    def partitions(self) -> list[str]:
+        """
+        Return the keys of the existing partitions, oldest first.
+        """
+        return sorted(self.generations())
+
+    def location(self, fields: dict[str, Any]) -> str:
+        """
+        Return the key of the partition a document with these fields is written to.
+        """
+        return partition_key(self.partitioning, fields[MTIME])
+
+    def other_indexes(self, fields: dict[str, Any]) -> list[FileIndex]:
+        """
+        Return the whoosh indexes of the partitions a document with these fields is not written to.
+        """
+        key = self.location(fields)
+        return [self.partition_index(other) for other in self.partitions() if other != key]
+
+    def partition_index(self, key: str) -> FileIndex:
+        """
+        Return the whoosh index of a partition, create it if it does not exist yet.
+        """
+        index = self._indexes.get(key)
+        if index is None:
+            name = self.partition_name(key)
+            if not self.storage.index_exists(name):
+                # creating an index removes all files of an existing one, do not race other processes
+                lock = self.storage.lock(PARTITION_CREATE_LOCK.format(indexname=self.indexname))
+                lock.acquire(blocking=True)
+                try:
+                    if not self.storage.index_exists(name):
+                        logging.info(f"creating index partition {name}")
+                        self.storage.create_index(self.schema, indexname=name)
+                finally:
+                    lock.release()
+            index = self._indexes[key] = self.storage.open_index(name)
+        return index
+
+    def partitions_for(self, q=None) -> list[str]:
+        """
+        Return the keys of the partitions that may have documents matching the query.
+        """
+        keys = self.partitions()
+        if q is None:
+            return keys
+        start, end = mtime_span(q)
+        if start is None and end is None:
+            return keys
+        selected = []
+        for key in keys:
+            span_start, span_end = partition_span(self.partitioning, key)
+            if (start is None or start < span_end) and (end is None or end >= span_start):
+                selected.append(key)
+        return selected
+
+    def newest_partitions(self, q, keys: list[str], limit: int) -> list[str]:
+        """
+        Return the newest of the given partitions that together have at least limit documents matching the query.
+
+        A search sorted by MTIME (newest first) with this limit only needs those.
+        """
+        found = 0
+        for i in range(len(keys) - 1, -1, -1):
+            with self.partition_index(keys[i]).searcher() as searcher:
+                found += sum(1 for _ in islice(searcher.docs_for_query(q or Every()), limit - found))
+            if found >= limit:
+                return keys[i:]
+        return keys
+
+    def select(self, q, newest_limit: int | None = None) -> tuple[str, ...] | None:
+        """
+        Return the keys of the partitions needed for a search, None if all are needed.
+
+        :param newest_limit: the limit of a search returning the newest revisions first
+        """
+        keys = self.partitions_for(q)
+        if newest_limit:
+            keys = self.newest_partitions(q, keys, newest_limit)
+        if keys == self.partitions():
+            return None
+        return tuple(keys)
+
+    def latest_generation(self) -> tuple:
+        return tuple(sorted(self.generations().items()))
+
+    def up_to_date(self) -> bool:
+        return all(self.partition_index(key).up_to_date() for key in self.partitions())
+
+    def doc_count(self) -> int:
+        return sum(self.partition_index(key).doc_count() for key in self.partitions())
+
+    def doc_count_all(self) -> int:
+        return sum(self.partition_index(key).doc_count_all() for key in self.partitions())
+
+    def reader(self, keys: Sequence[str] | None = None, reuse=None):
+        """
+        Return a reader of the given partitions (default: all).
+
+        Its generation is the one of the whole index (see latest_generation), so a searcher
+        using it is up to date (and refresh() keeps it) until any partition changes.
+        """
+        generation = self.latest_generation()
+        if keys is None:
+            keys = [key for key, _ in generation]
+        # federate the segment readers (whoosh searchers and collectors only handle a flat MultiReader),
+        # empty partitions have no columns to sort by
+        readers = [
+            leaf
+            for key in keys
+            for leaf, _ in self.partition_index(key).reader().leaf_readers()
+            if leaf.doc_count_all()
+        ]
+        if not readers:
+            return GenerationEmptyReader(self.schema, generation)
+        return MultiReader(readers, generation=generation)
+
+    def searcher(self, keys: Sequence[str] | None = None, **kw) -> Searcher:
+        """
+        Return a searcher federating the given partitions (default: all).
+        """
+        return Searcher(self.reader(keys), fromindex=self, **kw)
+
+    def writer(self, async_: bool = False, **kw) -> PartitionedWriter:
+        return PartitionedWriter(self, async_=async_, **kw)
+
+    def optimize(self, current: bool = True) -> None:
+        """
+        Merge the segments of every partition into one.
+
+        :param current: also optimize the partition of the current period (it gets new segments all the time)
+        """
+        current_key = self.current_key()
+        for key in self.partitions():
+            if key == current_key and not current:
+                continue
+            index = self.partition_index(key)
+            segments = index._segments()
+            if len(segments) > 1 or any(segment.has_deletions() for segment in segments):
+                logging.info(f"optimizing index partition {self.partition_name(key)}")
+                index.optimize()
+
+    def freeze(self) -> None:
+        """
+        Optimize the partitions of past periods, they are only written to when importing old revisions.
+        """
+        self.optimize(current=False)
+
+    def close(self) -> None:
+        for index in self._indexes.values():
+            index.close()
+        self._indexes = {}
+
+
+class GenerationEmptyReader(EmptyReader):
+    """
+    An empty reader of a partitioned index, with the generation of the index.
+    """
+
+    def __init__(self, schema: Schema, generation: tuple) -> None:
+        super().__init__(schema)
+        self._generation = generation
+
+    def generation(self) -> tuple:
+        return self._generation
+
+
+class PartitionedWriter:
+    """
+    Writer for a PartitionedIndex, writing every document to the partition of its MTIME.
+
+    The writers of the partitions are opened when needed; usually only the partition
+    of the current period is written to. update_document() only replaces documents in
+    the partition of the MTIME, a document moving to another partition (its MTIME was
+    changed) must be deleted first (see IndexingMiddleware._remove_moved).
+    """
+
+    def __init__(self, index: PartitionedIndex, async_: bool = False, **kw) -> None:
+        """
+        :param async_: use an AsyncWriter for every partition
+        :param kw: arguments for the writers of the partitions
+        """
+        self.index = index
+        self.async_ = async_
+        self.writerargs = kw
+        self.writers: dict[str, Any] = {}
+
+    def _writer(self, key: str):
+        writer = self.writers.get(key)
+        if writer is None:
+            if key != self.index.current_key():
+                logging.debug(f"writing to past index partition {self.index.partition_name(key)}")
+            partition_index = self.index.partition_index(key)
+            if self.async_:
+                writer = AsyncWriter(partition_index, writerargs=self.writerargs)
+            else:
+                writer = partition_index.writer(**self.writerargs)
+            self.writers[key] = writer
+        return writer
+
+    def _containing(self, fieldname: str, text) -> list[str]:
+        """
+        Return the keys of the partitions having the term.
+        """
+        keys = []
+        for key in self.index.partitions():
+            with self.index.partition_index(key).reader() as reader:
+                if (fieldname, self.index.schema[fieldname].to_bytes(text)) in reader:
+                    keys.append(key)
+        return keys
+
+    def add_document(self, **fields) -> None:
+        self._writer(self.index.location(fields)).add_document(**fields)
+
+    def update_document(self, **fields) -> None:
+        self._writer(self.index.location(fields)).update_document(**fields)
+
+    def delete_by_term(self, fieldname: str, text) -> None:
+        for key in self._containing(fieldname, text):
+            self._writer(key).delete_by_term(fieldname, text)
+
+    def delete_by_query(self, q) -> None:
+        for key in self.index.partitions_for(q):
+            self._writer(key).delete_by_query(q)
+
+    def commit(self, **kw) -> None:
+        for writer in self.writers.values():
+            writer.commit(**kw)
+        self.writers = {}
+
+    def cancel(self) -> None:
+        for writer in self.writers.values():
+            writer.cancel()
+        self.writers = {}
+
+    def __enter__(self) -> PartitionedWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type:
+            self.cancel()
+        else:
+            self.commit()
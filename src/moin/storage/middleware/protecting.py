@@ -528,6 +528,15 @@ class ProtectedRevision:
         self.require(READ, PUBREAD)
         return self.rev.data
 
+    def local_path(self) -> str | None:
+        self.require(READ, PUBREAD)
+        return self.rev.local_path()
+
+    def delta_opcodes(self, oldrev: ProtectedRevision) -> list | None:
+        self.require(READ, PUBREAD)
+        oldrev.require(READ, PUBREAD)
+        return self.rev.delta_opcodes(oldrev.rev)
+
     def close(self):
         self.rev.close()
 
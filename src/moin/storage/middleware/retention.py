@@ -0,0 +1,273 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - revision retention policies.
+
+The revision_retention configuration maps namespaces (None: all other namespaces)
+to rules deciding which revisions of the items in the namespace are kept:
+
+* keep_last: keep the newest N revisions
+* keep_days: keep the revisions newer than D days
+* thin: of the other revisions, keep the newest one per "day" or "week" (UTC)
+
+The latest revision of an item is always kept. A rule without any of these keys
+only keeps the latest revisions (e.g. for the userprofiles namespace, where every
+login saves a revision).
+
+The RevisionRetention applies the rules (moin maint-retention or periodically in a
+background thread of the wiki server): it reads the revisions from the ALL_REVS
+index, destroys the revisions not kept in batches (one index commit per batch,
+so the index write lock is only held shortly) and links the kept revisions to
+their new parent revisions (also those whose parent an interrupted run destroyed).
+"""
+
+from __future__ import annotations
+
+from typing import Any, NamedTuple, TYPE_CHECKING
+
+import threading
+import time
+
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from moin import log
+from moin.constants.keys import ALL_REVS, BACKENDNAME, DATAID, ITEMID, MTIME, NAMESPACE, PARENTID, REVID
+from moin.storage.middleware.journal import JOURNAL_INDEX, JOURNAL_REMOVE
+
+if TYPE_CHECKING:
+    from flask import Flask
+    from moin.config import RevisionRetentionRules
+    from moin.storage.middleware.indexing import IndexingMiddleware
+
+logging = log.getLogger(__name__)
+
+RETENTION_DAILY = "daily"
+RETENTION_WEEKLY = "weekly"
+RETENTION_KEYS = ("keep_last", "keep_days", "thin")
+
+RETENTION_BATCH_SIZE = 100  # revisions destroyed per index commit
+# lock file (in the index directory) of the one wiki server process applying the rules periodically
+RETENTION_LOCK = "retention.lock"
+
+
+def check_revision_retention(revision_retention: RevisionRetentionRules) -> None:
+    """
+    Raise ValueError if the revision_retention configuration has an invalid rule.
+    """
+    for namespace, rule in revision_retention.items():
+        unknown = set(rule) - set(RETENTION_KEYS)
+        if unknown:
+            raise ValueError(f"revision_retention rule of {namespace!r}: unknown keys {sorted(unknown)}")
+        for key in ("keep_last", "keep_days"):
+            value = rule.get(key)
+            if value is not None and not (isinstance(value, (int, float)) and value > 0):
+                raise ValueError(f"revision_retention rule of {namespace!r}: {key} must be a positive number")
+        if rule.get("thin") not in (None, RETENTION_DAILY, RETENTION_WEEKLY):
+            raise ValueError(
+                f"revision_retention rule of {namespace!r}: thin must be None, {RETENTION_DAILY!r} "
+                f"or {RETENTION_WEEKLY!r}"
+            )
+
+
+class RevInfo(NamedTuple):
+    revid: str
+    mtime: float  # UNIX timestamp
+    parentid: str | None
+    dataid: str | None
+    backend_name: str
+
+
+def _bucket(mtime: float, thin: str) -> int:
+    day = int(mtime // 86400)
+    return day if thin == RETENTION_DAILY else (day + 3) // 7  # weeks start on Monday (day 0 was a Thursday)
+
+
+def select_revisions(revisions: list[RevInfo], rule: dict[str, Any], now: float) -> tuple[list[RevInfo], list[RevInfo]]:
+    """
+    Apply a rule to the revisions of an item.
+
+    :returns: revisions kept (oldest first), revisions to destroy
+    """
+    keep_last, keep_days, thin = rule.get("keep_last"), rule.get("keep_days"), rule.get("thin")
+    kept, destroyed = [], []
+    buckets = set()
+    for number, rev in enumerate(sorted(revisions, key=lambda rev: rev.mtime, reverse=True)):
+        keep = (
+            number == 0
+            or (keep_last is not None and number < keep_last)
+            or (keep_days is not None and now - rev.mtime < keep_days * 86400)
+            or (thin is not None and _bucket(rev.mtime, thin) not in buckets)
+        )
+        if keep:
+            kept.append(rev)
+            if thin is not None:
+                buckets.add(_bucket(rev.mtime, thin))
+        else:
+            destroyed.append(rev)
+    kept.reverse()
+    return kept, destroyed
+
+
+class RetentionReport(NamedTuple):
+    namespace: str | None  # None: all namespaces with the default rule
+    items: int  # items with revisions destroyed
+    destroyed: int  # revisions destroyed (to destroy, for a dry run)
+    relinked: int  # revisions linked to a new parent revision
+    seconds: float
+
+
+class RevisionRetention:
+    """
+    Apply the revision retention rules (once or periodically in a background thread).
+    """
+
+    def __init__(
+        self,
+        app: Flask,
+        indexer: IndexingMiddleware,
+        rules: RevisionRetentionRules,
+        interval: float = 24 * 3600,
+        batch_size: int = RETENTION_BATCH_SIZE,
+    ) -> None:
+        """
+        :param interval: seconds between the runs of the background thread
+        :param batch_size: revisions destroyed per index commit
+        """
+        self.app = app
+        self.indexer = indexer
+        self.rules = rules
+        self.interval = interval
+        self.batch_size = batch_size
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def _revisions(self, namespace: str | None) -> dict[tuple[str, str], list[RevInfo]]:
+        """
+        Return the revisions of the items of a namespace (None: all namespaces) by (namespace, itemid).
+        """
+        kw = {} if namespace is None else {NAMESPACE: namespace}
+        items = defaultdict(list)
+        for doc in self.indexer._documents(idx_name=ALL_REVS, **kw):
+            mtime = doc[MTIME].replace(tzinfo=timezone.utc).timestamp() if isinstance(doc[MTIME], datetime) else 0
+            rev = RevInfo(doc[REVID], mtime, doc.get(PARENTID), doc.get(DATAID), doc[BACKENDNAME])
+            items[doc[NAMESPACE], doc[ITEMID]].append(rev)
+        return items
+
+    def apply(self, namespace: str | None, dry_run: bool = False) -> RetentionReport:
+        """
+        Apply the rule of a namespace (None: the default rule to the namespaces without a rule).
+        """
+        started = time.time()
+        destroy: list[RevInfo] = []
+        relink: list[tuple[RevInfo, str | None]] = []  # (revision, new parent)
+        items = 0
+        for (item_namespace, itemid), revisions in self._revisions(namespace).items():
+            if namespace is None and item_namespace in self.rules:
+                continue  # has its own rule
+            kept, destroyed = select_revisions(revisions, self.rules[namespace], started)
+            if destroyed:
+                items += 1
+                destroy += destroyed
+            # the parent revision is destroyed now or was destroyed by an interrupted run
+            kept_revids = {rev.revid for rev in kept}
+            parent = None
+            for rev in kept:
+                if rev.parentid is not None and rev.parentid not in kept_revids:
+                    relink.append((rev, parent))
+                parent = rev.revid
+        if not dry_run:
+            for start in range(0, len(destroy), self.batch_size):
+                self._destroy(destroy[start : start + self.batch_size])
+            for rev, parentid in relink:
+                self._relink(rev, parentid)
+        return RetentionReport(namespace, items, len(destroy), len(relink), time.time() - started)
+
+    def _destroy(self, revisions: list[RevInfo]) -> None:
+        """
+        Destroy a batch of revisions: remove them from the backend, then from the index (one commit).
+        """
+        # the data of a revision is destroyed with the last revision referencing it
+        batch_refs = Counter(rev.dataid for rev in revisions)
+        with self.indexer.ix[ALL_REVS].searcher() as searcher:
+            refcounts = {dataid: len(list(searcher.document_numbers(**{DATAID: dataid}))) for dataid in batch_refs}
+        journal = self.indexer.journal
+        entries = []
+        removed: Counter[str | None] = Counter()
+        for rev in revisions:
+            if journal is not None:
+                entries.append(journal.begin(JOURNAL_REMOVE, rev.backend_name, rev.revid))
+            removed[rev.dataid] += 1
+            destroy_data = removed[rev.dataid] == batch_refs[rev.dataid] == refcounts[rev.dataid]
+            try:
+                self.indexer.backend.remove(rev.backend_name, rev.revid, destroy_data=destroy_data)
+            except KeyError:
+                pass  # destroyed meanwhile
+        self.indexer.remove_revisions([rev.revid for rev in revisions])
+        for entry in entries:
+            journal.complete(entry)
+
+    def _relink(self, rev: RevInfo, parentid: str | None) -> None:
+        """
+        Link a kept revision to its new parent revision (the previous kept one), only its metadata is changed.
+        """
+        journal = self.indexer.journal
+        if journal is not None:
+            entry = journal.begin(JOURNAL_INDEX, rev.backend_name, rev.revid)
+        self.indexer.backend.update_meta(rev.backend_name, rev.revid, {PARENTID: parentid})
+        self.indexer.reindex_meta(rev.backend_name, [rev.revid])
+        if journal is not None:
+            journal.complete(entry)
+
+    def run_once(self, dry_run: bool = False) -> list[RetentionReport]:
+        """
+        Apply all rules (the default rule last).
+        """
+        reports = []
+        for namespace in sorted(self.rules, key=lambda namespace: namespace is None):
+            report = self.apply(namespace, dry_run=dry_run)
+            reports.append(report)
+            if report.destroyed or report.relinked:
+                logging.info(
+                    f"revision retention {'(dry run) ' if dry_run else ''}of namespace "
+                    f"{'*' if namespace is None else repr(namespace)}: {report.destroyed} revisions of "
+                    f"{report.items} items destroyed, {report.relinked} relinked in {report.seconds:.1f}s"
+                )
+        return reports
+
+    def run(self) -> None:
+        """
+        Apply the rules every interval seconds until stopped.
+
+        Only one process (e.g. of the WSGI workers of the wiki server) applies the rules,
+        it holds the retention lock until it stops, the others take over if it dies.
+        """
+        lock = self.indexer.get_storage().lock(RETENTION_LOCK)
+        locked = False
+        try:
+            while not self.stopped.wait(self.interval):
+                if not locked:
+                    locked = lock.acquire(blocking=False)
+                    if not locked:
+                        continue
+                try:
+                    # a new app context per run, so no searchers are cached across runs
+                    with self.app.app_context():
+                        self.run_once()
+                except Exception as err:  # keep running, the next run may succeed
+                    logging.exception(f"revision retention failed: {err}")
+        finally:
+            if locked:
+                lock.release()
+
+    def start(self) -> RevisionRetention:
+        self.thread = threading.Thread(target=self.run, name="moin-revision-retention", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
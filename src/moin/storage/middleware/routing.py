@@ -11,9 +11,10 @@ Route requests to different backends depending on the namespace.
 from __future__ import annotations
 
 from moin.constants.keys import NAME, BACKENDNAME, NAMESPACE
+from moin.storage.stores import RETRIEVE_BATCH_SIZE, batches
 from moin.storage.types import ItemData, MetaData
 
-from typing import Iterator, TYPE_CHECKING
+from typing import Iterable, Iterator, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from moin.config import BackendMapping, NamespaceMapping
@@ -75,6 +76,16 @@ class Backend:
         for backend in self.backends.values():
             backend.close()
 
+    def begin_batch(self):
+        for backend in self.backends.values():
+            if not backend.read_only:
+                backend.begin_batch()
+
+    def commit_batch(self):
+        for backend in self.backends.values():
+            if not backend.read_only:
+                backend.commit_batch()
+
     def _get_backend(self, fq_names: list[str]) -> tuple[str, list[str], str]:
         """
         For a given fully qualified item name (e.g., "ns:itemname"),
@@ -103,6 +114,38 @@ class Backend:
         meta, data = backend.retrieve(revid)
         return meta, data
 
+    def retrieve_many(self, revids: Iterable[tuple[str, str]]) -> Iterator[tuple[tuple[str, str], MetaData, ItemData]]:
+        """
+        Yield ((backend_name, revid), meta, data) for the given (backend_name, revid) tuples.
+
+        The revisions are retrieved in batches, by the retrieve_many method of the backends;
+        the revisions of a batch are yielded grouped by backend. Revisions not in the backends
+        are skipped.
+        """
+        for batch in batches(revids, RETRIEVE_BATCH_SIZE):
+            backend_revids: dict[str, list[str]] = {}
+            for backend_name, revid in batch:
+                backend_revids.setdefault(backend_name, []).append(revid)
+            for backend_name, backend_batch in backend_revids.items():
+                for revid, meta, data in self.backends[backend_name].retrieve_many(backend_batch):
+                    yield (backend_name, revid), meta, data
+
+    def local_path(self, backend_name: str, revid: str) -> str | None:
+        """
+        Return the filesystem path of the data of a revision if the backend keeps it
+        in a plain file (see the fs store), else None.
+        """
+        local_path = getattr(self.backends[backend_name], "local_path", None)
+        return None if local_path is None else local_path(revid)
+
+    def delta_opcodes(self, backend_name: str, old_dataid: str, new_dataid: str) -> list | None:
+        """
+        Return the opcodes of the lines changed from the old to the new data if the backend
+        stores the new data as a delta against the old data (see the delta backend), else None.
+        """
+        delta_opcodes = getattr(self.backends[backend_name], "delta_opcodes", None)
+        return None if delta_opcodes is None else delta_opcodes(old_dataid, new_dataid)
+
     # writing part
     def create(self):
         for backend in self.backends.values():
@@ -114,7 +157,10 @@ class Backend:
             if not backend.read_only:
                 backend.destroy()
 
-    def store(self, meta, data) -> tuple[str, str]:
+    def store_backend_name(self, meta) -> str:
+        """
+        Return the name of the backend a revision with this metadata is stored in.
+        """
         namespace = meta.get(NAMESPACE)
         if namespace is None:
             # if there is no NAMESPACE in metadata, we assume that the NAME
@@ -132,6 +178,10 @@ class Backend:
             if namespace:
                 namespace += ":"  # needed for _get_backend
             backend_name, _, _ = self._get_backend([namespace])
+        return backend_name
+
+    def store(self, meta, data) -> tuple[str, str]:
+        backend_name = self.store_backend_name(meta)
         backend = self.backends[backend_name]
 
         revid = backend.store(meta, data)
@@ -144,3 +194,17 @@ class Backend:
     def remove(self, backend_name, revid, destroy_data):
         backend = self.backends[backend_name]
         backend.remove(revid, destroy_data)
+
+    def update_meta(self, backend_name: str, revid: str, meta_update: dict) -> MetaData:
+        """
+        Update the metadata of a stored revision (None values remove the keys), keeping its data.
+        """
+        backend = self.backends[backend_name]
+        meta = backend._get_meta(revid)
+        for key, value in meta_update.items():
+            if value is None:
+                meta.pop(key, None)
+            else:
+                meta[key] = value
+        backend._store_meta(meta)
+        return meta
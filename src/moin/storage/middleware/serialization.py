@@ -23,6 +23,7 @@ from werkzeug.wsgi import LimitedStream
 from moin.constants.keys import NAME, ITEMTYPE, SIZE, NAMESPACE, REVID, ITEMID, REV_NUMBER, HASH_ALGORITHM
 from moin.constants.itemtypes import ITEMTYPE_DEFAULT, ITEMTYPE_USERPROFILE
 from moin.constants.namespaces import NAMESPACE_USERPROFILES
+from moin.storage.backends import WRITE_BATCH_SIZE, WriteBatch
 from moin.storage.backends.stores import Backend
 from moin.storage.backends._util import TrackingFileWrapper
 
@@ -72,17 +73,12 @@ def correcting_rev_iter(backend: Backend):
         data: the item data
         issues: list of strings describing issues that were corrected
     """
-    for revid in backend:
+    # the router middleware gives (backend_name, revid) tuples, lower level backends simple revids,
+    # both retrieve them in batches
+    for revid, meta, data in backend.retrieve_many(backend):
 
         issues: list[str] = []
 
-        if isinstance(revid, tuple):
-            # router middleware gives tuples and wants both values for retrieve:
-            meta, data = backend.retrieve(*revid)
-        else:
-            # lower level backends have simple revids
-            meta, data = backend.retrieve(revid)
-
         if REV_NUMBER not in meta:
             issues.append(f"{REV_NUMBER}_error {get_rev_str(meta)}: missing revision number")
             meta[REV_NUMBER] = -1
@@ -125,44 +121,47 @@ def serialize_iter(backend):
         logging.warning("metadata issues exist! maint-validate-metadata followed by index rebuild is recommended")
 
 
-def deserialize(src, backend, new_ns=None, old_ns=None, kill_ns=None):
+def deserialize(src, backend, new_ns=None, old_ns=None, kill_ns=None, batch_size=WRITE_BATCH_SIZE):
     """
     Normal usage is to restore an empty wiki with data from a backup.
 
     If new_ns and old_ns are passed, then all items in the old_ns are renamed into the new_ns.
     If kill_ns is passed, then all items in that namespace are not loaded.
+    The revisions are stored in batches of batch_size revisions (see WriteBatch).
     """
     assert bool(new_ns is None) == bool(old_ns is None), "new_ns and old_ns are co-dependent options"
-    while True:
-        meta_size_bytes = src.read(4)
-        if not len(meta_size_bytes):
-            return  # end of file
-        meta_size = struct.unpack("!i", meta_size_bytes)[0]
-        if not meta_size:
-            continue  # end of store
-        meta_str = src.read(meta_size)
-        text = meta_str.decode("utf-8")
-        meta = json.loads(text)
-        name = meta.get(NAME)
-        if isinstance(name, str):
-            # if we encounter single names, make a list of names:
-            meta[NAME] = [name]
-        if ITEMTYPE not in meta:
-            # temporary hack to upgrade serialized item files:
-            meta[ITEMTYPE] = ITEMTYPE_DEFAULT
-        data_size = meta[SIZE]
-        curr_pos = src.tell()
-        limited = LimitedStream(src, data_size)
-
-        if kill_ns and kill_ns == meta[NAMESPACE]:
-            continue
-        if new_ns is not None and old_ns == meta[NAMESPACE]:
-            meta[NAMESPACE] = new_ns
-
-        backend.store(meta, limited)
-        if not limited.is_exhausted:
-            # if we already have the DATAID in the backend, the backend code
-            # does not read from the limited stream:
-            assert limited._pos == 0
-            # but we must seek to get forward to the next item:
-            src.seek(curr_pos + data_size)
+    with WriteBatch(backend, batch_size) as batch:
+        while True:
+            meta_size_bytes = src.read(4)
+            if not len(meta_size_bytes):
+                return  # end of file
+            meta_size = struct.unpack("!i", meta_size_bytes)[0]
+            if not meta_size:
+                continue  # end of store
+            meta_str = src.read(meta_size)
+            text = meta_str.decode("utf-8")
+            meta = json.loads(text)
+            name = meta.get(NAME)
+            if isinstance(name, str):
+                # if we encounter single names, make a list of names:
+                meta[NAME] = [name]
+            if ITEMTYPE not in meta:
+                # temporary hack to upgrade serialized item files:
+                meta[ITEMTYPE] = ITEMTYPE_DEFAULT
+            data_size = meta[SIZE]
+            curr_pos = src.tell()
+            limited = LimitedStream(src, data_size)
+
+            if kill_ns and kill_ns == meta[NAMESPACE]:
+                continue
+            if new_ns is not None and old_ns == meta[NAMESPACE]:
+                meta[NAMESPACE] = new_ns
+
+            backend.store(meta, limited)
+            if not limited.is_exhausted:
+                # if we already have the DATAID in the backend, the backend code
+                # does not read from the limited stream:
+                assert limited._pos == 0
+                # but we must seek to get forward to the next item:
+                src.seek(curr_pos + data_size)
+            batch.stored()
@@ -0,0 +1,335 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - namespace-sharded whoosh indexes.
+
+By default, all namespaces share the indexes. Optionally, namespaces are mapped
+to index shards: every shard has its own set of indexes, so heavy writing in one
+namespace (e.g. user profiles being saved at every login) does not cause segment
+merges in (or new readers for) the indexes of the other namespaces.
+
+A ShardedIndex provides the part of the whoosh index API moin uses, writes go
+to the shard of the document NAMESPACE, searching is federated over the shards
+(a whoosh MultiReader), optionally limited to the shards a query (NAMESPACE
+terms) needs.
+"""
+
+from __future__ import annotations
+
+from typing import Any, TYPE_CHECKING
+
+import json
+import re
+
+from collections.abc import Sequence
+
+from whoosh.query import And, Not, Or, Term
+from whoosh.reading import MultiReader
+from whoosh.searching import Searcher
+from whoosh.writing import AsyncWriter
+
+from moin import log
+from moin.constants.keys import NAMESPACE
+from moin.storage.middleware.partitioning import GenerationEmptyReader, PartitionedIndex
+
+if TYPE_CHECKING:
+    from whoosh.fields import Schema
+    from whoosh.filedb.filestore import Storage
+
+logging = log.getLogger(__name__)
+
+# the shard of all namespaces not mapped to another shard, it uses the unprefixed index names
+DEFAULT_SHARD = ""
+SHARD_NAME_RE = re.compile(r"[a-z0-9]+")
+
+# file in the index storage recording the namespace -> shard mapping the indexes were created with
+SHARDS_FILE = "index_shards"
+
+
+def check_shards(shards: dict[str, str]) -> None:
+    """
+    Raise ValueError if the namespace -> shard mapping is invalid.
+    """
+    for namespace, shard in shards.items():
+        if not isinstance(namespace, str) or not isinstance(shard, str) or not SHARD_NAME_RE.fullmatch(shard):
+            raise ValueError(
+                f"index shards must map namespaces to shard names made of a-z and 0-9, not {namespace!r}: {shard!r}"
+            )
+
+
+def shard_names(shards: dict[str, str]) -> list[str]:
+    """
+    Return the names of all shards, the default shard first.
+    """
+    return [DEFAULT_SHARD] + sorted(set(shards.values()))
+
+
+def shard_index_name(shard: str, indexname: str) -> str:
+    """
+    Return the name of the whoosh index of a shard.
+
+    The prefix keeps the index files of a shard apart from the ones of the default shard
+    (whoosh removes all TOC files starting with the index name when creating an index).
+    """
+    return indexname if shard == DEFAULT_SHARD else f"{shard}__{indexname}"
+
+
+def stored_shards(storage: Storage) -> dict[str, str]:
+    """
+    Return the namespace -> shard mapping the indexes were created with.
+    """
+    if not storage.file_exists(SHARDS_FILE):
+        return {}
+    with storage.open_file(SHARDS_FILE) as f:
+        return json.loads(f.read().decode())
+
+
+def store_shards(storage: Storage, shards: dict[str, str]) -> None:
+    if shards:
+        with storage.create_file(SHARDS_FILE) as f:
+            f.write(json.dumps(shards, sort_keys=True).encode())
+    elif storage.file_exists(SHARDS_FILE):
+        storage.delete_file(SHARDS_FILE)
+
+
+def namespace_span(q) -> tuple[set[str] | None, set[str]]:
+    """
+    Return the namespaces a query can match (None: any) and the ones it excludes.
+
+    Only NAMESPACE terms, alone, negated, or-ed together or within an And, restrict the namespaces.
+    """
+    if isinstance(q, Term) and q.fieldname == NAMESPACE:
+        return {q.text}, set()
+    if isinstance(q, Or) and q.subqueries:
+        if all(isinstance(sub, Term) and sub.fieldname == NAMESPACE for sub in q.subqueries):
+            return {sub.text for sub in q.subqueries}, set()
+    if isinstance(q, Not) and isinstance(q.query, Term) and q.query.fieldname == NAMESPACE:
+        return None, {q.query.text}
+    included, excluded = None, set()
+    if isinstance(q, And):
+        for subquery in q.subqueries:
+            sub_included, sub_excluded = namespace_span(subquery)
+            if sub_included is not None:
+                included = sub_included if included is None else included & sub_included
+            excluded |= sub_excluded
+    return included, excluded
+
+
+def _writer(index, async_: bool, **kw):
+    """
+    Return a writer for a (maybe partitioned) index of a shard.
+    """
+    if isinstance(index, PartitionedIndex):
+        return index.writer(async_=async_, **kw)
+    if async_:
+        return AsyncWriter(index, writerargs=kw)
+    return index.writer(**kw)
+
+
+class ShardedIndex:
+    """
+    A whoosh index split by NAMESPACE into shards (one whoosh index or PartitionedIndex per shard).
+    """
+
+    def __init__(self, indexes: dict[str, Any], shards: dict[str, str], schema: Schema) -> None:
+        """
+        :param indexes: shard name -> open index of the shard
+        :param shards: namespace -> shard name, other namespaces are in the DEFAULT_SHARD
+        """
+        self.indexes = indexes
+        self.shards = shards
+        self.schema = schema
+
+    def shard_for(self, namespace: str) -> str:
+        return self.shards.get(namespace, DEFAULT_SHARD)
+
+    def location(self, fields: dict[str, Any]) -> tuple[str, str | None]:
+        """
+        Return the shard (and partition) a document with these fields is written to.
+        """
+        name = self.shard_for(fields.get(NAMESPACE, ""))
+        index = self.indexes[name]
+        return name, index.location(fields) if isinstance(index, PartitionedIndex) else None
+
+    def other_indexes(self, fields: dict[str, Any]) -> list:
+        """
+        Return the whoosh indexes of the shards (and partitions) a document with these fields is not written to.
+        """
+        name = self.shard_for(fields.get(NAMESPACE, ""))
+        indexes = []
+        for other, index in self.indexes.items():
+            if isinstance(index, PartitionedIndex):
+                if other == name:
+                    indexes += index.other_indexes(fields)
+                else:
+                    indexes += [index.partition_index(key) for key in index.partitions()]
+            elif other != name:
+                indexes.append(index)
+        return indexes
+
+    def shards_for(self, q=None) -> list[str]:
+        """
+        Return the names of the shards that may have documents matching the query.
+        """
+        names = list(self.indexes)
+        if q is None:
+            return names
+        included, excluded = namespace_span(q)
+        if included is not None:
+            needed = {self.shard_for(namespace) for namespace in included - excluded}
+            return [name for name in names if name in needed]
+        # a shard can be skipped if the query excludes all its namespaces
+        excluded_shards = {
+            name
+            for name in names
+            if name != DEFAULT_SHARD
+            and all(namespace in excluded for namespace, shard in self.shards.items() if shard == name)
+        }
+        return [name for name in names if name not in excluded_shards]
+
+    def select(self, q, newest_limit: int | None = None) -> tuple[tuple[str, Any], ...] | None:
+        """
+        Return the shards (with their partitions) needed for a search, None if all are needed.
+
+        :param newest_limit: the limit of a search returning the newest revisions first
+        """
+        selection = []
+        for name in self.shards_for(q):
+            index = self.indexes[name]
+            keys = index.select(q, newest_limit) if isinstance(index, PartitionedIndex) else None
+            selection.append((name, keys))
+        if len(selection) == len(self.indexes) and all(keys is None for _, keys in selection):
+            return None
+        return tuple(selection)
+
+    def latest_generation(self) -> tuple:
+        return tuple((name, index.latest_generation()) for name, index in self.indexes.items())
+
+    def up_to_date(self) -> bool:
+        return all(index.up_to_date() for index in self.indexes.values())
+
+    def doc_count(self) -> int:
+        return sum(index.doc_count() for index in self.indexes.values())
+
+    def doc_count_all(self) -> int:
+        return sum(index.doc_count_all() for index in self.indexes.values())
+
+    def reader(self, selection: Sequence[tuple[str, Any]] | None = None, reuse=None):
+        """
+        Return a reader of the given shards (default: all).
+
+        Its generation is the one of the whole index (see latest_generation), so a searcher
+        using it is up to date (and refresh() keeps it) until any shard changes.
+        """
+        if selection is None:
+            selection = [(name, None) for name in self.indexes]
+        generation = self.latest_generation()
+        # federate the segment readers (whoosh searchers and collectors only handle a flat MultiReader)
+        readers = []
+        for name, keys in selection:
+            index = self.indexes[name]
+            reader = index.reader() if keys is None else index.reader(keys)
+            readers.extend(leaf for leaf, _ in reader.leaf_readers() if leaf.doc_count_all())
+        if not readers:
+            return GenerationEmptyReader(self.schema, generation)
+        return MultiReader(readers, generation=generation)
+
+    def searcher(self, selection: Sequence[tuple[str, Any]] | None = None, **kw) -> Searcher:
+        """
+        Return a searcher federating the given shards (default: all).
+        """
+        return Searcher(self.reader(selection), fromindex=self, **kw)
+
+    def writer(self, async_: bool = False, **kw) -> ShardedWriter:
+        return ShardedWriter(self, async_=async_, **kw)
+
+    def optimize(self) -> None:
+        for name, index in self.indexes.items():
+            logging.info(f"optimizing index shard {name or '(default)'}")
+            index.optimize()
+
+    def freeze(self) -> None:
+        """
+        Optimize the past partitions of partitioned shards.
+        """
+        for index in self.indexes.values():
+            if isinstance(index, PartitionedIndex):
+                index.freeze()
+
+    def close(self) -> None:
+        for index in self.indexes.values():
+            index.close()
+        self.indexes = {}
+
+
+class ShardedWriter:
+    """
+    Writer for a ShardedIndex, writing every document to the shard of its NAMESPACE.
+
+    The writers of the shards are opened when needed, so writing documents of one
+    namespace leaves the indexes of other shards alone. update_document() only replaces
+    documents in the shard of the NAMESPACE, a document moving to another shard (e.g. an
+    item renamed to another namespace) must be deleted first (see IndexingMiddleware._remove_moved).
+    """
+
+    def __init__(self, index: ShardedIndex, async_: bool = False, **kw) -> None:
+        """
+        :param async_: use an AsyncWriter for every shard
+        :param kw: arguments for the writers of the shards
+        """
+        self.index = index
+        self.async_ = async_
+        self.writerargs = kw
+        self.writers: dict[str, Any] = {}
+
+    def _writer(self, name: str):
+        writer = self.writers.get(name)
+        if writer is None:
+            writer = self.writers[name] = _writer(self.index.indexes[name], self.async_, **self.writerargs)
+        return writer
+
+    def _containing(self, fieldname: str, text) -> list[str]:
+        """
+        Return the names of the shards having the term.
+        """
+        names = []
+        btext = self.index.schema[fieldname].to_bytes(text)
+        for name, index in self.index.indexes.items():
+            with index.reader() as reader:
+                if (fieldname, btext) in reader:
+                    names.append(name)
+        return names
+
+    def add_document(self, **fields) -> None:
+        self._writer(self.index.shard_for(fields.get(NAMESPACE, ""))).add_document(**fields)
+
+    def update_document(self, **fields) -> None:
+        self._writer(self.index.shard_for(fields.get(NAMESPACE, ""))).update_document(**fields)
+
+    def delete_by_term(self, fieldname: str, text) -> None:
+        for name in self._containing(fieldname, text):
+            self._writer(name).delete_by_term(fieldname, text)
+
+    def delete_by_query(self, q) -> None:
+        for name in self.index.shards_for(q):
+            self._writer(name).delete_by_query(q)
+
+    def commit(self, **kw) -> None:
+        for writer in self.writers.values():
+            writer.commit(**kw)
+        self.writers = {}
+
+    def cancel(self) -> None:
+        for writer in self.writers.values():
+            writer.cancel()
+        self.writers = {}
+
+    def __enter__(self) -> ShardedWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type:
+            self.cancel()
+        else:
+            self.commit()
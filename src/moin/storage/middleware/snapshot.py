@@ -0,0 +1,253 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - snapshots of the indexes.
+
+A snapshot is a tar archive of the index directory (the whoosh indexes and the
+indexed content store) taken while the indexes are write-locked, so the indexes
+in it are consistent with each other. Its manifest records a checksum of every
+file, the schema version, partitioning and shards of the indexes and the position
+of the indexes relative to the backend (number of revisions, newest MTIME and
+the position in the change feed, if there is one).
+
+Restoring a snapshot verifies the checksums before replacing the index directory,
+afterwards an index update catches up with the revisions stored (or destroyed)
+since the snapshot was taken, which is much faster than rebuilding the indexes.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import time
+
+from contextlib import contextmanager
+from io import BytesIO
+
+from whoosh.query import Every
+from whoosh.util.filelock import try_for
+
+from moin import log
+from moin.constants.keys import ALL_REVS, HASH_ALGORITHM, MTIME
+from moin.storage.error import StorageError
+from moin.storage.middleware.changefeed import stored_position
+from moin.storage.middleware.indexing import INDEX_SCHEMA_VERSION, INDEXES, IndexingMiddleware
+from moin.storage.middleware.merging import leaf_indexes
+from moin.storage.middleware.partitioning import PARTITION_CREATE_LOCK, PartitionedIndex
+from moin.storage.middleware.sharding import ShardedIndex, stored_shards
+
+logging = log.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_MANIFEST = "manifest.json"
+SNAPSHOT_INDEX_DIR = "index"  # directory of the index files within the archive
+
+# seconds to wait for the index writers to finish before taking a snapshot
+SNAPSHOT_LOCK_TIMEOUT = 60.0
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class SnapshotError(StorageError):
+    """
+    Raised if a snapshot can not be taken or is invalid.
+    """
+
+
+def _index_locks(index) -> list:
+    """
+    Return the locks keeping writers away from a (maybe sharded and/or partitioned) index.
+    """
+    if isinstance(index, ShardedIndex):
+        return [lock for shard_index in index.indexes.values() for lock in _index_locks(shard_index)]
+    locks = []
+    if isinstance(index, PartitionedIndex):
+        # no new partitions while taking the snapshot
+        locks.append(index.storage.lock(PARTITION_CREATE_LOCK.format(indexname=index.indexname)))
+    return locks + [ix.lock("WRITELOCK") for ix in leaf_indexes(index)]
+
+
+@contextmanager
+def _locked(indexes: list, timeout: float):
+    """
+    Hold the write locks of the indexes (and the partition create locks) while in the context.
+    """
+    locks = []
+    try:
+        for index in indexes:
+            for lock in _index_locks(index):
+                if not try_for(lock.acquire, timeout):
+                    raise SnapshotError(f"could not lock {lock.filename} within {timeout} s")
+                locks.append(lock)
+        yield
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+
+
+def _is_lock_file(filename: str) -> bool:
+    return filename.endswith("_WRITELOCK") or filename.endswith(PARTITION_CREATE_LOCK.format(indexname=""))
+
+
+def _index_files(index_dir: str) -> list[str]:
+    """
+    Return the paths (relative to index_dir, with / separators) of the files to snapshot.
+    """
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(index_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if _is_lock_file(filename):
+                continue
+            path = os.path.relpath(os.path.join(dirpath, filename), index_dir)
+            paths.append(path.replace(os.sep, "/"))
+    return paths
+
+
+def _checksum(f) -> str:
+    checksum = hashlib.new(HASH_ALGORITHM)
+    while chunk := f.read(CHUNK_SIZE):
+        checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def index_position(index) -> dict[str, Any]:
+    """
+    Return the position of an ALL_REVS index relative to the backend.
+    """
+    with index.searcher() as searcher:
+        revisions = searcher.doc_count()
+        mtime = None
+        if revisions:
+            newest = searcher.search(Every(), sortedby=MTIME, reverse=True, limit=1)
+            mtime = int(newest[0][MTIME].timestamp())
+    return {"revisions": revisions, "mtime": mtime}
+
+
+def _write_mode(path: str) -> str:
+    return "w:gz" if path.endswith((".tar.gz", ".tgz")) else "w"
+
+
+def create_snapshot(
+    indexer: IndexingMiddleware, path: str, tmp: bool = False, timeout: float = SNAPSHOT_LOCK_TIMEOUT
+) -> dict[str, Any]:
+    """
+    Write a snapshot of the indexes to a tar archive (gzip compressed if path ends with .tar.gz or .tgz).
+
+    The indexes are write-locked while the files are copied (saving items waits for it).
+
+    :returns: the manifest of the snapshot
+    """
+    kind, cls, params, kw = indexer.get_storage_params(tmp)
+    index_dir = params[0]
+    storage = indexer.get_storage(tmp)
+    partitioning = PartitionedIndex.stored_partitioning(storage, ALL_REVS)
+    shards = stored_shards(storage)
+    indexes = {name: indexer._open_index(storage, name, partitioning, shards) for name in INDEXES}
+    try:
+        with _locked(list(indexes.values()), timeout), tarfile.open(path, _write_mode(path)) as archive:
+            files = {}
+            for relpath in _index_files(index_dir):
+                filename = os.path.join(index_dir, *relpath.split("/"))
+                tarinfo = archive.gettarinfo(filename, f"{SNAPSHOT_INDEX_DIR}/{relpath}")
+                with open(filename, "rb") as f:
+                    archive.addfile(tarinfo, f)
+                    f.seek(0)
+                    files[relpath] = _checksum(f)
+            manifest = {
+                "format": SNAPSHOT_FORMAT,
+                "created": int(time.time()),
+                "schema_version": indexer.schema_version(tmp),
+                "partitioning": partitioning,
+                "shards": shards,
+                "position": dict(index_position(indexes[ALL_REVS]), changefeed=stored_position(storage)),
+                "checksum": HASH_ALGORITHM,
+                "files": files,
+            }
+            data = json.dumps(manifest, indent=1, sort_keys=True).encode()
+            tarinfo = tarfile.TarInfo(SNAPSHOT_MANIFEST)
+            tarinfo.size, tarinfo.mtime = len(data), manifest["created"]
+            archive.addfile(tarinfo, BytesIO(data))
+    finally:
+        for index in indexes.values():
+            index.close()
+    logging.info(f"index snapshot {path}: {len(files)} files, position {manifest['position']}")
+    return manifest
+
+
+def read_manifest(path: str) -> dict[str, Any]:
+    """
+    Return the manifest of a snapshot, raise SnapshotError if there is none or its format is unknown.
+    """
+    try:
+        with tarfile.open(path, "r:*") as archive:
+            f = archive.extractfile(SNAPSHOT_MANIFEST)
+            manifest = json.loads(f.read().decode())
+    except (OSError, KeyError, tarfile.TarError, ValueError) as err:
+        raise SnapshotError(f"{path} is not an index snapshot: {err}")
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"unknown index snapshot format {manifest.get('format')!r}")
+    return manifest
+
+
+def restore_snapshot(indexer: IndexingMiddleware, path: str, tmp: bool = False) -> dict[str, Any]:
+    """
+    Replace the indexes with the ones of a snapshot.
+
+    The files are extracted next to the index directory and their checksums verified,
+    the index directory is only replaced if all files are there and valid.
+
+    :returns: the manifest of the snapshot
+    """
+    manifest = read_manifest(path)
+    if manifest["schema_version"] != INDEX_SCHEMA_VERSION:
+        raise SnapshotError(
+            f"snapshot index schema version is {manifest['schema_version']}, but version {INDEX_SCHEMA_VERSION} "
+            "is required"
+        )
+    if manifest["partitioning"] != indexer.partitioning:
+        raise SnapshotError(
+            f"snapshot index partitioning is {manifest['partitioning']}, but {indexer.partitioning} is configured"
+        )
+    if manifest["shards"] != indexer.shards:
+        raise SnapshotError(f"snapshot index shards are {manifest['shards']}, but {indexer.shards} are configured")
+    kind, cls, params, kw = indexer.get_storage_params(tmp)
+    index_dir = params[0]
+    restore_dir = index_dir + ".restore"
+    if os.path.exists(restore_dir):
+        shutil.rmtree(restore_dir)
+    files = dict(manifest["files"])
+    prefix = f"{SNAPSHOT_INDEX_DIR}/"
+    try:
+        with tarfile.open(path, "r:*") as archive:
+            for tarinfo in archive:
+                if tarinfo.name == SNAPSHOT_MANIFEST:
+                    continue
+                relpath = tarinfo.name[len(prefix) :] if tarinfo.name.startswith(prefix) else None
+                if relpath not in files or not tarinfo.isfile():
+                    raise SnapshotError(f"unexpected snapshot member {tarinfo.name}")
+                parts = relpath.split("/")
+                if any(part in ("", ".", "..") for part in parts):
+                    raise SnapshotError(f"invalid snapshot member {tarinfo.name}")
+                filename = os.path.join(restore_dir, *parts)
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                with archive.extractfile(tarinfo) as src, open(filename, "w+b") as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                    dst.seek(0)
+                    if _checksum(dst) != files.pop(relpath):
+                        raise SnapshotError(f"checksum mismatch for snapshot member {tarinfo.name}")
+        if files:
+            raise SnapshotError(f"snapshot members missing: {', '.join(sorted(files))}")
+    except BaseException:
+        shutil.rmtree(restore_dir, ignore_errors=True)
+        raise
+    indexer.destroy(tmp)
+    os.rename(restore_dir, index_dir)
+    logging.info(f"index snapshot {path} restored, position {manifest['position']}")
+    return manifest
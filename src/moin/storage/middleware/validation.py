@@ -65,6 +65,18 @@ class UuidValidator(Validator):
 uuid_validator = UuidValidator()
 
 
+class DataidValidator(Validator):
+    """
+    Validate a dataid - a UUID value or the hash digest of the data (dedup backend).
+    """
+
+    def validate(self, element: Element, state: ValidationState) -> bool:
+        v = element.value
+        if isinstance(v, str) and len(v) == keys.HASH_LEN:
+            return HashValidator().validate(element, state)
+        return uuid_validator(element, state)
+
+
 class ItemidValidator(Validator):
     """
     Validate an itemid - a UUID value that identifies an item.
@@ -476,7 +488,7 @@ ContentMetaSchema = DuckDict.named("ContentMetaSchema").of(
     String.named(keys.USERID).validated_by(UseridValidator()),
     Integer.named(keys.SIZE).validated_by(SizeValidator()),
     String.named(keys.HASH_ALGORITHM).validated_by(HashValidator()),
-    String.named(keys.DATAID).validated_by(uuid_validator).using(optional=True),
+    String.named(keys.DATAID).validated_by(DataidValidator()).using(optional=True),
     # markup items may have this:
     List.named(keys.ITEMLINKS).of(String.named("itemlink").validated_by(ItemlinkValidator())).using(optional=True),
     List.named(keys.ITEMTRANSCLUSIONS)
@@ -11,14 +11,23 @@ you can likely implement it by adding very little and rather easy code.
 
 from __future__ import annotations
 
-from typing import BinaryIO, Iterator, TypeAlias, TypeVar
+from typing import BinaryIO, Iterable, Iterator, TypeAlias, TypeVar
 from typing_extensions import Self
 
 from abc import abstractmethod
 from collections.abc import MutableMapping
+from itertools import islice
 
 BinaryData = bytes | bytearray | memoryview
 
+RETRIEVE_BATCH_SIZE = 100  # values retrieved at once by retrieve_many
+
+
+def batches(iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
 
 _StoreValueT = TypeVar("_StoreValueT")
 
@@ -61,6 +70,21 @@ class StoreBase(MutableMapping[str, _StoreValueT]):
         Close the store; stop using it; free resources (except stored data).
         """
 
+    def begin_batch(self) -> None:
+        """
+        Begin a batch of writes: the store may group them (e.g. in one database
+        transaction) until commit_batch() is called.
+
+        Stores of the tables of one database share the transaction of a batch,
+        it is committed when all of them called commit_batch(). Batches nest: the
+        commit_batch() matching the outermost begin_batch() ends the batch.
+        """
+
+    def commit_batch(self) -> None:
+        """
+        Commit the writes of the batch and end it (a no-op if there is no batch).
+        """
+
     @abstractmethod
     def __iter__(self) -> Iterator[str]:
         """
@@ -77,6 +101,20 @@ class StoreBase(MutableMapping[str, _StoreValueT]):
         """
         raise KeyError
 
+    def retrieve_many(self, keys: Iterable[str]) -> Iterator[tuple[str, _StoreValueT]]:
+        """
+        Yield (key, value) for the given keys, in the order of the keys (a value for
+        every occurrence of a key). Keys not in the store are skipped.
+
+        Stores that can get many values at once (e.g. with one query) override this.
+        """
+        for key in keys:
+            try:
+                value = self[key]
+            except KeyError:
+                continue
+            yield key, value
+
     @abstractmethod
     def __setitem__(self, key: str, value: _StoreValueT) -> None:
         """
@@ -84,6 +122,15 @@ class StoreBase(MutableMapping[str, _StoreValueT]):
         """
         raise KeyError
 
+    def replace(self, key: str, value: _StoreValueT) -> None:
+        """
+        Store value under key, replacing an existing value.
+
+        Stores not overwriting values in __setitem__ (the database stores, except for
+        the userprofiles namespace) override this to replace the value atomically.
+        """
+        self[key] = value
+
     @abstractmethod
     def __delitem__(self, key: str) -> None:
         """
@@ -103,4 +150,7 @@ FileStoreBase: TypeAlias = StoreBase[BinaryIO]
 A store dealing with file-like objects.
 
 Note: The caller is responsible for closing the opened files.
+
+A FileStore keeping the values in plain files may also have a local_path(key)
+method returning the filesystem path of a value (see the fs store).
 """
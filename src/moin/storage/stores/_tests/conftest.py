@@ -10,12 +10,13 @@ from .wrappers import ByteToStreamWrappingStore
 
 STORES_PACKAGE = "moin.storage.stores"
 
-STORES = "fs memory sqlite sqlite:compressed sqla".split()
+STORES = "fs fs:fanout memory sqlite sqlite:compressed sqla".split()
 
 
 constructors = {
     "memory": lambda store, _: store(),
     "fs": lambda store, tmpdir: store(str(tmpdir.join("store"))),
+    "fs:fanout": lambda store, tmpdir: store(str(tmpdir.join("store")), fanout=2),
     "sqlite": lambda store, tmpdir: store(str(tmpdir.join("store.sqlite")), "test_table", compression_level=0),
     "sqlite:compressed": lambda store, tmpdir: store(
         str(tmpdir.join("store.sqlite")), "test_table", compression_level=1
@@ -78,13 +79,13 @@ def make_store(request, tmpdir):
 
 
 @pytest.fixture
-def bst(request):
-    return make_store(request)
+def bst(request, tmpdir):
+    return make_store(request, tmpdir)
 
 
 @pytest.fixture
-def fst(request):
-    return make_store(request)
+def fst(request, tmpdir):
+    return make_store(request, tmpdir)
 
 
 @pytest.fixture
@@ -43,6 +43,41 @@ def test_iter(store):
     assert result == kvs
 
 
+def test_retrieve_many(store):
+    keys = [f"key{i}" for i in range(250)]  # more than one batch
+    for key in keys:
+        store[key] = key.encode()
+    wanted = keys[::-1] + ["doesnotexist", keys[0]]
+    expected = [(key, key.encode()) for key in keys[::-1] + [keys[0]]]
+    assert list(store.retrieve_many(wanted)) == expected
+
+
+def test_batch(store):
+    store["deleted"] = b"value"
+    store.begin_batch()
+    for i in range(10):
+        store[f"key{i}"] = b"%d" % i
+    del store["deleted"]
+    assert store["key3"] == b"3"  # the writes of the batch are visible before the commit
+    assert sorted(store) == [f"key{i}" for i in range(10)]
+    store.commit_batch()
+    store.commit_batch()  # no batch
+    assert [store[f"key{i}"] for i in range(10)] == [b"%d" % i for i in range(10)]
+    with pytest.raises(KeyError):
+        store["deleted"]
+
+
+def test_replace(bst):
+    bst.replace("key", b"value")
+    bst.replace("key", b"new value")
+    assert bst["key"] == b"new value"
+    bst.begin_batch()
+    bst.replace("key", b"batch value")
+    bst.commit_batch()
+    assert bst["key"] == b"batch value"
+    assert list(bst) == ["key"]
+
+
 def test_len(store):
     assert len(store) == 0
     store["foo"] = b"bar"
@@ -6,6 +6,11 @@
 MoinMoin - FS store tests.
 """
 
+import hashlib
+import os
+
+from io import BytesIO
+
 import pytest
 
 from ..fs import BytesStore, FileStore
@@ -27,3 +32,120 @@ def test_create_and_destroy(tmpdir, Store):
 def test_from_uri(tmpdir, Store):
     store = Store.from_uri("%s" % tmpdir)
     assert store.path == tmpdir
+    assert store.fanout == 0
+    store = Store.from_uri("%s::2" % tmpdir)
+    assert store.path == tmpdir
+    assert store.fanout == 2
+
+
+def test_fanout(tmpdir):
+    store = BytesStore(str(tmpdir.join("store")), fanout=2)
+    store.create()
+    store.open()
+    store["key"] = b"value"
+    digest = hashlib.sha1(b"key").hexdigest()
+    assert tmpdir.join("store", digest[:2], digest[2:4], "key").read_binary() == b"value"
+    assert list(store) == ["key"]
+    # another instance (e.g. another process) uses the layout of the store, not its own fanout
+    other = BytesStore(str(tmpdir.join("store")))
+    other.open()
+    assert other["key"] == b"value"
+    del other["key"]
+    with pytest.raises(KeyError):
+        del store["key"]
+    assert list(store) == []
+
+
+def test_migrate(tmpdir):
+    store = BytesStore(str(tmpdir.join("store")))
+    store.create()
+    store.open()
+    keys = [f"key{i}" for i in range(20)]
+    for key in keys:
+        store[key] = key.encode()
+    other = BytesStore(str(tmpdir.join("store")))
+    other.open()
+    assert store.migrate(2) == 20
+    assert sorted(entry.basename for entry in tmpdir.join("store").listdir()) != sorted(keys)
+    # the other instance notices the migration
+    assert other["key1"] == b"key1"
+    other["new"] = b"new"
+    assert sorted(store) == sorted(keys + ["new"])
+    assert store.migrate(2) == 0
+    assert store.migrate(0) == 21
+    assert sorted(entry.basename for entry in tmpdir.join("store").listdir()) == sorted(keys + ["new"])
+    assert other["new"] == b"new"
+
+
+def test_migrate_resume(tmpdir):
+    store = BytesStore(str(tmpdir.join("store")))
+    store.create()
+    store.open()
+    store["moved"] = store["flat"] = b"value"
+    # interrupted after moving one value, the other is still in the old layout
+    store._write_layout(1, 0)
+    store._setitem("moved", BytesIO(b"value"))
+    assert sorted(store) == ["flat", "moved"]
+    assert store["flat"] == b"value"
+    with pytest.raises(ValueError):
+        store.migrate(2)
+    assert store.migrate(1) == 1
+    assert sorted(store) == ["flat", "moved"]
+    assert tmpdir.join("store").listdir(lambda path: path.isfile()) == [tmpdir.join("store", ".layout")]
+
+
+def test_migrate_concurrent(tmpdir, monkeypatch):
+    store = BytesStore(str(tmpdir.join("store")))
+    store.create()
+    store.open()
+    store["gone"] = store["written"] = store["kept"] = b"old"
+    monkeypatch.setattr(store, "_scan", lambda path, levels: iter(["gone", "written", "kept"]))
+    makedirs = os.makedirs
+
+    def race(path, **kw):
+        # other processes move a value and write another one again, while they are being moved
+        makedirs(path, **kw)
+        if os.path.exists(store._mkpath("gone", 0)):
+            os.remove(store._mkpath("gone", 0))
+        elif not os.path.exists(store._mkpath("written", 1)):
+            with open(store._mkpath("written", 1), "wb") as f:
+                f.write(b"new")
+
+    monkeypatch.setattr(os, "makedirs", race)
+    assert store.migrate(1) == 2
+    monkeypatch.undo()
+    assert sorted(store) == ["kept", "written"]
+    assert store["written"] == b"new"
+    assert store["kept"] == b"old"
+
+
+def test_migrate_back_late_write(tmpdir, monkeypatch):
+    store = BytesStore(str(tmpdir.join("store")), fanout=1)
+    store.create()
+    store.open()
+    store["key"] = b"value"
+    scan = store._scan
+
+    def late_scan(path, levels):
+        keys = list(scan(path, levels))
+        # a process still using the old layout writes another value
+        os.makedirs(os.path.dirname(store._mkpath("late", 1)), exist_ok=True)
+        with open(store._mkpath("late", 1), "wb") as f:
+            f.write(b"late")
+        return iter(keys)
+
+    monkeypatch.setattr(store, "_scan", late_scan)
+    assert store.migrate(0) == 2
+    assert sorted(entry.basename for entry in tmpdir.join("store").listdir()) == ["key", "late"]
+    assert store["late"] == b"late"
+
+
+@pytest.mark.parametrize("fanout", [0, 2])
+def test_local_path(tmpdir, fanout):
+    store = FileStore(str(tmpdir.join("store")), fanout=fanout)
+    store.create()
+    store.open()
+    store["key"] = BytesIO(b"value")
+    with open(store.local_path("key"), "rb") as f:
+        assert f.read() == b"value"
+    assert store.local_path("missing") is None
@@ -6,9 +6,15 @@
 MoinMoin - SQLA store tests.
 """
 
+import io
+
+from io import BytesIO
+
 import pytest
 
-from ..sqla import BytesStore, FileStore
+from sqlalchemy import func, select
+
+from ..sqla import BytesStore, FileStore, CHUNK_SIZE
 
 pytest.importorskip("moin.storage.stores.sqla")  # noqa
 
@@ -30,3 +36,91 @@ def test_from_uri(tmpdir, Store):
     store = Store.from_uri("sqlite://%s::test_base" % tmpdir)
     assert store.db_uri == "sqlite://%s" % tmpdir
     assert store.table_name == "test_base"
+
+
+def test_chunked_value(tmpdir):
+    store = FileStore(f"sqlite:///{tmpdir.join('store.sqlite')!s}")
+    store.create()
+    store.open()
+    value = bytes(range(256)) * (3 * CHUNK_SIZE // 256) + b"tail"
+    store["key"] = BytesIO(value)
+    with store.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(store.chunks)).scalar() == 4
+    f = store["key"]
+    assert f.read(10) == value[:10]
+    f.seek(CHUNK_SIZE * 2 - 3)
+    assert f.read(6) == value[CHUNK_SIZE * 2 - 3 : CHUNK_SIZE * 2 + 3]
+    f.seek(-4, io.SEEK_END)
+    assert f.read() == b"tail"
+    f.seek(0)
+    assert f.read() == value
+    f.close()
+    del store["key"]
+    with store.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(store.chunks)).scalar() == 0
+    store.close()
+
+
+def test_unchunked_value(tmpdir):
+    store = FileStore(f"sqlite:///{tmpdir.join('store.sqlite')!s}")
+    store.create()
+    store.open()
+    # values stored by older versions are in the main table
+    with store.engine.connect() as conn:
+        with conn.begin():
+            conn.execute(store.table.insert().values(key="old", value=b"old value"))
+    assert store["old"].read() == b"old value"
+    store["new"] = BytesIO(b"")
+    assert store["new"].read() == b""
+    assert sorted(store) == ["new", "old"]
+    store.close()
+
+
+def test_batch_shared_db(tmpdir):
+    uri = f"sqlite:///{tmpdir.join('store.sqlite')!s}"
+    meta, data = BytesStore(uri, "meta"), FileStore(uri, "data")
+    for store in meta, data:
+        store.create()
+        store.open()
+    assert meta.engine is data.engine
+    meta.begin_batch()
+    data.begin_batch()
+    meta["key"] = b"meta"
+    data["key"] = BytesIO(b"x" * (CHUNK_SIZE + 1))
+    assert data["key"].read() == b"x" * (CHUNK_SIZE + 1)
+    meta.commit_batch()
+    data.commit_batch()
+    with meta.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(meta.table)).scalar() == 1
+        assert conn.execute(select(func.count()).select_from(data.chunks)).scalar() == 2
+    for store in meta, data:
+        store.close()
+
+
+def test_batch_failed_write(tmpdir):
+    class BrokenStream(io.RawIOBase):
+        def __init__(self):
+            self.chunks = 0
+
+        def readable(self):
+            return True
+
+        def read(self, size=-1):
+            self.chunks += 1
+            if self.chunks > 1:
+                raise OSError("upload aborted")
+            return b"x" * size
+
+    store = FileStore(f"sqlite:///{tmpdir.join('store.sqlite')!s}", "data")
+    store.create()
+    store.open()
+    store.begin_batch()
+    store["kept"] = BytesIO(b"kept")
+    with pytest.raises(OSError):
+        store["key"] = BrokenStream()
+    store.commit_batch()
+    # the failed write left no (truncated) value, the other writes of the batch are committed
+    assert list(store) == ["kept"]
+    with store.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(store.chunks)).scalar() == 1
+    store.close()
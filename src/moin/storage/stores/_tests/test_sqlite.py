@@ -6,9 +6,15 @@
 MoinMoin - SQLite store tests.
 """
 
+import io
+import sqlite3
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
 import pytest
 
-from ..sqlite import BytesStore, FileStore
+from ..sqlite import BytesStore, FileStore, STORE_FORMAT_V1, STORE_FORMAT_V2
 
 
 def bytes_compressed(path):
@@ -55,3 +61,150 @@ def test_from_uri(tmpdir, Store):
     assert store.db_name == tmpdir
     assert store.table_name == "test_table"
     assert store.compression_level == 2
+
+
+def large_value(size):
+    # compressible, but not trivially
+    return b"".join(b"%08d " % i for i in range(size // 9 + 1))[:size]
+
+
+@pytest.mark.parametrize("Store", [file_uncompressed, file_compressed])
+def test_stream(tmpdir, Store):
+    store = Store(str(tmpdir.join("store.sqlite")))
+    store.create()
+    store.open()
+    value = large_value(5 * 1024 * 1024 + 17)
+    store["key"] = BytesIO(value)
+    f = store["key"]
+    assert f.read(10) == value[:10]
+    f.seek(3 * 1024 * 1024)
+    assert f.read(100) == value[3 * 1024 * 1024 : 3 * 1024 * 1024 + 100]
+    assert f.seek(0, io.SEEK_END) == len(value)
+    assert f.read() == b""
+    f.seek(5)
+    assert f.read() == value[5:]
+    f.seek(-7, io.SEEK_END)
+    assert f.read() == value[-7:]
+    f.close()
+    store.close()
+
+
+def test_v1_migrate(tmpdir):
+    dbfile = str(tmpdir.join("store.sqlite"))
+    conn = sqlite3.connect(dbfile)
+    with conn:
+        conn.execute("create table test_table (key text primary key, value blob)")
+    conn.close()
+    values = {"plain": (0, b"plain value"), "compressed": (1, large_value(100000))}
+    old = FileStore(dbfile, "test_table")
+    old.open()
+    assert old.format == STORE_FORMAT_V1
+    for key, (level, value) in values.items():
+        old.compression_level = level
+        old[key] = BytesIO(value)
+    old.close()
+
+    store = BytesStore(dbfile, "test_table", compression_level=1)
+    store.open()
+    assert store.format == STORE_FORMAT_V1
+    assert store["compressed"] == values["compressed"][1]
+    assert store.migrate() == 2
+    assert store.format == STORE_FORMAT_V2
+    assert store.migrate() == 0
+    for key, (level, value) in values.items():
+        assert store[key] == value
+    store["new"] = b"new value"
+    assert sorted(store) == ["compressed", "new", "plain"]
+    store.close()
+    conn = sqlite3.connect(dbfile)
+    rows = dict(conn.execute("select key, size from test_table"))
+    assert rows == {"plain": 11, "compressed": 100000, "new": 9}
+    assert conn.execute("pragma journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+
+def test_batch_shared_db(tmpdir):
+    dbfile = str(tmpdir.join("store.sqlite"))
+    meta, data = BytesStore(dbfile, "meta"), FileStore(dbfile, "data")
+    for store in meta, data:
+        store.create()
+        store.open()
+    assert meta.conn is data.conn
+    meta.begin_batch()
+    data.begin_batch()
+    meta["key"] = b"meta"
+    data["key"] = BytesIO(b"data")
+    with pytest.raises(sqlite3.IntegrityError):
+        meta["key"] = b"again"  # rolled back, the batch goes on
+    meta.commit_batch()
+    # not committed until all stores of the DB file committed the batch
+    with sqlite3.connect(dbfile) as conn:
+        assert conn.execute("select count(*) from meta").fetchone()[0] == 0
+    data.commit_batch()
+    with sqlite3.connect(dbfile) as conn:
+        assert conn.execute("select count(*) from meta").fetchone()[0] == 1
+        assert conn.execute("select count(*) from data").fetchone()[0] == 1
+    assert meta["key"] == b"meta"
+    assert data["key"].read() == b"data"
+    for store in meta, data:
+        store.close()
+
+
+def test_batch_nested(tmpdir):
+    dbfile = str(tmpdir.join("store.sqlite"))
+    store = BytesStore(dbfile, "meta")
+    store.create()
+    store.open()
+    store.begin_batch()
+    store.begin_batch()
+    store["key"] = b"value"
+    store.commit_batch()
+    # the inner batch does not commit the outer one
+    with sqlite3.connect(dbfile) as conn:
+        assert conn.execute("select count(*) from meta").fetchone()[0] == 0
+    store.commit_batch()
+    with sqlite3.connect(dbfile) as conn:
+        assert conn.execute("select count(*) from meta").fetchone()[0] == 1
+    store.close()
+
+
+def test_replace_failed(tmpdir):
+    store = BytesStore(str(tmpdir.join("store.sqlite")), "meta")
+    store.create()
+    store.open()
+    store["key"] = b"value"
+    store._sql_update = "update nosuchtable set value=?"
+    for batch in False, True:
+        if batch:
+            store.begin_batch()
+        with pytest.raises(sqlite3.OperationalError):
+            store.replace("key", b"new value")
+        if batch:
+            store.commit_batch()
+        # the old value is kept
+        assert store["key"] == b"value"
+    store.close()
+
+
+def test_concurrent_writes(tmpdir):
+    dbfile = str(tmpdir.join("store.sqlite"))
+    meta, data = BytesStore(dbfile, "meta"), FileStore(dbfile, "data")
+    for store in meta, data:
+        store.create()
+        store.open()
+    meta["dup"] = b"value"
+
+    def write(i):
+        # a failing (rolled back) write of one thread does not roll back the writes of the others
+        data[f"key{i}"] = BytesIO(b"x" * 100000)
+        with pytest.raises(sqlite3.IntegrityError):
+            meta["dup"] = b"again"
+        meta[f"key{i}"] = b"%d" % i
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(write, range(100)))
+    with sqlite3.connect(dbfile) as conn:
+        assert conn.execute("select count(*) from meta").fetchone()[0] == 101
+        assert conn.execute("select count(*) from data").fetchone()[0] == 100
+    for store in meta, data:
+        store.close()
@@ -32,3 +32,14 @@ class ByteToStreamWrappingStore(MutableMapping):
 
     def __len__(self):
         return len(self._st)
+
+    def retrieve_many(self, keys):
+        for key, stream in self._st.retrieve_many(keys):
+            with stream:
+                yield key, stream.read()
+
+    def begin_batch(self):
+        self._st.begin_batch()
+
+    def commit_batch(self):
+        self._st.commit_batch()
@@ -5,33 +5,61 @@
 MoinMoin - filesystem store.
 
 Store in the file system, one file per key/value pair.
+
+By default, all files are in one directory. With a fan-out layout of N levels,
+a file is in N levels of subdirectories named by the first 2 * N hex digits of
+the SHA1 hash of its key (e.g. ``ab/cd/<key>``), so big stores do not have
+directories with millions of files. The layout of a store is recorded in a
+``.layout`` file in its directory; migrate() changes it while the store is in
+use (other processes notice the change when they miss a key or write one).
 """
 
 from __future__ import annotations
 
-from typing import BinaryIO, Iterator
+from typing import BinaryIO, Iterable, Iterator, NamedTuple
 from typing_extensions import Self
 
 import os
 import errno
+import hashlib
 import shutil
 
 from io import BytesIO
 
-from . import BinaryData, BytesStoreBase, FileStoreBase
+from moin import log
+
+from . import RETRIEVE_BATCH_SIZE, BinaryData, BytesStoreBase, FileStoreBase, batches
+
+logging = log.getLogger(__name__)
+
+LAYOUT_FILE = ".layout"  # "<levels>", or "<levels> <old levels>" while migrating
+READAHEAD_SIZE = 1024 * 1024  # bytes of every file the kernel reads ahead for retrieve_many
+
+
+class Layout(NamedTuple):
+    levels: int  # levels of subdirectories new files are stored in
+    old_levels: int | None  # levels of a migration not finished yet (keys are looked up in both)
+    stamp: tuple[int, int] | None  # inode and mtime of the layout file (None: no layout file)
 
 
 class FileStoreMixin:
 
     @classmethod
     def from_uri(cls: type[Self], uri: str) -> Self:
-        return cls(uri)
+        """
+        :param uri: path::fanout, where fanout (levels of subdirectories for a new store) is optional
+        """
+        path, _, fanout = uri.partition("::")
+        return cls(path, int(fanout) if fanout else 0)
 
-    def __init__(self, path: str) -> None:
+    def __init__(self, path: str, fanout: int = 0) -> None:
         """
         :param path: Base directory used for this store.
+        :param fanout: levels of subdirectories for the files of a new store (0: all files in path).
         """
         self.path = path
+        self.fanout = fanout
+        self._layout = Layout(0, None, None)
 
     def create(self) -> None:
         try:
@@ -39,31 +67,217 @@ class FileStoreMixin:
         except OSError as e:
             if e.errno != errno.EEXIST:
                 raise
+        if self.fanout:
+            self._write_layout(self.fanout, None)
 
     def destroy(self) -> None:
         shutil.rmtree(self.path)
 
-    def _mkpath(self, key: str) -> str:
-        return os.path.join(self.path, key)
+    def open(self) -> None:
+        self._check_layout()
+        if self._layout.levels != self.fanout and self._layout.old_levels is None:
+            logging.info(
+                f"fs store {self.path} uses {self._layout.levels} fan-out levels, not {self.fanout}: "
+                "run 'moin maint-fs-layout' to migrate it"
+            )
+
+    def _write_layout(self, levels: int, old_levels: int | None) -> None:
+        name = os.path.join(self.path, LAYOUT_FILE)
+        if not levels and old_levels is None:
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+        else:
+            with open(name + ".tmp", "w") as f:
+                f.write(f"{levels}" if old_levels is None else f"{levels} {old_levels}")
+            os.replace(name + ".tmp", name)
+        self._check_layout()
+
+    def _check_layout(self) -> bool:
+        """
+        Reload the layout if another store instance (or process) changed it.
+
+        :returns: True if the layout changed
+        """
+        name = os.path.join(self.path, LAYOUT_FILE)
+        try:
+            st = os.stat(name)
+        except FileNotFoundError:
+            stamp = None
+        else:
+            stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp == self._layout.stamp:
+            return False
+        levels, old_levels = 0, None
+        if stamp is not None:
+            with open(name) as f:
+                values = [int(value) for value in f.read().split()]
+            levels, old_levels = values[0], values[1] if len(values) > 1 else None
+        self._layout = Layout(levels, old_levels, stamp)
+        return True
+
+    def _mkpath(self, key: str, levels: int | None = None) -> str:
+        if levels is None:
+            levels = self._layout.levels
+        if not levels:
+            return os.path.join(self.path, key)
+        digest = hashlib.sha1(key.encode(), usedforsecurity=False).hexdigest()
+        return os.path.join(self.path, *(digest[2 * level : 2 * level + 2] for level in range(levels)), key)
+
+    def _paths(self, key: str) -> list[str]:
+        """
+        Return the paths the file of a key can be at (two while migrating).
+        """
+        layout = self._layout
+        paths = [self._mkpath(key, layout.levels)]
+        if layout.old_levels is not None:
+            paths.append(self._mkpath(key, layout.old_levels))
+        return paths
+
+    def local_path(self, key: str) -> str | None:
+        """
+        Return the filesystem path of the file of a key (None if there is none),
+        so the web server can send it without reading it through Python.
+        """
+        while True:
+            for path in self._paths(key):
+                if os.path.isfile(path):
+                    return path
+            if not self._check_layout():
+                return None
+
+    def _scan(self, path: str, levels: int) -> Iterator[str]:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if levels and entry.is_dir():
+                    yield from self._scan(entry.path, levels - 1)
+                elif not levels and entry.is_file():
+                    yield entry.name
 
     def __iter__(self) -> Iterator[str]:
-        yield from os.listdir(self.path)
+        self._check_layout()
+        layout = self._layout
+        yield from self._scan(self.path, layout.levels)
+        if layout.old_levels is not None:
+            yield from self._scan(self.path, layout.old_levels)
 
     def __delitem__(self, key: str) -> None:
-        os.remove(self._mkpath(key))
+        while True:
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                    return
+                except FileNotFoundError:
+                    pass
+            if not self._check_layout():
+                raise KeyError(key)
 
     def _getitem(self, key: str) -> BinaryIO:
-        try:
-            return open(self._mkpath(key), "rb")
-        except OSError as e:
-            if e.errno == errno.ENOENT:
+        while True:
+            for path in self._paths(key):
+                try:
+                    return open(path, "rb")
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+            if not self._check_layout():
                 raise KeyError(key)
-            raise
+
+    def _getitem_many(self, keys: Iterable[str]) -> Iterator[tuple[str, BinaryIO]]:
+        """
+        Yield (key, open file) for the given keys in the store, in the order of the keys.
+
+        All files of a batch of keys are opened first and the kernel is asked to read
+        them ahead, so it can read them from the disk in parallel (and in a good order).
+        """
+        for batch in batches(keys, RETRIEVE_BATCH_SIZE):
+            files = []
+            for key in batch:
+                try:
+                    f = self._getitem(key)
+                except KeyError:
+                    continue
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), 0, READAHEAD_SIZE, os.POSIX_FADV_WILLNEED)
+                files.append((key, f))
+            try:
+                while files:
+                    yield files.pop(0)
+            finally:
+                for key, f in files:  # not yielded, the caller stopped early
+                    f.close()
 
     def _setitem(self, key: str, stream: BinaryIO) -> None:
-        with open(self._mkpath(key), "wb") as f:
+        self._check_layout()
+        path, *old_paths = self._paths(key)
+        if self._layout.levels:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
             blocksize = 64 * 1024
             shutil.copyfileobj(stream, f, blocksize)
+        for old_path in old_paths:
+            try:
+                os.remove(old_path)  # an overwritten value not migrated yet
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _move(old_path: str, path: str) -> bool:
+        """
+        Move a file unless it was moved meanwhile, return True if it was moved (or written again meanwhile).
+        """
+        try:
+            # unlike a rename, linking does not replace a value written again meanwhile
+            os.link(old_path, path)
+        except FileNotFoundError:
+            return False  # moved (or removed) meanwhile
+        except FileExistsError:
+            pass  # written again meanwhile, the old value is outdated
+        try:
+            os.remove(old_path)
+        except FileNotFoundError:
+            pass  # written again (and the old value removed) meanwhile
+        return True
+
+    def migrate(self, levels: int) -> int:
+        """
+        Move the files into a fan-out layout of levels subdirectories (0: all files in path).
+
+        The store can be used meanwhile, keys are looked up in the old and the new layout
+        until all files are moved. An interrupted migration is completed by running it again.
+
+        :returns: number of files moved
+        """
+        self._check_layout()
+        layout = self._layout
+        if layout.old_levels is not None and layout.levels != levels:
+            raise ValueError(f"{self.path}: finish the migration to {layout.levels} levels first")
+        old_levels = layout.levels if layout.old_levels is None else layout.old_levels
+        if old_levels == levels:
+            return 0
+        self._write_layout(levels, old_levels)
+        moved = 0
+        for key in self._scan(self.path, old_levels):
+            old_path, path = self._mkpath(key, old_levels), self._mkpath(key, levels)
+            if levels:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            moved += self._move(old_path, path)
+        if not levels:
+            for dirpath, dirnames, filenames in os.walk(self.path, topdown=False):
+                if dirpath == self.path:
+                    continue
+                # written by a process not noticing the migration yet
+                for filename in filenames:
+                    moved += self._move(os.path.join(dirpath, filename), self._mkpath(filename, 0))
+                try:
+                    os.rmdir(dirpath)
+                except OSError as e:
+                    logging.warning(f"{self.path}: not removing directory {dirpath} of the old layout: {e}")
+        self._write_layout(levels, None)
+        return moved
 
 
 class FileStore(FileStoreMixin, FileStoreBase):
@@ -79,6 +293,9 @@ class FileStore(FileStoreMixin, FileStoreBase):
     def __setitem__(self, key: str, stream: BinaryIO) -> None:
         self._setitem(key, stream)
 
+    def retrieve_many(self, keys: Iterable[str]) -> Iterator[tuple[str, BinaryIO]]:
+        return self._getitem_many(keys)
+
 
 class BytesStore(FileStoreMixin, BytesStoreBase):
     """
@@ -92,3 +309,9 @@ class BytesStore(FileStoreMixin, BytesStoreBase):
     def __setitem__(self, key: str, value: BinaryData) -> None:
         with BytesIO(value) as stream:
             self._setitem(key, stream)
+
+    def retrieve_many(self, keys: Iterable[str]) -> Iterator[tuple[str, BinaryData]]:
+        for key, stream in self._getitem_many(keys):
+            with stream:
+                value = stream.read()
+            yield key, value
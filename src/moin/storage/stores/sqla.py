@@ -5,31 +5,82 @@
 MoinMoin - SQLAlchemy store.
 
 Stores key/value pairs into any database supported by SQLAlchemy.
+
+The FileStore stores the values in chunks of CHUNK_SIZE bytes (rows of a second
+table, <table_name>_chunks), so reading and writing a value needs a bounded amount
+of memory and the readers can seek (e.g. to serve HTTP range requests). Values
+stored by older moin versions (in the value column of the main table) can still
+be read.
+
+The stores of the tables of one database share the engine (and its connection
+pool). In a batch (see begin_batch), they write on one connection in one
+transaction, committed when all of them have committed the batch.
 """
 
 from __future__ import annotations
 
+import io
 import os
+import threading
 
-from typing import Any, BinaryIO, TYPE_CHECKING
+from typing import Any, BinaryIO, Iterable, Iterator, TYPE_CHECKING
 from typing_extensions import override, Self
 
+from contextlib import contextmanager
 from io import BytesIO
 
-from sqlalchemy import create_engine, select, MetaData, Table, Column, String, LargeBinary
+from sqlalchemy import create_engine, event, func, select, MetaData, Table, Column, Integer, String, LargeBinary
 from sqlalchemy.pool import StaticPool
 from sqlalchemy.exc import IntegrityError
 
 from moin.constants.namespaces import NAMESPACE_USERPROFILES
 from moin.storage.error import StorageError
 
-from . import BytesStoreBase, FileStoreBase
+from . import RETRIEVE_BATCH_SIZE, BytesStoreBase, FileStoreBase, batches
 
 if TYPE_CHECKING:
-    from sqlalchemy import Engine
+    from sqlalchemy import Connection, Engine
 
 KEY_LEN = 128
 VALUE_LEN = 1024 * 1024  # 1MB binary data
+CHUNK_SIZE = 64 * 1024  # FileStore values are stored in chunks of this size (the last one may be smaller)
+KEYS_PAGE_SIZE = 1000  # keys fetched per query when iterating
+
+
+class Database:
+    """
+    The engine of a database, shared by the open stores of its tables, and the
+    connection of the batch the stores are writing in.
+    """
+
+    def __init__(self, engine: Engine) -> None:
+        self.engine = engine
+        self.users = 0  # open stores
+        self.batches = 0  # stores in the batch
+        self.batch_conn: Connection | None = None
+
+
+_databases: dict[str, Database] = {}  # db_uri -> Database
+_databases_lock = threading.Lock()
+
+
+def _create_engine(db_uri: str, **kw) -> Engine:
+    """
+    Create an engine. For SQLite, SQLAlchemy (not pysqlite) begins the transactions, so
+    savepoints work (see "Serializable isolation / Savepoints" in the SQLAlchemy SQLite docs).
+    """
+    engine = create_engine(db_uri, **kw)
+    if engine.dialect.name == "sqlite":
+
+        @event.listens_for(engine, "connect")
+        def connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None  # no BEGIN emitted by pysqlite
+
+        @event.listens_for(engine, "begin")
+        def begin(conn):
+            conn.exec_driver_sql("BEGIN")
+
+    return engine
 
 
 class SQLAlchemyStoreMixin:
@@ -65,6 +116,8 @@ class SQLAlchemyStoreMixin:
         self.engine: Engine | None = None
         self.table: Table | None = None
         self.table_name = table_name
+        self._database: Database | None = None
+        self._batch_depth = 0  # batches nest
         self._make_dirs()
 
     def _make_dirs(self) -> None:
@@ -85,9 +138,16 @@ class SQLAlchemyStoreMixin:
             # These settings apply only for development/testing. The additional args are necessary
             # due to some limitations of the in-memory SQLite database.
             db_uri = "sqlite:///:memory:"
-            self.engine = create_engine(db_uri, poolclass=StaticPool, connect_args={"check_same_thread": False})
+            database = Database(_create_engine(db_uri, poolclass=StaticPool, connect_args={"check_same_thread": False}))
         else:
-            self.engine = create_engine(db_uri, echo=self.verbose, echo_pool=self.verbose)
+            with _databases_lock:
+                database = _databases.get(db_uri)
+                if database is None:
+                    engine = _create_engine(db_uri, echo=self.verbose, echo_pool=self.verbose)
+                    database = _databases[db_uri] = Database(engine)
+                database.users += 1
+        self._database = database
+        self.engine = database.engine
 
         self.metadata = MetaData()
         self.table = Table(
@@ -99,10 +159,74 @@ class SQLAlchemyStoreMixin:
 
     def close(self) -> None:
         if self.engine is not None:
-            self.engine.dispose()
+            if self._batch_depth:
+                self._batch_depth = 1
+                self.commit_batch()
+            database = self._database
+            if self.db_uri is None:
+                database.engine.dispose()
+            else:
+                with _databases_lock:
+                    database.users -= 1
+                    if not database.users:
+                        database.engine.dispose()
+                        del _databases[self.db_uri]
+            self._database = None
             self.engine = None
         self.table = None
 
+    def begin_batch(self) -> None:
+        self._batch_depth += 1
+        if self._batch_depth > 1:
+            return
+        database = self._database
+        if database.batch_conn is None:
+            database.batch_conn = self._engine().connect()
+            database.batch_conn.begin()
+        database.batches += 1
+
+    def commit_batch(self) -> None:
+        if not self._batch_depth:
+            return
+        self._batch_depth -= 1
+        if self._batch_depth:
+            return
+        database = self._database
+        database.batches -= 1
+        if not database.batches:
+            conn, database.batch_conn = database.batch_conn, None
+            try:
+                conn.commit()
+            finally:
+                conn.close()
+
+    @contextmanager
+    def _connect(self) -> Iterator[Connection]:
+        """
+        Connect for reading: in a batch, use the connection of the batch (to see its
+        uncommitted writes), else a pooled connection.
+        """
+        if self._database is not None and self._database.batch_conn is not None:
+            yield self._database.batch_conn
+        else:
+            with self._engine().connect() as conn:
+                yield conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[Connection]:
+        """
+        Connect for writing: a transaction of its own or, in a batch, the transaction of the batch.
+        """
+        conn = self._database.batch_conn if self._database is not None else None
+        if conn is None:
+            with self._engine().connect() as conn:
+                with conn.begin():
+                    yield conn
+        else:
+            # a failing write must not leave partial rows in (or abort, e.g. in PostgreSQL) the batch
+            with conn.begin_nested():
+                yield conn
+
     def create(self) -> None:
         self.open()
         with self._engine().connect() as conn:
@@ -118,35 +242,55 @@ class SQLAlchemyStoreMixin:
         self.close()
 
     def __iter__(self):
-        with self._engine().connect() as conn:
-            rows = conn.execute(select(self.table.c.key))
-            for row in rows:
-                yield row[0]
+        # page by page, so no cursor stays open while the caller writes (and commits)
+        key = None
+        while True:
+            query = select(self.table.c.key).order_by(self.table.c.key).limit(KEYS_PAGE_SIZE)
+            if key is not None:
+                query = query.where(self.table.c.key > key)
+            with self._connect() as conn:
+                keys = conn.execute(query).scalars().all()
+            yield from keys
+            if len(keys) < KEYS_PAGE_SIZE:
+                break
+            key = keys[-1]
 
     def __delitem__(self, key):
-        with self._engine().connect() as conn:
-            with conn.begin():
-                conn.execute(self.table.delete().where(self.table.c.key == key))
+        with self._transaction() as conn:
+            conn.execute(self.table.delete().where(self.table.c.key == key))
 
     def _getitem(self, key):
-        with self._engine().connect() as conn:
+        with self._connect() as conn:
             value = conn.execute(select(self.table.c.value).where(self.table.c.key == key)).fetchone()
             if value is not None:
                 return value[0]
             else:
                 raise KeyError(key)
 
+    def _getitem_many(self, keys: Iterable[str]) -> Iterator[tuple[str, bytes | None]]:
+        """
+        Yield (key, value) for the given keys in the table, in the order of the keys,
+        with one query per batch of keys.
+        """
+        for batch in batches(keys, RETRIEVE_BATCH_SIZE):
+            with self._connect() as conn:
+                values = dict(
+                    conn.execute(select(self.table.c.key, self.table.c.value).where(self.table.c.key.in_(batch))).all()
+                )
+            for key in batch:
+                if key in values:
+                    yield key, values[key]
+
     def _setitem(self, key, value):
-        with self._engine().connect() as conn:
-            with conn.begin():
-                try:
-                    conn.execute(self.table.insert().values(key=key, value=value))
-                except IntegrityError:
-                    if NAMESPACE_USERPROFILES in self.db_uri:
-                        # userprofiles namespace does support revisions so we update existing row
-                        conn.execute(self.table.update().values(key=key, value=value))
-                    else:
-                        raise
+        with self._transaction() as conn:
+            try:
+                conn.execute(self.table.insert().values(key=key, value=value))
+            except IntegrityError:
+                if NAMESPACE_USERPROFILES in self.db_uri:
+                    # userprofiles namespace does support revisions so we update existing row
+                    conn.execute(self.table.update().where(self.table.c.key == key).values(value=value))
+                else:
+                    raise
 
 
 class BytesStore(SQLAlchemyStoreMixin, BytesStoreBase):
@@ -160,18 +304,151 @@ class BytesStore(SQLAlchemyStoreMixin, BytesStoreBase):
     def __setitem__(self, key, value):
         self._setitem(key, value)
 
+    @override
+    def replace(self, key: str, value: bytes) -> None:
+        # delete and insert (not an update after a failed insert, which aborts e.g. a PostgreSQL transaction)
+        with self._transaction() as conn:
+            conn.execute(self.table.delete().where(self.table.c.key == key))
+            conn.execute(self.table.insert().values(key=key, value=value))
+
+    @override
+    def retrieve_many(self, keys: Iterable[str]) -> Iterator[tuple[str, bytes]]:
+        return self._getitem_many(keys)
+
+
+class ChunkReader(io.RawIOBase):
+    """
+    Read a FileStore value chunk by chunk.
+
+    Every read fetches (at most) one chunk, using a pooled connection (or the
+    connection of the batch).
+    """
+
+    def __init__(self, store: FileStore, key: str, size: int) -> None:
+        self._store = store
+        self._key = key
+        self._size = size
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._pos >= self._size:
+            return 0
+        seq, offset = divmod(self._pos, CHUNK_SIZE)
+        data = self._store._getchunk(self._key, seq)[offset : offset + len(buffer)]
+        buffer[: len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self._pos = offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
 
 class FileStore(SQLAlchemyStoreMixin, FileStoreBase):
     """
-    SQLAlchemy FileStore.
+    SQLAlchemy FileStore, storing the values in chunks.
     """
 
+    @override
+    def open(self) -> None:
+        super().open()
+        self.chunks = Table(
+            f"{self.table_name}_chunks",
+            self.metadata,
+            Column("key", String(KEY_LEN), primary_key=True),
+            Column("seq", Integer, primary_key=True, autoincrement=False),
+            Column("data", LargeBinary(CHUNK_SIZE)),
+        )
+        # the chunk table is missing in stores created by older moin versions
+        with self._engine().connect() as conn:
+            with conn.begin():
+                self.chunks.create(conn, checkfirst=True)
+
+    def _getchunk(self, key: str, seq: int) -> bytes:
+        with self._connect() as conn:
+            row = conn.execute(
+                select(self.chunks.c.data).where(self.chunks.c.key == key, self.chunks.c.seq == seq)
+            ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row[0]
+
     @override
     def __getitem__(self, key: str) -> BinaryIO:
-        value = self._getitem(key)
-        return BytesIO(value)
+        for _, value in self.retrieve_many([key]):
+            return value
+        raise KeyError(key)
+
+    @override
+    def retrieve_many(self, keys: Iterable[str]) -> Iterator[tuple[str, BinaryIO]]:
+        # per batch of keys: one query for the values and one for the sizes of the chunked values
+        chunks = self.chunks
+        for batch in batches(keys, RETRIEVE_BATCH_SIZE):
+            values = dict(self._getitem_many(batch))
+            with self._connect() as conn:
+                sizes = dict(
+                    conn.execute(
+                        select(chunks.c.key, func.sum(func.length(chunks.c.data)))
+                        .where(chunks.c.key.in_(batch))
+                        .group_by(chunks.c.key)
+                    ).all()
+                )
+            for key in batch:
+                if key not in values:
+                    continue
+                if values[key] is not None:
+                    yield key, BytesIO(values[key])  # value stored by an older moin version
+                else:
+                    yield key, io.BufferedReader(ChunkReader(self, key, sizes.get(key, 0)), CHUNK_SIZE)
 
     @override
     def __setitem__(self, key: str, stream: BinaryIO) -> None:
-        value = stream.read()
-        self._setitem(key, value)
+        # one transaction (or savepoint of the batch) for all chunks of the value
+        with self._transaction() as conn:
+            try:
+                conn.execute(self.table.insert().values(key=key, value=None))
+            except IntegrityError:
+                if NAMESPACE_USERPROFILES in self.db_uri:
+                    # userprofiles namespace does support revisions so we update existing row
+                    conn.execute(self.table.update().where(self.table.c.key == key).values(value=None))
+                    conn.execute(self.chunks.delete().where(self.chunks.c.key == key))
+                else:
+                    raise
+            seq = 0
+            while data := self._read_chunk(stream):
+                conn.execute(self.chunks.insert().values(key=key, seq=seq, data=data))
+                seq += 1
+
+    @staticmethod
+    def _read_chunk(stream: BinaryIO) -> bytes:
+        """
+        Read the next chunk (CHUNK_SIZE bytes, less only at the end of the stream).
+        """
+        data = stream.read(CHUNK_SIZE)
+        while data and len(data) < CHUNK_SIZE:
+            more = stream.read(CHUNK_SIZE - len(data))
+            if not more:
+                break
+            data += more
+        return data
+
+    @override
+    def __delitem__(self, key: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(self.chunks.delete().where(self.chunks.c.key == key))
+            conn.execute(self.table.delete().where(self.table.c.key == key))
@@ -8,22 +8,170 @@ This store stores data in a SQLite table, using a single DB file in the file sys
 You can use the same DB file for multiple stores by using different table names.
 
 Optionally, zlib ("gzip") compression can be used.
+
+Store formats:
+
+* v1 (old tables): the (maybe compressed) value with {{{GZn|...}}} markers, base64 encoded.
+* v2 (new tables): the (maybe compressed) value as a raw BLOB, with its compression level
+  and (uncompressed) size in separate columns. The FileStore streams values from and to
+  the BLOBs using incremental BLOB I/O, so big values are never completely in memory.
+
+The database uses the WAL journal mode, so readers do not block the writer. The SQL
+statements of a store are built once, so SQLite's statement cache of the connection
+reuses the prepared statements.
+
+The stores of the tables of one DB file share one connection. Every write is a
+transaction of its own, except in a batch (see begin_batch): all writes of the
+stores of the DB file are then one transaction, committed when the last of these
+stores calls commit_batch(). The writes (and commits) of the threads using the
+connection are serialized by a lock, so committing or rolling back a write never
+includes a write of another thread in progress.
+
+Use migrate() (moin maint-migrate-sqlite) to convert a v1 table to v2 in place.
 """
 
 from __future__ import annotations
 
-from typing import Any, BinaryIO, Iterator
+from typing import Any, BinaryIO, Iterable, Iterator
 from typing_extensions import override, Self
 
+import io
 import os
 import base64
+import tempfile
+import threading
 import zlib
 
+from contextlib import contextmanager
 from io import BytesIO
-from sqlite3 import connect, Row, IntegrityError
+from sqlite3 import connect, Blob, Connection, Row, IntegrityError
 
 from moin.constants.namespaces import NAMESPACE_USERPROFILES
-from . import BytesStoreBase, FileStoreBase
+from . import RETRIEVE_BATCH_SIZE, BytesStoreBase, FileStoreBase, batches
+
+STORE_FORMAT_V1 = 1  # base64 encoded text with {{{GZn|...}}} markers
+STORE_FORMAT_V2 = 2  # raw BLOB, compression level and size columns
+
+CHUNK_SIZE = 64 * 1024  # bytes read / written at once when streaming values
+SPOOL_SIZE = 1024 * 1024  # values written are spooled in memory up to this size, in a temporary file if bigger
+CACHED_STATEMENTS = 64  # prepared statements cached per connection
+
+
+class Database:
+    """
+    The connection to a DB file, shared by the open stores of its tables.
+    """
+
+    def __init__(self, db_name: str) -> None:
+        self.conn = connect(db_name, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+        self.conn.row_factory = Row  # make column access by ['colname'] possible
+        # readers do not block the writer (and vice versa), the journal mode is persistent
+        self.conn.execute("pragma journal_mode=wal")
+        self.users = 0  # open stores
+        self.batches = 0  # stores in a batch
+        self.lock = threading.RLock()  # held while writing or committing
+
+
+_databases: dict[str, Database] = {}  # absolute DB file name -> Database
+_databases_lock = threading.Lock()
+
+
+class BlobReader(io.RawIOBase):
+    """
+    Read an uncompressed value from a BLOB (incremental BLOB I/O).
+    """
+
+    def __init__(self, blob: Blob) -> None:
+        self._blob = blob
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._blob.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._blob.seek(offset, whence)
+        return self._blob.tell()
+
+    def tell(self) -> int:
+        return self._blob.tell()
+
+    def close(self) -> None:
+        if not self.closed:
+            self._blob.close()
+        super().close()
+
+
+class ZlibBlobReader(io.RawIOBase):
+    """
+    Read and decompress a zlib compressed value from a BLOB (incremental BLOB I/O).
+
+    Seeking backwards restarts decompressing at the start of the value, seeking to
+    (or beyond) the end does not decompress anything (to get the size of the value).
+    """
+
+    def __init__(self, blob: Blob, size: int) -> None:
+        self._blob = blob
+        self._size = size
+        self._rewind()
+
+    def _rewind(self) -> None:
+        self._blob.seek(0)
+        self._decompressor = zlib.decompressobj()
+        self._buffer = b""
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._pos >= self._size:
+            return 0
+        while not self._buffer:
+            chunk = self._blob.read(CHUNK_SIZE)
+            if not chunk:
+                self._buffer = self._decompressor.flush()
+                if not self._buffer:
+                    return 0
+            else:
+                self._buffer = self._decompressor.decompress(chunk)
+        count = min(len(buffer), len(self._buffer))
+        buffer[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        self._pos += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < self._pos:
+            self._rewind()
+        if offset >= self._size:
+            # the decompressor is not at this position, reading returns nothing anyway
+            self._pos = offset
+            return self._pos
+        while self._pos < offset and self.read(min(CHUNK_SIZE, offset - self._pos)):
+            pass
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        if not self.closed:
+            self._blob.close()
+        super().close()
 
 
 class SqliteStoreMixin:
@@ -65,34 +213,128 @@ class SqliteStoreMixin:
         self.db_name = db_name
         self.table_name = table_name
         self.compression_level = compression_level
+        self.format = STORE_FORMAT_V2
+        self.conn: Connection | None = None
+        self._database: Database | None = None
+        self._batch_depth = 0  # batches nest
         db_path = os.path.dirname(self.db_name)
         if not os.path.exists(db_path):
             os.makedirs(db_path)
 
+    def _create_table(self, conn: Connection, table_name: str) -> None:
+        conn.execute(
+            f"create table {table_name} "
+            "(key text primary key, compression integer not null, size integer not null, value blob not null)"
+        )
+
     def create(self) -> None:
         conn = connect(self.db_name)
         with conn:
-            conn.execute(f"create table {self.table_name} (key text primary key, value blob)")
+            self._create_table(conn, self.table_name)
+        conn.close()
 
     def destroy(self) -> None:
         conn = connect(self.db_name)
         with conn:
             conn.execute(f"drop table {self.table_name}")
+        conn.close()
+
+    def _table_format(self) -> int:
+        columns = {row["name"] for row in self.conn.execute(f"pragma table_info({self.table_name})")}
+        return STORE_FORMAT_V2 if "compression" in columns else STORE_FORMAT_V1
 
     def open(self) -> None:
-        self.conn = connect(self.db_name, check_same_thread=False)
-        self.conn.row_factory = Row  # make column access by ['colname'] possible
+        path = os.path.abspath(self.db_name)
+        with _databases_lock:
+            database = _databases.get(path)
+            if database is None:
+                database = _databases[path] = Database(path)
+            database.users += 1
+        self._database = database
+        self.conn = database.conn
+        self.format = self._table_format()
+        table = self.table_name
+        self._sql_iter = f"select key from {table}"
+        self._sql_delete = f"delete from {table} where key=?"
+        if self.format == STORE_FORMAT_V1:
+            self._sql_get = f"select value from {table} where key=?"
+            self._sql_get_many = f"select key, value from {table} where key in (%s)"
+            self._sql_insert = f"insert into {table} values (?, ?)"
+            self._sql_update = f"update {table} set value=? where key=?"
+        else:
+            self._sql_get = f"select compression, value from {table} where key=?"
+            self._sql_get_many = f"select key, compression, value from {table} where key in (%s)"
+            self._sql_get_blob = f"select rowid, compression, size from {table} where key=?"
+            self._sql_get_blob_many = f"select key, rowid, compression, size from {table} where key in (%s)"
+            self._sql_insert = f"insert into {table} (key, compression, size, value) values (?, ?, ?, ?)"
+            self._sql_update = f"update {table} set compression=?, size=?, value=? where key=?"
+            self._sql_insert_blob = f"insert into {table} (key, compression, size, value) values (?, ?, ?, zeroblob(?))"
+            self._sql_update_blob = f"update {table} set compression=?, size=?, value=zeroblob(?) where key=?"
+            self._sql_rowid = f"select rowid from {table} where key=?"
 
     def close(self) -> None:
-        pass
+        if self.conn is not None:
+            if self._batch_depth:
+                self._batch_depth = 1
+                self.commit_batch()
+            with _databases_lock:
+                self._database.users -= 1
+                if not self._database.users:
+                    self.conn.close()
+                    del _databases[os.path.abspath(self.db_name)]
+            self.conn = None
+            self._database = None
+
+    def begin_batch(self) -> None:
+        self._batch_depth += 1
+        if self._batch_depth == 1:
+            self._database.batches += 1
+
+    def commit_batch(self) -> None:
+        if self._batch_depth:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._database.batches -= 1
+                if not self._database.batches:
+                    with self._database.lock:
+                        self.conn.commit()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """
+        Do a write in a transaction of its own or, in a batch, in a savepoint (so a failing
+        write does not leave partial changes in the transaction of the batch).
+
+        The lock of the connection is held, so the commit or rollback does not affect
+        a write of another thread.
+        """
+        with self._database.lock:
+            if not self._database.batches:
+                with self.conn:
+                    yield
+                return
+            if not self.conn.in_transaction:
+                self.conn.execute("begin")  # releasing the savepoint must not commit
+            self.conn.execute("savepoint write")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("rollback to write")
+                raise
+            finally:
+                self.conn.execute("release write")
 
     def __iter__(self) -> Iterator[str]:
-        for row in self.conn.execute(f"select key from {self.table_name}"):
+        for row in self.conn.execute(self._sql_iter):
             yield row["key"]
 
     def __delitem__(self, key: str) -> None:
-        with self.conn:
-            self.conn.execute(f"delete from {self.table_name} where key=?", (key,))
+        with self._transaction():
+            self.conn.execute(self._sql_delete, (key,))
+
+    def _may_overwrite(self) -> bool:
+        # The userprofiles namespace does not support revisions, so we update the existing row
+        return NAMESPACE_USERPROFILES in self.db_name
 
     def _compress(self, value: bytes) -> bytes:
         if self.compression_level:
@@ -103,39 +345,138 @@ class SqliteStoreMixin:
         tail = "}}}"
         return header.encode() + value + tail.encode()
 
-    def _decompress(self, value: bytes) -> bytes:
+    @staticmethod
+    def _unmark(value: bytes) -> tuple[int, bytes]:
+        """
+        Return the compression level and the (maybe compressed) value of a marked (v1) value.
+        """
         if not (value[:5] == b"{{{GZ" and value[-3:] == b"}}}"):
-            print("value = %r ... %r" % (value[:5], value[-3:]))
             raise ValueError("Invalid data format in database.")
-        compression_level = int(chr(value[5]))
-        value = value[7:-3]
+        return int(chr(value[5])), value[7:-3]
+
+    def _decompress(self, value: bytes) -> bytes:
+        compression_level, value = self._unmark(value)
         if compression_level:
             value = zlib.decompress(value)
         return value
 
+    def _rows_many(self, sql: str, keys: Iterable[str]) -> Iterator[tuple[str, Row]]:
+        """
+        Yield (key, row) for the given keys in the table, in the order of the keys,
+        with one query per batch of keys.
+
+        :param sql: a query selecting the key column, with a %s placeholder for the keys
+        """
+        for batch in batches(keys, RETRIEVE_BATCH_SIZE):
+            placeholders = ",".join("?" * len(batch))
+            rows = {row["key"]: row for row in self.conn.execute(sql % placeholders, batch)}
+            for key in batch:
+                if key in rows:
+                    yield key, rows[key]
+
     def _getitem(self, key: str) -> bytes:
-        rows = list(self.conn.execute(f"select value from {self.table_name} where key=?", (key,)))
-        if not rows:
+        row = self.conn.execute(self._sql_get, (key,)).fetchone()
+        if row is None:
             raise KeyError(key)
-        base64_value = str(rows[0]["value"])  # a string in base64 encoding
-        compressed = base64.b64decode(base64_value.encode())
-        return self._decompress(compressed)
-
-    def _setitem(self, key: str, value: bytes) -> None:
-        compressed = self._compress(value)
-        with self.conn:
-            base64_value = base64.b64encode(compressed).decode()  # a string in base64 encoding
+        return self._value(row)
+
+    def _value(self, row: Row) -> bytes:
+        if self.format == STORE_FORMAT_V1:
+            return self._decompress(base64.b64decode(str(row["value"]).encode()))  # a string in base64 encoding
+        value = row["value"]
+        if row["compression"]:
+            value = zlib.decompress(value)
+        return value
+
+    def _setitem(self, key: str, value: bytes, overwrite: bool = False) -> None:
+        if self.format == STORE_FORMAT_V1:
+            base64_value = base64.b64encode(self._compress(value)).decode()  # a string in base64 encoding
+            insert, update = (key, base64_value), (base64_value, key)
+        else:
+            size = len(value)
+            if self.compression_level:
+                value = zlib.compress(value, self.compression_level)
+            insert, update = (key, self.compression_level, size, value), (self.compression_level, size, value, key)
+        with self._transaction():
             try:
-                self.conn.execute(f"insert into {self.table_name} values (?, ?)", (key, base64_value))
+                self.conn.execute(self._sql_insert, insert)
             except IntegrityError:
-                if NAMESPACE_USERPROFILES in self.db_name:
-                    # The userprofiles namespace does not support revisions, so we update the existing row
-                    self.conn.execute(
-                        'UPDATE {0} SET value = "{2}" WHERE key = "{1}"'.format(self.table_name, key, base64_value)
-                    )
+                if overwrite or self._may_overwrite():
+                    self.conn.execute(self._sql_update, update)
                 else:
                     raise
 
+    def _open_value(self, key: str) -> BinaryIO:
+        """
+        Return a file object streaming the value from its BLOB (v2 format).
+        """
+        row = self.conn.execute(self._sql_get_blob, (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self._open_blob(row)
+
+    def _open_blob(self, row: Row) -> BinaryIO:
+        blob = self.conn.blobopen(self.table_name, "value", row["rowid"], readonly=True)
+        raw = ZlibBlobReader(blob, row["size"]) if row["compression"] else BlobReader(blob)
+        return io.BufferedReader(raw, CHUNK_SIZE)
+
+    def _setstream(self, key: str, stream: BinaryIO) -> None:
+        """
+        Stream a value into a BLOB (v2 format).
+
+        The (maybe compressed) value is spooled first, as the size of the BLOB is needed to create it.
+        """
+        compressor = zlib.compressobj(self.compression_level) if self.compression_level else None
+        size = 0
+        with tempfile.SpooledTemporaryFile(SPOOL_SIZE) as spool:
+            while chunk := stream.read(CHUNK_SIZE):
+                size += len(chunk)
+                spool.write(compressor.compress(chunk) if compressor else chunk)
+            if compressor:
+                spool.write(compressor.flush())
+            blob_size = spool.tell()
+            spool.seek(0)
+            with self._transaction():
+                try:
+                    cursor = self.conn.execute(self._sql_insert_blob, (key, self.compression_level, size, blob_size))
+                    rowid = cursor.lastrowid
+                except IntegrityError:
+                    if not self._may_overwrite():
+                        raise
+                    self.conn.execute(self._sql_update_blob, (self.compression_level, size, blob_size, key))
+                    rowid = self.conn.execute(self._sql_rowid, (key,)).fetchone()["rowid"]
+                with self.conn.blobopen(self.table_name, "value", rowid) as blob:
+                    while chunk := spool.read(CHUNK_SIZE):
+                        blob.write(chunk)
+
+    def migrate(self) -> int:
+        """
+        Convert a v1 table to the v2 format in place (within one transaction).
+
+        Compressed values are copied as they are (no recompression).
+
+        :returns: number of values converted (0 if the table already has the v2 format)
+        """
+        if self.format == STORE_FORMAT_V2:
+            return 0
+        table, new_table = self.table_name, f"{self.table_name}_v2"
+        count = 0
+        with self._database.lock, self.conn:
+            self.conn.execute(f"drop table if exists {new_table}")
+            self._create_table(self.conn, new_table)
+            insert = f"insert into {new_table} (key, compression, size, value) values (?, ?, ?, ?)"
+            for row in self.conn.execute(f"select key, value from {table}"):
+                compression_level, value = self._unmark(base64.b64decode(str(row["value"]).encode()))
+                size = len(zlib.decompress(value)) if compression_level else len(value)
+                self.conn.execute(insert, (row["key"], compression_level, size, value))
+                count += 1
+            self.conn.execute(f"drop table {table}")
+            self.conn.execute(f"alter table {new_table} rename to {table}")
+        # prepare the statements for the new format
+        self.close()
+        self.open()
+        return count
+
 
 class BytesStore(SqliteStoreMixin, BytesStoreBase):
     """
@@ -150,6 +491,15 @@ class BytesStore(SqliteStoreMixin, BytesStoreBase):
     def __setitem__(self, key: str, value: bytes) -> None:
         self._setitem(key, value)
 
+    @override
+    def replace(self, key: str, value: bytes) -> None:
+        self._setitem(key, value, overwrite=True)
+
+    @override
+    def retrieve_many(self, keys: Iterable[str]) -> Iterator[tuple[str, bytes]]:
+        for key, row in self._rows_many(self._sql_get_many, keys):
+            yield key, self._value(row)
+
 
 class FileStore(SqliteStoreMixin, FileStoreBase):
     """
@@ -158,10 +508,22 @@ class FileStore(SqliteStoreMixin, FileStoreBase):
 
     @override
     def __getitem__(self, key: str) -> BinaryIO:
-        value = self._getitem(key)
-        return BytesIO(value)
+        if self.format == STORE_FORMAT_V1:
+            return BytesIO(self._getitem(key))
+        return self._open_value(key)
+
+    @override
+    def retrieve_many(self, keys: Iterable[str]) -> Iterator[tuple[str, BinaryIO]]:
+        if self.format == STORE_FORMAT_V1:
+            for key, row in self._rows_many(self._sql_get_many, keys):
+                yield key, BytesIO(self._value(row))
+        else:
+            for key, row in self._rows_many(self._sql_get_blob_many, keys):
+                yield key, self._open_blob(row)
 
     @override
     def __setitem__(self, key: str, stream: BinaryIO) -> None:
-        value = stream.read()
-        self._setitem(key, value)
+        if self.format == STORE_FORMAT_V1:
+            self._setitem(key, stream.read())
+        else:
+            self._setstream(key, stream)
@@ -5,6 +5,8 @@
 MoinMoin - tests for moin.utils.diff_html.
 """
 
+import difflib
+
 from moin.utils import diff_html
 
 
@@ -80,3 +82,15 @@ AAA 100
         )
     ]
     assert result == expected
+
+
+def test_diff_opcodes():
+    old, new = "a\nb\nc\nd\n", "a\nB\nc\nd\ne\n"
+    opcodes = difflib.SequenceMatcher(None, old.splitlines(), new.splitlines()).get_opcodes()
+    assert diff_html.diff(old, new, opcodes) == diff_html.diff(old, new)
+    # opcodes not matching the lines are not used
+    assert diff_html.diff(old, "x\n", opcodes) == diff_html.diff(old, "x\n")
+    # line counts matching, but lines not equal (e.g. opcodes of lines split at other line breaks)
+    old, new = "a\nb\nc\n", "a\nB\nc\n"
+    opcodes = [("equal", 0, 3, 0, 3)]
+    assert diff_html.diff(old, new, opcodes) == diff_html.diff(old, new) != []
@@ -11,6 +11,9 @@ import shutil
 
 import pytest
 
+from flask import current_app
+from werkzeug.datastructures import Range
+
 from moin.utils import send_file
 
 
@@ -38,3 +41,37 @@ class TestFuid:
 
         with pytest.raises(TypeError):
             send_file.send_file(None, as_attachment=True)
+
+    @pytest.mark.usefixtures("_req_ctx")
+    def test_web_server_sends_file(self, monkeypatch):
+        self.makefile(self.fname, "test_content")
+        monkeypatch.setitem(current_app.config, "USE_X_SENDFILE", True)
+        result = send_file.send_file(self.fname, etag="hash")
+        assert result.headers["X-Sendfile"] == self.fname
+        assert result.headers["Content-Length"] == str(len("test_content"))
+        assert result.last_modified is not None
+        monkeypatch.setitem(current_app.config, "X_ACCEL_REDIRECT", [(self.test_dir, "/moin-data/")])
+        result = send_file.send_file(self.fname, etag="hash")
+        assert result.headers["X-Accel-Redirect"] == "/moin-data/test_file"
+        assert "X-Sendfile" not in result.headers
+        assert send_file.x_accel_redirect(self.test_dir + "x/test_file") is None
+
+    def test_byte_ranges(self, app):
+        self.makefile(self.fname, "0123456789" * 10)
+        headers = {"Range": "bytes=10-19,90-"}
+        with app.test_request_context("/", headers=headers):
+            result = send_file.send_file(self.fname, etag="hash", conditional=True)
+            assert result.status_code == 206
+            assert result.content_type.startswith("multipart/byteranges; boundary=")
+            body = b"".join(result.response)
+            assert int(result.headers["Content-Length"]) == len(body)
+            assert b"Content-Range: bytes 10-19/100\r\n\r\n0123456789\r\n" in body
+            assert b"Content-Range: bytes 90-99/100\r\n\r\n0123456789\r\n" in body
+            result.close()
+        with app.test_request_context("/", headers={"Range": "bytes=10-19,20-24"}):
+            result = send_file.send_file(self.fname, etag="hash", conditional=True)
+            assert result.status_code == 206
+            assert result.headers["Content-Range"] == "bytes 10-24/100"
+            assert b"".join(result.response) == b"012345678901234"
+            result.close()
+        assert send_file.byte_ranges(Range("bytes", [(0, 10), (5, 20), (-5, None)]), 100) == [(0, 20), (95, 100)]
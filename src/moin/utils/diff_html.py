@@ -23,19 +23,34 @@ def indent(line):
     return eol + line
 
 
+def _opcodes_match(opcodes, seq1, seq2):
+    """Check that opcodes (computed from lines split in another way, e.g. of the
+    stored bytes) cover the lines seq1 and seq2 and their equal lines are equal.
+    """
+    if opcodes[-1][2] != len(seq1) or opcodes[-1][4] != len(seq2):
+        return False
+    return all(seq1[i1:i2] == seq2[j1:j2] for tag, i1, i2, j1, j2 in opcodes if tag == "equal")
+
+
 # This code originally by Scott Moonen, used with permission.
-def diff(old, new):
+def diff(old, new, opcodes=None):
     """Find changes between old and new and return
     HTML markup visualizing them.
 
     :param old: old text [unicode]
     :param new: new text [unicode]
+    :param opcodes: line opcodes (see difflib.SequenceMatcher.get_opcodes) already known,
+                    e.g. from a stored delta, used if they match the lines of old and new
     """
     seq1 = old.splitlines()
     seq2 = new.splitlines()
 
-    seqobj = difflib.SequenceMatcher(None, seq1, seq2)
-    linematch = seqobj.get_matching_blocks()
+    if opcodes and _opcodes_match(opcodes, seq1, seq2):
+        linematch = [(i1, j1, i2 - i1) for tag, i1, i2, j1, j2 in opcodes if tag == "equal"]
+        linematch.append((len(seq1), len(seq2), 0))
+    else:
+        seqobj = difflib.SequenceMatcher(None, seq1, seq2)
+        linematch = seqobj.get_matching_blocks()
 
     result = []
 
@@ -22,6 +22,8 @@ def prior_next_revs(revid, itemid):
         # maintenance scripts, such as dump-html, have request.view_args == {}
         show_revision = False
     if show_revision:
+        from moin.storage.middleware.indexing import index_only
+
         # Query by itemid, not by the item's current name: a name-based query only
         # matches revisions indexed under that name, but renaming an item does not
         # retroactively update older revisions' indexed NAME. itemid is stable
@@ -30,9 +32,10 @@ def prior_next_revs(revid, itemid):
         revs = flaskg.storage.search(query, idx_name=ALL_REVS, sortedby=[MTIME], reverse=True, limit=None)
         rev_ids = []
         mtimes = []
-        for rev in revs:
-            mtimes.append(dict(rev.meta)["mtime"])
-            rev_ids.append(rev.revid)
+        with index_only(MTIME):
+            for rev in revs:
+                mtimes.append(rev.meta[MTIME])
+                rev_ids.append(rev.revid)
         prior_rev = next_rev = prior_mtime = next_mtime = None
         current_idx = rev_ids.index(revid)
         current_mtime = mtimes[current_idx]
@@ -25,15 +25,21 @@ from time import time
 from zlib import adler32
 
 from urllib.parse import quote
-from werkzeug.datastructures import Headers
+from werkzeug.datastructures import ContentRange, Headers
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.http import is_byte_range_valid, is_resource_modified
 from werkzeug.wsgi import wrap_file
 from flask import current_app, request
 
 
 from moin import log
+from moin.utils.crypto import make_uuid
 
 logging = log.getLogger(__name__)
 
+MAX_RANGES = 64  # requests for more byte ranges get the complete data
+RANGE_BUFFER_SIZE = 64 * 1024  # bytes read at once when sending byte ranges
+
 
 def encode_rfc2231(value, coding="UTF-8", lang=""):
     """
@@ -70,6 +76,9 @@ def send_file(
     Alternatively, you can set ``USE_X_SENDFILE = True`` in the application's
     config to directly emit an `X-Sendfile` header.  This
     however requires support of the underlying web server for `X-Sendfile`.
+    For nginx, set ``X_ACCEL_REDIRECT`` to a list of (filesystem directory,
+    internal location) tuples to emit an `X-Accel-Redirect` header for the
+    filesystem files in these directories.
 
     send_file will try to guess some stuff for you if you do not provide them:
 
@@ -110,7 +119,9 @@ def send_file(
     :param mtime: the modification time of the file if provided, otherwise
                   it will be determined automatically for filesystem files
     :param cache_timeout: the timeout in seconds for the headers.
-    :param conditional: set to `True` to enable conditional responses.
+    :param conditional: set to `True` to enable conditional responses and
+                        range requests (206 Partial Content, also with
+                        multiple byte ranges) for the data sent by moin.
     :param add_etags: set to `False` to disable attaching of etags.
     :param etag: you can give an etag here, None means to try to compute the
                  etag from the file's filesystem metadata (the latter of course
@@ -162,29 +173,31 @@ def send_file(
         # that correctly). See there for details: http://greenbytes.de/tech/tc2231/
         headers.add("Content-Disposition", f"attachment; filename*={encode_rfc2231(attachment_filename)}")
 
-    if current_app.config["USE_X_SENDFILE"] and filename:
+    accel_redirect = x_accel_redirect(filename) if filename else None
+    if filename and mtime is None:
+        mtime = os.path.getmtime(filename)
+    if accel_redirect or (current_app.config["USE_X_SENDFILE"] and filename):
+        # the web server sends the file, no Python worker is busy with it
         if file:
             file.close()
-        headers["X-Sendfile"] = filename
+        if accel_redirect:
+            headers["X-Accel-Redirect"] = accel_redirect
+        else:
+            headers["X-Sendfile"] = filename
         data = None
     else:
-        if filename:
-            if not file:
-                file = open(filename, "rb")
-            if mtime is None:
-                mtime = os.path.getmtime(filename)
+        if filename and not file:
+            file = open(filename, "rb")
+            if hasattr(os, "posix_fadvise"):
+                # the file is read once, from start to end: read ahead more
+                os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
         data = wrap_file(request.environ, file)
 
     rv = current_app.response_class(data, mimetype=mimetype, headers=headers, direct_passthrough=True)
 
-    # if we know the file modification date, we can store it as the
-    # current time to better support conditional requests.  Werkzeug
-    # as of 0.6.1 will override this value however in the conditional
-    # response with the current time.  This will be fixed in Werkzeug
-    # with a new release, however many WSGI servers will still emit
-    # a separate date header.
+    # if we know the file modification date, conditional requests can use it
     if mtime is not None:
-        rv.date = int(mtime)
+        rv.last_modified = int(mtime)
 
     rv.cache_control.public = True
     if cache_timeout:
@@ -201,9 +214,122 @@ def send_file(
             raise TypeError("can't determine etag - please give etag or filename")
         rv.set_etag(etag)
         if conditional:
-            rv = rv.make_conditional(request)
+            # the web server handles range requests for X-Sendfile / X-Accel-Redirect
+            accept_ranges = data is not None and bool(fsize)
+            byte_range = request.range if accept_ranges else None
+            if byte_range is not None and len(byte_range.ranges) > 1:
+                # werkzeug only handles requests for a single byte range
+                rv = rv.make_conditional(request)
+                rv.accept_ranges = "bytes"
+                if rv.status_code == 200 and is_range_request_processable(rv):
+                    send_byte_ranges(rv, file, byte_range, fsize)
+            else:
+                rv = rv.make_conditional(request, accept_ranges=accept_ranges, complete_length=fsize)
             # make sure we don't send x-sendfile for servers that
             # ignore the 304 status code for x-sendfile.
             if rv.status_code == 304:
                 rv.headers.pop("x-sendfile", None)
+                rv.headers.pop("x-accel-redirect", None)
     return rv
+
+
+def x_accel_redirect(filename):
+    """
+    Return the nginx internal URI of a filesystem file for an X-Accel-Redirect header,
+    if it is in a directory configured in X_ACCEL_REDIRECT (None otherwise).
+    """
+    for directory, location in current_app.config.get("X_ACCEL_REDIRECT") or ():
+        directory = os.path.join(directory, "")
+        if filename.startswith(directory):
+            return location.rstrip("/") + "/" + quote(filename[len(directory) :].replace(os.sep, "/"))
+    return None
+
+
+def is_range_request_processable(rv):
+    """
+    Return True if the data of the response is unchanged according to the If-Range
+    header of the request (or if there is no If-Range header).
+    """
+    return "HTTP_IF_RANGE" not in request.environ or not is_resource_modified(
+        request.environ, rv.headers.get("ETag"), last_modified=rv.headers.get("Last-Modified"), ignore_if_range=False
+    )
+
+
+def byte_ranges(byte_range, length):
+    """
+    Return the sorted, satisfiable (start, stop) byte ranges of a parsed Range header
+    for data of the given length, adjacent (or overlapping) ranges coalesced.
+    """
+    ranges = []
+    for start, stop in byte_range.ranges:
+        if stop is None:
+            stop = length
+            if start < 0:
+                start = max(start + length, 0)
+        if is_byte_range_valid(start, stop, length):
+            ranges.append((start, min(stop, length)))
+    coalesced = []
+    for start, stop in sorted(ranges):
+        if coalesced and start <= coalesced[-1][1]:
+            coalesced[-1] = coalesced[-1][0], max(stop, coalesced[-1][1])
+        else:
+            coalesced.append((start, stop))
+    return coalesced
+
+
+def read_range(file, start, stop):
+    """
+    Read the bytes start..stop-1 of a seekable file in chunks.
+    """
+    file.seek(start)
+    remaining = stop - start
+    while remaining > 0:
+        chunk = file.read(min(remaining, RANGE_BUFFER_SIZE))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def send_byte_ranges(rv, file, byte_range, length):
+    """
+    Make the 200 response sending the complete data of file a 206 response sending
+    the requested byte ranges (multipart/byteranges if there is more than one).
+    Only the requested bytes are read from the file.
+    """
+    if byte_range.units != "bytes" or len(byte_range.ranges) > MAX_RANGES:
+        return
+    ranges = byte_ranges(byte_range, length)
+    if not ranges:
+        raise RequestedRangeNotSatisfiable(length)
+    rv.status_code = 206
+    rv.call_on_close(file.close)
+    if len(ranges) == 1:
+        [(start, stop)] = ranges
+        rv.content_range = ContentRange("bytes", start, stop, length)
+        rv.content_length = stop - start
+        rv.response = read_range(file, start, stop)
+        return
+    boundary = make_uuid()
+    content_type = rv.headers["Content-Type"]
+    parts = [
+        (
+            f"--{boundary}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n".encode(),
+            start,
+            stop,
+        )
+        for start, stop in ranges
+    ]
+    end = f"--{boundary}--\r\n".encode()
+
+    def generate():
+        for header, start, stop in parts:
+            yield header
+            yield from read_range(file, start, stop)
+            yield b"\r\n"
+        yield end
+
+    rv.content_type = f"multipart/byteranges; boundary={boundary}"
+    rv.content_length = sum(len(header) + stop - start + 2 for header, start, stop in parts) + len(end)
+    rv.response = generate()
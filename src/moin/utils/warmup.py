@@ -0,0 +1,128 @@
+# Copyright: 2026 MoinMoin project
+# License: GNU GPL v2 (or any later version), see LICENSE.txt for details.
+
+"""
+MoinMoin - warm up the wiki server at startup.
+
+The first requests after a (re)start open the index files, read the columns
+used for sorting, load the group and dict items and compile the templates.
+With warmup enabled, a background thread does this before the server reports
+being ready (see the /+misc/ready view), so a load balancer only sends
+requests to it afterwards.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import threading
+import time
+
+from whoosh.query import Every
+
+from moin import flaskg, log
+from moin.constants.keys import MTIME, NAME_EXACT
+
+if TYPE_CHECKING:
+    from moin.app import MoinApp
+
+logging = log.getLogger(__name__)
+
+# index columns the views sort by
+WARMUP_SORT_FIELDS = [NAME_EXACT, MTIME]
+
+
+class Warmup:
+    """
+    Warm up the indexes, the groups and dicts and some views of a wiki.
+    """
+
+    def __init__(self, app: MoinApp, urls: list[str] | None = None) -> None:
+        """
+        :param urls: URLs (paths) of views to render, e.g. the wiki root
+        """
+        self.app = app
+        self.urls = list(urls or [])
+        self.done = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.seconds: dict[str, float] = {}  # step -> time it took
+
+    @property
+    def ready(self) -> bool:
+        return self.done.is_set()
+
+    def warm_indexes(self) -> None:
+        """
+        Open a searcher for every index and sort by the sort columns (reads them from disk).
+        """
+        storage = self.app.storage
+        for idx_name, index in storage.ix.items():
+            schema = storage.schemas[idx_name]
+            fields = [field for field in WARMUP_SORT_FIELDS if field in schema and schema[field].column_type]
+            with index.searcher() as searcher:
+                if not searcher.doc_count_all():
+                    continue
+                for field in fields:
+                    searcher.search(Every(), sortedby=field, limit=1)
+
+    def warm_datastructures(self) -> None:
+        """
+        Load all groups and dicts (and the items defining them).
+        """
+        from moin.app import before_wiki
+
+        with self.app.test_request_context("/"):
+            before_wiki()
+            groups = flaskg.groups
+            for name in groups:
+                list(groups[name])
+            dicts = flaskg.dicts
+            if hasattr(dicts, "__iter__"):
+                names = list(dicts)
+            else:
+                names = [
+                    rev.fqname.value
+                    for rev in flaskg.unprotected_storage.documents()
+                    if dicts.is_dict_name(rev.fqname.value)
+                ]
+            for name in names:
+                dicts.get(name)
+
+    def warm_urls(self) -> None:
+        """
+        Render the warmup URLs (compiles the templates used by these views).
+        """
+        with self.app.test_client() as client:
+            for url in self.urls:
+                response = client.get(url)
+                if response.status_code >= 400:
+                    logging.warning(f"warmup: GET {url} returned {response.status}")
+
+    def run(self) -> None:
+        """
+        Run all warmup steps, the wiki is ready afterwards (also if a step failed).
+        """
+        try:
+            for step in (self.warm_indexes, self.warm_datastructures, self.warm_urls):
+                start = time.monotonic()
+                try:
+                    step()
+                except Exception as err:  # warming up is optional, serve the wiki anyway
+                    logging.exception(f"warmup: {step.__name__} failed: {err}")
+                self.seconds[step.__name__] = time.monotonic() - start
+            logging.info(
+                "warmup finished: " + ", ".join(f"{name} {seconds:.2f} s" for name, seconds in self.seconds.items())
+            )
+        finally:
+            self.done.set()
+
+    def start(self) -> Warmup:
+        self.thread = threading.Thread(target=self.run, name="moin-warmup", daemon=True)
+        self.thread.start()
+        return self
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Wait until the warmup finished, return whether it did.
+        """
+        return self.done.wait(timeout)